@@ -27,6 +27,7 @@ from xml.dom import minidom
 from nova.api.ec2 import ec2utils
 from nova import exception
 from nova.openstack.common import log as logging
+from nova import utils
 
 LOG = logging.getLogger(__name__)
 
@@ -77,7 +78,8 @@ class APIRequest(object):
                     args[key] = [v for k, v in s]
 
         result = method(context, **args)
-        return self._render_response(result, context.request_id)
+        with utils.timed('serialization'):
+            return self._render_response(result, context.request_id)
 
     def _render_response(self, response_data, request_id):
         xml = minidom.Document()
@@ -15,7 +15,9 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import datetime
 import functools
+import hashlib
 import os
 import re
 import urlparse
@@ -30,7 +32,9 @@ from nova.compute import utils as compute_utils
 from nova.compute import vm_states
 from nova import exception
 from nova.openstack.common import log as logging
+from nova.openstack.common import timeutils
 from nova import quota
+from nova import version
 
 osapi_opts = [
     cfg.IntOpt('osapi_max_limit',
@@ -232,6 +236,70 @@ def limited_by_marker(items, request, max_limit=CONF.osapi_max_limit):
     return items[start_index:range_end]
 
 
+def get_requested_page(request, max_limit=CONF.osapi_max_limit):
+    """Return the limit and marker a collection should be paged with.
+
+    Both are None unless the request gives a limit or marker, so that
+    collections which did not always page are still returned whole to
+    clients which do not ask for a page.
+    """
+    params = get_pagination_params(request)
+    if not params:
+        return None, None
+    limit = min(max_limit, params.get('limit') or max_limit)
+    return limit, params.get('marker')
+
+
+def get_collection_links(request, items, collection_name, id_key='id'):
+    """Return the 'next' link of a page of a collection, if it is full."""
+    return ViewBuilder()._get_collection_links(request, items,
+                                               collection_name, id_key)
+
+
+def check_etag(req, summarize):
+    """Tag a listing with a weak entity tag and honour If-None-Match.
+
+    The tag is derived from the summary returned by summarize(), which must
+    change whenever the listing does, and from what else the representation
+    depends on: the request URL, content type and credentials, and the nova
+    version.
+
+    Looking up the summary costs a query of its own, so it is only done
+    for conditional requests.  Clients that want a tag send If-None-Match
+    with the tag they hold, or with any tag on their first request.
+
+    summary['updated_at'] may only have whole second resolution, so a
+    second change within the same second can leave the summary as it was.
+    As with Last-Modified, no tag is given out until that second is over.
+
+    Returns a 304 Not Modified response when the client already has the
+    listing.  Otherwise the tag, if any, is set on the response by
+    wsgi.Resource and None is returned.
+    """
+    if 'HTTP_IF_NONE_MATCH' not in req.environ:
+        return
+    summary = summarize()
+    updated_at = summary.get('updated_at')
+    if updated_at is not None:
+        settled_at = (updated_at.replace(microsecond=0) +
+                      datetime.timedelta(seconds=1))
+        if timeutils.utcnow() < settled_at:
+            return
+    context = req.environ['nova.context']
+    key = repr((version.version_string_with_package(),
+                req.path_qs,
+                req.best_match_content_type(),
+                context.user_id,
+                context.project_id,
+                context.is_admin,
+                sorted(context.roles),
+                sorted(summary.items())))
+    etag = hashlib.sha1(key).hexdigest()
+    if etag in req.if_none_match:
+        return webob.exc.HTTPNotModified(headers={'ETag': 'W/"%s"' % etag})
+    req.environ['nova.etag'] = etag
+
+
 def get_id_from_href(href):
     """Return the id or uuid portion of a url.
 
@@ -48,6 +48,20 @@ class ExtendedAZController(wsgi.Controller):
             self.mc.set(cache_key, az, AZ_CACHE_SECONDS)
         return az
 
+    def _cache_host_azs(self, context, instances):
+        """Look up the zones of hosts missing from the cache at once."""
+        hosts = set()
+        for instance in instances:
+            host = str(instance.get('host'))
+            if host and not self.mc.get("azcache-%s" % host):
+                hosts.add(host)
+        if not hosts:
+            return
+        elevated = context.elevated()
+        azs = availability_zones.get_host_availability_zones(elevated, hosts)
+        for host, az in azs.iteritems():
+            self.mc.set("azcache-%s" % host, az, AZ_CACHE_SECONDS)
+
     def _extend_server(self, context, server, instance):
         key = "%s:availability_zone" % Extended_availability_zone.alias
         server[key] = self._get_host_az(context, instance)
@@ -67,8 +81,10 @@ class ExtendedAZController(wsgi.Controller):
         if authorize(context):
             resp_obj.attach(xml=ExtendedAZsTemplate())
             servers = list(resp_obj.obj['servers'])
-            for server in servers:
-                db_instance = req.get_db_instance(server['id'])
+            instances = [req.get_db_instance(server['id'])
+                         for server in servers]
+            self._cache_host_azs(context, instances)
+            for server, db_instance in zip(servers, instances):
                 self._extend_server(context, server, db_instance)
 
 
@@ -33,9 +33,8 @@ class ExtendedIpsController(wsgi.Controller):
         super(ExtendedIpsController, self).__init__(*args, **kwargs)
         self.compute_api = compute.API()
 
-    def _extend_server(self, context, server, instance):
+    def _extend_server(self, server, networks):
         key = "%s:type" % Extended_ips.alias
-        networks = common.get_networks_for_instance(context, instance)
         for label, network in networks.items():
             # NOTE(vish): ips are hidden in some states via the
             #             hide_server_addresses extension.
@@ -45,6 +44,15 @@ class ExtendedIpsController(wsgi.Controller):
                 for i, ip in enumerate(all_ips):
                     server['addresses'][label][i][key] = ip['type']
 
+    def _get_networks(self, req, context, instance_uuid):
+        networks = req.get_instance_networks(instance_uuid)
+        if networks is None:
+            # server['id'] is guaranteed to be in the cache due to
+            # the core API adding it in its 'show' or 'detail' method.
+            instance = req.get_db_instance(instance_uuid)
+            networks = common.get_networks_for_instance(context, instance)
+        return networks
+
     @wsgi.extends
     def show(self, req, resp_obj, id):
         context = req.environ['nova.context']
@@ -52,10 +60,8 @@ class ExtendedIpsController(wsgi.Controller):
             # Attach our slave template to the response object
             resp_obj.attach(xml=ExtendedIpsServerTemplate())
             server = resp_obj.obj['server']
-            db_instance = req.get_db_instance(server['id'])
-            # server['id'] is guaranteed to be in the cache due to
-            # the core API adding it in its 'show' method.
-            self._extend_server(context, server, db_instance)
+            networks = self._get_networks(req, context, server['id'])
+            self._extend_server(server, networks)
 
     @wsgi.extends
     def detail(self, req, resp_obj):
@@ -65,10 +71,12 @@ class ExtendedIpsController(wsgi.Controller):
             resp_obj.attach(xml=ExtendedIpsServersTemplate())
             servers = list(resp_obj.obj['servers'])
             for server in servers:
-                db_instance = req.get_db_instance(server['id'])
-                # server['id'] is guaranteed to be in the cache due to
-                # the core API adding it in its 'detail' method.
-                self._extend_server(context, server, db_instance)
+                # NOTE: addresses are left out of listings that ask for
+                #       a sparse set of fields.
+                if 'addresses' not in server:
+                    continue
+                networks = self._get_networks(req, context, server['id'])
+                self._extend_server(server, networks)
 
 
 class Extended_ips(extensions.ExtensionDescriptor):
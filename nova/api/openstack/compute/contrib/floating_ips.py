@@ -19,6 +19,7 @@
 
 import webob
 
+from nova.api.openstack import common
 from nova.api.openstack import extensions
 from nova.api.openstack import wsgi
 from nova.api.openstack import xmlutil
@@ -139,12 +140,24 @@ class FloatingIPController(object):
         context = req.environ['nova.context']
         authorize(context)
 
-        floating_ips = self.network_api.get_floating_ips_by_project(context)
+        limit, marker = common.get_requested_page(req)
+        try:
+            floating_ips = self.network_api.get_floating_ips_by_project(
+                context, limit=limit, marker=marker)
+        except exception.MarkerNotFound:
+            msg = _('marker [%s] not found') % marker
+            raise webob.exc.HTTPBadRequest(explanation=msg)
 
         for floating_ip in floating_ips:
             self._normalize_ip(floating_ip)
 
-        return _translate_floating_ips_view(floating_ips)
+        result = _translate_floating_ips_view(floating_ips)
+        if limit:
+            links = common.get_collection_links(req, result['floating_ips'],
+                                                'os-floating-ips')
+            if links:
+                result['floating_ips_links'] = links
+        return result
 
     @wsgi.serializers(xml=FloatingIPTemplate)
     def create(self, req, body=None):
@@ -17,6 +17,7 @@
 
 import webob.exc
 
+from nova.api.openstack import common
 from nova.api.openstack import extensions
 from nova.api.openstack import wsgi
 from nova.api.openstack import xmlutil
@@ -161,19 +162,31 @@ class HypervisorsController(object):
 
     @wsgi.serializers(xml=HypervisorIndexTemplate)
     def index(self, req):
-        context = req.environ['nova.context']
-        authorize(context)
-        compute_nodes = self.host_api.compute_node_get_all(context)
-        return dict(hypervisors=[self._view_hypervisor(hyp, False)
-                                 for hyp in compute_nodes])
+        return self._get_hypervisors(req, 'os-hypervisors', False)
 
     @wsgi.serializers(xml=HypervisorDetailTemplate)
     def detail(self, req):
+        return self._get_hypervisors(req, 'os-hypervisors/detail', True)
+
+    def _get_hypervisors(self, req, collection_name, detail):
         context = req.environ['nova.context']
         authorize(context)
-        compute_nodes = self.host_api.compute_node_get_all(context)
-        return dict(hypervisors=[self._view_hypervisor(hyp, True)
-                                 for hyp in compute_nodes])
+        limit, marker = common.get_requested_page(req)
+        try:
+            compute_nodes = self.host_api.compute_node_get_all(
+                context, limit=limit, marker=marker)
+        except exception.MarkerNotFound:
+            msg = _('marker [%s] not found') % marker
+            raise webob.exc.HTTPBadRequest(explanation=msg)
+        hypervisors = [self._view_hypervisor(hyp, detail)
+                       for hyp in compute_nodes]
+        result = dict(hypervisors=hypervisors)
+        if limit:
+            links = common.get_collection_links(req, hypervisors,
+                                                collection_name)
+            if links:
+                result['hypervisors_links'] = links
+        return result
 
     @wsgi.serializers(xml=HypervisorTemplate)
     def show(self, req, id):
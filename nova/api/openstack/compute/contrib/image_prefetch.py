@@ -0,0 +1,136 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""The image prefetch extension."""
+
+import webob.exc
+
+from nova.api.openstack import extensions
+from nova.api.openstack import wsgi
+from nova.api.openstack import xmlutil
+from nova import compute
+from nova import exception
+from nova.image import glance
+
+authorize = extensions.extension_authorizer('compute', 'image_prefetch')
+
+PREFETCH_STATES = ('queued', 'fetching', 'cached', 'error', 'unsupported',
+                   'unreachable')
+
+
+class ImagePrefetchTemplate(xmlutil.TemplateBuilder):
+    def construct(self):
+        root = xmlutil.TemplateElement('image_prefetch',
+                                       selector='image_prefetch')
+        root.set('image_id')
+        root.set('total')
+        for state in PREFETCH_STATES:
+            root.set(state)
+        hosts = xmlutil.SubTemplateElement(root, 'hosts')
+        host = xmlutil.SubTemplateElement(hosts, 'host', selector='hosts')
+        host.set('host')
+        host.set('status')
+        return xmlutil.MasterTemplate(root, 1)
+
+
+class ImagePrefetchDeserializer(wsgi.XMLDeserializer):
+    def default(self, string):
+        node = xmlutil.safe_minidom_parse_string(string)
+        prefetch = {}
+        prefetch_node = self.find_first_child_named(node, 'image_prefetch')
+        if prefetch_node is not None:
+            for attr in ('image_id', 'aggregate', 'availability_zone'):
+                if prefetch_node.hasAttribute(attr):
+                    prefetch[attr] = prefetch_node.getAttribute(attr)
+        return {'body': {'image_prefetch': prefetch}}
+
+
+class ImagePrefetchController(object):
+    """Pre-populates compute host image caches ahead of a launch."""
+
+    def __init__(self):
+        self.host_api = compute.HostAPI()
+        self.image_service = glance.get_default_image_service()
+
+    def _format(self, image_id, status):
+        hosts = [{'host': host, 'status': status[host]}
+                 for host in sorted(status)]
+        summary = dict((state, 0) for state in PREFETCH_STATES)
+        for host in hosts:
+            if host['status'] in summary:
+                summary[host['status']] += 1
+        result = {'image_id': image_id,
+                  'total': len(hosts),
+                  'hosts': hosts}
+        result.update(summary)
+        return {'image_prefetch': result}
+
+    @wsgi.serializers(xml=ImagePrefetchTemplate)
+    def show(self, req, id):
+        """Return the prefetch state of an image on the selected hosts."""
+        context = req.environ['nova.context']
+        authorize(context)
+        try:
+            status = self.host_api.get_image_prefetch_status(
+                context, id, aggregate=req.GET.get('aggregate'),
+                availability_zone=req.GET.get('availability_zone'))
+        except exception.AggregateNotFound as e:
+            raise webob.exc.HTTPNotFound(explanation=e.format_message())
+        return self._format(id, status)
+
+    @wsgi.response(202)
+    @wsgi.serializers(xml=ImagePrefetchTemplate)
+    @wsgi.deserializers(xml=ImagePrefetchDeserializer)
+    def create(self, req, body):
+        """Ask the selected hosts to fetch an image into their cache."""
+        context = req.environ['nova.context']
+        authorize(context)
+        try:
+            params = body['image_prefetch']
+            image_id = params['image_id']
+        except (TypeError, KeyError):
+            msg = _("image_prefetch and image_id must be specified.")
+            raise webob.exc.HTTPBadRequest(explanation=msg)
+
+        try:
+            self.image_service.show(context, image_id)
+        except exception.ImageNotFound:
+            msg = _("Image not found.")
+            raise webob.exc.HTTPNotFound(explanation=msg)
+
+        try:
+            hosts = self.host_api.prefetch_image(
+                context, image_id, aggregate=params.get('aggregate'),
+                availability_zone=params.get('availability_zone'))
+        except exception.AggregateNotFound as e:
+            raise webob.exc.HTTPNotFound(explanation=e.format_message())
+        return self._format(image_id, dict((host, 'queued')
+                                           for host in hosts))
+
+
+class Image_prefetch(extensions.ExtensionDescriptor):
+    """Admin-only image cache pre-warming on compute hosts."""
+
+    name = "ImagePrefetch"
+    alias = "os-image-prefetch"
+    namespace = ("http://docs.openstack.org/compute/ext/"
+                 "image_prefetch/api/v1.1")
+    updated = "2013-06-01T00:00:00+00:00"
+
+    def get_resources(self):
+        resources = [extensions.ResourceExtension('os-image-prefetch',
+                                                  ImagePrefetchController())]
+        return resources
@@ -20,6 +20,7 @@
 import webob
 import webob.exc
 
+from nova.api.openstack import common
 from nova.api.openstack.compute import servers
 from nova.api.openstack import extensions
 from nova.api.openstack import wsgi
@@ -132,7 +133,13 @@ class KeypairController(object):
         """
         context = req.environ['nova.context']
         authorize(context)
-        key_pairs = self.api.get_key_pairs(context, context.user_id)
+        limit, marker = common.get_requested_page(req)
+        try:
+            key_pairs = self.api.get_key_pairs(context, context.user_id,
+                                               limit=limit, marker=marker)
+        except exception.MarkerNotFound:
+            msg = _('marker [%s] not found') % marker
+            raise webob.exc.HTTPBadRequest(explanation=msg)
         rval = []
         for key_pair in key_pairs:
             rval.append({'keypair': {
@@ -141,7 +148,13 @@ class KeypairController(object):
                 'fingerprint': key_pair['fingerprint'],
             }})
 
-        return {'keypairs': rval}
+        result = {'keypairs': rval}
+        if limit:
+            links = common.get_collection_links(req, key_pairs, 'os-keypairs',
+                                                id_key='name')
+            if links:
+                result['keypairs_links'] = links
+        return result
 
 
 class ServerKeyNameTemplate(xmlutil.TemplateBuilder):
@@ -264,17 +264,33 @@ class SecurityGroupController(SecurityGroupControllerBase):
         search_opts = {}
         search_opts.update(req.GET)
 
-        raw_groups = self.security_group_api.list(context,
-                                                  project=context.project_id,
-                                                  search_opts=search_opts)
+        # Offset paging is still done here, over every group.
+        limit = marker = None
+        if 'offset' not in req.GET:
+            limit, marker = common.get_requested_page(req)
+        try:
+            raw_groups = self.security_group_api.list(
+                context, project=context.project_id, search_opts=search_opts,
+                limit=limit, marker=marker)
+        except exception.MarkerNotFound:
+            msg = _('marker [%s] not found') % marker
+            raise exc.HTTPBadRequest(explanation=msg)
 
         limited_list = common.limited(raw_groups, req)
         result = [self._format_security_group(context, group)
                     for group in limited_list]
 
-        return {'security_groups':
-                list(sorted(result,
-                            key=lambda k: (k['tenant_id'], k['name'])))}
+        groups = {'security_groups':
+                  list(sorted(result,
+                              key=lambda k: (k['tenant_id'], k['name'])))}
+        if limit:
+            # Groups are paged by id but sorted by tenant and name.
+            links = common.get_collection_links(
+                req, [{'id': group['id']} for group in limited_list],
+                'os-security-groups')
+            if links:
+                groups['security_groups_links'] = links
+        return groups
 
     @wsgi.serializers(xml=SecurityGroupTemplate)
     @wsgi.deserializers(xml=SecurityGroupXMLDeserializer)
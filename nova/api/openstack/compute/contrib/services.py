@@ -17,6 +17,7 @@
 from oslo.config import cfg
 import webob.exc
 
+from nova.api.openstack import common
 from nova.api.openstack import extensions
 from nova.api.openstack import wsgi
 from nova.api.openstack import xmlutil
@@ -83,19 +84,18 @@ class ServiceController(object):
         context = req.environ['nova.context']
         authorize(context)
         now = timeutils.utcnow()
-        services = self.host_api.service_get_all(
-            context, set_zones=True)
-
-        host = ''
-        if 'host' in req.GET:
-            host = req.GET['host']
-        binary = ''
-        if 'binary' in req.GET:
-            binary = req.GET['binary']
-        if host:
-            services = [s for s in services if s['host'] == host]
-        if binary:
-            services = [s for s in services if s['binary'] == binary]
+        filters = {}
+        for key in ('host', 'binary'):
+            if req.GET.get(key):
+                filters[key] = req.GET[key]
+        limit, marker = common.get_requested_page(req)
+        try:
+            services = self.host_api.service_get_all(
+                context, filters=filters, set_zones=True, limit=limit,
+                marker=marker)
+        except exception.MarkerNotFound:
+            msg = _('marker [%s] not found') % marker
+            raise webob.exc.HTTPBadRequest(explanation=msg)
 
         svcs = []
         for svc in services:
@@ -109,7 +109,14 @@ class ServiceController(object):
                          'zone': svc['availability_zone'],
                          'status': active, 'state': art,
                          'updated_at': svc['updated_at']})
-        return {'services': svcs}
+        result = {'services': svcs}
+        if limit:
+            # Services are paged by their id, which is not in the view.
+            links = common.get_collection_links(
+                req, [{'id': svc['id']} for svc in services], 'os-services')
+            if links:
+                result['services_links'] = links
+        return result
 
     @wsgi.deserializers(xml=ServiceUpdateDeserializer)
     @wsgi.serializers(xml=ServiceUpdateTemplate)
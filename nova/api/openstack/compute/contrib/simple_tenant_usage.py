@@ -20,6 +20,7 @@ import urlparse
 
 from webob import exc
 
+from nova.api.openstack import common
 from nova.api.openstack import extensions
 from nova.api.openstack import wsgi
 from nova.api.openstack import xmlutil
@@ -129,13 +130,16 @@ class SimpleTenantUsageController(object):
         return it_ref
 
     def _tenant_usages_for_period(self, context, period_start,
-                                  period_stop, tenant_id=None, detailed=True):
+                                  period_stop, tenant_id=None, detailed=True,
+                                  limit=None, marker=None):
 
         compute_api = api.API()
         instances = compute_api.get_active_by_window(context,
                                                      period_start,
                                                      period_stop,
-                                                     tenant_id)
+                                                     tenant_id,
+                                                     limit=limit,
+                                                     marker=marker)
         rval = {}
         flavors = {}
 
@@ -241,11 +245,23 @@ class SimpleTenantUsageController(object):
         now = timeutils.utcnow()
         if period_stop > now:
             period_stop = now
+        limit, marker = common.get_requested_page(req)
         usages = self._tenant_usages_for_period(context,
                                                 period_start,
                                                 period_stop,
-                                                detailed=detailed)
-        return {'tenant_usages': usages}
+                                                detailed=detailed,
+                                                limit=limit,
+                                                marker=marker)
+        result = {'tenant_usages': usages}
+        if limit:
+            # Usages are paged by tenant.
+            usages.sort(key=lambda usage: usage['tenant_id'])
+            links = common.get_collection_links(req, usages,
+                                                'os-simple-tenant-usage',
+                                                id_key='tenant_id')
+            if links:
+                result['tenant_usages_links'] = links
+        return result
 
     @wsgi.serializers(xml=SimpleTenantUsageTemplate)
     def show(self, req, id):
@@ -70,13 +70,21 @@ class Controller(wsgi.Controller):
     @wsgi.serializers(xml=MinimalFlavorsTemplate)
     def index(self, req):
         """Return all flavors in brief."""
-        flavors = self._get_flavors(req)
+        filters = self._get_filters(req)
+        not_modified = self._check_etag(req, filters)
+        if not_modified:
+            return not_modified
+        flavors = self._get_flavors(req, filters)
         return self._view_builder.index(req, flavors)
 
     @wsgi.serializers(xml=FlavorsTemplate)
     def detail(self, req):
         """Return all flavors in detail."""
-        flavors = self._get_flavors(req)
+        filters = self._get_filters(req)
+        not_modified = self._check_etag(req, filters)
+        if not_modified:
+            return not_modified
+        flavors = self._get_flavors(req, filters)
         req.cache_db_flavors(flavors)
         return self._view_builder.detail(req, flavors)
 
@@ -111,8 +119,8 @@ class Controller(wsgi.Controller):
             msg = _('Invalid is_public filter [%s]') % req.params['is_public']
             raise webob.exc.HTTPBadRequest(explanation=msg)
 
-    def _get_flavors(self, req):
-        """Helper function that returns a list of flavor dicts."""
+    def _get_filters(self, req):
+        """Helper function that returns the DB filters of a listing."""
         filters = {}
 
         context = req.environ['nova.context']
@@ -137,6 +145,18 @@ class Controller(wsgi.Controller):
                 msg = _('Invalid minDisk filter [%s]') % req.params['minDisk']
                 raise webob.exc.HTTPBadRequest(explanation=msg)
 
+        return filters
+
+    def _check_etag(self, req, filters):
+        """Return a 304 response if the client has the current listing."""
+        context = req.environ['nova.context']
+        return common.check_etag(
+            req, lambda: instance_types.get_all_types_summary(
+                context, filters=filters))
+
+    def _get_flavors(self, req, filters):
+        """Helper function that returns a list of flavor dicts."""
+        context = req.environ['nova.context']
         flavors = instance_types.get_all_types(context, filters=filters)
         flavors_list = flavors.values()
         sorted_flavors = sorted(flavors_list,
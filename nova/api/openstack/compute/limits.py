@@ -19,6 +19,7 @@ Module dedicated functions/classes dealing with rate limiting requests.
 
 import collections
 import copy
+import hashlib
 import httplib
 import math
 import re
@@ -32,6 +33,7 @@ from nova.api.openstack import wsgi
 from nova.api.openstack import xmlutil
 from nova.openstack.common import importutils
 from nova.openstack.common import jsonutils
+from nova.openstack.common import memorycache
 from nova import quota
 from nova import wsgi as base_wsgi
 
@@ -172,6 +174,15 @@ class Limit(object):
         if self.verb != verb or not re.match(self.regex, url):
             return
 
+        return self.register_request()
+
+    def register_request(self):
+        """
+        Record a request already known to match this limit.
+
+        @return: Delay in seconds before the request would be allowed, or
+                 None if it is allowed.
+        """
         now = self._get_time()
 
         if self.last_request is None:
@@ -307,6 +318,7 @@ class Limiter(object):
         """
         self.limits = copy.deepcopy(limits)
         self.levels = collections.defaultdict(lambda: copy.deepcopy(limits))
+        self._indexes = {}
 
         # Pick up any per-user limit information
         for key, value in kwargs.items():
@@ -320,6 +332,31 @@ class Limiter(object):
         """
         return [limit.display() for limit in self.levels[username]]
 
+    def _get_matching_limits(self, verb, url, username):
+        """
+        Return the limits of a user which apply to a request.
+
+        The limits of each user are grouped by verb, with their regular
+        expressions compiled, the first time the user is seen.
+        """
+        index = self._indexes.get(username)
+        if index is None:
+            index = collections.defaultdict(list)
+            for limit in self.levels[username]:
+                index[limit.verb].append((re.compile(limit.regex), limit))
+            index = self._indexes[username] = dict(index)
+
+        return [limit for regex, limit in index.get(verb, [])
+                if regex.match(url)]
+
+    def _check_limit(self, limit, username):
+        """
+        Record a request against a matching limit.
+
+        @return: Delay in seconds, or None if the request is allowed
+        """
+        return limit.register_request()
+
     def check_for_delay(self, verb, url, username=None):
         """
         Check the given verb/user/user triplet for limit.
@@ -328,8 +365,8 @@ class Limiter(object):
         """
         delays = []
 
-        for limit in self.levels[username]:
-            delay = limit(verb, url)
+        for limit in self._get_matching_limits(verb, url, username):
+            delay = self._check_limit(limit, username)
             if delay:
                 delays.append((delay, limit.error_message))
 
@@ -400,6 +437,96 @@ class Limiter(object):
         return result
 
 
+class MemcachedLimiter(Limiter):
+    """
+    Rate-limit checking class which keeps limit state in memcached.
+
+    All API workers and hosts configured with the same memcached_servers
+    share the state, so limits apply to the whole deployment rather than
+    to each worker.  Without memcached_servers, state is kept in process.
+    Select it with "limiter = nova.api.openstack.compute.limits.
+    MemcachedLimiter" in the ratelimit filter section of api-paste.ini.
+
+    Each limit is tracked as the time at which its bucket will be empty,
+    in microseconds.  A request adds to it with a single incr for every
+    limit it matches, so concurrent requests each see the level left by
+    the others, and takes its share back with decr if it is rejected.
+    A bucket that has drained is restarted with set, so requests racing
+    on an empty bucket may each be counted as the first.  Entries do not
+    expire; memcached evicts idle ones when it needs the space.
+    """
+
+    def __init__(self, limits, **kwargs):
+        super(MemcachedLimiter, self).__init__(limits, **kwargs)
+        self._cache = memorycache.get_client()
+
+    @staticmethod
+    def _cache_key(limit, username):
+        key = repr((username, limit.verb, limit.regex, limit.value,
+                    limit.unit))
+        return 'ratelimit-%s' % hashlib.md5(key).hexdigest()
+
+    @staticmethod
+    def _usecs(seconds):
+        return int(seconds * 1000000)
+
+    def _get_empty_time(self, key, now):
+        """Return when a bucket will be empty, or None if it already is."""
+        empty_time = self._cache.get(key)
+        if empty_time is not None and int(empty_time) > now:
+            return int(empty_time)
+        return None
+
+    def _decr(self, key, delta):
+        try:
+            decr = self._cache.decr
+        except AttributeError:
+            # The in process cache has no decr, but takes negative deltas.
+            return self._cache.incr(key, -delta)
+        return decr(key, delta)
+
+    def _check_limit(self, limit, username):
+        key = self._cache_key(limit, username)
+        now = self._usecs(limit._get_time())
+        request_value = self._usecs(limit.request_value)
+
+        empty_time = self._cache.incr(key, request_value)
+        if empty_time is None:
+            if self._cache.add(key, str(now + request_value)):
+                return
+            empty_time = self._cache.incr(key, request_value)
+        if empty_time is None or empty_time - request_value < now:
+            # The bucket was empty, so it fills from now on.
+            self._cache.set(key, str(now + request_value))
+            return
+
+        difference = empty_time - now - self._usecs(limit.capacity)
+        if difference > 0:
+            self._decr(key, request_value)
+            return difference / 1000000.0
+
+    def get_limits(self, username=None):
+        """
+        Return the limits for a given user, with their shared state.
+        """
+        limits = []
+        for limit in self.levels[username]:
+            now = self._usecs(limit._get_time())
+            capacity = self._usecs(limit.capacity)
+            empty_time = self._get_empty_time(
+                self._cache_key(limit, username), now) or now
+            water_level = empty_time - now
+            next_request = max(now, empty_time - capacity +
+                               self._usecs(limit.request_value))
+
+            display = limit.display()
+            display['remaining'] = int(math.floor(
+                float(capacity - water_level) / capacity * limit.value))
+            display['resetTime'] = next_request // 1000000
+            limits.append(display)
+        return limits
+
+
 class WsgiLimiter(object):
     """
     Rate-limit checking from a WSGI application. Uses an in-memory `Limiter`.
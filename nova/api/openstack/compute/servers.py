@@ -493,12 +493,47 @@ class Controller(wsgi.Controller):
 
         return instances
 
+    def _prepare_instances(self, req, context, instances, fields):
+        """Resolve data needed to render a page of servers up front.
+
+        Faults are looked up for all instances at once, and the networks
+        of each instance are prepared once and kept on the request for the
+        view builder and extensions.
+        """
+        if fields is None or 'fault' in fields:
+            self._add_instance_faults(context, instances)
+        if fields is None or 'addresses' in fields:
+            req.cache_instance_networks(dict(
+                (instance['uuid'],
+                 common.get_networks_for_instance(context, instance))
+                for instance in instances))
+
+    def _get_requested_fields(self, value):
+        """Parse and validate the fields query parameter."""
+        fields = set(field.strip() for field in value.split(',')
+                     if field.strip())
+        invalid = fields - self._view_builder.get_detail_fields()
+        if invalid:
+            msg = _("Invalid fields: %s") % ', '.join(sorted(invalid))
+            raise exc.HTTPBadRequest(explanation=msg)
+        return fields
+
     def _get_servers(self, req, is_detail):
         """Returns a list of servers, based on any search options specified."""
 
         search_opts = {}
         search_opts.update(req.GET)
 
+        # fields selects what is rendered rather than which servers are
+        # listed, so it never reaches compute as a filter.
+        fields = search_opts.pop('fields', None)
+        columns_to_join = None
+        if is_detail and fields is not None:
+            fields = self._get_requested_fields(fields)
+            columns_to_join = self._view_builder.get_columns_to_join(fields)
+        else:
+            fields = None
+
         context = req.environ['nova.context']
         remove_invalid_options(context, search_opts,
                 self._get_server_search_options())
@@ -546,10 +581,14 @@ class Controller(wsgi.Controller):
 
         limit, marker = common.get_limit_and_marker(req)
         try:
-            instance_list = self.compute_api.get_all(context,
-                                                     search_opts=search_opts,
-                                                     limit=limit,
-                                                     marker=marker)
+            not_modified = common.check_etag(
+                req, lambda: self.compute_api.get_all_summary(
+                    context, search_opts=search_opts))
+            if not_modified:
+                return not_modified
+            instance_list = self.compute_api.get_all(
+                context, search_opts=search_opts, limit=limit, marker=marker,
+                columns_to_join=columns_to_join)
         except exception.MarkerNotFound as e:
             msg = _('marker [%s] not found') % marker
             raise exc.HTTPBadRequest(explanation=msg)
@@ -559,8 +598,9 @@ class Controller(wsgi.Controller):
             instance_list = []
 
         if is_detail:
-            self._add_instance_faults(context, instance_list)
-            response = self._view_builder.detail(req, instance_list)
+            self._prepare_instances(req, context, instance_list, fields)
+            response = self._view_builder.detail(req, instance_list,
+                                                 fields=fields)
         else:
             response = self._view_builder.index(req, instance_list)
         req.cache_db_instances(instance_list)
@@ -16,6 +16,7 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import functools
 import hashlib
 
 from nova.api.openstack import common
@@ -47,6 +48,28 @@ class ViewBuilder(common.ViewBuilder):
         "ERROR",
     )
 
+    # Attributes of the detailed view that can be selected with the fields
+    # query parameter, and the instance relationships each of them needs.
+    # security_groups is rendered by the security groups extension.
+    _detail_fields = {
+        "name": [],
+        "status": [],
+        "tenant_id": [],
+        "user_id": [],
+        "metadata": ["metadata"],
+        "hostId": [],
+        "image": [],
+        "flavor": ["system_metadata"],
+        "created": [],
+        "updated": [],
+        "addresses": ["info_cache"],
+        "accessIPv4": [],
+        "accessIPv6": [],
+        "fault": [],
+        "progress": [],
+        "security_groups": ["security_groups"],
+    }
+
     def __init__(self):
         """Initialize view builder."""
         super(ViewBuilder, self).__init__()
@@ -55,13 +78,24 @@ class ViewBuilder(common.ViewBuilder):
         self._image_builder = views_images.ViewBuilder()
 
     def _skip_precooked(func):
-        def wrapped(self, request, instance):
+        def wrapped(self, request, instance, *args, **kwargs):
             if instance.get("_is_precooked"):
                 return dict(server=instance)
             else:
-                return func(self, request, instance)
+                return func(self, request, instance, *args, **kwargs)
         return wrapped
 
+    def get_detail_fields(self):
+        """Return the attributes of the detailed view."""
+        return set(self._detail_fields)
+
+    def get_columns_to_join(self, fields):
+        """Return the instance relationships needed to render fields."""
+        columns = set()
+        for field in fields:
+            columns.update(self._detail_fields[field])
+        return sorted(columns)
+
     def create(self, request, instance):
         """View that should be returned when an instance is created."""
         return {
@@ -87,35 +121,48 @@ class ViewBuilder(common.ViewBuilder):
         }
 
     @_skip_precooked
-    def show(self, request, instance):
-        """Detailed view of a single instance."""
+    def show(self, request, instance, fields=None):
+        """Detailed view of a single instance.
+
+        If fields is given only those attributes are rendered, besides the
+        id and links which are always included.
+        """
+        status = self._get_vm_state(instance)
+        attributes = {
+            "name": lambda: instance["display_name"],
+            "status": lambda: status,
+            "tenant_id": lambda: instance.get("project_id") or "",
+            "user_id": lambda: instance.get("user_id") or "",
+            "metadata": lambda: self._get_metadata(instance),
+            "hostId": lambda: self._get_host_id(instance) or "",
+            "image": lambda: self._get_image(request, instance),
+            "flavor": lambda: self._get_flavor(request, instance),
+            "created": lambda: timeutils.isotime(instance["created_at"]),
+            "updated": lambda: timeutils.isotime(instance["updated_at"]),
+            "addresses": lambda: self._get_addresses(request, instance),
+            "accessIPv4": lambda: instance.get("access_ip_v4") or "",
+            "accessIPv6": lambda: instance.get("access_ip_v6") or "",
+        }
         server = {
             "server": {
                 "id": instance["uuid"],
-                "name": instance["display_name"],
-                "status": self._get_vm_state(instance),
-                "tenant_id": instance.get("project_id") or "",
-                "user_id": instance.get("user_id") or "",
-                "metadata": self._get_metadata(instance),
-                "hostId": self._get_host_id(instance) or "",
-                "image": self._get_image(request, instance),
-                "flavor": self._get_flavor(request, instance),
-                "created": timeutils.isotime(instance["created_at"]),
-                "updated": timeutils.isotime(instance["updated_at"]),
-                "addresses": self._get_addresses(request, instance),
-                "accessIPv4": instance.get("access_ip_v4") or "",
-                "accessIPv6": instance.get("access_ip_v6") or "",
                 "links": self._get_links(request,
                                          instance["uuid"],
                                          self._collection_name),
             },
         }
-        _inst_fault = self._get_fault(request, instance)
-        if server["server"]["status"] in self._fault_statuses and _inst_fault:
-            server['server']['fault'] = _inst_fault
+        for name, attribute in attributes.iteritems():
+            if fields is None or name in fields:
+                server["server"][name] = attribute()
+
+        if fields is None or "fault" in fields:
+            _inst_fault = self._get_fault(request, instance)
+            if status in self._fault_statuses and _inst_fault:
+                server['server']['fault'] = _inst_fault
 
-        if server["server"]["status"] in self._progress_statuses:
-            server["server"]["progress"] = instance.get("progress", 0)
+        if fields is None or "progress" in fields:
+            if status in self._progress_statuses:
+                server["server"]["progress"] = instance.get("progress", 0)
 
         return server
 
@@ -123,9 +170,10 @@ class ViewBuilder(common.ViewBuilder):
         """Show a list of servers without many details."""
         return self._list_view(self.basic, request, instances)
 
-    def detail(self, request, instances):
+    def detail(self, request, instances, fields=None):
         """Detailed view of a list of instance."""
-        return self._list_view(self.show, request, instances)
+        show = functools.partial(self.show, fields=fields)
+        return self._list_view(show, request, instances)
 
     def _list_view(self, func, request, servers):
         """Provide a view for a list of servers."""
@@ -159,8 +207,10 @@ class ViewBuilder(common.ViewBuilder):
             return sha_hash.hexdigest()
 
     def _get_addresses(self, request, instance):
-        context = request.environ["nova.context"]
-        networks = common.get_networks_for_instance(context, instance)
+        networks = request.get_instance_networks(instance["uuid"])
+        if networks is None:
+            context = request.environ["nova.context"]
+            networks = common.get_networks_for_instance(context, instance)
         return self._address_builder.index(networks)["addresses"]
 
     def _get_image(self, request, instance):
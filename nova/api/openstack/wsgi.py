@@ -21,12 +21,14 @@ import time
 from xml.dom import minidom
 
 from lxml import etree
+from oslo.config import cfg
 import webob
 
 from nova.api.openstack import xmlutil
 from nova import exception
 from nova.openstack.common import jsonutils
 from nova.openstack.common import log as logging
+from nova import utils
 from nova import wsgi
 
 
@@ -35,8 +37,22 @@ XMLNS_V11 = 'http://docs.openstack.org/compute/api/v1.1'
 
 XMLNS_ATOM = 'http://www.w3.org/2005/Atom'
 
+wsgi_opts = [
+    cfg.IntOpt('osapi_stream_min_items',
+               default=500,
+               help='Collection responses with at least this many items '
+                    'are serialized one item at a time, which avoids '
+                    'converting the whole collection at once; 0 disables '
+                    'this'),
+]
+CONF = cfg.CONF
+CONF.register_opts(wsgi_opts)
+
 LOG = logging.getLogger(__name__)
 
+# Streamed bodies are written out in chunks of roughly this many bytes.
+_STREAM_CHUNK_SIZE = 64 * 1024
+
 # The vendor content types should serialize identically to the non-vendor
 # content types. So to avoid littering the code with both options, we
 # map the vendor to the other when looking up the type
@@ -123,6 +139,23 @@ class Request(webob.Request):
     def get_db_flavor(self, flavorid):
         return self.get_db_item('flavors', flavorid)
 
+    def cache_instance_networks(self, networks):
+        """
+        Store the prepared networks of instances, keyed by instance uuid,
+        so the info cache of each instance is only hydrated once per
+        request by the core API and its extensions.
+        """
+        db_items = self._extension_data['db_items']
+        db_items.setdefault('networks', {}).update(networks)
+
+    def get_instance_networks(self, instance_uuid):
+        """
+        Return the stored networks of an instance, or None when they
+        were not prepared in this request.
+        """
+        networks = self._extension_data['db_items'].get('networks', {})
+        return networks.get(instance_uuid)
+
     def best_match_content_type(self):
         """Determine the requested response content-type."""
         if 'nova.best_content_type' not in self.environ:
@@ -321,6 +354,47 @@ class JSONDictSerializer(DictSerializer):
     def default(self, data):
         return jsonutils.dumps(data)
 
+    def serialize_iter(self, data, action='default'):
+        """Serialize data one list item at a time.
+
+        Collections are a dict whose members are lists, so converting and
+        encoding each item separately avoids holding a primitive copy and
+        the encoded text of the whole document at once.  The output is
+        identical to that of serialize().
+        """
+        chunk = []
+        size = 0
+        for piece in self._iter_pieces(data):
+            chunk.append(piece)
+            size += len(piece)
+            if size >= _STREAM_CHUNK_SIZE:
+                yield ''.join(chunk)
+                chunk = []
+                size = 0
+        if chunk:
+            yield ''.join(chunk)
+
+    def _iter_pieces(self, data):
+        if not isinstance(data, dict):
+            yield jsonutils.dumps(data)
+            return
+
+        yield '{'
+        for i, (key, value) in enumerate(data.items()):
+            if i:
+                yield ', '
+            yield '%s: ' % jsonutils.dumps(key)
+            if not isinstance(value, list):
+                yield jsonutils.dumps(value)
+                continue
+            yield '['
+            for j, item in enumerate(value):
+                if j:
+                    yield ', '
+                yield jsonutils.dumps(item)
+            yield ']'
+        yield '}'
+
 
 class XMLDictSerializer(DictSerializer):
 
@@ -591,10 +665,31 @@ class ResponseObject(object):
             response.headers[hdr] = str(value)
         response.headers['Content-Type'] = content_type
         if self.obj is not None:
-            response.body = serializer.serialize(self.obj)
+            if self._should_stream(serializer):
+                # The chunks are all encoded before the status is sent, so
+                # an item that fails to serialize still fails the request
+                # instead of truncating a 200 response.
+                with utils.timed('serialization'):
+                    chunks = list(serializer.serialize_iter(self.obj))
+                response.app_iter = chunks
+                response.content_length = sum(len(chunk)
+                                              for chunk in chunks)
+            else:
+                with utils.timed('serialization'):
+                    response.body = serializer.serialize(self.obj)
 
         return response
 
+    def _should_stream(self, serializer):
+        """Decide whether to send the wrapped object incrementally."""
+        if (not CONF.osapi_stream_min_items or
+                not hasattr(serializer, 'serialize_iter') or
+                not isinstance(self.obj, dict)):
+            return False
+        items = sum(len(value) for value in self.obj.values()
+                    if isinstance(value, list))
+        return items >= CONF.osapi_stream_min_items
+
     @property
     def code(self):
         """Retrieve the response status."""
@@ -913,7 +1008,8 @@ class Resource(wsgi.Application):
         # Now, deserialize the request body...
         try:
             if content_type:
-                contents = self.deserialize(meth, content_type, body)
+                with utils.timed('serialization'):
+                    contents = self.deserialize(meth, content_type, body)
             else:
                 contents = {}
         except exception.InvalidContentType:
@@ -957,6 +1053,7 @@ class Resource(wsgi.Application):
             # Run post-processing extensions
             if resp_obj:
                 _set_request_id_header(request, resp_obj)
+                _set_etag_header(request, resp_obj)
                 # Do a preserialize to set up the response object
                 serializers = getattr(meth, 'wsgi_serializers', {})
                 resp_obj._bind_method_serializers(serializers)
@@ -1247,3 +1344,9 @@ def _set_request_id_header(req, headers):
     context = req.environ.get('nova.context')
     if context:
         headers['x-compute-request-id'] = context.request_id
+
+
+def _set_etag_header(req, headers):
+    etag = req.environ.get('nova.etag')
+    if etag:
+        headers['ETag'] = 'W/"%s"' % etag
@@ -32,6 +32,15 @@ XMLNS_V11 = 'http://docs.openstack.org/compute/api/v1.1'
 XMLNS_COMMON_V10 = 'http://docs.openstack.org/common/api/v1.0'
 XMLNS_ATOM = 'http://www.w3.org/2005/Atom'
 
+# Bumped whenever any template element is modified; compiled render plans
+# built before the change are then rebuilt on next use.
+_generation = 0
+
+
+def _template_changed():
+    global _generation
+    _generation += 1
+
 
 def validate_schema(xml, schema_name):
     if isinstance(xml, str):
@@ -177,6 +186,7 @@ class TemplateElement(object):
         self._text = None
         self._children = []
         self._childmap = {}
+        self._plans = {}
 
         # Run the incoming attributes through set() so that they
         # become selectorized
@@ -224,6 +234,7 @@ class TemplateElement(object):
 
         self._children.append(elem)
         self._childmap[elem.tag] = elem
+        _template_changed()
 
     def extend(self, elems):
         """Append children to the element."""
@@ -245,6 +256,7 @@ class TemplateElement(object):
         # Update the children
         self._children.extend(elemlist)
         self._childmap.update(elemmap)
+        _template_changed()
 
     def insert(self, idx, elem):
         """Insert a child element at the given index."""
@@ -258,6 +270,7 @@ class TemplateElement(object):
 
         self._children.insert(idx, elem)
         self._childmap[elem.tag] = elem
+        _template_changed()
 
     def remove(self, elem):
         """Remove a child element."""
@@ -271,6 +284,7 @@ class TemplateElement(object):
 
         self._children.remove(elem)
         del self._childmap[elem.tag]
+        _template_changed()
 
     def get(self, key):
         """Get an attribute.
@@ -301,6 +315,7 @@ class TemplateElement(object):
             value = Selector(value)
 
         self.attrib[key] = value
+        _template_changed()
 
     def keys(self):
         """Return the attribute names."""
@@ -458,9 +473,11 @@ class TemplateElement(object):
             value = Selector(value)
 
         self._text = value
+        _template_changed()
 
     def _text_del(self):
         self._text = None
+        _template_changed()
 
     text = property(_text_get, _text_set, _text_del)
 
@@ -517,6 +534,140 @@ def SubTemplateElement(parent, tag, attrib=None, selector=None,
     return elem
 
 
+_DYNAMIC = object()
+
+
+def _index_of(selector):
+    """Return the key a selector indexes with, if that is all it does."""
+
+    if (type(selector) is Selector and len(selector.chain) == 1 and
+            not callable(selector.chain[0])):
+        return selector.chain[0]
+    return _DYNAMIC
+
+
+def _select(obj, index, selector):
+    """Equivalent to selector(obj), using index when it is known."""
+
+    if index is _DYNAMIC:
+        return selector(obj)
+    try:
+        return obj[index]
+    except (KeyError, IndexError):
+        return None
+
+
+class _CompiledElement(object):
+    """Render plan for a template element and its sibling patches.
+
+    Template elements attached by slave templates are merged with the
+    master element once, so that serializing an object only evaluates
+    selectors and creates etree.Element instances.
+    """
+
+    def __init__(self, siblings):
+        element = siblings[0]
+        self.tag = element.tag
+        self.dynamic_tag = callable(element.tag)
+        self.selector = element.selector
+        self.index = _index_of(element.selector)
+        self.subselector = element.subselector
+        self.will_render = element.will_render
+
+        # Later patches override the text and attributes of earlier ones
+        self.text = None
+        self.text_index = _DYNAMIC
+        self.attrib = []
+        for sibling in siblings:
+            if sibling.text is not None:
+                self.text = sibling.text
+                self.text_index = _index_of(sibling.text)
+            for key, value in sibling.items():
+                self.attrib.append((key, _index_of(value), value))
+
+        self.children = []
+        seen = set()
+        for idx, sibling in enumerate(siblings):
+            for child in sibling:
+                if child.tag in seen:
+                    continue
+                seen.add(child.tag)
+                nieces = [child]
+                for sib in siblings[idx + 1:]:
+                    if child.tag in sib:
+                        nieces.append(sib[child.tag])
+                self.children.append(_CompiledElement(nieces))
+
+    def render(self, parent, obj, nsmap=None):
+        """Render obj, returning the first etree.Element created."""
+
+        data = None if obj is None else _select(obj, self.index,
+                                                 self.selector)
+        if not self.will_render(data):
+            return None
+
+        if data is None:
+            data = [None]
+            subselector = None
+        elif not isinstance(data, list):
+            data = [data]
+            subselector = self.subselector
+        elif parent is None:
+            raise ValueError(_('root element selecting a list'))
+        else:
+            subselector = self.subselector
+
+        first = None
+        for datum in data:
+            if subselector is not None:
+                datum = subselector(datum)
+            elem = self._render(parent, datum, nsmap)
+            for child in self.children:
+                child.render(elem, datum)
+            if first is None:
+                first = elem
+        return first
+
+    def _render(self, parent, datum, nsmap):
+        tagname = self.tag(datum) if self.dynamic_tag else self.tag
+        if parent is None:
+            elem = etree.Element(tagname, nsmap=nsmap)
+        else:
+            elem = etree.SubElement(parent, tagname, nsmap=nsmap)
+
+        if datum is None:
+            return elem
+
+        if self.text is not None:
+            elem.text = unicode(_select(datum, self.text_index, self.text))
+
+        for key, index, value in self.attrib:
+            # Attributes without a value are left out
+            if index is _DYNAMIC:
+                try:
+                    elem.set(key, unicode(value(datum, True)))
+                except KeyError:
+                    pass
+            else:
+                try:
+                    elem.set(key, unicode(datum[index]))
+                except (KeyError, IndexError):
+                    pass
+        return elem
+
+
+def _compile(siblings):
+    """Return the cached render plan for a list of sibling elements."""
+
+    root = siblings[0]
+    key = tuple(siblings[1:])
+    generation, plan = root._plans.get(key, (None, None))
+    if generation != _generation:
+        plan = _CompiledElement(siblings)
+        root._plans[key] = (_generation, plan)
+    return plan
+
+
 class Template(object):
     """Represent a template."""
 
@@ -536,9 +687,10 @@ class Template(object):
     def _serialize(self, parent, obj, siblings, nsmap=None):
         """Internal serialization.
 
-        Recursive routine to build a tree of etree.Element instances
-        from an object based on the template.  Returns the first
-        etree.Element instance rendered, or None.
+        Builds a tree of etree.Element instances from an object based
+        on the template, using a render plan compiled once for the
+        siblings.  Returns the first etree.Element instance rendered,
+        or None.
 
         :param parent: The parent etree.Element instance.  Can be
                        None.
@@ -550,32 +702,7 @@ class Template(object):
                       rendered.
         """
 
-        # First step, render the element
-        elems = siblings[0].render(parent, obj, siblings[1:], nsmap)
-
-        # Now, recurse to all child elements
-        seen = set()
-        for idx, sibling in enumerate(siblings):
-            for child in sibling:
-                # Have we handled this child already?
-                if child.tag in seen:
-                    continue
-                seen.add(child.tag)
-
-                # Determine the child's siblings
-                nieces = [child]
-                for sib in siblings[idx + 1:]:
-                    if child.tag in sib:
-                        nieces.append(sib[child.tag])
-
-                # Now we recurse for every data element
-                for elem, datum in elems:
-                    self._serialize(elem, datum, nieces)
-
-        # Return the first element; at the top level, this will be the
-        # root element
-        if elems:
-            return elems[0][0]
+        return _compile(siblings).render(parent, obj, nsmap)
 
     def serialize(self, obj, *args, **kwargs):
         """Serialize an object.
@@ -0,0 +1,71 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright (c) 2013 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+"""
+SQL statement accounting middleware.
+
+"""
+
+from oslo.config import cfg
+import webob.dec
+
+from nova.openstack.common.db.sqlalchemy import session as db_session
+from nova import wsgi
+
+
+query_count_header_opt = cfg.BoolOpt('query_count_header',
+                                     default=False,
+                                     help='Return the number of SQL '
+                                          'statements run by each API '
+                                          'request and the seconds they took '
+                                          'in the X-DB-Query-Count and '
+                                          'X-DB-Query-Time response headers')
+
+CONF = cfg.CONF
+CONF.register_opt(query_count_header_opt)
+
+# The QueryCounter of a request, shared with the timing middleware.
+ENVIRON_KEY = 'nova.query_counter'
+
+
+class QueryCounter(wsgi.Middleware):
+    """Count the SQL statements run by each request.
+
+    Requests which run more statements than the sql_query_*_warning options
+    allow are logged with their request id.
+    """
+
+    @webob.dec.wsgify(RequestClass=wsgi.Request)
+    def __call__(self, req):
+        counter = req.environ.get(ENVIRON_KEY)
+        if counter is not None:
+            # Already counted, and logged, further up the pipeline.
+            response = self._get_response(req, counter)
+        else:
+            description = '%s %s' % (req.method, req.path)
+            with db_session.count_queries(description=description) as counter:
+                req.environ[ENVIRON_KEY] = counter
+                response = self._get_response(req, counter)
+        if CONF.query_count_header:
+            response.headers['X-DB-Query-Count'] = str(counter.count)
+            response.headers['X-DB-Query-Time'] = '%.3f' % counter.duration
+        return response
+
+    def _get_response(self, req, counter):
+        response = req.get_response(self.application)
+        context = req.environ.get('nova.context')
+        if context is not None:
+            counter.request_id = context.request_id
+        return response
@@ -0,0 +1,124 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright (c) 2013 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+"""
+Request timing middleware.
+
+"""
+
+import cProfile
+import pstats
+import random
+import StringIO
+
+from oslo.config import cfg
+import webob.dec
+
+from nova.api import querycount
+from nova.openstack.common.db.sqlalchemy import session as db_session
+from nova.openstack.common import log as logging
+from nova import utils
+from nova import wsgi
+
+
+request_timing_opts = [
+    cfg.BoolOpt('request_timing_header',
+                default=False,
+                help='Return the seconds each API request spent in the '
+                     'database, RPC calls, other services, policy checks '
+                     'and serialization in the X-Nova-Timing response '
+                     'header'),
+    cfg.FloatOpt('request_timing_warning',
+                 default=0.0,
+                 help='Log the timings of API requests which take longer '
+                      'than this many seconds as a warning; 0 disables'),
+    cfg.FloatOpt('request_profile_rate',
+                 default=0.0,
+                 help='Fraction of API requests, between 0 and 1, to run '
+                      'under cProfile, logging the functions they spent '
+                      'most time in. Other greenthreads running at the same '
+                      'time can show up in the profile'),
+    ]
+
+CONF = cfg.CONF
+CONF.register_opts(request_timing_opts)
+LOG = logging.getLogger(__name__)
+
+# Number of functions logged for a profiled request.
+_PROFILE_LINES = 30
+
+
+class RequestTiming(wsgi.Middleware):
+    """Break down the time taken by each request.
+
+    Time is recorded in the greenthread handling the request for the
+    database, RPC calls, policy checks, hooks, (de)serialization and calls
+    to glance, quantum and cinder. Streamed response bodies are serialized
+    after the request has been timed.
+
+    The SQL statements of the request are counted as the querycount
+    middleware does, and the querycount middleware further down the
+    pipeline reuses the counter rather than counting them again.
+    """
+
+    @webob.dec.wsgify(RequestClass=wsgi.Request)
+    def __call__(self, req):
+        profiler = None
+        if (CONF.request_profile_rate and
+                random.random() < CONF.request_profile_rate):
+            profiler = cProfile.Profile()
+
+        description = '%s %s' % (req.method, req.path)
+        timer = utils.start_request_timer()
+        try:
+            with db_session.count_queries(description=description) as counter:
+                req.environ[querycount.ENVIRON_KEY] = counter
+                if profiler:
+                    response = profiler.runcall(req.get_response,
+                                                self.application)
+                else:
+                    response = req.get_response(self.application)
+                context = req.environ.get('nova.context')
+                if context is not None:
+                    counter.request_id = context.request_id
+        finally:
+            utils.stop_request_timer(timer)
+        if counter.count:
+            timer.durations['db'] = counter.duration
+            timer.counts['db'] = counter.count
+
+        values = {'method': req.method,
+                  'path': req.path,
+                  'request_id': getattr(context, 'request_id', None),
+                  'status': response.status_int,
+                  'timings': timer.format()}
+        if (CONF.request_timing_warning and
+                timer.duration > CONF.request_timing_warning):
+            LOG.warn(_('%(method)s %(path)s [%(request_id)s] '
+                       'status=%(status)s %(timings)s'), values)
+        else:
+            LOG.debug(_('%(method)s %(path)s [%(request_id)s] '
+                        'status=%(status)s %(timings)s'), values)
+        if profiler:
+            stream = StringIO.StringIO()
+            stats = pstats.Stats(profiler, stream=stream)
+            stats.sort_stats('cumulative').print_stats(_PROFILE_LINES)
+            values['profile'] = stream.getvalue()
+            LOG.info(_('Profile of %(method)s %(path)s [%(request_id)s]:\n'
+                       '%(profile)s'), values)
+
+        if CONF.request_timing_header:
+            response.headers['X-Nova-Timing'] = timer.format()
+        return response
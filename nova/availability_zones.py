@@ -66,6 +66,23 @@ def get_host_availability_zone(context, host, conductor_api=None):
         return CONF.default_availability_zone
 
 
+def get_host_availability_zones(context, hosts):
+    """Return a dict of the availability zone of each host.
+
+    Unlike get_host_availability_zone this looks up all hosts with a
+    single query.
+    """
+    metadata = db.aggregate_host_get_by_metadata_key(context,
+            key='availability_zone')
+    zones = {}
+    for host in hosts:
+        if metadata.get(host):
+            zones[host] = list(metadata[host])[0]
+        else:
+            zones[host] = CONF.default_availability_zone
+    return zones
+
+
 def get_availability_zones(context):
     """Return available and unavailable zones."""
     enabled_services = db.service_get_all(context, False)
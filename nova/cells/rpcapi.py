@@ -28,6 +28,7 @@ from nova import exception
 from nova.openstack.common import jsonutils
 from nova.openstack.common import log as logging
 from nova.openstack.common.rpc import proxy as rpc_proxy
+from nova import utils
 
 LOG = logging.getLogger(__name__)
 
@@ -57,6 +58,7 @@ class CellsAPI(rpc_proxy.RpcProxy):
     def __init__(self):
         super(CellsAPI, self).__init__(topic=CONF.cells.topic,
                 default_version=self.BASE_RPC_API_VERSION)
+        utils.time_rpc_calls(self)
 
     def cast_compute_api_method(self, ctxt, cell_name, method,
             *args, **kwargs):
@@ -42,9 +42,13 @@ def get_instances_to_sync(context, updated_since=None, project_id=None,
         filters['project_id'] = project_id
     if not deleted:
         filters['deleted'] = False
+    kwargs = {}
+    if uuids_only:
+        # Only the uuids are needed, so skip loading the joined tables.
+        kwargs['columns_to_join'] = []
     # Active instances first.
     instances = db.instance_get_all_by_filters(
-            context, filters, 'deleted', 'asc')
+            context, filters, 'deleted', 'asc', **kwargs)
     if shuffle:
         random.shuffle(instances)
     for instance in instances:
@@ -21,6 +21,7 @@ Client side of the cert manager RPC API.
 from oslo.config import cfg
 
 import nova.openstack.common.rpc.proxy
+from nova import utils
 
 rpcapi_opts = [
     cfg.StrOpt('cert_topic',
@@ -55,6 +56,7 @@ class CertAPI(nova.openstack.common.rpc.proxy.RpcProxy):
         super(CertAPI, self).__init__(
                 topic=CONF.cert_topic,
                 default_version=self.BASE_RPC_API_VERSION)
+        utils.time_rpc_calls(self)
 
     def revoke_certs_by_user(self, ctxt, user_id):
         return self.call(ctxt, self.make_msg('revoke_certs_by_user',
@@ -28,6 +28,7 @@ import string
 import time
 import uuid
 
+from eventlet import greenpool
 from oslo.config import cfg
 
 from nova import availability_zones
@@ -52,6 +53,7 @@ from nova import notifications
 from nova.openstack.common import excutils
 from nova.openstack.common import jsonutils
 from nova.openstack.common import log as logging
+from nova.openstack.common.rpc import common as rpc_common
 from nova.openstack.common import timeutils
 from nova.openstack.common import uuidutils
 import nova.policy
@@ -1310,10 +1312,16 @@ class API(base.Base):
 
     #NOTE(bcwaldon): no policy check here since it should be rolled in to
     # search_opts in get_all
-    def get_active_by_window(self, context, begin, end=None, project_id=None):
-        """Get instances that were continuously active over a window."""
+    def get_active_by_window(self, context, begin, end=None, project_id=None,
+                             limit=None, marker=None):
+        """Get instances that were continuously active over a window.
+
+        limit and marker page through the projects owning the instances.
+        """
         return self.db.instance_get_active_by_window_joined(context, begin,
-                                                     end, project_id)
+                                                     end, project_id,
+                                                     limit=limit,
+                                                     marker=marker)
 
     #NOTE(bcwaldon): this doesn't really belong in this class
     def get_instance_type(self, context, instance_type_id):
@@ -1341,7 +1349,8 @@ class API(base.Base):
         return inst
 
     def get_all(self, context, search_opts=None, sort_key='created_at',
-                sort_dir='desc', limit=None, marker=None):
+                sort_dir='desc', limit=None, marker=None,
+                columns_to_join=None):
         """Get all instances filtered by one of the given parameters.
 
         If there is no filter and the context is an admin, it will retrieve
@@ -1353,8 +1362,48 @@ class API(base.Base):
         The results will be returned sorted in the order specified by the
         'sort_dir' parameter using the key specified in the 'sort_key'
         parameter.
+
+        columns_to_join limits the instance relationships that are loaded,
+        None loads all of them.
         """
 
+        filters = self._get_search_filters(context, search_opts)
+        if filters is None:
+            return []
+
+        inst_models = self._get_instances_by_filters(
+            context, filters, sort_key, sort_dir, limit=limit, marker=marker,
+            columns_to_join=columns_to_join)
+
+        # Convert the models to dictionaries
+        instances = []
+        for inst_model in inst_models:
+            instance = dict(inst_model.iteritems())
+            # NOTE(comstud): Doesn't get returned by iteritems
+            instance['name'] = inst_model['name']
+            instances.append(instance)
+
+        return instances
+
+    def get_all_summary(self, context, search_opts=None):
+        """Summarize the instances get_all would return for search_opts.
+
+        Returns a dict with the number of matching instances and the time
+        the last of them changed, which is cheaper to look up than the
+        instances themselves.
+        """
+        filters = self._get_search_filters(context, search_opts)
+        if filters is None:
+            return {'count': 0, 'updated_at': None}
+        self._remap_ip_filters(context, filters)
+        return self.db.instance_get_summary_by_filters(context, filters,
+                                                       use_slave=True)
+
+    def _get_search_filters(self, context, search_opts):
+        """Check policy and turn search options into DB filters.
+
+        Returns None if the search options can not match any instance.
+        """
         #TODO(bcwaldon): determine the best argument for target here
         target = {
             'project_id': context.project_id,
@@ -1412,30 +1461,13 @@ class API(base.Base):
                     try:
                         remap_object(value)
 
-                    # We already know we can't match the filter, so
-                    # return an empty list
+                    # We already know we can't match the filter
                     except ValueError:
-                        return []
+                        return None
 
-        inst_models = self._get_instances_by_filters(context, filters,
-                                                     sort_key, sort_dir,
-                                                     limit=limit,
-                                                     marker=marker)
+        return filters
 
-        # Convert the models to dictionaries
-        instances = []
-        for inst_model in inst_models:
-            instance = dict(inst_model.iteritems())
-            # NOTE(comstud): Doesn't get returned by iteritems
-            instance['name'] = inst_model['name']
-            instances.append(instance)
-
-        return instances
-
-    def _get_instances_by_filters(self, context, filters,
-                                  sort_key, sort_dir,
-                                  limit=None,
-                                  marker=None):
+    def _remap_ip_filters(self, context, filters):
         if 'ip6' in filters or 'ip' in filters:
             res = self.network_api.get_instance_uuids_by_ip_filter(context,
                                                                    filters)
@@ -1444,9 +1476,15 @@ class API(base.Base):
             uuids = set([r['instance_uuid'] for r in res])
             filters['uuid'] = uuids
 
-        return self.db.instance_get_all_by_filters(context, filters,
-                                                   sort_key, sort_dir,
-                                                   limit=limit, marker=marker)
+    def _get_instances_by_filters(self, context, filters,
+                                  sort_key, sort_dir,
+                                  limit=None,
+                                  marker=None,
+                                  columns_to_join=None):
+        self._remap_ip_filters(context, filters)
+        return self.db.instance_get_all_by_filters(
+            context, filters, sort_key, sort_dir, limit=limit, marker=marker,
+            columns_to_join=columns_to_join, use_slave=True)
 
     @wrap_check_policy
     @check_instance_state(vm_state=[vm_states.ACTIVE, vm_states.STOPPED])
@@ -2529,16 +2567,30 @@ class HostAPI(base.Base):
         return self.rpcapi.host_maintenance_mode(context,
                 host_param=host_name, mode=mode, host=host_name)
 
-    def service_get_all(self, context, filters=None, set_zones=False):
+    def service_get_all(self, context, filters=None, set_zones=False,
+                        limit=None, marker=None):
         """Returns a list of services, optionally filtering the results.
 
         If specified, 'filters' should be a dictionary containing services
         attributes and matching values.  Ie, to get a list of services for
         the 'compute' topic, use filters={'topic': 'compute'}.
+
+        limit and marker page through the services ordered by id.
         """
         if filters is None:
             filters = {}
         disabled = filters.pop('disabled', None)
+        paged = limit is not None or marker is not None
+        if paged and 'availability_zone' not in filters:
+            # Every other filter is a column, so the database can page.
+            services = self.db.service_get_all(context, disabled=disabled,
+                                               filters=filters, limit=limit,
+                                               marker=marker)
+            if set_zones:
+                services = availability_zones.set_availability_zones(
+                        context, services)
+            return services
+
         services = self.db.service_get_all(context, disabled=disabled)
         if set_zones or 'availability_zone' in filters:
             services = availability_zones.set_availability_zones(context,
@@ -2551,7 +2603,68 @@ class HostAPI(base.Base):
             else:
                 # All filters matched.
                 ret_services.append(service)
-        return ret_services
+        return utils.page_items(ret_services, limit, marker)
+
+    def _get_prefetch_hosts(self, context, aggregate=None,
+                            availability_zone=None):
+        """Return the enabled compute hosts in an aggregate and/or zone.
+
+        'aggregate' may be an aggregate id or name.
+        """
+        services = self.service_get_all(context,
+                                        filters={'topic': CONF.compute_topic,
+                                                 'disabled': False},
+                                        set_zones=True)
+        hosts = [service['host'] for service in services
+                 if (availability_zone is None or
+                     service['availability_zone'] == availability_zone)]
+        if aggregate is not None:
+            matches = [agg for agg in self.db.aggregate_get_all(context)
+                       if str(agg['id']) == str(aggregate) or
+                          agg['name'] == aggregate]
+            if not matches:
+                raise exception.AggregateNotFound(aggregate_id=aggregate)
+            members = self.db.aggregate_host_get_all(context,
+                                                     matches[0]['id'])
+            hosts = [host for host in hosts if host in members]
+        return sorted(set(hosts))
+
+    def prefetch_image(self, context, image_id, aggregate=None,
+                       availability_zone=None):
+        """Ask compute hosts to fetch an image into their image cache.
+
+        Returns the list of hosts the request was sent to.
+        """
+        hosts = self._get_prefetch_hosts(context, aggregate=aggregate,
+                                         availability_zone=availability_zone)
+        for host in hosts:
+            self.rpcapi.prefetch_image(context, image_id=image_id, host=host)
+        return hosts
+
+    def get_image_prefetch_status(self, context, image_id, aggregate=None,
+                                  availability_zone=None):
+        """Return a dict of host to image prefetch state.
+
+        The hosts are asked in parallel.  A host that does not answer is
+        reported as 'unreachable', and one that fails to as 'error'.
+        """
+        hosts = self._get_prefetch_hosts(context, aggregate=aggregate,
+                                         availability_zone=availability_zone)
+
+        def get_status(host):
+            try:
+                return self.rpcapi.get_image_prefetch_status(
+                    context, image_id=image_id, host=host)
+            except rpc_common.Timeout:
+                return 'unreachable'
+            except Exception:
+                LOG.exception(_("Failed to get the prefetch status of image "
+                                "%(image_id)s on %(host)s") %
+                              {'image_id': image_id, 'host': host})
+                return 'error'
+
+        pool = greenpool.GreenPool()
+        return dict(zip(hosts, pool.imap(get_status, hosts)))
 
     def service_get_by_compute_host(self, context, host_name):
         """Get service entry for the given compute hostname."""
@@ -2576,8 +2689,9 @@ class HostAPI(base.Base):
         """Return compute node entry for particular integer ID."""
         return self.db.compute_node_get(context, int(compute_id))
 
-    def compute_node_get_all(self, context):
-        return self.db.compute_node_get_all(context)
+    def compute_node_get_all(self, context, limit=None, marker=None):
+        return self.db.compute_node_get_all(context, limit=limit,
+                                            marker=marker)
 
     def compute_node_search_by_hypervisor(self, context, hypervisor_match):
         return self.db.compute_node_search_by_hypervisor(context,
@@ -2768,9 +2882,11 @@ class KeypairAPI(base.Base):
         """Delete a keypair by name."""
         self.db.key_pair_destroy(context, user_id, key_name)
 
-    def get_key_pairs(self, context, user_id):
-        """List key pairs."""
-        key_pairs = self.db.key_pair_get_all_by_user(context, user_id)
+    def get_key_pairs(self, context, user_id, limit=None, marker=None):
+        """List key pairs, optionally paged through by name."""
+        key_pairs = self.db.key_pair_get_all_by_user(context, user_id,
+                                                     limit=limit,
+                                                     marker=marker)
         rval = []
         for key_pair in key_pairs:
             rval.append({
@@ -2895,7 +3011,7 @@ class SecurityGroupAPI(base.Base, security_group_base.SecurityGroupBase):
                 raise
 
     def list(self, context, names=None, ids=None, project=None,
-             search_opts=None):
+             search_opts=None, limit=None, marker=None):
         self.ensure_default(context)
 
         groups = []
@@ -2908,19 +3024,25 @@ class SecurityGroupAPI(base.Base, security_group_base.SecurityGroupBase):
             if ids:
                 for id in ids:
                     groups.append(self.db.security_group_get(context, id))
+            groups = utils.page_items(groups, limit, marker)
 
         elif context.is_admin:
             # TODO(eglynn): support a wider set of search options than just
             # all_tenants, at least include the standard filters defined for
             # the EC2 DescribeSecurityGroups API for the non-admin case also
             if (search_opts and 'all_tenants' in search_opts):
-                groups = self.db.security_group_get_all(context)
+                groups = self.db.security_group_get_all(context, limit=limit,
+                                                        marker=marker)
             else:
                 groups = self.db.security_group_get_by_project(context,
-                                                               project)
+                                                               project,
+                                                               limit=limit,
+                                                               marker=marker)
 
         elif project:
-            groups = self.db.security_group_get_by_project(context, project)
+            groups = self.db.security_group_get_by_project(context, project,
+                                                           limit=limit,
+                                                           marker=marker)
 
         return groups
 
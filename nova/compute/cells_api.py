@@ -26,6 +26,7 @@ from nova.compute import vm_states
 from nova import exception
 from nova.openstack.common import excutils
 from nova.openstack.common import log as logging
+from nova import utils
 
 LOG = logging.getLogger(__name__)
 
@@ -588,23 +589,34 @@ class HostAPI(compute_api.HostAPI):
         """
         pass
 
-    def service_get_all(self, context, filters=None, set_zones=False):
-        if filters is None:
-            filters = {}
+    def service_get_all(self, context, filters=None, set_zones=False,
+                        limit=None, marker=None):
+        # The filters are consumed below, so leave the caller's alone.
+        filters = dict(filters or {})
         if 'availability_zone' in filters:
             zone_filter = filters.pop('availability_zone')
             set_zones = True
         else:
             zone_filter = None
+        # Child cells report hosts without their cell prefix, so hosts
+        # and binaries are matched here once the cell has been added.
+        local_filters = {}
+        for key in ('host', 'binary'):
+            if key in filters:
+                local_filters[key] = filters.pop(key)
         services = self.cells_rpcapi.service_get_all(context,
                                                      filters=filters)
+        if local_filters:
+            services = [s for s in services
+                        if all(s[key] == value
+                               for key, value in local_filters.items())]
         if set_zones:
             services = availability_zones.set_availability_zones(context,
                                                                  services)
             if zone_filter is not None:
                 services = [s for s in services
                             if s['availability_zone'] == zone_filter]
-        return services
+        return utils.page_items(services, limit, marker)
 
     def service_get_by_compute_host(self, context, host_name):
         return self.cells_rpcapi.service_get_by_compute_host(context,
@@ -644,8 +656,9 @@ class HostAPI(compute_api.HostAPI):
         """
         return self.cells_rpcapi.compute_node_get(context, compute_id)
 
-    def compute_node_get_all(self, context):
-        return self.cells_rpcapi.compute_node_get_all(context)
+    def compute_node_get_all(self, context, limit=None, marker=None):
+        compute_nodes = self.cells_rpcapi.compute_node_get_all(context)
+        return utils.page_items(compute_nodes, limit, marker)
 
     def compute_node_search_by_hypervisor(self, context, hypervisor_match):
         return self.cells_rpcapi.compute_node_get_all(context,
@@ -168,6 +168,17 @@ def get_all_types(ctxt=None, inactive=False, filters=None):
 get_all_flavors = get_all_types
 
 
+def get_all_types_summary(ctxt=None, inactive=False, filters=None):
+    """Get the number of instance_types get_all_types would return and
+    when the last of them changed.
+    """
+    if ctxt is None:
+        ctxt = context.get_admin_context()
+
+    return db.instance_type_get_summary(
+            ctxt, inactive=inactive, filters=filters)
+
+
 def get_default_instance_type():
     """Get the default instance type."""
     name = CONF.default_instance_type
@@ -37,6 +37,7 @@ import traceback
 import uuid
 
 from eventlet import greenthread
+from eventlet import semaphore
 from oslo.config import cfg
 
 from nova import block_device
@@ -91,6 +92,10 @@ compute_opts = [
                 help='Whether to batch up the application of IPTables rules'
                      ' during a host restart and apply all at the end of the'
                      ' init phase'),
+    cfg.IntOpt('image_prefetch_concurrency',
+               default=2,
+               help='Maximum number of images fetched into the image cache '
+                    'at the same time in response to prefetch requests'),
     cfg.StrOpt('instances_path',
                default=paths.state_path_def('instances'),
                help='where instances are stored on disk'),
@@ -324,7 +329,7 @@ class ComputeVirtAPI(virtapi.VirtAPI):
 class ComputeManager(manager.SchedulerDependentManager):
     """Manages the running instances from creation to destruction."""
 
-    RPC_API_VERSION = '2.27'
+    RPC_API_VERSION = '2.28'
 
     def __init__(self, compute_driver=None, *args, **kwargs):
         """Load configuration options and connect to the hypervisor."""
@@ -343,6 +348,9 @@ class ComputeManager(manager.SchedulerDependentManager):
         self.consoleauth_rpcapi = consoleauth.rpcapi.ConsoleAuthAPI()
         self.cells_rpcapi = cells_rpcapi.CellsAPI()
         self._resource_tracker_dict = {}
+        self._image_prefetch_semaphore = semaphore.Semaphore(
+            CONF.image_prefetch_concurrency)
+        self._image_prefetch_status = {}
         self.pre_defined_network = (
             network.get_pre_defined_network())
         super(ComputeManager, self).__init__(service_name="compute",
@@ -2635,6 +2643,31 @@ class ComputeManager(manager.SchedulerDependentManager):
         """Returns the result of calling "uptime" on the target host."""
         return self.driver.get_host_uptime(self.host)
 
+    @exception.wrap_exception(notifier=notifier, publisher_id=publisher_id())
+    def prefetch_image(self, context, image_id):
+        """Fetch an image into the image cache of this host."""
+        self._image_prefetch_status[image_id] = 'queued'
+        with self._image_prefetch_semaphore:
+            LOG.audit(_("Prefetching image %s"), image_id, context=context)
+            self._image_prefetch_status[image_id] = 'fetching'
+            try:
+                self.driver.prefetch_image(context, image_id)
+            except NotImplementedError:
+                self._image_prefetch_status[image_id] = 'unsupported'
+                return
+            except Exception:
+                with excutils.save_and_reraise_exception():
+                    self._image_prefetch_status[image_id] = 'error'
+            self._image_prefetch_status[image_id] = 'cached'
+
+    def get_image_prefetch_status(self, context, image_id):
+        """Return the state of a prefetch request for an image.
+
+        One of 'queued', 'fetching', 'cached', 'error', 'unsupported', or
+        None if the image was not prefetched since the service started.
+        """
+        return self._image_prefetch_status.get(image_id)
+
     @exception.wrap_exception(notifier=notifier, publisher_id=publisher_id())
     @wrap_instance_fault
     def get_diagnostics(self, context, instance):
@@ -3414,13 +3447,13 @@ class ComputeManager(manager.SchedulerDependentManager):
                     # Instance is gone.  Try to grab another.
                     continue
             else:
-                # No more in our copy of uuids.  Pull from the DB.
-                db_instances = self.conductor_api.instance_get_all_by_host(
-                        context, self.host)
+                # No more in our copy of uuids.  Pull them from the DB,
+                # without loading the instances themselves.
+                db_instances = self.conductor_api.instance_get_columns_by_host(
+                        context, self.host, ['uuid'])
                 if not db_instances:
                     # None.. just return.
                     return
-                instance = db_instances.pop(0)
                 instance_uuids = [inst['uuid'] for inst in db_instances]
                 self._instance_uuids_to_heal = instance_uuids
 
@@ -3730,8 +3763,12 @@ class ComputeManager(manager.SchedulerDependentManager):
         loop, one database record at a time, checking if the hypervisor has the
         same power state as is in the database.
         """
-        db_instances = self.conductor_api.instance_get_all_by_host(context,
-                                                                   self.host)
+        # NOTE: only the columns needed to query the driver and to skip
+        # busy instances are loaded here; the full instance is fetched by
+        # _sync_instance_power_state when it is actually needed.
+        db_instances = self.conductor_api.instance_get_columns_by_host(
+                context, self.host,
+                ['id', 'uuid', 'name', 'host', 'vm_state', 'task_state'])
 
         num_vm_instances = self.driver.get_num_instances()
         num_db_instances = len(db_instances)
@@ -3822,7 +3859,7 @@ class ComputeManager(manager.SchedulerDependentManager):
                     # Note(maoy): here we call the API instead of
                     # brutally updating the vm_state in the database
                     # to allow all the hooks and checks to be performed.
-                    self.conductor_api.compute_stop(context, db_instance)
+                    self.conductor_api.compute_stop(context, u)
                 except Exception:
                     # Note(maoy): there is no need to propagate the error
                     # because the same power_state will be retrieved next
@@ -3835,7 +3872,7 @@ class ComputeManager(manager.SchedulerDependentManager):
                 LOG.warn(_("Instance is suspended unexpectedly. Calling "
                            "the stop API."), instance=db_instance)
                 try:
-                    self.conductor_api.compute_stop(context, db_instance)
+                    self.conductor_api.compute_stop(context, u)
                 except Exception:
                     LOG.exception(_("error during stop() in "
                                     "sync_power_state."),
@@ -3865,7 +3902,7 @@ class ComputeManager(manager.SchedulerDependentManager):
                 try:
                     # Note(maoy): this assumes that the stop API is
                     # idempotent.
-                    self.conductor_api.compute_stop(context, db_instance)
+                    self.conductor_api.compute_stop(context, u)
                 except Exception:
                     LOG.exception(_("error during stop() in "
                                     "sync_power_state."),
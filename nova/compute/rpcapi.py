@@ -24,6 +24,7 @@ from nova import exception
 from nova.openstack.common import jsonutils
 from nova.openstack.common import rpc
 import nova.openstack.common.rpc.proxy
+from nova import utils
 
 rpcapi_opts = [
     cfg.StrOpt('compute_topic',
@@ -165,6 +166,7 @@ class ComputeAPI(nova.openstack.common.rpc.proxy.RpcProxy):
                vnc on the correct port
         2.27 - Adds 'reservations' to terminate_instance() and
                soft_delete_instance()
+        2.28 - Adds prefetch_image() and get_image_prefetch_status()
     '''
 
     #
@@ -181,6 +183,7 @@ class ComputeAPI(nova.openstack.common.rpc.proxy.RpcProxy):
         super(ComputeAPI, self).__init__(
                 topic=CONF.compute_topic,
                 default_version=self.BASE_RPC_API_VERSION)
+        utils.time_rpc_calls(self)
 
     def add_aggregate_host(self, ctxt, aggregate, host_param, host,
                            slave_info=None):
@@ -554,6 +557,17 @@ class ComputeAPI(nova.openstack.common.rpc.proxy.RpcProxy):
         topic = _compute_topic(self.topic, ctxt, host, None)
         return self.call(ctxt, self.make_msg('get_host_uptime'), topic)
 
+    def prefetch_image(self, ctxt, image_id, host):
+        self.cast(ctxt, self.make_msg('prefetch_image', image_id=image_id),
+                topic=_compute_topic(self.topic, ctxt, host, None),
+                version='2.28')
+
+    def get_image_prefetch_status(self, ctxt, image_id, host):
+        return self.call(ctxt, self.make_msg('get_image_prefetch_status',
+                image_id=image_id),
+                topic=_compute_topic(self.topic, ctxt, host, None),
+                version='2.28')
+
     def reserve_block_device_name(self, ctxt, instance, device, volume_id):
         instance_p = jsonutils.to_primitive(instance)
         return self.call(ctxt, self.make_msg('reserve_block_device_name',
@@ -656,6 +670,7 @@ class SecurityGroupAPI(nova.openstack.common.rpc.proxy.RpcProxy):
         super(SecurityGroupAPI, self).__init__(
                 topic=CONF.compute_topic,
                 default_version=self.BASE_RPC_API_VERSION)
+        utils.time_rpc_calls(self)
 
     def refresh_security_group_rules(self, ctxt, security_group_id, host):
         self.cast(ctxt, self.make_msg('refresh_security_group_rules',
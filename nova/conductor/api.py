@@ -83,6 +83,10 @@ class LocalAPI(object):
     def instance_get_all_by_host_and_node(self, context, host, node):
         return self._manager.instance_get_all_by_host(context, host, node)
 
+    def instance_get_columns_by_host(self, context, host, columns):
+        return self._manager.instance_get_columns_by_host(context, host,
+                                                          columns)
+
     def instance_get_all_by_filters(self, context, filters,
                                     sort_key='created_at',
                                     sort_dir='desc',
@@ -412,6 +416,10 @@ class API(object):
         return self.conductor_rpcapi.instance_get_all_by_host(context,
                                                               host, node)
 
+    def instance_get_columns_by_host(self, context, host, columns):
+        return self.conductor_rpcapi.instance_get_columns_by_host(
+            context, host, columns)
+
     def instance_get_all_by_filters(self, context, filters,
                                     sort_key='created_at',
                                     sort_dir='desc',
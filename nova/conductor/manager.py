@@ -49,7 +49,7 @@ datetime_fields = ['launched_at', 'terminated_at', 'updated_at']
 class ConductorManager(manager.Manager):
     """Mission: TBD."""
 
-    RPC_API_VERSION = '1.48'
+    RPC_API_VERSION = '1.49'
 
     def __init__(self, *args, **kwargs):
         super(ConductorManager, self).__init__(*args, **kwargs)
@@ -77,6 +77,22 @@ class ConductorManager(manager.Manager):
     def ping(self, context, arg):
         return jsonutils.to_primitive({'service': 'conductor', 'arg': arg})
 
+    @manager.periodic_task(spacing=manager.DEFAULT_INTERVAL)
+    def _log_db_tpool_metrics(self, context):
+        """Log how DB API calls fare in the tpool, if it is enabled."""
+        metrics = self.db.get_tpool_metrics()
+        if metrics is None:
+            return
+        LOG.info(_("DB API tpool: %(in_flight)d calls in flight, "
+                   "%(queue_depth)d waiting for one of %(pool_size)d "
+                   "threads, at most %(max_queue_depth)d waiting so far"),
+                 metrics)
+        for name, stats in sorted(metrics['calls'].items()):
+            LOG.debug(_("DB API tpool call %(name)s: %(count)d calls, "
+                        "%(total_time).3fs total, %(max_time).3fs max, "
+                        "%(total_wait).3fs waiting, %(max_wait).3fs max "
+                        "wait"), dict(stats, name=name))
+
     @rpc_common.client_exceptions(KeyError, ValueError,
                                   exception.InvalidUUID,
                                   exception.InstanceNotFound,
@@ -119,6 +135,11 @@ class ConductorManager(manager.Manager):
                                                       columns_to_join)
         return jsonutils.to_primitive(result)
 
+    def instance_get_columns_by_host(self, context, host, columns):
+        result = self.db.instance_get_columns_by_host(context.elevated(),
+                                                      host, columns)
+        return jsonutils.to_primitive(result)
+
     @rpc_common.client_exceptions(exception.MigrationNotFound)
     def migration_get(self, context, migration_id):
         migration_ref = self.db.migration_get(context.elevated(),
@@ -18,6 +18,7 @@ from oslo.config import cfg
 
 from nova.openstack.common import jsonutils
 import nova.openstack.common.rpc.proxy
+from nova import utils
 
 CONF = cfg.CONF
 
@@ -87,6 +88,7 @@ class ConductorAPI(nova.openstack.common.rpc.proxy.RpcProxy):
     1.47 - Added columns_to_join to instance_get_all_by_host and
                  instance_get_all_by_filters
     1.48 - Added compute_unrescue
+    1.49 - Added instance_get_columns_by_host
     """
 
     BASE_RPC_API_VERSION = '1.0'
@@ -95,6 +97,7 @@ class ConductorAPI(nova.openstack.common.rpc.proxy.RpcProxy):
         super(ConductorAPI, self).__init__(
             topic=CONF.conductor.topic,
             default_version=self.BASE_RPC_API_VERSION)
+        utils.time_rpc_calls(self)
 
     def ping(self, context, arg, timeout=None):
         arg_p = jsonutils.to_primitive(arg)
@@ -315,6 +318,11 @@ class ConductorAPI(nova.openstack.common.rpc.proxy.RpcProxy):
                             columns_to_join=columns_to_join)
         return self.call(context, msg, version='1.47')
 
+    def instance_get_columns_by_host(self, context, host, columns):
+        msg = self.make_msg('instance_get_columns_by_host', host=host,
+                            columns=columns)
+        return self.call(context, msg, version='1.49')
+
     def instance_fault_create(self, context, values):
         msg = self.make_msg('instance_fault_create', values=values)
         return self.call(context, msg, version='1.36')
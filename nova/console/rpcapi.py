@@ -21,6 +21,7 @@ Client side of the console RPC API.
 from oslo.config import cfg
 
 import nova.openstack.common.rpc.proxy
+from nova import utils
 
 rpcapi_opts = [
     cfg.StrOpt('console_topic',
@@ -56,6 +57,7 @@ class ConsoleAPI(nova.openstack.common.rpc.proxy.RpcProxy):
         super(ConsoleAPI, self).__init__(
                 topic=topic,
                 default_version=self.BASE_RPC_API_VERSION)
+        utils.time_rpc_calls(self)
 
     def add_console(self, ctxt, instance_id):
         self.cast(ctxt, self.make_msg('add_console', instance_id=instance_id))
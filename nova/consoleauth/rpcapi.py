@@ -21,6 +21,7 @@ Client side of the consoleauth RPC API.
 from oslo.config import cfg
 
 import nova.openstack.common.rpc.proxy
+from nova import utils
 
 CONF = cfg.CONF
 
@@ -50,6 +51,7 @@ class ConsoleAuthAPI(nova.openstack.common.rpc.proxy.RpcProxy):
         super(ConsoleAuthAPI, self).__init__(
                 topic=CONF.consoleauth_topic,
                 default_version=self.BASE_RPC_API_VERSION)
+        utils.time_rpc_calls(self)
 
     def authorize_console(self, ctxt, token, console_type, host, port,
                           internal_access_path, instance_uuid=None):
@@ -146,7 +146,7 @@ class RequestContext(object):
         context.is_admin = True
 
         if 'admin' not in context.roles:
-            context.roles.append('admin')
+            context.roles = context.roles + ['admin']
 
         if read_deleted is not None:
             context.read_deleted = read_deleted
@@ -43,11 +43,16 @@ these objects be simple dictionaries.
 
 """
 
+import functools
+import time
+
+from eventlet import tpool
 from oslo.config import cfg
 
 from nova.cells import rpcapi as cells_rpcapi
 from nova import exception
 from nova.openstack.common.db import api as db_api
+from nova.openstack.common import lockutils
 from nova.openstack.common import log as logging
 
 
@@ -65,11 +70,128 @@ db_opts = [
 
 CONF = cfg.CONF
 CONF.register_opts(db_opts)
+CONF.import_opt('sql_max_pool_size',
+                'nova.openstack.common.db.sqlalchemy.session')
+CONF.import_opt('sql_max_overflow',
+                'nova.openstack.common.db.sqlalchemy.session')
 
 _BACKEND_MAPPING = {'sqlalchemy': 'nova.db.sqlalchemy.api'}
 
 
-IMPL = db_api.DBAPI(backend_mapping=_BACKEND_MAPPING)
+class TpoolMetrics(object):
+    """Latency and queue depth of DB API calls made through the tpool.
+
+    Counters are only updated from the calling green threads, never from
+    the worker threads, so no locking is needed.
+    """
+
+    def __init__(self, pool_size):
+        self.pool_size = pool_size
+        self.in_flight = 0
+        self.max_queue_depth = 0
+        self.calls = {}
+
+    @property
+    def queue_depth(self):
+        """Number of calls waiting for a free worker thread."""
+        return max(0, self.in_flight - self.pool_size)
+
+    def dispatched(self):
+        self.in_flight += 1
+        self.max_queue_depth = max(self.max_queue_depth, self.queue_depth)
+
+    def completed(self, name, wait, duration):
+        self.in_flight -= 1
+        stats = self.calls.setdefault(name, {'count': 0,
+                                             'total_time': 0.0,
+                                             'max_time': 0.0,
+                                             'total_wait': 0.0,
+                                             'max_wait': 0.0})
+        stats['count'] += 1
+        stats['total_time'] += duration
+        stats['max_time'] = max(stats['max_time'], duration)
+        stats['total_wait'] += wait
+        stats['max_wait'] = max(stats['max_wait'], wait)
+
+    def to_dict(self):
+        return {'pool_size': self.pool_size,
+                'in_flight': self.in_flight,
+                'queue_depth': self.queue_depth,
+                'max_queue_depth': self.max_queue_depth,
+                'calls': dict((name, dict(stats))
+                              for name, stats in self.calls.items())}
+
+
+class TpoolDBAPI(object):
+    """Sizes the tpool and records metrics for DB API calls.
+
+    When dbapi_use_tpool is set, calls are dispatched to a tpool worker
+    thread here, so the time spent waiting for a worker can be told apart
+    from the time the call runs. The DBAPI being wrapped then runs them
+    directly, as eventlet does not recurse into the tpool from a worker.
+
+    The tpool is sized to sql_max_pool_size plus sql_max_overflow, the most
+    connections the SQL pool hands out, so that every worker thread can
+    hold a database connection.
+    """
+
+    def __init__(self, dbapi):
+        self.__dbapi = dbapi
+        self.__metrics = None
+
+    @lockutils.synchronized('dbapi_tpool', 'nova-')
+    def __get_metrics(self):
+        if self.__metrics is None:
+            # SQLAlchemy lets a pool overflow by 10 connections unless
+            # told otherwise.
+            max_overflow = CONF.sql_max_overflow
+            if max_overflow is None:
+                max_overflow = 10
+            pool_size = CONF.sql_max_pool_size + max(max_overflow, 0)
+            # This only takes effect if nothing else in the process has
+            # used the tpool yet.
+            tpool.set_num_threads(pool_size)
+            self.__metrics = TpoolMetrics(pool_size)
+        return self.__metrics
+
+    def __getattr__(self, key):
+        attr = getattr(self.__dbapi, key)
+
+        if not CONF.dbapi_use_tpool or not hasattr(attr, '__call__'):
+            return attr
+
+        metrics = self.__metrics or self.__get_metrics()
+
+        def tpool_wrapper(*args, **kwargs):
+            timing = {}
+
+            def timed_call():
+                timing['start'] = time.time()
+                try:
+                    return attr(*args, **kwargs)
+                finally:
+                    timing['end'] = time.time()
+
+            queued_at = time.time()
+            metrics.dispatched()
+            try:
+                return tpool.execute(timed_call)
+            finally:
+                start = timing.get('start', queued_at)
+                metrics.completed(key, start - queued_at,
+                                  timing.get('end', start) - start)
+
+        functools.update_wrapper(tpool_wrapper, attr)
+        return tpool_wrapper
+
+    def get_tpool_metrics(self):
+        """Return DB API call metrics, or None if the tpool is not used."""
+        if self.__metrics is None:
+            return None
+        return self.__metrics.to_dict()
+
+
+IMPL = TpoolDBAPI(db_api.DBAPI(backend_mapping=_BACKEND_MAPPING))
 LOG = logging.getLogger(__name__)
 
 
@@ -109,6 +231,14 @@ def not_equal(*values):
     return IMPL.not_equal(*values)
 
 
+def get_tpool_metrics():
+    """Return the latency and queue depth of DB API calls run in the tpool.
+
+    Returns None unless dbapi_use_tpool is enabled.
+    """
+    return IMPL.get_tpool_metrics()
+
+
 ###################
 
 
@@ -127,9 +257,14 @@ def service_get_by_host_and_topic(context, host, topic):
     return IMPL.service_get_by_host_and_topic(context, host, topic)
 
 
-def service_get_all(context, disabled=None):
-    """Get all services."""
-    return IMPL.service_get_all(context, disabled)
+def service_get_all(context, disabled=None, filters=None, limit=None,
+                    marker=None):
+    """Get all services, optionally matching a dict of column filters.
+
+    limit and marker page through the services ordered by id.
+    """
+    return IMPL.service_get_all(context, disabled, filters=filters,
+                                limit=limit, marker=marker)
 
 
 def service_get_all_by_topic(context, topic):
@@ -177,9 +312,9 @@ def compute_node_get(context, compute_id):
     return IMPL.compute_node_get(context, compute_id)
 
 
-def compute_node_get_all(context):
-    """Get all computeNodes."""
-    return IMPL.compute_node_get_all(context)
+def compute_node_get_all(context, limit=None, marker=None):
+    """Get all computeNodes, optionally paged through by id."""
+    return IMPL.compute_node_get_all(context, limit=limit, marker=marker)
 
 
 def compute_node_search_by_hypervisor(context, hypervisor_match):
@@ -208,8 +343,13 @@ def compute_node_delete(context, compute_id):
     return IMPL.compute_node_delete(context, compute_id)
 
 
-def compute_node_statistics(context):
-    return IMPL.compute_node_statistics(context)
+def compute_node_statistics(context, use_slave=None):
+    """Compute statistics over all compute nodes.
+
+    This is served by the slave database, if there is one, unless
+    use_slave is False.
+    """
+    return IMPL.compute_node_statistics(context, use_slave=use_slave)
 
 
 ###################
@@ -322,9 +462,11 @@ def floating_ip_get_all_by_host(context, host):
     return IMPL.floating_ip_get_all_by_host(context, host)
 
 
-def floating_ip_get_all_by_project(context, project_id):
-    """Get all floating ips by project."""
-    return IMPL.floating_ip_get_all_by_project(context, project_id)
+def floating_ip_get_all_by_project(context, project_id, limit=None,
+                                   marker=None):
+    """Get all floating ips by project, optionally paged through by id."""
+    return IMPL.floating_ip_get_all_by_project(context, project_id,
+                                               limit=limit, marker=marker)
 
 
 def floating_ip_get_by_address(context, address):
@@ -610,23 +752,45 @@ def instance_get_all(context, columns_to_join=None):
 
 def instance_get_all_by_filters(context, filters, sort_key='created_at',
                                 sort_dir='desc', limit=None, marker=None,
-                                columns_to_join=None):
-    """Get all instances that match all filters."""
+                                columns_to_join=None, use_slave=None):
+    """Get all instances that match all filters.
+
+    This is only served by the slave database, if there is one, when
+    use_slave is True.
+    """
     return IMPL.instance_get_all_by_filters(context, filters, sort_key,
                                             sort_dir, limit=limit,
                                             marker=marker,
-                                            columns_to_join=columns_to_join)
+                                            columns_to_join=columns_to_join,
+                                            use_slave=use_slave)
+
+
+def instance_get_summary_by_filters(context, filters, use_slave=None):
+    """Summarize the instances that match all filters.
+
+    Returns a dict with the number of matching instances and the time the
+    last of them changed, suitable for validating a cached listing.
+    """
+    return IMPL.instance_get_summary_by_filters(context, filters,
+                                                use_slave=use_slave)
 
 
 def instance_get_active_by_window_joined(context, begin, end=None,
-                                         project_id=None, host=None):
+                                         project_id=None, host=None,
+                                         limit=None, marker=None,
+                                         use_slave=None):
     """Get instances and joins active during a certain time window.
 
     Specifying a project_id will filter for a certain project.
     Specifying a host will filter for instances on a given compute host.
+    limit and marker page through the projects owning the instances.
+    This is served by the slave database, if there is one, unless
+    use_slave is False.
     """
     return IMPL.instance_get_active_by_window_joined(context, begin, end,
-                                              project_id, host)
+                                              project_id, host,
+                                              limit=limit, marker=marker,
+                                              use_slave=use_slave)
 
 
 def instance_get_all_by_host(context, host, columns_to_join=None):
@@ -634,6 +798,15 @@ def instance_get_all_by_host(context, host, columns_to_join=None):
     return IMPL.instance_get_all_by_host(context, host, columns_to_join)
 
 
+def instance_get_columns_by_host(context, host, columns):
+    """Get only the given columns of all instances belonging to a host.
+
+    Returns a list of dicts rather than Instance models. 'name' may be
+    given as a column as well.
+    """
+    return IMPL.instance_get_columns_by_host(context, host, columns)
+
+
 def instance_get_all_by_host_and_node(context, host, node):
     """Get all instances belonging to a node."""
     return IMPL.instance_get_all_by_host_and_node(context, host, node)
@@ -771,9 +944,10 @@ def key_pair_get(context, user_id, name):
     return IMPL.key_pair_get(context, user_id, name)
 
 
-def key_pair_get_all_by_user(context, user_id):
-    """Get all key_pairs by user."""
-    return IMPL.key_pair_get_all_by_user(context, user_id)
+def key_pair_get_all_by_user(context, user_id, limit=None, marker=None):
+    """Get all key_pairs by user, optionally paged through by name."""
+    return IMPL.key_pair_get_all_by_user(context, user_id, limit=limit,
+                                         marker=marker)
 
 
 def key_pair_count_by_user(context, user_id):
@@ -995,6 +1169,12 @@ def reservation_expire(context):
     return IMPL.reservation_expire(context)
 
 
+def quota_usage_refresh(context, resources, until_refresh, max_age):
+    """Recount any quota usages which are due for a refresh."""
+    return IMPL.quota_usage_refresh(context, resources, until_refresh,
+                                    max_age)
+
+
 ###################
 
 
@@ -1069,9 +1249,9 @@ def block_device_mapping_destroy_by_instance_and_volume(context, instance_uuid,
 ####################
 
 
-def security_group_get_all(context):
-    """Get all security groups."""
-    return IMPL.security_group_get_all(context)
+def security_group_get_all(context, limit=None, marker=None):
+    """Get all security groups, optionally paged through by id."""
+    return IMPL.security_group_get_all(context, limit=limit, marker=marker)
 
 
 def security_group_get(context, security_group_id):
@@ -1084,9 +1264,14 @@ def security_group_get_by_name(context, project_id, group_name):
     return IMPL.security_group_get_by_name(context, project_id, group_name)
 
 
-def security_group_get_by_project(context, project_id):
-    """Get all security groups belonging to a project."""
-    return IMPL.security_group_get_by_project(context, project_id)
+def security_group_get_by_project(context, project_id, limit=None,
+                                  marker=None):
+    """Get all security groups belonging to a project.
+
+    limit and marker page through the groups ordered by id.
+    """
+    return IMPL.security_group_get_by_project(context, project_id,
+                                              limit=limit, marker=marker)
 
 
 def security_group_get_by_instance(context, instance_id):
@@ -1282,6 +1467,12 @@ def instance_type_get_all(context, inactive=False, filters=None):
         context, inactive=inactive, filters=filters)
 
 
+def instance_type_get_summary(context, inactive=False, filters=None):
+    """Get the number of instance types and when the last one changed."""
+    return IMPL.instance_type_get_summary(
+        context, inactive=inactive, filters=filters)
+
+
 def instance_type_get(context, id):
     """Get instance type by id."""
     return IMPL.instance_type_get(context, id)
@@ -1348,6 +1539,17 @@ def cell_get_all(context):
 ####################
 
 
+def instance_metadata_compact(context, max_count):
+    """Fill in the serialized metadata copies of up to max_count instances.
+
+    :returns: the number of instances filled in.
+    """
+    return IMPL.instance_metadata_compact(context, max_count)
+
+
+####################
+
+
 def instance_metadata_get(context, instance_uuid):
     """Get all metadata for an instance."""
     return IMPL.instance_metadata_get(context, instance_uuid)
@@ -1691,9 +1893,14 @@ def task_log_begin_task(context, task_name,
 
 
 def task_log_get_all(context, task_name, period_beginning,
-                 period_ending, host=None, state=None):
+                 period_ending, host=None, state=None, use_slave=None):
+    """Get all task logs of a period.
+
+    This is served by the slave database, if there is one, unless
+    use_slave is False.
+    """
     return IMPL.task_log_get_all(context, task_name, period_beginning,
-                 period_ending, host, state)
+                 period_ending, host, state, use_slave=use_slave)
 
 
 def task_log_get(context, task_name, period_beginning,
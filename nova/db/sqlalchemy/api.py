@@ -23,6 +23,7 @@ import collections
 import copy
 import datetime
 import functools
+import re
 import sys
 import time
 import uuid
@@ -39,7 +40,6 @@ from sqlalchemy import or_
 from sqlalchemy.orm import joinedload
 from sqlalchemy.orm import joinedload_all
 from sqlalchemy.schema import Table
-from sqlalchemy.sql.expression import asc
 from sqlalchemy.sql.expression import desc
 from sqlalchemy.sql.expression import select
 from sqlalchemy.sql import func
@@ -51,13 +51,16 @@ from nova.compute import vm_states
 import nova.context
 from nova import db
 from nova.db.sqlalchemy import models
+from nova.db.sqlalchemy import utils as db_utils
 from nova import exception
 from nova.openstack.common.db import exception as db_exc
 from nova.openstack.common.db.sqlalchemy import session as db_session
 from nova.openstack.common.db.sqlalchemy import utils as sqlalchemyutils
+from nova.openstack.common import jsonutils
 from nova.openstack.common import log as logging
 from nova.openstack.common import timeutils
 from nova.openstack.common import uuidutils
+from nova import utils
 
 db_opts = [
     cfg.StrOpt('osapi_compute_unique_server_name_scope',
@@ -65,6 +68,25 @@ db_opts = [
                help='When set, compute API will consider duplicate hostnames '
                     'invalid within the specified scope, regardless of case. '
                     'Should be empty, "project" or "global".'),
+    cfg.IntOpt('quota_reserve_attempts',
+               default=5,
+               help='Number of times a quota reservation is attempted '
+                    'without locking the usages it changes. The final '
+                    'attempt locks them.'),
+    cfg.BoolOpt('compact_instance_metadata',
+                default=False,
+                help='Read the metadata and system_metadata of listed '
+                     'instances from the serialized copy kept on the '
+                     'instances table instead of the metadata tables. '
+                     'Instances without a copy, which can be filled in with '
+                     '"nova-manage db compact_instance_metadata", are still '
+                     'read from the metadata tables.'),
+    cfg.StrOpt('slave_connection',
+               default='',
+               help='The SQLAlchemy connection string used to connect to a '
+                    'read-only replica of the database, for the DB API '
+                    'calls which may be served by one',
+               secret=True),
 ]
 
 CONF = cfg.CONF
@@ -75,8 +97,37 @@ CONF.import_opt('sql_connection',
 
 LOG = logging.getLogger(__name__)
 
-get_engine = db_session.get_engine
-get_session = db_session.get_session
+_SLAVE_ENGINE = None
+_SLAVE_MAKER = None
+
+
+def get_engine(use_slave=False):
+    """Return a SQLAlchemy engine.
+
+    :param use_slave: if True and slave_connection is set, return the engine
+                      of the slave database.
+    """
+    global _SLAVE_ENGINE
+    if use_slave and CONF.slave_connection:
+        if _SLAVE_ENGINE is None:
+            _SLAVE_ENGINE = db_session.create_engine(CONF.slave_connection)
+        return _SLAVE_ENGINE
+    return db_session.get_engine()
+
+
+def get_session(use_slave=False, **kwargs):
+    """Return a SQLAlchemy session.
+
+    :param use_slave: if True and slave_connection is set, the session is
+                      bound to the slave database.
+    """
+    global _SLAVE_MAKER
+    if use_slave and CONF.slave_connection:
+        if _SLAVE_MAKER is None:
+            _SLAVE_MAKER = db_session.get_maker(get_engine(use_slave=True),
+                                                **kwargs)
+        return _SLAVE_MAKER()
+    return db_session.get_session(**kwargs)
 
 
 def get_backend():
@@ -160,6 +211,30 @@ def _retry_on_deadlock(f):
     return wrapped
 
 
+def replica_safe(use_slave=True):
+    """Decorator factory marking a read-only DB API call as replica safe.
+
+    The decorated function must take a session keyword argument.  Unless
+    it is given one, it is called with a session on the database set by
+    slave_connection, if there is one.  Callers can pass use_slave to
+    override the default, e.g. use_slave=False when they need to read
+    their own writes.
+
+    :param use_slave: whether calls use the slave database by default.
+    """
+    def decorator(f):
+        @functools.wraps(f)
+        def wrapper(*args, **kwargs):
+            slave = kwargs.pop('use_slave', None)
+            if slave is None:
+                slave = use_slave
+            if slave and kwargs.get('session') is None:
+                kwargs['session'] = get_session(use_slave=True)
+            return f(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
 def model_query(context, model, *args, **kwargs):
     """Query helper that accounts for context's `read_deleted` field.
 
@@ -266,6 +341,55 @@ def exact_filter(query, model, filters, legal_keys):
     return query
 
 
+def _bound_first_sort_key(query, model, sort_key, sort_dir, marker):
+    """Bound the first sort key of a paginated query by the marker.
+
+    The keyset criteria added by paginate_query imply this bound. Spelling
+    it out lets the database seek into an index on the key instead of
+    scanning every row before the marker.
+    """
+    value = getattr(marker, sort_key)
+    if value is None:
+        return query
+    model_attr = getattr(model, sort_key)
+    if sort_dir == 'desc':
+        return query.filter(model_attr <= value)
+    return query.filter(model_attr >= value)
+
+
+def _paginate_query(query, model, limit, marker, marker_key='id'):
+    """Page through the results of a query.
+
+    Results are ordered by marker_key and then id, and the page starts
+    after the row whose marker_key is marker.  The query is returned
+    unchanged when neither limit nor marker is given.
+
+    Markers come from the query string, so they are converted to integers
+    for integer keys.  Raises MarkerNotFound if no row matched by the query
+    has the marker.
+    """
+    if limit is None and marker is None:
+        return query
+    sort_keys = [marker_key]
+    if marker_key != 'id':
+        sort_keys.append('id')
+    if marker is not None:
+        column = getattr(model, marker_key)
+        if isinstance(column.property.columns[0].type, Integer):
+            try:
+                marker = int(marker)
+            except (TypeError, ValueError):
+                raise exception.MarkerNotFound(marker=marker)
+        marker_row = query.filter(column == marker).first()
+        if not marker_row:
+            raise exception.MarkerNotFound(marker=marker)
+        marker = marker_row
+        query = _bound_first_sort_key(query, model, marker_key, 'asc',
+                                      marker)
+    return sqlalchemyutils.paginate_query(query, model, limit, sort_keys,
+                                          marker=marker)
+
+
 def convert_datetimes(values, *datetime_keys):
     for key in values:
         if key in datetime_keys and isinstance(values[key], basestring):
@@ -357,13 +481,16 @@ def service_get(context, service_id):
 
 
 @require_admin_context
-def service_get_all(context, disabled=None):
+def service_get_all(context, disabled=None, filters=None, limit=None,
+                    marker=None):
     query = model_query(context, models.Service)
 
     if disabled is not None:
         query = query.filter_by(disabled=disabled)
+    if filters:
+        query = query.filter_by(**filters)
 
-    return query.all()
+    return _paginate_query(query, models.Service, limit, marker).all()
 
 
 @require_admin_context
@@ -448,7 +575,6 @@ def _compute_node_get(context, compute_id, session=None):
     result = model_query(context, models.ComputeNode, session=session).\
             filter_by(id=compute_id).\
             options(joinedload('service')).\
-            options(joinedload('stats')).\
             first()
 
     if not result:
@@ -458,11 +584,10 @@ def _compute_node_get(context, compute_id, session=None):
 
 
 @require_admin_context
-def compute_node_get_all(context):
-    return model_query(context, models.ComputeNode).\
-            options(joinedload('service')).\
-            options(joinedload('stats')).\
-            all()
+def compute_node_get_all(context, limit=None, marker=None):
+    query = model_query(context, models.ComputeNode).\
+            options(joinedload('service'))
+    return _paginate_query(query, models.ComputeNode, limit, marker).all()
 
 
 @require_admin_context
@@ -475,15 +600,8 @@ def compute_node_search_by_hypervisor(context, hypervisor_match):
 
 
 def _prep_stats_dict(values):
-    """Make list of ComputeNodeStats."""
-    stats = []
-    d = values.get('stats', {})
-    for k, v in d.iteritems():
-        stat = models.ComputeNodeStat()
-        stat['key'] = k
-        stat['value'] = v
-        stats.append(stat)
-    values['stats'] = stats
+    """Serialize the stats dict of a compute node."""
+    values['stats'] = jsonutils.dumps(values.get('stats') or {})
 
 
 @require_admin_context
@@ -499,41 +617,6 @@ def compute_node_create(context, values):
     return compute_node_ref
 
 
-def _update_stats(context, new_stats, compute_id, session, prune_stats=False):
-
-    existing = model_query(context, models.ComputeNodeStat, session=session,
-            read_deleted="no").filter_by(compute_node_id=compute_id).all()
-    statmap = {}
-    for stat in existing:
-        key = stat['key']
-        statmap[key] = stat
-
-    stats = []
-    for k, v in new_stats.iteritems():
-        old_stat = statmap.pop(k, None)
-        if old_stat:
-            # update existing value:
-            old_stat.update({'value': v})
-            stats.append(old_stat)
-        else:
-            # add new stat:
-            stat = models.ComputeNodeStat()
-            stat['compute_node_id'] = compute_id
-            stat['key'] = k
-            stat['value'] = v
-            stats.append(stat)
-
-    if prune_stats:
-        # prune un-touched old stats:
-        for stat in statmap.values():
-            session.add(stat)
-            stat.soft_delete(session=session)
-
-    # add new and updated stats
-    for stat in stats:
-        session.add(stat)
-
-
 @require_admin_context
 def compute_node_update(context, compute_id, values, prune_stats=False):
     """Updates the ComputeNode record with the most recent data."""
@@ -541,8 +624,14 @@ def compute_node_update(context, compute_id, values, prune_stats=False):
 
     session = get_session()
     with session.begin():
-        _update_stats(context, stats, compute_id, session, prune_stats)
         compute_ref = _compute_node_get(context, compute_id, session=session)
+        # Stats not in the update are kept unless prune_stats is set.
+        if stats or prune_stats:
+            if not prune_stats and compute_ref['stats']:
+                old_stats = jsonutils.loads(compute_ref['stats'])
+                old_stats.update(stats)
+                stats = old_stats
+            values['stats'] = jsonutils.dumps(stats)
         # Always update this, even if there's going to be no other
         # changes in data.  This ensures that we invalidate the
         # scheduler cache of compute node data in case of races.
@@ -564,7 +653,8 @@ def compute_node_delete(context, compute_id):
         raise exception.ComputeHostNotFound(host=compute_id)
 
 
-def compute_node_statistics(context):
+@replica_safe()
+def compute_node_statistics(context, session=None):
     """Compute statistics over all compute nodes."""
     result = model_query(context,
                          func.count(models.ComputeNode.id),
@@ -580,6 +670,7 @@ def compute_node_statistics(context):
                          func.sum(models.ComputeNode.running_vms),
                          func.sum(models.ComputeNode.disk_available_least),
                          base_model=models.ComputeNode,
+                         session=session,
                          read_deleted="no").first()
 
     # Build a dict of the info--making no assumptions about result
@@ -853,14 +944,15 @@ def floating_ip_get_all_by_host(context, host):
 
 
 @require_context
-def floating_ip_get_all_by_project(context, project_id):
+def floating_ip_get_all_by_project(context, project_id, limit=None,
+                                   marker=None):
     nova.context.authorize_project_context(context, project_id)
     # TODO(tr3buchet): why do we not want auto_assigned floating IPs here?
-    return _floating_ip_get_all(context).\
+    query = _floating_ip_get_all(context).\
                          filter_by(project_id=project_id).\
                          filter_by(auto_assigned=False).\
-                         options(joinedload_all('fixed_ip.instance')).\
-                         all()
+                         options(joinedload_all('fixed_ip.instance'))
+    return _paginate_query(query, models.FloatingIp, limit, marker).all()
 
 
 @require_context
@@ -1438,6 +1530,10 @@ def instance_create(context, values):
     values - dict containing column values.
     """
     values = values.copy()
+    values['serialized_metadata'] = _serialize_metadata(
+            values.get('metadata'))
+    values['serialized_system_metadata'] = _serialize_metadata(
+            values.get('system_metadata'))
     values['metadata'] = _metadata_refs(
             values.get('metadata'), models.InstanceMetadata)
 
@@ -1521,6 +1617,12 @@ def instance_destroy(context, instance_uuid, constraint=None):
         session.query(models.InstanceMetadata).\
                  filter_by(instance_uuid=instance_uuid).\
                  soft_delete()
+        # NOTE: the metadata rows of a deleted instance are read as deleted,
+        # which the serialized copy can not express.
+        session.query(models.Instance).\
+                filter_by(uuid=instance_uuid).\
+                update({'serialized_metadata': None},
+                       synchronize_session=False)
     return instance_ref
 
 
@@ -1568,7 +1670,8 @@ def _build_instance_get(context, session=None):
             options(joinedload('system_metadata'))
 
 
-def _instances_fill_metadata(context, instances, manual_joins=None):
+def _instances_fill_metadata(context, instances, manual_joins=None,
+                             session=None):
     """Selectively fill instances with manually-joined metadata. Note that
     instance will be converted to a dict.
 
@@ -1577,21 +1680,33 @@ def _instances_fill_metadata(context, instances, manual_joins=None):
     :param manual_joins: list of tables to manually join (can be any
                          combination of 'metadata' and 'system_metadata' or
                          None to take the default of both)
-    """
-    uuids = [inst['uuid'] for inst in instances]
+    :param session: if present, the session to query metadata with
 
+    With compact_instance_metadata set, the serialized copies on the
+    instances are used and only instances without one are looked up in the
+    metadata tables.
+    """
     if manual_joins is None:
         manual_joins = ['metadata', 'system_metadata']
 
     meta = collections.defaultdict(list)
-    if 'metadata' in manual_joins:
-        for row in _instance_metadata_get_multi(context, uuids):
-            meta[row['instance_uuid']].append(row)
-
     sys_meta = collections.defaultdict(list)
-    if 'system_metadata' in manual_joins:
-        for row in _instance_system_metadata_get_multi(context, uuids):
-            sys_meta[row['instance_uuid']].append(row)
+    for join, column, result, get_multi in (
+            ('metadata', 'serialized_metadata', meta,
+             _instance_metadata_get_multi),
+            ('system_metadata', 'serialized_system_metadata', sys_meta,
+             _instance_system_metadata_get_multi)):
+        if join not in manual_joins:
+            continue
+        uuids = []
+        for inst in instances:
+            if CONF.compact_instance_metadata and inst[column] is not None:
+                result[inst['uuid']] = _deserialize_metadata(inst[column])
+            else:
+                uuids.append(inst['uuid'])
+        if uuids:
+            for row in get_multi(context, uuids, session=session):
+                result[row['instance_uuid']].append(row)
 
     filled_instances = []
     for inst in instances:
@@ -1633,6 +1748,7 @@ def instance_get_all(context, columns_to_join=None):
 
 
 @require_context
+@replica_safe(use_slave=False)
 def instance_get_all_by_filters(context, filters, sort_key, sort_dir,
                                 limit=None, marker=None, columns_to_join=None,
                                 session=None):
@@ -1640,8 +1756,6 @@ def instance_get_all_by_filters(context, filters, sort_key, sort_dir,
     will be returned by default, unless there's a filter that says
     otherwise"""
 
-    sort_fn = {'desc': desc, 'asc': asc}
-
     if not session:
         session = get_session()
 
@@ -1655,9 +1769,27 @@ def instance_get_all_by_filters(context, filters, sort_key, sort_dir,
     for column in columns_to_join:
         query_prefix = query_prefix.options(joinedload(column))
 
-    query_prefix = query_prefix.order_by(sort_fn[sort_dir](
-            getattr(models.Instance, sort_key)))
+    query_prefix = _instance_filter_query(context, query_prefix, filters)
+
+    # paginate query
+    sort_keys = [sort_key, 'created_at', 'id']
+    if marker is not None:
+        marker = _instance_get_marker(context, marker, sort_keys,
+                                      session=session)
+        query_prefix = _bound_first_sort_key(query_prefix, models.Instance,
+                                             sort_key, sort_dir, marker)
+    query_prefix = sqlalchemyutils.paginate_query(query_prefix,
+                           models.Instance, limit,
+                           sort_keys,
+                           marker=marker,
+                           sort_dir=sort_dir)
+
+    return _instances_fill_metadata(context, query_prefix.all(), manual_joins,
+                                    session=session)
 
+
+def _instance_filter_query(context, query_prefix, filters):
+    """Apply the filters of instance_get_all_by_filters to a query."""
     # Make a copy of the filters dictionary to use going forward, as we'll
     # be modifying it and we shouldn't affect the caller's use of it.
     filters = filters.copy()
@@ -1697,25 +1829,76 @@ def instance_get_all_by_filters(context, filters, sort_key, sort_dir,
                                 filters, exact_match_filter_names)
 
     query_prefix = regex_filter(query_prefix, models.Instance, filters)
+    return query_prefix
 
-    # paginate query
-    if marker is not None:
-        try:
-            marker = _instance_get_by_uuid(context, marker, session=session)
-        except exception.InstanceNotFound:
-            raise exception.MarkerNotFound(marker)
-    query_prefix = sqlalchemyutils.paginate_query(query_prefix,
-                           models.Instance, limit,
-                           [sort_key, 'created_at', 'id'],
-                           marker=marker,
-                           sort_dir=sort_dir)
 
-    return _instances_fill_metadata(context, query_prefix.all(), manual_joins)
+@require_context
+@replica_safe()
+def instance_get_summary_by_filters(context, filters, session=None):
+    """Summarize the instances that match all filters.
+
+    Returns the number of matching instances and of their security group
+    associations and faults, and when the last of the instances or of their
+    network info caches, security group associations and faults changed.
+    The summary changes whenever a listing of the same filters would, so it
+    can be used to validate such a listing without fetching it.
+    """
+    if not session:
+        session = get_session()
+
+    instances = _instance_filter_query(context,
+                                       session.query(models.Instance),
+                                       filters).subquery()
+    count, updated_at = session.query(
+            func.count(instances.c.id),
+            func.max(func.coalesce(instances.c.updated_at,
+                                   instances.c.created_at))).first()
+    summary = {'count': count, 'updated_at': updated_at}
+
+    uuids = session.query(instances.c.uuid)
+    for key, model in (('info_caches', models.InstanceInfoCache),
+                       ('security_groups',
+                        models.SecurityGroupInstanceAssociation),
+                       ('faults', models.InstanceFault)):
+        related_count, related_updated_at = session.query(
+                func.count(model.id),
+                func.max(func.coalesce(model.updated_at,
+                                       model.created_at))).\
+                filter(model.deleted == 0).\
+                filter(model.instance_uuid.in_(uuids)).\
+                first()
+        summary['%s_count' % key] = related_count
+        if related_updated_at is not None:
+            summary['updated_at'] = max(summary['updated_at'],
+                                        related_updated_at)
+    return summary
+
+
+def _instance_get_marker(context, marker, sort_keys, session=None):
+    """Return the sort key values of the instance used as a marker.
+
+    Only the columns needed to seek past the marker are loaded, rather than
+    the instance and all of its joins.
+    """
+    columns = [getattr(models.Instance, key)
+               for key in sorted(set(sort_keys))]
+    result = model_query(context, columns[0], *columns[1:],
+                         base_model=models.Instance, session=session,
+                         project_only=True).\
+                filter_by(uuid=marker).\
+                first()
+    if not result:
+        raise exception.MarkerNotFound(marker)
+    return result
 
 
 def regex_filter(query, model, filters):
     """Applies regular expression filtering to a query.
 
+    Regexes anchored to the start of the string also get an equality or
+    LIKE prefix filter, so that the database can use an index to narrow
+    down the rows the regex is evaluated on.
+
     Returns the updated query.
 
     :param query: query to apply filters to
@@ -1738,20 +1921,37 @@ def regex_filter(query, model, filters):
             continue
         if 'property' == type(column_attr).__name__:
             continue
-        query = query.filter(column_attr.op(db_regexp_op)(
-                                    str(filters[filter_name])))
+        value = str(filters[filter_name])
+        prefix = None
+        if db_regexp_op != 'LIKE':
+            prefix = utils.regex_literal_prefix(value)
+        if prefix and prefix[1]:
+            query = query.filter(column_attr == prefix[0])
+        elif prefix and prefix[0]:
+            escaped = prefix[0]
+            for char in ('\\', '%', '_'):
+                escaped = escaped.replace(char, '\\' + char)
+            query = query.filter(column_attr.like(escaped + '%',
+                                                  escape='\\'))
+        query = query.filter(column_attr.op(db_regexp_op)(value))
     return query
 
 
 @require_context
+@replica_safe()
 def instance_get_active_by_window_joined(context, begin, end=None,
-                                         project_id=None, host=None):
-    """Return instances and joins that were active during window."""
-    session = get_session()
-    query = session.query(models.Instance)
+                                         project_id=None, host=None,
+                                         limit=None, marker=None,
+                                         session=None):
+    """Return instances and joins that were active during window.
 
-    query = query.options(joinedload('info_cache')).\
-                  options(joinedload('security_groups')).\
+    limit and marker page through the projects with active instances,
+    returning the instances of at most limit projects whose ids sort after
+    marker.
+    """
+    if not session:
+        session = get_session()
+    query = session.query(models.Instance).\
                   filter(or_(models.Instance.terminated_at == None,
                              models.Instance.terminated_at > begin))
     if end:
@@ -1761,7 +1961,23 @@ def instance_get_active_by_window_joined(context, begin, end=None,
     if host:
         query = query.filter_by(host=host)
 
-    return _instances_fill_metadata(context, query.all())
+    if limit is not None or marker is not None:
+        # MySQL does not support LIMIT in an IN subquery, so the page
+        # of projects is joined as a derived table instead.
+        projects = query.with_entities(models.Instance.project_id).distinct()
+        if marker is not None:
+            projects = projects.filter(models.Instance.project_id > marker)
+        projects = projects.order_by(models.Instance.project_id).\
+                            limit(limit).\
+                            subquery()
+        query = query.join(projects,
+                           models.Instance.project_id ==
+                           projects.c.project_id)
+
+    query = query.options(joinedload('info_cache')).\
+                  options(joinedload('security_groups'))
+
+    return _instances_fill_metadata(context, query.all(), session=session)
 
 
 @require_admin_context
@@ -1782,6 +1998,41 @@ def instance_get_all_by_host(context, host, columns_to_join=None):
                                 manual_joins=columns_to_join)
 
 
+def _instance_name(values):
+    """Build an instance's name from its columns like Instance.name does."""
+    try:
+        return CONF.instance_name_template % values['id']
+    except TypeError:
+        try:
+            return CONF.instance_name_template % values
+        except KeyError:
+            return values['uuid']
+
+
+@require_admin_context
+def instance_get_columns_by_host(context, host, columns):
+    names = set(columns)
+    if 'name' in names:
+        names.remove('name')
+        names.update(['id', 'uuid'])
+        names.update(key for key in re.findall(r'%\((\w+)\)',
+                                               CONF.instance_name_template)
+                     if key in models.Instance.__table__.c)
+    names = sorted(names)
+    query_columns = [models.Instance.__table__.c[name] for name in names]
+
+    results = []
+    for row in model_query(context, *query_columns,
+                           base_model=models.Instance).\
+                    filter(models.Instance.host == host).\
+                    all():
+        values = dict(zip(names, row))
+        if 'name' in columns:
+            values['name'] = _instance_name(values)
+        results.append(dict((column, values[column]) for column in columns))
+    return results
+
+
 @require_admin_context
 def _instance_get_all_uuids_by_host(context, host, session=None):
     """Return a list of the instance uuids on a given host.
@@ -1944,6 +2195,7 @@ def _instance_update(context, instance_uuid, values, copy_old_instance=False):
 
         metadata = values.get('metadata')
         if metadata is not None:
+            values['serialized_metadata'] = _serialize_metadata(metadata)
             _instance_metadata_update_in_place(context, instance_ref,
                                                'metadata',
                                                models.InstanceMetadata,
@@ -1952,6 +2204,8 @@ def _instance_update(context, instance_uuid, values, copy_old_instance=False):
 
         system_metadata = values.get('system_metadata')
         if system_metadata is not None:
+            values['serialized_system_metadata'] = _serialize_metadata(
+                    system_metadata)
             _instance_metadata_update_in_place(context, instance_ref,
                                                'system_metadata',
                                                models.InstanceSystemMetadata,
@@ -2072,11 +2326,12 @@ def key_pair_get(context, user_id, name):
 
 
 @require_context
-def key_pair_get_all_by_user(context, user_id):
+def key_pair_get_all_by_user(context, user_id, limit=None, marker=None):
     nova.context.authorize_user_context(context, user_id)
-    return model_query(context, models.KeyPair, read_deleted="no").\
-                   filter_by(user_id=user_id).\
-                   all()
+    query = model_query(context, models.KeyPair, read_deleted="no").\
+                   filter_by(user_id=user_id)
+    return _paginate_query(query, models.KeyPair, limit, marker,
+                           marker_key='name').all()
 
 
 def key_pair_count_by_user(context, user_id):
@@ -2613,38 +2868,112 @@ def reservation_create(context, uuid, usage, project_id, resource, delta,
 # cause under or over counting of resources. To avoid deadlocks, this
 # code always acquires the lock on quota_usages before acquiring the lock
 # on reservations.
+#
+# Reservations only touch the usage rows of the resources they change.
+# Those rows are read without locks and written back with compare-and-swap
+# updates, in order of their ids, so parallel reservations in one project
+# neither serialize on nor deadlock over the project's other usages.  A
+# reservation that loses a race is retried, and the last attempt falls
+# back to locking the rows it needs.  Usage refreshes triggered by
+# until_refresh and max_age are left to quota_usage_refresh(), which is
+# run periodically by the scheduler.  Committing, rolling back or expiring
+# reservations locks their usage rows, in order of their ids, before the
+# reservations themselves.
+
+
+class _QuotaUsageChanged(Exception):
+    """A usage row changed between being read and being updated."""
+    pass
+
 
-def _get_quota_usages(context, session, project_id):
+def _get_quota_usages(context, session, project_id, resources=None,
+                      lock=False):
     # Broken out for testability
-    rows = model_query(context, models.QuotaUsage,
-                       read_deleted="no",
-                       session=session).\
-                   filter_by(project_id=project_id).\
-                   with_lockmode('update').\
-                   all()
+    query = model_query(context, models.QuotaUsage,
+                        read_deleted="no",
+                        session=session).\
+                   filter_by(project_id=project_id)
+    if resources is not None:
+        query = query.filter(models.QuotaUsage.resource.in_(resources))
+    if lock:
+        query = query.with_lockmode('update')
+    rows = query.order_by(models.QuotaUsage.id).all()
     return dict((row.resource, row) for row in rows)
 
 
-@require_context
-def quota_reserve(context, resources, quotas, deltas, expire,
-                  until_refresh, max_age, project_id=None):
+def _quota_usage_swap(context, session, usage, values):
+    """Update a usage row only if it still holds the values read from it.
+
+    Returns True if the row was updated, and applies values to usage.
+    """
+    result = model_query(context, models.QuotaUsage,
+                         read_deleted="no",
+                         session=session).\
+                     filter_by(id=usage.id).\
+                     filter_by(in_use=usage.in_use).\
+                     filter_by(reserved=usage.reserved).\
+                     update(values, synchronize_session=False)
+    if not result:
+        return False
+    for key, value in values.items():
+        setattr(usage, key, value)
+    return True
+
+
+def _quota_usage_adjust(context, session, usage_id, in_use, reserved):
+    """Atomically add to the in_use and reserved counts of a usage row."""
+    values = {}
+    if in_use:
+        values['in_use'] = models.QuotaUsage.in_use + in_use
+    if reserved:
+        values['reserved'] = models.QuotaUsage.reserved + reserved
+    if values:
+        model_query(context, models.QuotaUsage, read_deleted="no",
+                    session=session).\
+                filter_by(id=usage_id).\
+                update(values, synchronize_session=False)
+
+
+def _quota_usage_sync(context, session, resources, project_id, resource,
+                      usages, until_refresh):
+    """Recount a usage with its resource's sync routine.
+
+    Returns the refreshed in_use counts, keyed by resource.  Any usage
+    row the sync routine reports on that does not exist yet is created.
+    """
+    updates = resources[resource].sync(context, project_id, session)
+    for res in updates:
+        # Make sure we have a destination for the usage!
+        if res not in usages:
+            usages[res] = _quota_usage_create(context, project_id, res,
+                                              0, 0, until_refresh or None,
+                                              session=session)
+
+    # NOTE(Vek): We make the assumption that the sync routine
+    #            actually refreshes the resources that it is the sync
+    #            routine for.  We don't check, because this is a
+    #            best-effort mechanism.
+    return updates
+
+
+def _quota_reserve(context, resources, quotas, deltas, expire,
+                   until_refresh, project_id, lock):
     elevated = context.elevated()
     session = get_session()
     with session.begin():
-
-        if project_id is None:
-            project_id = context.project_id
-
-        # Get the current usages
-        usages = _get_quota_usages(context, session, project_id)
-
-        # Handle usage refresh
-        work = set(deltas.keys())
-        while work:
-            resource = work.pop()
-
-            # Do we need to refresh the usage?
-            refresh = False
+        # Get the current usages of the resources being reserved
+        usages = _get_quota_usages(context, session, project_id,
+                                   resources=deltas.keys(), lock=lock)
+
+        # Missing and negative usages must be counted before the quota
+        # check can be trusted; anything else is refreshed in the
+        # background.
+        in_use = dict((resource, usage.in_use)
+                      for resource, usage in usages.items())
+        refreshed = set()
+        for resource in sorted(deltas.keys()):
+            if resource in refreshed:
+                continue
             if resource not in usages:
                 usages[resource] = _quota_usage_create(elevated,
                                                       project_id,
@@ -2652,55 +2981,24 @@ def quota_reserve(context, resources, quotas, deltas, expire,
                                                       0, 0,
                                                       until_refresh or None,
                                                       session=session)
-                refresh = True
-            elif usages[resource].in_use < 0:
-                # Negative in_use count indicates a desync, so try to
-                # heal from that...
-                refresh = True
-            elif usages[resource].until_refresh is not None:
-                usages[resource].until_refresh -= 1
-                if usages[resource].until_refresh <= 0:
-                    refresh = True
-            elif max_age and (usages[resource].updated_at -
-                              timeutils.utcnow()).seconds >= max_age:
-                refresh = True
-
-            # OK, refresh the usage
-            if refresh:
-                # Grab the sync routine
-                sync = resources[resource].sync
-
-                updates = sync(elevated, project_id, session)
-                for res, in_use in updates.items():
-                    # Make sure we have a destination for the usage!
-                    if res not in usages:
-                        usages[res] = _quota_usage_create(elevated,
-                                                         project_id,
-                                                         res,
-                                                         0, 0,
-                                                         until_refresh or None,
-                                                         session=session)
-
-                    # Update the usage
-                    usages[res].in_use = in_use
-                    usages[res].until_refresh = until_refresh or None
-
-                    # Because more than one resource may be refreshed
-                    # by the call to the sync routine, and we don't
-                    # want to double-sync, we make sure all refreshed
-                    # resources are dropped from the work set.
-                    work.discard(res)
+            elif usages[resource].in_use >= 0:
+                continue
 
-                    # NOTE(Vek): We make the assumption that the sync
-                    #            routine actually refreshes the
-                    #            resources that it is the sync routine
-                    #            for.  We don't check, because this is
-                    #            a best-effort mechanism.
+            # Because more than one resource may be refreshed by the
+            # call to the sync routine, and we don't want to double-sync,
+            # we skip all refreshed resources.
+            counts = _quota_usage_sync(elevated, session, resources,
+                                       project_id, resource, usages,
+                                       until_refresh)
+            in_use.update(counts)
+            refreshed.update(counts)
+        for resource, usage in usages.items():
+            in_use.setdefault(resource, usage.in_use)
 
         # Check for deltas that would go negative
         unders = [resource for resource, delta in deltas.items()
                   if delta < 0 and
-                  delta + usages[resource].in_use < 0]
+                  delta + in_use[resource] < 0]
 
         # Now, let's check the quotas
         # NOTE(Vek): We're only concerned about positive increments.
@@ -2709,7 +3007,8 @@ def quota_reserve(context, resources, quotas, deltas, expire,
         #            problems.
         overs = [resource for resource, delta in deltas.items()
                  if quotas[resource] >= 0 and delta >= 0 and
-                 quotas[resource] < delta + usages[resource].total]
+                 quotas[resource] < (delta + in_use[resource] +
+                                     usages[resource].reserved)]
 
         # NOTE(Vek): The quota check needs to be in the transaction,
         #            but the transaction doesn't fail just because
@@ -2718,19 +3017,15 @@ def quota_reserve(context, resources, quotas, deltas, expire,
         #            here, our usage updates would be discarded, but
         #            they're not invalidated by being over-quota.
 
-        # Create the reservations
+        # Work out the new values of each usage row
+        updates = {}
+        for resource in refreshed:
+            updates[resource] = {'in_use': in_use[resource],
+                                 'until_refresh': until_refresh or None}
         if not overs:
-            reservations = []
             for resource, delta in deltas.items():
-                reservation = reservation_create(elevated,
-                                                 str(uuid.uuid4()),
-                                                 usages[resource],
-                                                 project_id,
-                                                 resource, delta, expire,
-                                                 session=session)
-                reservations.append(reservation.uuid)
-
-                # Also update the reserved quantity
+                usage = usages[resource]
+                values = updates.setdefault(resource, {})
                 # NOTE(Vek): Again, we are only concerned here about
                 #            positive increments.  Here, though, we're
                 #            worried about the following scenario:
@@ -2743,11 +3038,58 @@ def quota_reserve(context, resources, quotas, deltas, expire,
                 #            To prevent this, we only update the
                 #            reserved value if the delta is positive.
                 if delta > 0:
-                    usages[resource].reserved += delta
+                    values['reserved'] = usage.reserved + delta
+                if (resource not in refreshed and
+                        usage.until_refresh is not None and
+                        usage.until_refresh > 0):
+                    values['until_refresh'] = usage.until_refresh - 1
+
+        # Apply the updates in a fixed order, and start over if anybody
+        # else got to one of the rows first
+        for resource in sorted(updates, key=lambda res: usages[res].id):
+            if (updates[resource] and
+                    not _quota_usage_swap(elevated, session,
+                                          usages[resource],
+                                          updates[resource])):
+                raise _QuotaUsageChanged()
+
+        # Create the reservations
+        reservations = []
+        if not overs:
+            for resource, delta in deltas.items():
+                reservation = reservation_create(elevated,
+                                                 str(uuid.uuid4()),
+                                                 usages[resource],
+                                                 project_id,
+                                                 resource, delta, expire,
+                                                 session=session)
+                reservations.append(reservation.uuid)
+
+    return reservations, usages, unders, overs
+
+
+@require_context
+def quota_reserve(context, resources, quotas, deltas, expire,
+                  until_refresh, max_age, project_id=None):
+    if project_id is None:
+        project_id = context.project_id
 
-        # Apply updates to the usages table
-        for usage_ref in usages.values():
-            usage_ref.save(session=session)
+    # NOTE: max_age is only honoured by quota_usage_refresh().
+    for attempt in range(1, CONF.quota_reserve_attempts):
+        try:
+            result = _quota_reserve(context, resources, quotas, deltas,
+                                    expire, until_refresh, project_id,
+                                    lock=False)
+            break
+        except _QuotaUsageChanged:
+            LOG.debug(_("Quota usages of project %(project_id)s changed "
+                        "during reservation, retrying"),
+                      {'project_id': project_id})
+    else:
+        # Stop racing and lock the rows being reserved instead
+        result = _quota_reserve(context, resources, quotas, deltas, expire,
+                                until_refresh, project_id, lock=True)
+    reservations, usages, unders, overs = result
 
     if unders:
         LOG.warning(_("Change will make usage less than 0 for the following "
@@ -2761,6 +3103,49 @@ def quota_reserve(context, resources, quotas, deltas, expire,
     return reservations
 
 
+@require_admin_context
+def quota_usage_refresh(context, resources, until_refresh, max_age):
+    """Recount the usages which are due for a refresh.
+
+    A usage is due once its until_refresh count has run out, when it has
+    not been updated for max_age seconds, or when its in_use count has
+    gone negative.
+    """
+    due = [models.QuotaUsage.in_use < 0,
+           models.QuotaUsage.until_refresh <= 0]
+    if max_age:
+        stale = timeutils.utcnow() - datetime.timedelta(seconds=max_age)
+        due.append(models.QuotaUsage.updated_at < stale)
+    rows = model_query(context, models.QuotaUsage.project_id,
+                       models.QuotaUsage.resource,
+                       base_model=models.QuotaUsage, read_deleted="no").\
+                   filter(or_(*due)).\
+                   all()
+
+    by_project = collections.defaultdict(set)
+    for project_id, resource in rows:
+        if getattr(resources.get(resource), 'sync', None):
+            by_project[project_id].add(resource)
+
+    for project_id, work in by_project.items():
+        session = get_session()
+        with session.begin():
+            usages = _get_quota_usages(context, session, project_id,
+                                       lock=True)
+            while work:
+                resource = work.pop()
+                updates = _quota_usage_sync(context, session, resources,
+                                            project_id, resource, usages,
+                                            until_refresh)
+                for res, in_use in updates.items():
+                    usages[res].in_use = in_use
+                    usages[res].until_refresh = until_refresh or None
+                    # Bump the refresh time even if the count is unchanged
+                    usages[res].updated_at = timeutils.utcnow()
+                    usages[res].save(session=session)
+                    work.discard(res)
+
+
 def _quota_reservations_query(session, context, reservations):
     """Return the relevant reservations."""
 
@@ -2768,37 +3153,70 @@ def _quota_reservations_query(session, context, reservations):
     return model_query(context, models.Reservation,
                        read_deleted="no",
                        session=session).\
-                   filter(models.Reservation.uuid.in_(reservations)).\
-                   with_lockmode('update')
+                   filter(models.Reservation.uuid.in_(reservations))
+
+
+def _quota_reservations_apply(context, session, reservations, commit):
+    """Release reserved usage, moving it to in_use when committing."""
+    adjustments = {}
+    for reservation in reservations:
+        in_use, reserved = adjustments.get(reservation.usage_id, (0, 0))
+        if reservation.delta >= 0:
+            reserved -= reservation.delta
+        if commit:
+            in_use += reservation.delta
+        adjustments[reservation.usage_id] = (in_use, reserved)
+
+    for usage_id in sorted(adjustments):
+        in_use, reserved = adjustments[usage_id]
+        _quota_usage_adjust(context, session, usage_id, in_use, reserved)
+
+
+def _quota_reservations_release(context, session, reservation_query, commit):
+    """Apply and delete the reservations matched by reservation_query.
+
+    The usage rows the reservations belong to are locked, in order of
+    their ids, before the reservations themselves are locked and deleted.
+    """
+    usage_ids = set(reservation.usage_id
+                    for reservation in reservation_query.all())
+    if not usage_ids:
+        return
+
+    model_query(context, models.QuotaUsage, read_deleted="no",
+                session=session).\
+            filter(models.QuotaUsage.id.in_(usage_ids)).\
+            order_by(models.QuotaUsage.id).\
+            with_lockmode('update').\
+            all()
+
+    # Only release reservations whose usage rows we hold locks on
+    reservation_query = reservation_query.\
+            filter(models.Reservation.usage_id.in_(usage_ids))
+    _quota_reservations_apply(context, session,
+                              reservation_query.with_lockmode('update').all(),
+                              commit)
+    reservation_query.soft_delete(synchronize_session=False)
 
 
 @require_context
 def reservation_commit(context, reservations, project_id=None):
     session = get_session()
     with session.begin():
-        usages = _get_quota_usages(context, session, project_id)
         reservation_query = _quota_reservations_query(session, context,
                                                       reservations)
-        for reservation in reservation_query.all():
-            usage = usages[reservation.resource]
-            if reservation.delta >= 0:
-                usage.reserved -= reservation.delta
-            usage.in_use += reservation.delta
-        reservation_query.soft_delete(synchronize_session=False)
+        _quota_reservations_release(context, session, reservation_query,
+                                    commit=True)
 
 
 @require_context
 def reservation_rollback(context, reservations, project_id=None):
     session = get_session()
     with session.begin():
-        usages = _get_quota_usages(context, session, project_id)
         reservation_query = _quota_reservations_query(session, context,
                                                       reservations)
-        for reservation in reservation_query.all():
-            usage = usages[reservation.resource]
-            if reservation.delta >= 0:
-                usage.reserved -= reservation.delta
-        reservation_query.soft_delete(synchronize_session=False)
+        _quota_reservations_release(context, session, reservation_query,
+                                    commit=False)
 
 
 @require_admin_context
@@ -2829,13 +3247,8 @@ def reservation_expire(context):
         reservation_query = model_query(context, models.Reservation,
                                         session=session, read_deleted="no").\
                             filter(models.Reservation.expire < current_time)
-
-        for reservation in reservation_query.join(models.QuotaUsage).all():
-            if reservation.delta >= 0:
-                reservation.usage.reserved -= reservation.delta
-                reservation.usage.save(session=session)
-
-        reservation_query.soft_delete(synchronize_session=False)
+        _quota_reservations_release(context, session, reservation_query,
+                                    commit=False)
 
 
 ###################
@@ -3042,8 +3455,9 @@ def _security_group_get_by_names(context, session, project_id, group_names):
 
 
 @require_context
-def security_group_get_all(context):
-    return _security_group_get_query(context).all()
+def security_group_get_all(context, limit=None, marker=None):
+    query = _security_group_get_query(context)
+    return _paginate_query(query, models.SecurityGroup, limit, marker).all()
 
 
 @require_context
@@ -3087,10 +3501,11 @@ def security_group_get_by_name(context, project_id, group_name,
 
 
 @require_context
-def security_group_get_by_project(context, project_id):
-    return _security_group_get_query(context, read_deleted="no").\
-                        filter_by(project_id=project_id).\
-                        all()
+def security_group_get_by_project(context, project_id, limit=None,
+                                  marker=None):
+    query = _security_group_get_query(context, read_deleted="no").\
+                        filter_by(project_id=project_id)
+    return _paginate_query(query, models.SecurityGroup, limit, marker).all()
 
 
 @require_context
@@ -3603,12 +4018,9 @@ def _instance_type_get_query(context, session=None, read_deleted=None):
                      options(joinedload('extra_specs'))
 
 
-@require_context
-def instance_type_get_all(context, inactive=False, filters=None):
-    """
-    Returns all instance types.
-    """
-    filters = filters or {}
+def _instance_type_get_all_query(context, inactive=False, filters=None,
+                                 session=None):
+    filters = dict(filters or {})
 
     # FIXME(sirp): now that we have the `disabled` field for instance-types, we
     # should probably remove the use of `deleted` to mark inactive. `deleted`
@@ -3616,7 +4028,8 @@ def instance_type_get_all(context, inactive=False, filters=None):
     # database.
     read_deleted = "yes" if inactive else "no"
 
-    query = _instance_type_get_query(context, read_deleted=read_deleted)
+    query = _instance_type_get_query(context, session=session,
+                                     read_deleted=read_deleted)
 
     if 'min_memory_mb' in filters:
         query = query.filter(
@@ -3643,11 +4056,38 @@ def instance_type_get_all(context, inactive=False, filters=None):
             query = query.filter(the_filter[0])
         del filters['is_public']
 
+    return query
+
+
+@require_context
+def instance_type_get_all(context, inactive=False, filters=None):
+    """
+    Returns all instance types.
+    """
+    query = _instance_type_get_all_query(context, inactive=inactive,
+                                         filters=filters)
     inst_types = query.order_by("name").all()
 
     return [_dict_with_extra_specs(i) for i in inst_types]
 
 
+@require_context
+def instance_type_get_summary(context, inactive=False, filters=None):
+    """
+    Returns the number of instance types instance_type_get_all would
+    return, and when the last of them changed.
+    """
+    session = get_session()
+    inst_types = _instance_type_get_all_query(context, inactive=inactive,
+                                              filters=filters,
+                                              session=session).subquery()
+    count, updated_at = session.query(
+            func.count(inst_types.c.id),
+            func.max(func.coalesce(inst_types.c.updated_at,
+                                   inst_types.c.created_at))).first()
+    return {'count': count, 'updated_at': updated_at}
+
+
 @require_context
 def instance_type_get(context, id, session=None):
     """Returns a dict describing specific instance_type."""
@@ -3804,6 +4244,97 @@ def cell_get_all(context):
     return model_query(context, models.Cell, read_deleted="no").all()
 
 
+########################
+# Serialized metadata
+
+
+def _serialize_metadata(metadata):
+    """Return a metadata dict as stored in the serialized_* columns.
+
+    Values are converted to strings, as the metadata tables would.
+    """
+    metadata = metadata or {}
+    return jsonutils.dumps(dict((key, value if value is None
+                                 else unicode(value))
+                                for key, value in metadata.iteritems()))
+
+
+def _deserialize_metadata(serialized):
+    """Return serialized metadata as the key/value rows callers expect."""
+    return [{'key': key, 'value': value}
+            for key, value in jsonutils.loads(serialized).iteritems()]
+
+
+def _instance_lock_for_metadata(context, instance_uuid, session):
+    """Lock the instance row until the end of the transaction.
+
+    Metadata updates read the rows and then write the serialized copy, so
+    they are serialized on the instance row to keep concurrent updates from
+    writing a stale copy.
+    """
+    model_query(context, models.Instance.id, base_model=models.Instance,
+                session=session, read_deleted="yes").\
+            filter_by(uuid=instance_uuid).\
+            with_lockmode('update').\
+            first()
+
+
+def _instance_serialized_metadata_set(context, instance_uuid, column,
+                                      metadata, session):
+    model_query(context, models.Instance, session=session,
+                read_deleted="yes").\
+            filter_by(uuid=instance_uuid).\
+            update({column: _serialize_metadata(metadata)},
+                   synchronize_session=False)
+
+
+@require_admin_context
+def instance_metadata_compact(context, max_count):
+    """Fill in the serialized metadata copies of up to max_count instances.
+
+    :returns: the number of instances filled in.
+    """
+    session = get_session()
+    with session.begin():
+        instances = model_query(context, models.Instance.uuid,
+                                models.Instance.serialized_metadata,
+                                models.Instance.serialized_system_metadata,
+                                base_model=models.Instance, session=session,
+                                read_deleted="no").\
+                filter(or_(models.Instance.serialized_metadata == None,
+                           models.Instance.serialized_system_metadata ==
+                           None)).\
+                order_by(models.Instance.id).\
+                limit(max_count).\
+                with_lockmode('update').\
+                all()
+        if not instances:
+            return 0
+        uuids = [instance[0] for instance in instances]
+
+        meta = collections.defaultdict(dict)
+        for row in _instance_metadata_get_multi(context, uuids,
+                                                session=session):
+            meta[row['instance_uuid']][row['key']] = row['value']
+        sys_meta = collections.defaultdict(dict)
+        for row in _instance_system_metadata_get_multi(context, uuids,
+                                                       session=session):
+            sys_meta[row['instance_uuid']][row['key']] = row['value']
+
+        for instance_uuid, serialized, serialized_system in instances:
+            values = {}
+            if serialized is None:
+                values['serialized_metadata'] = _serialize_metadata(
+                        meta[instance_uuid])
+            if serialized_system is None:
+                values['serialized_system_metadata'] = _serialize_metadata(
+                        sys_meta[instance_uuid])
+            session.query(models.Instance).\
+                    filter_by(uuid=instance_uuid).\
+                    update(values, synchronize_session=False)
+    return len(instances)
+
+
 ########################
 # User-provided metadata
 
@@ -3834,9 +4365,18 @@ def instance_metadata_get(context, instance_uuid, session=None):
 
 @require_context
 def instance_metadata_delete(context, instance_uuid, key):
-    _instance_metadata_get_query(context, instance_uuid).\
-        filter_by(key=key).\
-        soft_delete()
+    session = get_session()
+    with session.begin():
+        _instance_lock_for_metadata(context, instance_uuid, session)
+        _instance_metadata_get_query(context, instance_uuid,
+                                     session=session).\
+            filter_by(key=key).\
+            soft_delete(synchronize_session=False)
+        _instance_serialized_metadata_set(
+                context, instance_uuid, 'serialized_metadata',
+                instance_metadata_get(context, instance_uuid,
+                                      session=session),
+                session)
 
 
 @require_context
@@ -3848,6 +4388,7 @@ def instance_metadata_update(context, instance_uuid, metadata, delete,
         session = get_session()
         synchronize_session = False
     with session.begin(subtransactions=True):
+        _instance_lock_for_metadata(context, instance_uuid, session)
         if delete:
             _instance_metadata_get_query(context, instance_uuid,
                                          session=session).\
@@ -3871,6 +4412,15 @@ def instance_metadata_update(context, instance_uuid, metadata, delete,
                              "instance_uuid": instance_uuid})
             session.add(meta_ref)
 
+        if not delete:
+            session.flush()
+        _instance_serialized_metadata_set(
+                context, instance_uuid, 'serialized_metadata',
+                metadata if delete else
+                instance_metadata_get(context, instance_uuid,
+                                      session=session),
+                session)
+
         return metadata
 
 
@@ -3912,6 +4462,7 @@ def instance_system_metadata_update(context, instance_uuid, metadata, delete,
         session = get_session()
         synchronize_session = False
     with session.begin(subtransactions=True):
+        _instance_lock_for_metadata(context, instance_uuid, session)
         if delete:
             _instance_system_metadata_get_query(context, instance_uuid,
                                                 session=session).\
@@ -3935,6 +4486,15 @@ def instance_system_metadata_update(context, instance_uuid, metadata, delete,
                              "instance_uuid": instance_uuid})
             session.add(meta_ref)
 
+        if not delete:
+            session.flush()
+        _instance_serialized_metadata_set(
+                context, instance_uuid, 'serialized_system_metadata',
+                metadata if delete else
+                instance_system_metadata_get(context, instance_uuid,
+                                             session=session),
+                session)
+
         return metadata
 
 
@@ -4343,7 +4903,9 @@ def aggregate_metadata_get_by_host(context, host, key=None):
 @require_admin_context
 def aggregate_host_get_by_metadata_key(context, key):
     query = model_query(context, models.Aggregate).join(
-            "_metadata").filter(models.AggregateMetadata.key == key)
+            "_metadata").filter(models.AggregateMetadata.key == key).\
+            options(joinedload('_hosts')).\
+            options(joinedload('_metadata'))
     rows = query.all()
     metadata = collections.defaultdict(set)
     for agg in rows:
@@ -4751,10 +5313,12 @@ def task_log_get(context, task_name, period_beginning, period_ending, host,
 
 
 @require_admin_context
+@replica_safe()
 def task_log_get_all(context, task_name, period_beginning, period_ending,
-                     host=None, state=None):
+                     host=None, state=None, session=None):
     return _task_log_get_query(context, task_name, period_beginning,
-                               period_ending, host, state).all()
+                               period_ending, host, state,
+                               session=session).all()
 
 
 @require_admin_context
@@ -4794,6 +5358,10 @@ def task_log_end_task(context, task_name, period_beginning, period_ending,
             raise exception.TaskNotRunning(task_name=task_name, host=host)
 
 
+# Most rows archived from a table in one transaction
+_ARCHIVE_BATCH_SIZE = 1000
+
+
 def _get_default_deleted_value(table):
     # TODO(dripton): It would be better to introspect the actual default value
     # from the column, but I don't see a way to do that in the low-level APIs
@@ -4814,9 +5382,15 @@ def _get_default_deleted_value(table):
 
 
 @require_admin_context
-def archive_deleted_rows_for_table(context, tablename, max_rows):
+def archive_deleted_rows_for_table(context, tablename, max_rows=None):
     """Move up to max_rows rows from one tables to the corresponding
-    shadow table.
+    shadow table, or all of its deleted rows if max_rows is None.
+
+    Rows are moved in batches of at most _ARCHIVE_BATCH_SIZE rows.  Each
+    batch is copied with a single INSERT ... SELECT and removed with a
+    single DELETE, in its own short transaction, so the rows never travel
+    through Python.  If a batch fails with an IntegrityError, its rows are
+    retried one by one and those that still fail are left behind.
 
     :returns: number of rows archived
     """
@@ -4834,55 +5408,94 @@ def archive_deleted_rows_for_table(context, tablename, max_rows):
     except NoSuchTableError:
         # No corresponding shadow table; skip it.
         return rows_archived
-    # Group the insert and delete in a transaction.
-    with conn.begin():
-        # TODO(dripton): It would be more efficient to insert(select) and then
-        # delete(same select) without ever returning the selected rows back to
-        # Python.  sqlalchemy does not support that directly, but we have
-        # nova.db.sqlalchemy.utils.InsertFromSelect for the insert side.  We
-        # need a corresponding function for the delete side.
+    try:
+        column = table.c.id
+    except AttributeError:
+        # We have one table (dns_domains) where the key is called
+        # "domain" rather than "id"
+        column = table.c.domain
+    deleted = table.c.deleted != default_deleted_value
+    columns = [table.c[shadow_column.name]
+               for shadow_column in shadow_table.columns]
+
+    last_key = None
+    while max_rows is None or rows_archived < max_rows:
+        batch_size = _ARCHIVE_BATCH_SIZE
+        if max_rows is not None:
+            batch_size = min(batch_size, max_rows - rows_archived)
+        # Only the keys of the batch are read, which bounds both the size
+        # of the transaction and the rows it locks.  Each batch starts
+        # after the last key of the previous one, so rows left behind are
+        # not selected again.
+        condition = deleted
+        if last_key is not None:
+            condition = and_(deleted, column > last_key)
+        query = select([column], condition).order_by(column).\
+                limit(batch_size)
+        keys = [row[0] for row in conn.execute(query)]
+        if not keys:
+            break
         try:
-            column = table.c.id
-            column_name = "id"
-        except AttributeError:
-            # We have one table (dns_domains) where the key is called
-            # "domain" rather than "id"
-            column = table.c.domain
-            column_name = "domain"
-        query = select([table],
-                       table.c.deleted != default_deleted_value).\
-                       order_by(column).limit(max_rows)
-        rows = conn.execute(query).fetchall()
-        if rows:
-            keys = [getattr(row, column_name) for row in rows]
-            delete_statement = table.delete(column.in_(keys))
-            try:
-                result = conn.execute(delete_statement)
-            except IntegrityError:
-                # A foreign key constraint keeps us from deleting some of
-                # these rows until we clean up a dependent table.  Just
-                # skip this table for now; we'll come back to it later.
-                return rows_archived
-            insert_statement = shadow_table.insert()
-            conn.execute(insert_statement, rows)
-            rows_archived = result.rowcount
+            rows_archived += _archive_rows(conn, table, shadow_table, columns,
+                                           and_(deleted, column.in_(keys)))
+        except IntegrityError:
+            # A foreign key constraint keeps us from deleting some of
+            # these rows until we clean up a dependent table.  Archive
+            # the others one by one; we'll come back to the rest later.
+            for key in keys:
+                try:
+                    rows_archived += _archive_rows(conn, table, shadow_table,
+                                                   columns,
+                                                   and_(deleted,
+                                                        column == key))
+                except IntegrityError:
+                    LOG.debug(_("Leaving row %(key)s of %(tablename)s "
+                                "unarchived, it is still referenced") %
+                              {'key': key, 'tablename': tablename})
+        last_key = keys[-1]
+        if len(keys) < batch_size:
+            break
     return rows_archived
 
 
+def _archive_rows(conn, table, shadow_table, columns, condition):
+    """Move the rows of table matching condition to shadow_table.
+
+    :returns: number of rows moved
+    """
+    insert_statement = db_utils.InsertFromSelect(shadow_table,
+                                                 select(columns, condition))
+    delete_statement = table.delete(condition)
+    # Group the insert and delete in a transaction.
+    with conn.begin():
+        conn.execute(insert_statement)
+        return conn.execute(delete_statement).rowcount
+
+
+def _archive_tablenames():
+    """Return the names of the archivable tables, referencing tables first.
+
+    Archiving rows which are referenced by a foreign key can only succeed
+    once the rows referencing them are gone.
+    """
+    return [table.name
+            for table in reversed(models.BASE.metadata.sorted_tables)]
+
+
 @require_admin_context
 def archive_deleted_rows(context, max_rows=None):
     """Move up to max_rows rows from production tables to the corresponding
-    shadow tables.
+    shadow tables, or all deleted rows if max_rows is None.
 
     :returns: Number of rows archived.
     """
     # The context argument is only used for the decorator.
-    tablenames = []
-    for model_class in models.__dict__.itervalues():
-        if hasattr(model_class, "__tablename__"):
-            tablenames.append(model_class.__tablename__)
     rows_archived = 0
-    for tablename in tablenames:
+    for tablename in _archive_tablenames():
+        if max_rows is None:
+            rows_archived += archive_deleted_rows_for_table(context,
+                                                            tablename)
+            continue
         rows_archived += archive_deleted_rows_for_table(context, tablename,
                                          max_rows=max_rows - rows_archived)
         if rows_archived >= max_rows:
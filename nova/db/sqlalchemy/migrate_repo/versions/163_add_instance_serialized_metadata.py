@@ -0,0 +1,48 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from sqlalchemy import Column, MetaData, Table, Text
+from sqlalchemy.dialects import mysql
+
+# JSON copies of the instance_metadata and instance_system_metadata rows of
+# each instance, so that instance listings do not have to query them.
+COLUMNS = ('serialized_metadata', 'serialized_system_metadata')
+TABLES = ('instances', 'shadow_instances')
+
+
+def MediumText():
+    return Text().with_variant(mysql.MEDIUMTEXT(), 'mysql')
+
+
+def upgrade(migrate_engine):
+    meta = MetaData()
+    meta.bind = migrate_engine
+
+    for table_name in TABLES:
+        table = Table(table_name, meta, autoload=True)
+        for column in COLUMNS:
+            table.create_column(Column(column, MediumText()))
+
+
+def downgrade(migrate_engine):
+    meta = MetaData()
+    meta.bind = migrate_engine
+
+    for table_name in TABLES:
+        table = Table(table_name, meta, autoload=True)
+        for column in COLUMNS:
+            table.drop_column(column)
@@ -0,0 +1,93 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import collections
+
+from sqlalchemy import Column, DateTime, Index, Integer, MetaData
+from sqlalchemy import select, String, Table, Text
+
+from nova.openstack.common import jsonutils
+
+# Compute node stats move from one compute_node_stats row per stat to a
+# JSON dict in compute_nodes.stats.
+
+
+def _stats_table(meta, name):
+    columns = [
+        Column('created_at', DateTime),
+        Column('updated_at', DateTime),
+        Column('deleted_at', DateTime),
+        Column('deleted', Integer),
+        Column('id', Integer, primary_key=True, nullable=False),
+        Column('compute_node_id', Integer, nullable=False),
+        Column('key', String(length=255), nullable=False),
+        Column('value', String(length=255)),
+    ]
+    return Table(name, meta, *columns, mysql_engine='InnoDB',
+                 mysql_charset='utf8')
+
+
+def upgrade(migrate_engine):
+    meta = MetaData()
+    meta.bind = migrate_engine
+
+    for table_name in ('compute_nodes', 'shadow_compute_nodes'):
+        table = Table(table_name, meta, autoload=True)
+        table.create_column(Column('stats', Text))
+
+    compute_nodes = Table('compute_nodes', meta, autoload=True)
+    compute_node_stats = Table('compute_node_stats', meta, autoload=True)
+
+    stats = collections.defaultdict(dict)
+    rows = select([compute_node_stats.c.compute_node_id,
+                   compute_node_stats.c.key,
+                   compute_node_stats.c.value]).\
+            where(compute_node_stats.c.deleted == 0).execute()
+    for compute_node_id, key, value in rows:
+        stats[compute_node_id][key] = value
+    for compute_node_id, values in stats.iteritems():
+        compute_nodes.update().\
+                where(compute_nodes.c.id == compute_node_id).\
+                values(stats=jsonutils.dumps(values)).\
+                execute()
+
+    compute_node_stats.drop()
+    Table('shadow_compute_node_stats', meta, autoload=True).drop()
+
+
+def downgrade(migrate_engine):
+    meta = MetaData()
+    meta.bind = migrate_engine
+
+    compute_node_stats = _stats_table(meta, 'compute_node_stats')
+    compute_node_stats.create()
+    Index('ix_compute_node_stats_compute_node_id',
+          compute_node_stats.c.compute_node_id).create(migrate_engine)
+    _stats_table(meta, 'shadow_compute_node_stats').create()
+
+    compute_nodes = Table('compute_nodes', meta, autoload=True)
+    rows = select([compute_nodes.c.id, compute_nodes.c.stats]).\
+            where(compute_nodes.c.stats != None).execute()
+    for compute_node_id, stats in rows:
+        for key, value in jsonutils.loads(stats).iteritems():
+            compute_node_stats.insert().values(
+                compute_node_id=compute_node_id, key=key, value=value,
+                deleted=0).execute()
+
+    for table_name in ('compute_nodes', 'shadow_compute_nodes'):
+        table = Table(table_name, meta, autoload=True)
+        table.drop_column('stats')
@@ -95,23 +95,9 @@ class ComputeNode(BASE, NovaBase):
     cpu_info = Column(Text, nullable=True)
     disk_available_least = Column(Integer)
 
-
-class ComputeNodeStat(BASE, NovaBase):
-    """Stats related to the current workload of a compute host that are
-    intended to aid in making scheduler decisions."""
-    __tablename__ = 'compute_node_stats'
-    id = Column(Integer, primary_key=True)
-    key = Column(String(511))
-    value = Column(String(255))
-    compute_node_id = Column(Integer, ForeignKey('compute_nodes.id'))
-
-    primary_join = ('and_(ComputeNodeStat.compute_node_id == '
-                    'ComputeNode.id, ComputeNodeStat.deleted == 0)')
-    stats = relationship("ComputeNode", backref="stats",
-            primaryjoin=primary_join)
-
-    def __str__(self):
-        return "{%d: %s = %s}" % (self.compute_node_id, self.key, self.value)
+    # JSON dict of stats related to the current workload of the host that
+    # are intended to aid in making scheduler decisions.
+    stats = Column(Text)
 
 
 class Certificate(BASE, NovaBase):
@@ -156,6 +142,21 @@ class Instance(BASE, NovaBase):
     def _extra_keys(self):
         return ['name']
 
+    # The serialized metadata copies are internal to the DB layer and are
+    # left out of the dict view of an instance, so they are not sent over
+    # RPC along with it.
+    _internal_keys = ('serialized_metadata', 'serialized_system_metadata')
+
+    def __iter__(self):
+        super(Instance, self).__iter__()
+        self._i = (key for key in self._i if key not in self._internal_keys)
+        return self
+
+    def iteritems(self):
+        return ((key, value)
+                for key, value in super(Instance, self).iteritems()
+                if key not in self._internal_keys)
+
     user_id = Column(String(255))
     project_id = Column(String(255))
 
@@ -238,6 +239,11 @@ class Instance(BASE, NovaBase):
     # the cells tree and it'll be a full cell name such as 'api!hop1!hop2'
     cell_name = Column(String(255))
 
+    # JSON copies of the metadata and system_metadata rows, read instead of
+    # them by instance listings when compact_instance_metadata is set.
+    serialized_metadata = Column(Text)
+    serialized_system_metadata = Column(Text)
+
 
 class InstanceInfoCache(BASE, NovaBase):
     """
@@ -42,6 +42,7 @@ import functools
 import stevedore
 
 from nova.openstack.common import log as logging
+from nova import utils
 
 LOG = logging.getLogger(__name__)
 NS = 'nova.hooks'
@@ -81,9 +82,11 @@ def add_hook(name):
         def inner(*args, **kwargs):
             manager = _HOOKS.setdefault(name, HookManager(name))
 
-            manager.run_pre(name, args, kwargs)
+            with utils.timed('hooks'):
+                manager.run_pre(name, args, kwargs)
             rv = f(*args, **kwargs)
-            manager.run_post(name, rv, args, kwargs)
+            with utils.timed('hooks'):
+                manager.run_post(name, rv, args, kwargs)
 
             return rv
 
@@ -35,6 +35,7 @@ from nova import exception
 from nova.openstack.common import jsonutils
 from nova.openstack.common import log as logging
 from nova.openstack.common import timeutils
+from nova import utils
 
 glance_opts = [
     cfg.StrOpt('glance_host',
@@ -111,7 +112,11 @@ def _create_glance_client(context, host, port, use_ssl, version=1):
     if CONF.auth_strategy == 'keystone':
         params['token'] = context.auth_token
     endpoint = '%s://%s:%s' % (scheme, host, port)
-    return glanceclient.Client(str(version), endpoint, **params)
+    client = glanceclient.Client(str(version), endpoint, **params)
+    http_client = getattr(client, 'http_client', None)
+    for name in ('json_request', 'raw_request'):
+        utils.time_calls(http_client, name, 'glance')
+    return client
 
 
 def get_api_servers():
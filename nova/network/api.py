@@ -162,9 +162,11 @@ class API(base.Base):
         return self.db.floating_ip_get_by_address(context, address)
 
     @wrap_check_policy
-    def get_floating_ips_by_project(self, context):
+    def get_floating_ips_by_project(self, context, limit=None, marker=None):
         return self.db.floating_ip_get_all_by_project(context,
-                                                      context.project_id)
+                                                      context.project_id,
+                                                      limit=limit,
+                                                      marker=marker)
 
     @wrap_check_policy
     def get_floating_ips_by_fixed_address(self, context, fixed_address):
@@ -29,6 +29,7 @@ from nova.network import api as shiny_api
 from nova.network import model as network_model
 from nova.network import rpcapi as network_rpcapi
 from nova.openstack.common import log as logging
+from nova import utils
 
 LOG = logging.getLogger(__name__)
 
@@ -93,8 +94,9 @@ class API(base.Base):
         return self.network_rpcapi.get_floating_ip_by_address(context, address)
 
     @wrap_check_policy
-    def get_floating_ips_by_project(self, context):
-        return self.network_rpcapi.get_floating_ips_by_project(context)
+    def get_floating_ips_by_project(self, context, limit=None, marker=None):
+        floating_ips = self.network_rpcapi.get_floating_ips_by_project(context)
+        return utils.page_items(floating_ips, limit, marker)
 
     @wrap_check_policy
     def get_floating_ips_by_fixed_address(self, context, fixed_address):
@@ -404,7 +404,41 @@ class NetworkManager(manager.Manager):
         #                floating ips MUST override this or use the Mixin
         return []
 
+    def _get_instance_uuid_by_exact_ip(self, context, address):
+        if not (utils.is_valid_ipv4(address) or utils.is_valid_ipv6(address)):
+            return []
+        admin_context = context.elevated()
+        try:
+            fixed_ip = self.db.fixed_ip_get_by_address(admin_context,
+                                                       address)
+        except exception.FixedIpNotFoundForAddress:
+            # A floating ip matches the instance of its fixed ip
+            try:
+                floating_ip = self.db.floating_ip_get_by_address(
+                        admin_context, address)
+            except exception.FloatingIpNotFoundForAddress:
+                return []
+            if floating_ip['fixed_ip_id'] is None:
+                return []
+            fixed_ip = self.db.fixed_ip_get(admin_context,
+                                            floating_ip['fixed_ip_id'])
+        if (fixed_ip['instance_uuid'] is None or
+                fixed_ip['virtual_interface_id'] is None):
+            return []
+        return [{'instance_uuid': fixed_ip['instance_uuid'],
+                 'ip': address}]
+
     def get_instance_uuids_by_ip_filter(self, context, filters):
+        # An exact address, as built by the compute API for the fixed_ip
+        # search option, can be looked up by index instead of walking
+        # every virtual interface.
+        if 'ip' in filters and not ('ip6' in filters or
+                                    'fixed_ip' in filters):
+            prefix = utils.regex_literal_prefix(str(filters['ip']))
+            if prefix and prefix[1]:
+                return self._get_instance_uuid_by_exact_ip(context,
+                                                           prefix[0])
+
         fixed_ip_filter = filters.get('fixed_ip')
         ip_filter = re.compile(str(filters.get('ip')))
         ipv6_filter = re.compile(str(filters.get('ip6')))
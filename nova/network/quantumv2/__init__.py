@@ -21,6 +21,7 @@ from quantumclient.v2_0 import client as clientv20
 
 from nova.openstack.common import excutils
 from nova.openstack.common import log as logging
+from nova import utils
 
 CONF = cfg.CONF
 LOG = logging.getLogger(__name__)
@@ -56,7 +57,10 @@ def _get_client(token=None):
         params['token'] = token
     else:
         params['auth_strategy'] = None
-    return clientv20.Client(**params)
+    client = clientv20.Client(**params)
+    utils.time_calls(getattr(client, 'httpclient', None), 'request',
+                     'quantum')
+    return client
 
 
 def get_client(context, admin=False):
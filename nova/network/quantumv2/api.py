@@ -35,6 +35,7 @@ from nova.openstack.common import excutils
 from nova.openstack.common import jsonutils
 from nova.openstack.common import log as logging
 from nova.openstack.common import uuidutils
+from nova import utils
 from quantumclient.quantum import v2_0 as quantumv20
 
 quantum_opts = [
@@ -674,10 +675,11 @@ class API(base.Base):
         port_dict = self._setup_port_dict(client, fip['port_id'])
         return self._format_floating_ip_model(fip, pool_dict, port_dict)
 
-    def get_floating_ips_by_project(self, context):
+    def get_floating_ips_by_project(self, context, limit=None, marker=None):
         client = quantumv2.get_client(context)
         project_id = context.project_id
         fips = client.list_floatingips(tenant_id=project_id)['floatingips']
+        fips = utils.page_items(fips, limit, marker)
         pool_dict = self._setup_pools_dict(client)
         port_dict = self._setup_ports_dict(client, project_id)
         return [self._format_floating_ip_model(fip, pool_dict, port_dict)
@@ -23,6 +23,7 @@ from oslo.config import cfg
 from nova.openstack.common import jsonutils
 from nova.openstack.common import rpc
 from nova.openstack.common.rpc import proxy as rpc_proxy
+from nova import utils
 
 rpcapi_opts = [
     cfg.StrOpt('network_topic',
@@ -71,6 +72,7 @@ class NetworkAPI(rpc_proxy.RpcProxy):
         super(NetworkAPI, self).__init__(
                 topic=topic,
                 default_version=self.BASE_RPC_API_VERSION)
+        utils.time_rpc_calls(self)
 
     def get_all_networks(self, ctxt):
         return self.call(ctxt, self.make_msg('get_all_networks'))
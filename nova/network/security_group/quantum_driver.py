@@ -112,7 +112,7 @@ class SecurityGroupAPI(security_group_base.SecurityGroupBase):
         return self._convert_to_nova_security_group_format(group)
 
     def list(self, context, names=None, ids=None, project=None,
-             search_opts=None):
+             search_opts=None, limit=None, marker=None):
         """Returns list of security group rules owned by tenant."""
         quantum = quantumv2.get_client(context)
         search_opts = {}
@@ -132,7 +132,7 @@ class SecurityGroupAPI(security_group_base.SecurityGroupBase):
         for security_group in security_groups:
             converted_rules.append(
                 self._convert_to_nova_security_group_format(security_group))
-        return converted_rules
+        return utils.page_items(converted_rules, limit, marker)
 
     def validate_id(self, id):
         if not uuidutils.is_uuid_like(id):
@@ -189,7 +189,7 @@ class SecurityGroupBase(object):
         raise NotImplementedError()
 
     def list(self, context, names=None, ids=None, project=None,
-             search_opts=None):
+             search_opts=None, limit=None, marker=None):
         raise NotImplementedError()
 
     def destroy(self, context, security_group):
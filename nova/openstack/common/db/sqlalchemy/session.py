@@ -238,12 +238,27 @@ Efficient use of soft deletes:
         for bar_ref in bar_refs:
             bar_ref.soft_delete(session=session)
         # This will produce count(bar_refs) db requests.
+
+Query accounting:
+
+* Every statement run by an engine created here is counted, together with
+  the time it took, against the QueryCounters started in the current
+  greenthread. A request handler wraps its work in count_queries(), and
+  counters which exceed sql_query_count_warning, sql_query_time_warning or
+  sql_query_repeat_warning are logged when they are stopped. Statements run
+  in another greenthread or native thread are not counted:
+
+    with session.count_queries(description='GET /servers') as counter:
+        handle_request()
+    LOG.debug('%d statements', counter.count)
 """
 
+import contextlib
 import os.path
 import re
 import time
 
+from eventlet import corolocal
 from eventlet import greenthread
 from oslo.config import cfg
 from sqlalchemy import exc as sqla_exc
@@ -253,6 +268,7 @@ from sqlalchemy.pool import NullPool, StaticPool
 from sqlalchemy.sql.expression import literal_column
 
 from nova.openstack.common.db import exception
+from nova.openstack.common import local
 from nova.openstack.common import log as logging
 from nova.openstack.common.gettextutils import _
 from nova.openstack.common import timeutils
@@ -300,6 +316,21 @@ sql_opts = [
     cfg.BoolOpt('sql_connection_trace',
                 default=False,
                 help='Add python stack traces to SQL as comment strings'),
+    cfg.IntOpt('sql_query_count_warning',
+               default=100,
+               help='Log a warning when a single request runs more SQL '
+                    'statements than this. 0 disables the warning'),
+    cfg.FloatOpt('sql_query_time_warning',
+                 default=5.0,
+                 help='Log a warning when the SQL statements of a single '
+                      'request take longer than this many seconds in total. '
+                      '0 disables the warning'),
+    cfg.IntOpt('sql_query_repeat_warning',
+               default=20,
+               help='Log a warning when a single request runs the same SQL '
+                    'statement more times than this, which usually means '
+                    'rows are being loaded one query at a time (N+1). '
+                    '0 disables the warning'),
 ]
 
 CONF = cfg.CONF
@@ -309,6 +340,9 @@ LOG = logging.getLogger(__name__)
 _ENGINE = None
 _MAKER = None
 
+# The QueryCounters active in each greenthread, innermost last.
+_COUNTERS = corolocal.local()
+
 
 def set_defaults(sql_connection, sqlite_db):
     """Set defaults for configuration variables."""
@@ -500,6 +534,104 @@ def is_db_connection_error(args):
     return False
 
 
+class QueryCounter(object):
+    """Number of SQL statements run on behalf of a request and their time.
+
+    Statements are also counted by their text, which for statements built
+    by SQLAlchemy only differs in bind parameters placeholders, so that the
+    same query being run for every row of a result can be spotted.
+    """
+
+    def __init__(self, request_id=None, description=None):
+        self.request_id = request_id
+        self.description = description
+        self.count = 0
+        self.duration = 0.0
+        self.statements = {}
+
+    def record(self, statement, duration):
+        self.count += 1
+        self.duration += duration
+        self.statements[statement] = self.statements.get(statement, 0) + 1
+        if self.request_id is None:
+            context = getattr(local.store, 'context', None)
+            self.request_id = getattr(context, 'request_id', None)
+
+    def repeated(self, threshold):
+        """Return (statement, count) pairs run more than threshold times."""
+        return sorted([(statement, count)
+                       for statement, count in self.statements.iteritems()
+                       if count > threshold],
+                      key=lambda item: item[1], reverse=True)
+
+    def log_warnings(self):
+        """Log the thresholds exceeded by this counter."""
+        values = {'description': self.description or _('Request'),
+                  'request_id': self.request_id,
+                  'count': self.count,
+                  'duration': self.duration}
+        if ((CONF.sql_query_count_warning and
+             self.count > CONF.sql_query_count_warning) or
+                (CONF.sql_query_time_warning and
+                 self.duration > CONF.sql_query_time_warning)):
+            LOG.warn(_('%(description)s [%(request_id)s] ran %(count)d SQL '
+                       'statements taking %(duration).3f seconds'), values)
+        if CONF.sql_query_repeat_warning:
+            for statement, count in self.repeated(
+                    CONF.sql_query_repeat_warning):
+                values.update(statement=statement, count=count)
+                LOG.warn(_('%(description)s [%(request_id)s] ran the same SQL '
+                           'statement %(count)d times, possible N+1 query: '
+                           '%(statement)s'), values)
+
+
+def start_query_counter(request_id=None, description=None):
+    """Start counting the statements run by the current greenthread."""
+    counter = QueryCounter(request_id, description)
+    counters = getattr(_COUNTERS, 'counters', None)
+    if counters is None:
+        counters = _COUNTERS.counters = []
+    counters.append(counter)
+    return counter
+
+
+def stop_query_counter(counter):
+    """Stop a counter returned by start_query_counter and log warnings."""
+    counters = getattr(_COUNTERS, 'counters', None) or []
+    if counter in counters:
+        counters.remove(counter)
+        counter.log_warnings()
+    return counter
+
+
+@contextlib.contextmanager
+def count_queries(request_id=None, description=None):
+    """Count the statements run within the block in a QueryCounter."""
+    counter = start_query_counter(request_id, description)
+    try:
+        yield counter
+    finally:
+        stop_query_counter(counter)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context,
+                           executemany):
+    """Time statements while a QueryCounter is active."""
+    if getattr(_COUNTERS, 'counters', None):
+        conn.info['query_start_time'] = time.time()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context,
+                          executemany):
+    """Record a statement against the active QueryCounters."""
+    start_time = conn.info.pop('query_start_time', None)
+    if start_time is None:
+        return
+    duration = time.time() - start_time
+    for counter in getattr(_COUNTERS, 'counters', None) or []:
+        counter.record(statement, duration)
+
+
 def create_engine(sql_connection):
     """Return a new SQLAlchemy engine."""
     connection_dict = sqlalchemy.engine.url.make_url(sql_connection)
@@ -530,6 +662,10 @@ def create_engine(sql_connection):
     engine = sqlalchemy.create_engine(sql_connection, **engine_args)
 
     sqlalchemy.event.listen(engine, 'checkin', greenthread_yield)
+    sqlalchemy.event.listen(engine, 'before_cursor_execute',
+                            _before_cursor_execute)
+    sqlalchemy.event.listen(engine, 'after_cursor_execute',
+                            _after_cursor_execute)
 
     if 'mysql' in connection_dict.drivername:
         sqlalchemy.event.listen(engine, 'checkout', ping_listener)
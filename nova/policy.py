@@ -18,6 +18,8 @@
 """Policy Engine For Nova."""
 
 import os.path
+import time
+import weakref
 
 from oslo.config import cfg
 
@@ -33,6 +35,10 @@ policy_opts = [
     cfg.StrOpt('policy_default_rule',
                default='default',
                help=_('Rule checked when requested rule is not found')),
+    cfg.IntOpt('policy_file_check_interval',
+               default=1,
+               help=_('Seconds between checks of the policy file for '
+                      'changes; 0 checks on every policy decision')),
     ]
 
 CONF = cfg.CONF
@@ -40,25 +46,41 @@ CONF.register_opts(policy_opts)
 
 _POLICY_PATH = None
 _POLICY_CACHE = {}
+_POLICY_CHECKED = None
+
+# Decisions already made for each request context, keyed by action,
+# target and credentials, along with the rules they were made with.
+_DECISIONS = weakref.WeakKeyDictionary()
 
 
 def reset():
     global _POLICY_PATH
     global _POLICY_CACHE
+    global _POLICY_CHECKED
     _POLICY_PATH = None
     _POLICY_CACHE = {}
+    _POLICY_CHECKED = None
+    _DECISIONS.clear()
     policy.reset()
 
 
 def init():
     global _POLICY_PATH
     global _POLICY_CACHE
+    global _POLICY_CHECKED
     if not _POLICY_PATH:
         _POLICY_PATH = CONF.policy_file
         if not os.path.exists(_POLICY_PATH):
             _POLICY_PATH = CONF.find_file(_POLICY_PATH)
         if not _POLICY_PATH:
             raise exception.ConfigNotFound(path=CONF.policy_file)
+
+    # Only stat the policy file every policy_file_check_interval seconds
+    now = time.time()
+    if (_POLICY_CACHE and _POLICY_CHECKED is not None and
+            now - _POLICY_CHECKED < CONF.policy_file_check_interval):
+        return
+    _POLICY_CHECKED = now
     utils.read_cached_file(_POLICY_PATH, _POLICY_CACHE,
                            reload_func=_set_rules)
 
@@ -68,6 +90,23 @@ def _set_rules(data):
     policy.set_rules(policy.Rules.load_json(data, default_rule))
 
 
+def _decision_key(context, action, target):
+    """Return a key for remembering a decision, or None if it can't be.
+
+    Only plain dicts of hashable values are remembered as targets, which
+    covers the project and user targets used by most checks.  Instances
+    and other objects are always checked.
+    """
+    if type(target) is not dict:
+        return None
+    try:
+        target_key = frozenset(target.iteritems())
+    except TypeError:
+        return None
+    return (action, target_key, context.user_id, context.project_id,
+            context.is_admin, tuple(context.roles))
+
+
 def enforce(context, action, target, do_raise=True):
     """Verifies that the action is valid on the target in this context.
 
@@ -92,14 +131,27 @@ def enforce(context, action, target, do_raise=True):
     """
     init()
 
-    credentials = context.to_dict()
-
-    # Add the exception arguments if asked to do a raise
-    extra = {}
-    if do_raise:
-        extra.update(exc=exception.PolicyNotAuthorized, action=action)
-
-    return policy.check(action, target, credentials, **extra)
+    # A request usually makes the same checks several times, e.g. once
+    # for every server in a listing, so remember decisions per context.
+    key = _decision_key(context, action, target)
+    rules, decisions = _DECISIONS.get(context, (None, None))
+    if rules is not policy._rules:
+        rules, decisions = policy._rules, {}
+        _DECISIONS[context] = (rules, decisions)
+
+    if key in decisions:
+        result = decisions[key]
+    else:
+        credentials = context.to_dict()
+        with utils.timed('policy'):
+            result = policy.check(action, target, credentials)
+        if key is not None:
+            decisions[key] = result
+
+    if do_raise and result is False:
+        raise exception.PolicyNotAuthorized(action=action)
+
+    return result
 
 
 def check_is_admin(context):
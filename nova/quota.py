@@ -19,6 +19,7 @@
 """Quotas for instances, and floating ips."""
 
 import datetime
+import weakref
 
 from oslo.config import cfg
 
@@ -80,12 +81,61 @@ quota_opts = [
     cfg.StrOpt('quota_driver',
                default='nova.quota.DbQuotaDriver',
                help='default driver to use for quota checks'),
+    cfg.IntOpt('quota_limit_cache_ttl',
+               default=5,
+               help='number of seconds project and quota class limits '
+                    'are cached for; 0 only caches them for the duration '
+                    'of a request'),
     ]
 
 CONF = cfg.CONF
 CONF.register_opts(quota_opts)
 
 
+class LimitCache(object):
+    """Cache of quota limits looked up from the database.
+
+    Limits are remembered for the lifetime of the request context which
+    looked them up, so that the several quota checks made on behalf of
+    one request share a single lookup, and for quota_limit_cache_ttl
+    seconds across requests.  Entries are dropped as soon as the limits
+    are changed through this process; other processes see the change
+    once their entries expire.
+    """
+
+    def __init__(self):
+        self._entries = {}
+        self._requests = weakref.WeakKeyDictionary()
+
+    def get(self, context, key, lookup):
+        """Return the cached value of key, calling lookup on a miss."""
+        try:
+            request_entries = self._requests.setdefault(context, {})
+        except TypeError:
+            # The context can't be weakly referenced
+            request_entries = {}
+        if key in request_entries:
+            return request_entries[key]
+
+        now = timeutils.utcnow_ts()
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] > now:
+            value = entry[1]
+        else:
+            value = lookup()
+            if CONF.quota_limit_cache_ttl > 0:
+                self._entries[key] = (now + CONF.quota_limit_cache_ttl,
+                                      value)
+        request_entries[key] = value
+        return value
+
+    def invalidate(self, key):
+        """Forget the value of key, for all requests."""
+        self._entries.pop(key, None)
+        for request_entries in self._requests.values():
+            request_entries.pop(key, None)
+
+
 class DbQuotaDriver(object):
     """
     Driver to perform necessary checks to enforce quotas and obtain
@@ -93,6 +143,19 @@ class DbQuotaDriver(object):
     database.
     """
 
+    def __init__(self):
+        self._limits = LimitCache()
+
+    def _get_project_limits(self, context, project_id):
+        return self._limits.get(
+            context, ('project', project_id),
+            lambda: db.quota_get_all_by_project(context, project_id))
+
+    def _get_class_limits(self, context, quota_class):
+        return self._limits.get(
+            context, ('class', quota_class),
+            lambda: db.quota_class_get_all_by_name(context, quota_class))
+
     def get_by_project(self, context, project_id, resource):
         """Get a specific quota by project."""
 
@@ -132,7 +195,7 @@ class DbQuotaDriver(object):
         """
 
         quotas = {}
-        class_quotas = db.quota_class_get_all_by_name(context, quota_class)
+        class_quotas = self._get_class_limits(context, quota_class)
         for resource in resources.values():
             if defaults or resource.name in class_quotas:
                 quotas[resource.name] = class_quotas.get(resource.name,
@@ -164,7 +227,7 @@ class DbQuotaDriver(object):
         """
 
         quotas = {}
-        project_quotas = db.quota_get_all_by_project(context, project_id)
+        project_quotas = self._get_project_limits(context, project_id)
         if usages:
             project_usages = db.quota_usage_get_all_by_project(context,
                                                                project_id)
@@ -176,7 +239,7 @@ class DbQuotaDriver(object):
         if project_id == context.project_id:
             quota_class = context.quota_class
         if quota_class:
-            class_quotas = db.quota_class_get_all_by_name(context, quota_class)
+            class_quotas = self._get_class_limits(context, quota_class)
         else:
             class_quotas = {}
 
@@ -424,6 +487,7 @@ class DbQuotaDriver(object):
         """
 
         db.quota_destroy_all_by_project(context, project_id)
+        self._limits.invalidate(('project', project_id))
 
     def expire(self, context):
         """Expire reservations.
@@ -436,6 +500,32 @@ class DbQuotaDriver(object):
 
         db.reservation_expire(context)
 
+    def usage_refresh(self, context, resources):
+        """Refresh usages.
+
+        Recounts the usage records whose until_refresh count has run
+        out, which have not been refreshed for max_age seconds, or
+        whose in_use count has gone negative.
+
+        :param context: The request context, for access checks.
+        :param resources: A dictionary of the registered resources.
+        """
+
+        db.quota_usage_refresh(context, resources, CONF.until_refresh,
+                               CONF.max_age)
+
+    def limits_changed(self, project_id=None, quota_class=None):
+        """Drop cached limits after they were changed.
+
+        :param project_id: The project whose limits were changed.
+        :param quota_class: The quota class whose limits were changed.
+        """
+
+        if project_id is not None:
+            self._limits.invalidate(('project', project_id))
+        if quota_class is not None:
+            self._limits.invalidate(('class', quota_class))
+
 
 class NoopQuotaDriver(object):
     """Driver that turns quotas calls into no-ops and pretends that quotas
@@ -635,6 +725,26 @@ class NoopQuotaDriver(object):
         """
         pass
 
+    def usage_refresh(self, context, resources):
+        """Refresh usages.
+
+        Recounts the usage records whose until_refresh count has run
+        out, which have not been refreshed for max_age seconds, or
+        whose in_use count has gone negative.
+
+        :param context: The request context, for access checks.
+        :param resources: A dictionary of the registered resources.
+        """
+        pass
+
+    def limits_changed(self, project_id=None, quota_class=None):
+        """Drop cached limits after they were changed.
+
+        :param project_id: The project whose limits were changed.
+        :param quota_class: The quota class whose limits were changed.
+        """
+        pass
+
 
 class BaseResource(object):
     """Describe a single resource for quota checking."""
@@ -1050,6 +1160,28 @@ class QuotaEngine(object):
 
         self._driver.expire(context)
 
+    def usage_refresh(self, context):
+        """Refresh usages.
+
+        Recounts the usage records whose until_refresh count has run
+        out, which have not been refreshed for max_age seconds, or
+        whose in_use count has gone negative.
+
+        :param context: The request context, for access checks.
+        """
+
+        self._driver.usage_refresh(context, self._resources)
+
+    def limits_changed(self, project_id=None, quota_class=None):
+        """Drop cached limits after they were changed.
+
+        :param project_id: The project whose limits were changed.
+        :param quota_class: The quota class whose limits were changed.
+        """
+
+        self._driver.limits_changed(project_id=project_id,
+                                    quota_class=quota_class)
+
     @property
     def resources(self):
         return sorted(self._resources.keys())
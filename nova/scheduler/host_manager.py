@@ -25,6 +25,7 @@ from nova.compute import task_states
 from nova.compute import vm_states
 from nova import db
 from nova import exception
+from nova.openstack.common import jsonutils
 from nova.openstack.common import log as logging
 from nova.openstack.common import timeutils
 from nova.scheduler import filters
@@ -172,8 +173,7 @@ class HostState(object):
         self.vcpus_used = compute['vcpus_used']
         self.updated = compute['updated_at']
 
-        stats = compute.get('stats', [])
-        statmap = self._statmap(stats)
+        statmap = jsonutils.loads(compute.get('stats') or '{}')
 
         # Track number of instances on host
         self.num_instances = int(statmap.get('num_instances', 0))
@@ -251,9 +251,6 @@ class HostState(object):
                 task_states.IMAGE_BACKUP]:
             self.num_io_ops += 1
 
-    def _statmap(self, stats):
-        return dict((st['key'], st['value']) for st in stats)
-
     def __repr__(self):
         return ("(%s, %s) ram:%s disk:%s io_ops:%s instances:%s vm_type:%s" %
                 (self.host, self.nodename, self.free_ram_mb, self.free_disk_mb,
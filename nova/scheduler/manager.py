@@ -290,6 +290,10 @@ class SchedulerManager(manager.Manager):
     def _expire_reservations(self, context):
         QUOTAS.expire(context)
 
+    @manager.periodic_task
+    def _refresh_quota_usages(self, context):
+        QUOTAS.usage_refresh(context)
+
     def get_backdoor_port(self, context):
         return self.backdoor_port
 
@@ -22,6 +22,7 @@ from oslo.config import cfg
 
 from nova.openstack.common import jsonutils
 import nova.openstack.common.rpc.proxy
+from nova import utils
 
 rpcapi_opts = [
     cfg.StrOpt('scheduler_topic',
@@ -73,6 +74,7 @@ class SchedulerAPI(nova.openstack.common.rpc.proxy.RpcProxy):
     def __init__(self):
         super(SchedulerAPI, self).__init__(topic=CONF.scheduler_topic,
                 default_version=self.BASE_RPC_API_VERSION)
+        utils.time_rpc_calls(self)
 
     def run_instance(self, ctxt, request_spec, admin_password,
             injected_files, requested_networks, is_first_time,
@@ -34,6 +34,7 @@ from oslo.config import cfg
 from nova import conductor
 from nova import context
 from nova import exception
+from nova.openstack.common.db.sqlalchemy import session as db_session
 from nova.openstack.common import eventlet_backdoor
 from nova.openstack.common import importutils
 from nova.openstack.common import log as logging
@@ -386,6 +387,20 @@ class ProcessLauncher(object):
                 self._wait_child()
 
 
+class QueryCountingDispatcher(object):
+    """Counts the SQL statements run by each RPC method of a service."""
+
+    def __init__(self, dispatcher, topic):
+        self.dispatcher = dispatcher
+        self.topic = topic
+
+    def dispatch(self, ctxt, version, method, **kwargs):
+        with db_session.count_queries(
+                request_id=getattr(ctxt, 'request_id', None),
+                description='%s.%s' % (self.topic, method)):
+            return self.dispatcher.dispatch(ctxt, version, method, **kwargs)
+
+
 class Service(object):
     """Service object for binaries running on hosts.
 
@@ -445,7 +460,8 @@ class Service(object):
 
         self.manager.pre_start_hook(rpc_connection=self.conn)
 
-        rpc_dispatcher = self.manager.create_rpc_dispatcher()
+        rpc_dispatcher = QueryCountingDispatcher(
+            self.manager.create_rpc_dispatcher(), self.topic)
 
         # Share this same connection for these Consumers
         self.conn.create_consumer(self.topic, rpc_dispatcher, fanout=False)
@@ -44,6 +44,10 @@ def fake_get_host_availability_zone(context, host):
     return host
 
 
+def fake_get_host_availability_zones(context, hosts):
+    return dict((host, host) for host in hosts)
+
+
 class ExtendedServerAttributesTest(test.TestCase):
     content_type = 'application/json'
     prefix = 'OS-EXT-AZ:'
@@ -55,6 +59,8 @@ class ExtendedServerAttributesTest(test.TestCase):
         self.stubs.Set(compute.api.API, 'get_all', fake_compute_get_all)
         self.stubs.Set(availability_zones, 'get_host_availability_zone',
                        fake_get_host_availability_zone)
+        self.stubs.Set(availability_zones, 'get_host_availability_zones',
+                       fake_get_host_availability_zones)
 
         self.flags(
             osapi_compute_extension=[
@@ -92,6 +98,32 @@ class ExtendedServerAttributesTest(test.TestCase):
         for i, server in enumerate(self._get_servers(res.body)):
             self.assertServerAttributes(server, 'all-host')
 
+    def test_detail_looks_up_zones_at_once(self):
+        def fake_compute_get_all(*args, **kwargs):
+            return [fakes.stub_instance(i, uuid=uuid, host='host%d' % (i % 2))
+                    for i, uuid in enumerate([UUID1, UUID2, UUID3])]
+
+        def fake_get_host_availability_zone(context, host):
+            self.fail('zones should not be looked up one host at a time')
+
+        looked_up = []
+
+        def fake_get_host_availability_zones(context, hosts):
+            looked_up.append(sorted(hosts))
+            return dict((host, 'zone-' + host) for host in hosts)
+
+        self.stubs.Set(compute.api.API, 'get_all', fake_compute_get_all)
+        self.stubs.Set(availability_zones, 'get_host_availability_zone',
+                       fake_get_host_availability_zone)
+        self.stubs.Set(availability_zones, 'get_host_availability_zones',
+                       fake_get_host_availability_zones)
+        res = self._make_request('/v2/fake/servers/detail')
+
+        self.assertEqual(res.status_int, 200)
+        self.assertEqual([['host0', 'host1']], looked_up)
+        for i, server in enumerate(self._get_servers(res.body)):
+            self.assertServerAttributes(server, 'zone-host%d' % (i % 2))
+
     def test_no_instance_passthrough_404(self):
 
         def fake_compute_get(*args, **kwargs):
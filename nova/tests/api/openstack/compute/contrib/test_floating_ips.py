@@ -30,6 +30,7 @@ from nova.openstack.common import jsonutils
 from nova import test
 from nova.tests.api.openstack import fakes
 from nova.tests import fake_network
+from nova import utils
 
 
 FAKE_UUID = 'aaaaaaaa-aaaa-aaaa-aaaa-aaaaaaaaaaaa'
@@ -45,16 +46,18 @@ def network_api_get_floating_ip_by_address(self, context, address):
             'fixed_ip_id': 10}
 
 
-def network_api_get_floating_ips_by_project(self, context):
-    return [{'id': 1,
-             'address': '10.10.10.10',
-             'pool': 'nova',
-             'fixed_ip': {'address': '10.0.0.1',
-                          'instance': {'uuid': FAKE_UUID}}},
-            {'id': 2,
-             'pool': 'nova', 'interface': 'eth0',
-             'address': '10.10.10.11',
-             'fixed_ip': None}]
+def network_api_get_floating_ips_by_project(self, context, limit=None,
+                                            marker=None):
+    ips = [{'id': 1,
+            'address': '10.10.10.10',
+            'pool': 'nova',
+            'fixed_ip': {'address': '10.0.0.1',
+                         'instance': {'uuid': FAKE_UUID}}},
+           {'id': 2,
+            'pool': 'nova', 'interface': 'eth0',
+            'address': '10.10.10.11',
+            'fixed_ip': None}]
+    return utils.page_items(ips, limit, marker)
 
 
 def compute_api_get(self, context, instance_id):
@@ -198,6 +201,27 @@ class FloatingIpTest(test.TestCase):
                                       'id': 2}]}
         self.assertEqual(res_dict, response)
 
+    def test_floating_ips_list_paged(self):
+        req = fakes.HTTPRequest.blank('/v2/fake/os-floating-ips?limit=1')
+        res_dict = self.controller.index(req)
+
+        self.assertEqual([ip['id'] for ip in res_dict['floating_ips']], [1])
+        self.assertEqual(res_dict['floating_ips_links'], [
+                {'rel': 'next',
+                 'href': 'http://localhost/v2/fake/os-floating-ips'
+                         '?limit=1&marker=1'}])
+
+        req = fakes.HTTPRequest.blank('/v2/fake/os-floating-ips?limit=1'
+                                      '&marker=1')
+        res_dict = self.controller.index(req)
+
+        self.assertEqual([ip['id'] for ip in res_dict['floating_ips']], [2])
+
+    def test_floating_ips_list_bad_marker(self):
+        req = fakes.HTTPRequest.blank('/v2/fake/os-floating-ips?marker=9')
+        self.assertRaises(webob.exc.HTTPBadRequest, self.controller.index,
+                          req)
+
     def test_floating_ip_release_nonexisting(self):
         def fake_get_floating_ip(*args, **kwargs):
             raise exception.FloatingIpNotFound(id=id)
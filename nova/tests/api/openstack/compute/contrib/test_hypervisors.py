@@ -22,6 +22,7 @@ from nova import db
 from nova import exception
 from nova import test
 from nova.tests.api.openstack import fakes
+from nova import utils
 
 
 TEST_HYPERS = [
@@ -79,8 +80,8 @@ TEST_SERVERS = [dict(name="inst1", uuid="uuid1", host="compute1"),
                 dict(name="inst4", uuid="uuid4", host="compute2")]
 
 
-def fake_compute_node_get_all(context):
-    return TEST_HYPERS
+def fake_compute_node_get_all(context, limit=None, marker=None):
+    return utils.page_items(TEST_HYPERS, limit, marker)
 
 
 def fake_compute_node_search_by_hypervisor(context, hypervisor_re):
@@ -192,6 +193,28 @@ class HypervisorsTest(test.TestCase):
                     dict(id=1, hypervisor_hostname="hyper1"),
                     dict(id=2, hypervisor_hostname="hyper2")]))
 
+    def test_index_paged(self):
+        req = fakes.HTTPRequest.blank('/v2/fake/os-hypervisors?limit=1')
+        result = self.controller.index(req)
+
+        self.assertEqual(result['hypervisors'],
+                         [dict(id=1, hypervisor_hostname="hyper1")])
+        self.assertEqual(result['hypervisors_links'], [
+                {'rel': 'next',
+                 'href': 'http://localhost/v2/fake/os-hypervisors'
+                         '?limit=1&marker=1'}])
+
+        req = fakes.HTTPRequest.blank('/v2/fake/os-hypervisors?limit=1'
+                                      '&marker=1')
+        result = self.controller.index(req)
+
+        self.assertEqual(result['hypervisors'],
+                         [dict(id=2, hypervisor_hostname="hyper2")])
+
+    def test_index_bad_marker(self):
+        req = fakes.HTTPRequest.blank('/v2/fake/os-hypervisors?marker=9')
+        self.assertRaises(exc.HTTPBadRequest, self.controller.index, req)
+
     def test_detail(self):
         req = fakes.HTTPRequest.blank('/v2/fake/os-hypervisors/detail')
         result = self.controller.detail(req)
@@ -0,0 +1,142 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from lxml import etree
+import webob.exc
+
+from nova.api.openstack.compute.contrib import image_prefetch
+from nova import compute
+from nova import exception
+from nova import test
+from nova.tests.api.openstack import fakes
+
+
+FAKE_IMAGE = '155d900f-4e14-4e4c-a73d-069cbf4541e6'
+
+
+class FakeImageService(object):
+    def show(self, context, image_id):
+        if image_id != FAKE_IMAGE:
+            raise exception.ImageNotFound(image_id=image_id)
+        return {'id': image_id}
+
+
+class ImagePrefetchTest(test.TestCase):
+
+    def setUp(self):
+        super(ImagePrefetchTest, self).setUp()
+        self.stubs.Set(image_prefetch.glance, 'get_default_image_service',
+                       FakeImageService)
+        self.controller = image_prefetch.ImagePrefetchController()
+        self.calls = []
+
+        def fake_prefetch_image(context, image_id, aggregate=None,
+                                availability_zone=None):
+            self.calls.append((image_id, aggregate, availability_zone))
+            if aggregate == 'missing':
+                raise exception.AggregateNotFound(aggregate_id=aggregate)
+            return ['host1', 'host2']
+
+        def fake_get_status(context, image_id, aggregate=None,
+                            availability_zone=None):
+            self.calls.append((image_id, aggregate, availability_zone))
+            if aggregate == 'missing':
+                raise exception.AggregateNotFound(aggregate_id=aggregate)
+            return {'host1': 'cached', 'host2': 'fetching',
+                    'host3': 'unreachable'}
+
+        self.stubs.Set(compute.api.HostAPI, 'prefetch_image',
+                       lambda s, *a, **kw: fake_prefetch_image(*a, **kw))
+        self.stubs.Set(compute.api.HostAPI, 'get_image_prefetch_status',
+                       lambda s, *a, **kw: fake_get_status(*a, **kw))
+
+    def _req(self, url='/v2/fake/os-image-prefetch'):
+        return fakes.HTTPRequest.blank(url, use_admin_context=True)
+
+    def test_create(self):
+        body = {'image_prefetch': {'image_id': FAKE_IMAGE,
+                                   'aggregate': 'agg1'}}
+        result = self.controller.create(self._req(), body)['image_prefetch']
+        self.assertEqual([(FAKE_IMAGE, 'agg1', None)], self.calls)
+        self.assertEqual(2, result['total'])
+        self.assertEqual(2, result['queued'])
+        self.assertEqual(0, result['cached'])
+        self.assertEqual([{'host': 'host1', 'status': 'queued'},
+                          {'host': 'host2', 'status': 'queued'}],
+                         result['hosts'])
+
+    def test_create_missing_image_id(self):
+        self.assertRaises(webob.exc.HTTPBadRequest, self.controller.create,
+                          self._req(), {'image_prefetch': {}})
+        self.assertRaises(webob.exc.HTTPBadRequest, self.controller.create,
+                          self._req(), {})
+
+    def test_create_image_not_found(self):
+        body = {'image_prefetch': {'image_id': 'bogus'}}
+        self.assertRaises(webob.exc.HTTPNotFound, self.controller.create,
+                          self._req(), body)
+        self.assertEqual([], self.calls)
+
+    def test_create_aggregate_not_found(self):
+        body = {'image_prefetch': {'image_id': FAKE_IMAGE,
+                                   'aggregate': 'missing'}}
+        self.assertRaises(webob.exc.HTTPNotFound, self.controller.create,
+                          self._req(), body)
+
+    def test_show(self):
+        req = self._req('/v2/fake/os-image-prefetch/%s'
+                        '?availability_zone=nova' % FAKE_IMAGE)
+        result = self.controller.show(req, FAKE_IMAGE)['image_prefetch']
+        self.assertEqual([(FAKE_IMAGE, None, 'nova')], self.calls)
+        self.assertEqual(3, result['total'])
+        self.assertEqual(1, result['cached'])
+        self.assertEqual(1, result['fetching'])
+        self.assertEqual(1, result['unreachable'])
+        self.assertEqual(0, result['error'])
+
+    def test_show_aggregate_not_found(self):
+        req = self._req('/v2/fake/os-image-prefetch/%s?aggregate=missing' %
+                        FAKE_IMAGE)
+        self.assertRaises(webob.exc.HTTPNotFound, self.controller.show,
+                          req, FAKE_IMAGE)
+
+
+class ImagePrefetchXmlTest(test.TestCase):
+
+    def test_serializer(self):
+        serializer = image_prefetch.ImagePrefetchTemplate()
+        text = serializer.serialize({'image_prefetch': {
+            'image_id': FAKE_IMAGE, 'total': 1, 'cached': 1,
+            'hosts': [{'host': 'host1', 'status': 'cached'}]}})
+        tree = etree.fromstring(text)
+        self.assertEqual('image_prefetch', tree.tag)
+        self.assertEqual(FAKE_IMAGE, tree.get('image_id'))
+        self.assertEqual('1', tree.get('cached'))
+        hosts = tree.findall('hosts/host')
+        self.assertEqual(1, len(hosts))
+        self.assertEqual('host1', hosts[0].get('host'))
+        self.assertEqual('cached', hosts[0].get('status'))
+
+    def test_deserializer(self):
+        deserializer = image_prefetch.ImagePrefetchDeserializer()
+        intext = ('<?xml version="1.0" encoding="UTF-8"?>\n'
+                  '<image_prefetch image_id="%s" aggregate="agg1"/>' %
+                  FAKE_IMAGE)
+        result = deserializer.deserialize(intext)
+        self.assertEqual({'image_prefetch': {'image_id': FAKE_IMAGE,
+                                             'aggregate': 'agg1'}},
+                         result['body'])
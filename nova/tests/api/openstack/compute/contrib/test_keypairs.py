@@ -24,6 +24,7 @@ from nova.openstack.common import jsonutils
 from nova import quota
 from nova import test
 from nova.tests.api.openstack import fakes
+from nova import utils
 
 
 QUOTAS = quota.QUOTAS
@@ -35,7 +36,7 @@ def fake_keypair(name):
             'name': name}
 
 
-def db_key_pair_get_all_by_user(self, user_id):
+def db_key_pair_get_all_by_user(self, user_id, limit=None, marker=None):
     return [fake_keypair('FAKE')]
 
 
@@ -80,6 +81,32 @@ class KeypairsTest(test.TestCase):
         response = {'keypairs': [{'keypair': fake_keypair('FAKE')}]}
         self.assertEqual(res_dict, response)
 
+    def test_keypair_list_paged(self):
+        def fake_get_all(context, user_id, limit=None, marker=None):
+            keypairs = [fake_keypair('key1'), fake_keypair('key2')]
+            return utils.page_items(keypairs, limit, marker, key='name')
+
+        self.stubs.Set(db, "key_pair_get_all_by_user", fake_get_all)
+        req = webob.Request.blank('/v2/fake/os-keypairs?limit=1')
+        res = req.get_response(self.app)
+        self.assertEqual(res.status_int, 200)
+        res_dict = jsonutils.loads(res.body)
+        self.assertEqual(res_dict['keypairs'],
+                         [{'keypair': fake_keypair('key1')}])
+        self.assertEqual(res_dict['keypairs_links'], [
+                {'rel': 'next',
+                 'href': 'http://localhost/v2/fake/os-keypairs'
+                         '?limit=1&marker=key1'}])
+
+        req = webob.Request.blank('/v2/fake/os-keypairs?marker=key1')
+        res_dict = jsonutils.loads(req.get_response(self.app).body)
+        self.assertEqual(res_dict, {'keypairs': [
+                {'keypair': fake_keypair('key2')}]})
+
+        req = webob.Request.blank('/v2/fake/os-keypairs?marker=missing')
+        res = req.get_response(self.app)
+        self.assertEqual(res.status_int, 400)
+
     def test_keypair_create(self):
         body = {'keypair': {'name': 'create_test'}}
         req = webob.Request.blank('/v2/fake/os-keypairs')
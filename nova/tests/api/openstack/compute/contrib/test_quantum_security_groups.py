@@ -122,6 +122,24 @@ class TestQuantumSecurityGroups(
         list_dict = self.controller.index(req)
         self.assertEquals(len(list_dict['security_groups']), 2)
 
+    def test_get_security_group_list_paged(self):
+        self._create_sg_template().get('security_group')
+        req = fakes.HTTPRequest.blank('/v2/fake/os-security-groups')
+        ids = sorted(sg['id'] for sg in
+                     self.controller.index(req)['security_groups'])
+
+        req = fakes.HTTPRequest.blank('/v2/fake/os-security-groups?limit=1')
+        list_dict = self.controller.index(req)
+        self.assertEquals([sg['id'] for sg in list_dict['security_groups']],
+                          ids[:1])
+        self.assertEquals(len(list_dict['security_groups_links']), 1)
+
+        req = fakes.HTTPRequest.blank('/v2/fake/os-security-groups?marker=%s'
+                                      % ids[0])
+        list_dict = self.controller.index(req)
+        self.assertEquals([sg['id'] for sg in list_dict['security_groups']],
+                          ids[1:])
+
     def test_get_security_group_list_all_tenants(self):
         pass
 
@@ -31,6 +31,7 @@ from nova import quota
 from nova import test
 from nova.tests.api.openstack import fakes
 from nova.tests import utils
+import nova.utils
 
 CONF = cfg.CONF
 FAKE_UUID1 = 'a47ae74e-ab08-447f-8eee-ffd43fc46c16'
@@ -286,7 +287,8 @@ class TestSecurityGroups(test.TestCase):
             groups.append(sg)
         expected = {'security_groups': groups}
 
-        def return_security_groups(context, project_id):
+        def return_security_groups(context, project_id, limit=None,
+                                   marker=None):
             return [security_group_db(sg) for sg in groups]
 
         self.stubs.Set(nova.db, 'security_group_get_by_project',
@@ -297,6 +299,41 @@ class TestSecurityGroups(test.TestCase):
 
         self.assertEquals(res_dict, expected)
 
+    def test_get_security_group_list_paged(self):
+        groups = []
+        for i, name in enumerate(['default', 'test']):
+            sg = security_group_template(id=i + 1,
+                                         name=name,
+                                         description=name + '-desc',
+                                         rules=[])
+            groups.append(sg)
+
+        def return_security_groups(context, project_id, limit=None,
+                                   marker=None):
+            return nova.utils.page_items(
+                [security_group_db(sg) for sg in groups], limit, marker)
+
+        self.stubs.Set(nova.db, 'security_group_get_by_project',
+                       return_security_groups)
+
+        req = fakes.HTTPRequest.blank('/v2/fake/os-security-groups?limit=1')
+        res_dict = self.controller.index(req)
+
+        self.assertEquals(res_dict['security_groups'], groups[:1])
+        self.assertEquals(res_dict['security_groups_links'], [
+                {'rel': 'next',
+                 'href': 'http://localhost/v2/fake/os-security-groups'
+                         '?limit=1&marker=1'}])
+
+        req = fakes.HTTPRequest.blank('/v2/fake/os-security-groups?marker=1')
+        res_dict = self.controller.index(req)
+
+        self.assertEquals(res_dict, {'security_groups': groups[1:]})
+
+        req = fakes.HTTPRequest.blank('/v2/fake/os-security-groups?marker=9')
+        self.assertRaises(webob.exc.HTTPBadRequest, self.controller.index,
+                          req)
+
     def test_get_security_group_list_all_tenants(self):
         all_groups = []
         tenant_groups = []
@@ -313,13 +350,14 @@ class TestSecurityGroups(test.TestCase):
         all = {'security_groups': all_groups}
         tenant_specific = {'security_groups': tenant_groups}
 
-        def return_all_security_groups(context):
+        def return_all_security_groups(context, limit=None, marker=None):
             return [security_group_db(sg) for sg in all_groups]
 
         self.stubs.Set(nova.db, 'security_group_get_all',
                        return_all_security_groups)
 
-        def return_tenant_security_groups(context, project_id):
+        def return_tenant_security_groups(context, project_id, limit=None,
+                                          marker=None):
             return [security_group_db(sg) for sg in tenant_groups]
 
         self.stubs.Set(nova.db, 'security_group_get_by_project',
@@ -15,6 +15,8 @@
 
 import datetime
 
+import webob.exc
+
 from nova.api.openstack.compute.contrib import services
 from nova import availability_zones
 from nova import context
@@ -23,6 +25,7 @@ from nova import exception
 from nova.openstack.common import timeutils
 from nova import test
 from nova.tests.api.openstack import fakes
+from nova import utils
 
 
 fake_services_list = [
@@ -77,10 +80,15 @@ class FakeRequestWithHostService(object):
         GET = {"host": "host1", "binary": "nova-compute"}
 
 
-def fake_host_api_service_get_all(context, filters=None, set_zones=False):
+def fake_host_api_service_get_all(context, filters=None, set_zones=False,
+                                  limit=None, marker=None):
+    filters = filters or {}
+    svcs = fake_services_list
     if set_zones or 'availability_zone' in filters:
-        return availability_zones.set_availability_zones(context,
-                                                         fake_services_list)
+        svcs = availability_zones.set_availability_zones(context, svcs)
+    svcs = [s for s in svcs
+            if all(s[key] == value for key, value in filters.items())]
+    return utils.page_items(svcs, limit, marker)
 
 
 def fake_db_api_service_get_all(context, disabled=None):
@@ -189,6 +197,36 @@ class ServicesTest(test.TestCase):
                     'updated_at': datetime.datetime(2012, 10, 29, 13, 42, 5)}]}
         self.assertEqual(res_dict, response)
 
+    def test_services_list_paged(self):
+        req = fakes.HTTPRequest.blank('/v2/fake/os-services?limit=3',
+                                      use_admin_context=True)
+        res_dict = self.controller.index(req)
+
+        self.assertEqual([(s['host'], s['binary'])
+                          for s in res_dict['services']],
+                         [('host1', 'nova-scheduler'),
+                          ('host1', 'nova-compute'),
+                          ('host2', 'nova-scheduler')])
+        self.assertEqual(res_dict['services_links'], [
+                {'rel': 'next',
+                 'href': 'http://localhost/v2/fake/os-services'
+                         '?limit=3&marker=3'}])
+
+        req = fakes.HTTPRequest.blank('/v2/fake/os-services?limit=3'
+                                      '&marker=3', use_admin_context=True)
+        res_dict = self.controller.index(req)
+
+        self.assertEqual([(s['host'], s['binary'])
+                          for s in res_dict['services']],
+                         [('host2', 'nova-compute')])
+        self.assertFalse('services_links' in res_dict)
+
+    def test_services_list_bad_marker(self):
+        req = fakes.HTTPRequest.blank('/v2/fake/os-services?marker=9',
+                                      use_admin_context=True)
+        self.assertRaises(webob.exc.HTTPBadRequest, self.controller.index,
+                          req)
+
     def test_services_enable(self):
         body = {'host': 'host1', 'binary': 'nova-compute'}
         req = fakes.HTTPRequest.blank('/v2/fake/os-services/enable')
@@ -74,12 +74,19 @@ def get_fake_db_instance(start, end, instance_id, tenant_id):
 
 
 def fake_instance_get_active_by_window_joined(self, context, begin, end,
-        project_id):
-            return [get_fake_db_instance(START,
-                                         STOP,
-                                         x,
-                                         "faketenant_%s" % (x / SERVERS))
-                                         for x in xrange(TENANTS * SERVERS)]
+        project_id, limit=None, marker=None):
+            instances = [get_fake_db_instance(START,
+                                              STOP,
+                                              x,
+                                              "faketenant_%s" % (x / SERVERS))
+                         for x in xrange(TENANTS * SERVERS)]
+            if limit is None and marker is None:
+                return instances
+            tenants = sorted(set(inst['project_id'] for inst in instances
+                                 if marker is None or
+                                    inst['project_id'] > marker))[:limit]
+            return [inst for inst in instances
+                    if inst['project_id'] in tenants]
 
 
 class SimpleTenantUsageTest(test.TestCase):
@@ -140,11 +147,15 @@ class SimpleTenantUsageTest(test.TestCase):
         future = NOW + datetime.timedelta(hours=HOURS)
         self._test_verify_show(START, future)
 
-    def _get_tenant_usages(self, detailed=''):
+    def _get_tenant_usages(self, detailed='', paging=''):
+        res_dict = self._get_tenant_usages_page(detailed, paging)
+        return res_dict['tenant_usages']
+
+    def _get_tenant_usages_page(self, detailed='', paging=''):
         req = webob.Request.blank(
                     '/v2/faketenant_0/os-simple-tenant-usage?'
-                    'detailed=%s&start=%s&end=%s' %
-                    (detailed, START.isoformat(), STOP.isoformat()))
+                    'detailed=%s&start=%s&end=%s%s' %
+                    (detailed, START.isoformat(), STOP.isoformat(), paging))
         req.method = "GET"
         req.headers["content-type"] = "application/json"
 
@@ -152,8 +163,21 @@ class SimpleTenantUsageTest(test.TestCase):
                                fake_auth_context=self.admin_context,
                                init_only=('os-simple-tenant-usage',)))
         self.assertEqual(res.status_int, 200)
-        res_dict = jsonutils.loads(res.body)
-        return res_dict['tenant_usages']
+        return jsonutils.loads(res.body)
+
+    def test_verify_index_paged(self):
+        res_dict = self._get_tenant_usages_page('1', '&limit=1')
+        usages = res_dict['tenant_usages']
+        self.assertEqual([usage['tenant_id'] for usage in usages],
+                         ['faketenant_0'])
+        self.assertEqual(len(usages[0]['server_usages']), SERVERS)
+        links = res_dict['tenant_usages_links']
+        self.assertEqual(links[0]['rel'], 'next')
+        self.assertTrue('marker=faketenant_0' in links[0]['href'])
+
+        usages = self._get_tenant_usages('1', '&limit=1&marker=faketenant_0')
+        self.assertEqual([usage['tenant_id'] for usage in usages],
+                         ['faketenant_1'])
 
     def test_verify_detailed_index(self):
         usages = self._get_tenant_usages('1')
@@ -340,6 +340,32 @@ class FlavorsTest(test.TestCase):
         }
         self.assertEqual(flavor, expected)
 
+    def test_get_flavor_list_detail_etag(self):
+        app = fakes.wsgi_app(init_only=('flavors',))
+        req = webob.Request.blank('/v2/fake/flavors/detail')
+        req.headers['If-None-Match'] = 'W/"0"'
+        res = req.get_response(app)
+        self.assertEqual(200, res.status_int)
+        etag = res.headers['ETag']
+
+        req = webob.Request.blank('/v2/fake/flavors/detail')
+        req.headers['If-None-Match'] = etag
+        res = req.get_response(app)
+        self.assertEqual(304, res.status_int)
+        self.assertEqual('', res.body)
+
+        def fake_get_all_types_summary(ctxt=None, inactive=False,
+                                       filters=None):
+            return {'count': 3, 'updated_at': None}
+
+        self.stubs.Set(nova.compute.instance_types, 'get_all_types_summary',
+                       fake_get_all_types_summary)
+        req = webob.Request.blank('/v2/fake/flavors/detail')
+        req.headers['If-None-Match'] = etag
+        res = req.get_response(app)
+        self.assertEqual(200, res.status_int)
+        self.assertNotEqual(etag, res.headers['ETag'])
+
     def test_get_empty_flavor_list(self):
         self.stubs.Set(nova.compute.instance_types, "get_all_types",
                        empty_instance_type_get_all)
@@ -29,6 +29,7 @@ from nova.api.openstack.compute import views
 from nova.api.openstack import xmlutil
 import nova.context
 from nova.openstack.common import jsonutils
+from nova.openstack.common import memorycache
 from nova import test
 from nova.tests.api.openstack import fakes
 from nova.tests import matchers
@@ -634,6 +635,75 @@ class LimiterTest(BaseLimitTestSuite):
         self.assertEqual(expected, results)
 
 
+class MemcachedLimiterTest(LimiterTest):
+    """
+    Tests for the `limits.MemcachedLimiter` class.
+    """
+
+    def setUp(self):
+        """Run before each test."""
+        super(MemcachedLimiterTest, self).setUp()
+        self.cache = memorycache.Client()
+        self.stubs.Set(memorycache, 'get_client', lambda: self.cache)
+        userlimits = {'user:user3': ''}
+        self.limiter = limits.MemcachedLimiter(TEST_LIMITS, **userlimits)
+
+    def test_delay_POST(self):
+        expected = [None] * 7
+        results = list(self._check(7, "POST", "/anything"))
+        self.assertEqual(expected, results)
+
+        # The state is kept in whole microseconds
+        expected = 60.0 / 7.0
+        results = self._check_sum(1, "POST", "/anything")
+        self.failUnlessAlmostEqual(expected, results, 5)
+
+    def test_shared_between_limiters(self):
+        other = limits.MemcachedLimiter(TEST_LIMITS)
+        expected = [None] * 5
+        results = list(self._check(5, "PUT", "/anything"))
+        self.assertEqual(expected, results)
+
+        expected = [None] * 5 + [6.0]
+        results = [other.check_for_delay("PUT", "/anything")[0]
+                   for x in xrange(6)]
+        self.assertEqual(expected, results)
+
+    def test_rejected_request_taken_back(self):
+        decrs = []
+
+        def fake_decr(key, delta=1):
+            decrs.append(delta)
+            return self.cache.incr(key, -delta)
+
+        self.cache.decr = fake_decr
+        expected = [None] * 10 + [6.0] * 2
+        results = list(self._check(12, "PUT", "/anything"))
+        self.assertEqual(expected, results)
+        self.assertEqual([6000000] * 2, decrs)
+
+    def test_drained_bucket_restarted(self):
+        list(self._check(10, "PUT", "/anything"))
+        self.time += 120.0
+        expected = [None] * 10 + [6.0]
+        results = list(self._check(11, "PUT", "/anything"))
+        self.assertEqual(expected, results)
+
+    def test_get_limits(self):
+        self.time = 1000.0
+        list(self._check(5, "PUT", "/anything"))
+        limit = [l for l in self.limiter.get_limits()
+                 if l['verb'] == 'PUT' and l['URI'] == '*'][0]
+        self.assertEqual(5, limit['remaining'])
+        self.assertEqual(1000, limit['resetTime'])
+
+        list(self._check(6, "PUT", "/anything"))
+        limit = [l for l in self.limiter.get_limits()
+                 if l['verb'] == 'PUT' and l['URI'] == '*'][0]
+        self.assertEqual(0, limit['remaining'])
+        self.assertEqual(1006, limit['resetTime'])
+
+
 class WsgiLimiterTest(BaseLimitTestSuite):
     """
     Tests for `limits.WsgiLimiter` class.
@@ -26,6 +26,7 @@ from lxml import etree
 from oslo.config import cfg
 import webob
 
+from nova.api.openstack import common
 from nova.api.openstack import compute
 from nova.api.openstack.compute import ips
 from nova.api.openstack.compute import servers
@@ -45,6 +46,7 @@ from nova.network.quantumv2 import api as quantum_api
 from nova.openstack.common import jsonutils
 from nova.openstack.common import policy as common_policy
 from nova.openstack.common import rpc
+from nova.openstack.common import timeutils
 from nova import policy
 from nova import test
 from nova.tests.api.openstack import fakes
@@ -72,6 +74,10 @@ def fake_gen_uuid():
     return FAKE_UUID
 
 
+def fake_get_all_summary(compute_self, context, search_opts=None):
+    return {'count': 5, 'updated_at': datetime.datetime(2013, 6, 1)}
+
+
 def return_servers_empty(context, *args, **kwargs):
     return []
 
@@ -160,6 +166,8 @@ class ServersControllerTest(test.TestCase):
                        return_security_group)
         self.stubs.Set(db, 'instance_update_and_get_original',
                 instance_update)
+        self.stubs.Set(compute_api.API, 'get_all_summary',
+                       fake_get_all_summary)
 
         self.ext_mgr = extensions.ExtensionManager()
         self.ext_mgr.extensions = {}
@@ -687,7 +695,7 @@ class ServersControllerTest(test.TestCase):
 
         def fake_get_all(compute_self, context, search_opts=None,
                          sort_key=None, sort_dir='desc',
-                         limit=None, marker=None):
+                         limit=None, marker=None, columns_to_join=None):
             return [fakes.stub_instance(100, uuid=server_uuid)]
 
         self.stubs.Set(compute_api.API, 'get_all', fake_get_all)
@@ -703,7 +711,7 @@ class ServersControllerTest(test.TestCase):
 
         def fake_get_all(compute_self, context, search_opts=None,
                          sort_key=None, sort_dir='desc',
-                         limit=None, marker=None):
+                         limit=None, marker=None, columns_to_join=None):
             self.assertNotEqual(search_opts, None)
             self.assertTrue('image' in search_opts)
             self.assertEqual(search_opts['image'], '12345')
@@ -719,7 +727,8 @@ class ServersControllerTest(test.TestCase):
 
     def test_tenant_id_filter_converts_to_project_id_for_admin(self):
         def fake_get_all(context, filters=None, sort_key=None,
-                         sort_dir='desc', limit=None, marker=None):
+                         sort_dir='desc', limit=None, marker=None,
+                         columns_to_join=None, use_slave=None):
             self.assertNotEqual(filters, None)
             self.assertEqual(filters['project_id'], 'fake')
             self.assertFalse(filters.get('tenant_id'))
@@ -736,7 +745,8 @@ class ServersControllerTest(test.TestCase):
 
     def test_admin_restricted_tenant(self):
         def fake_get_all(context, filters=None, sort_key=None,
-                         sort_dir='desc', limit=None, marker=None):
+                         sort_dir='desc', limit=None, marker=None,
+                         columns_to_join=None, use_slave=None):
             self.assertNotEqual(filters, None)
             self.assertEqual(filters['project_id'], 'fake')
             return [fakes.stub_instance(100)]
@@ -752,7 +762,8 @@ class ServersControllerTest(test.TestCase):
 
     def test_all_tenants_pass_policy(self):
         def fake_get_all(context, filters=None, sort_key=None,
-                         sort_dir='desc', limit=None, marker=None):
+                         sort_dir='desc', limit=None, marker=None,
+                         columns_to_join=None, use_slave=None):
             self.assertNotEqual(filters, None)
             self.assertTrue('project_id' not in filters)
             return [fakes.stub_instance(100)]
@@ -776,7 +787,8 @@ class ServersControllerTest(test.TestCase):
 
     def test_all_tenants_fail_policy(self):
         def fake_get_all(context, filters=None, sort_key=None,
-                         sort_dir='desc', limit=None, marker=None):
+                         sort_dir='desc', limit=None, marker=None,
+                         columns_to_join=None, use_slave=None):
             self.assertNotEqual(filters, None)
             return [fakes.stub_instance(100)]
 
@@ -800,7 +812,7 @@ class ServersControllerTest(test.TestCase):
 
         def fake_get_all(compute_self, context, search_opts=None,
                          sort_key=None, sort_dir='desc',
-                         limit=None, marker=None):
+                         limit=None, marker=None, columns_to_join=None):
             self.assertNotEqual(search_opts, None)
             self.assertTrue('flavor' in search_opts)
             # flavor is an integer ID
@@ -826,7 +838,7 @@ class ServersControllerTest(test.TestCase):
 
         def fake_get_all(compute_self, context, search_opts=None,
                          sort_key=None, sort_dir='desc',
-                         limit=None, marker=None):
+                         limit=None, marker=None, columns_to_join=None):
             self.assertNotEqual(search_opts, None)
             self.assertTrue('vm_state' in search_opts)
             self.assertEqual(search_opts['vm_state'], vm_states.ACTIVE)
@@ -858,7 +870,7 @@ class ServersControllerTest(test.TestCase):
 
         def fake_get_all(compute_self, context, search_opts=None,
                          sort_key=None, sort_dir='desc',
-                         limit=None, marker=None):
+                         limit=None, marker=None, columns_to_join=None):
             self.assertTrue('vm_state' in search_opts)
             self.assertEqual(search_opts['vm_state'], 'deleted')
 
@@ -878,7 +890,7 @@ class ServersControllerTest(test.TestCase):
 
         def fake_get_all(compute_self, context, search_opts=None,
                          sort_key=None, sort_dir='desc',
-                         limit=None, marker=None):
+                         limit=None, marker=None, columns_to_join=None):
             self.assertNotEqual(search_opts, None)
             self.assertTrue('name' in search_opts)
             self.assertEqual(search_opts['name'], 'whee.*')
@@ -897,7 +909,7 @@ class ServersControllerTest(test.TestCase):
 
         def fake_get_all(compute_self, context, search_opts=None,
                          sort_key=None, sort_dir='desc',
-                         limit=None, marker=None):
+                         limit=None, marker=None, columns_to_join=None):
             self.assertNotEqual(search_opts, None)
             self.assertTrue('changes-since' in search_opts)
             changes_since = datetime.datetime(2011, 1, 24, 17, 8, 1,
@@ -929,7 +941,7 @@ class ServersControllerTest(test.TestCase):
 
         def fake_get_all(compute_self, context, search_opts=None,
                          sort_key=None, sort_dir='desc',
-                         limit=None, marker=None):
+                         limit=None, marker=None, columns_to_join=None):
             self.assertNotEqual(search_opts, None)
             # Allowed by user
             self.assertTrue('name' in search_opts)
@@ -958,7 +970,7 @@ class ServersControllerTest(test.TestCase):
 
         def fake_get_all(compute_self, context, search_opts=None,
                          sort_key=None, sort_dir='desc',
-                         limit=None, marker=None):
+                         limit=None, marker=None, columns_to_join=None):
             self.assertNotEqual(search_opts, None)
             # Allowed by user
             self.assertTrue('name' in search_opts)
@@ -987,7 +999,7 @@ class ServersControllerTest(test.TestCase):
 
         def fake_get_all(compute_self, context, search_opts=None,
                          sort_key=None, sort_dir='desc',
-                         limit=None, marker=None):
+                         limit=None, marker=None, columns_to_join=None):
             self.assertNotEqual(search_opts, None)
             self.assertTrue('ip' in search_opts)
             self.assertEqual(search_opts['ip'], '10\..*')
@@ -1010,7 +1022,7 @@ class ServersControllerTest(test.TestCase):
 
         def fake_get_all(compute_self, context, search_opts=None,
                          sort_key=None, sort_dir='desc',
-                         limit=None, marker=None):
+                         limit=None, marker=None, columns_to_join=None):
             self.assertNotEqual(search_opts, None)
             self.assertTrue('ip6' in search_opts)
             self.assertEqual(search_opts['ip6'], 'ffff.*')
@@ -1544,6 +1556,176 @@ class ServersControllerTest(test.TestCase):
             self.assertEqual(s['hostId'], host_ids[i % 2])
             self.assertEqual(s['name'], 'server%d' % (i + 1))
 
+    def test_get_server_details_with_fields(self):
+        def fake_get_all(context, filters=None, sort_key=None,
+                         sort_dir='desc', limit=None, marker=None,
+                         columns_to_join=None, use_slave=None):
+            self.assertEqual([], columns_to_join)
+            return [fakes.stub_instance(1, uuid=FAKE_UUID)]
+
+        def fake_get_instance_faults(*args, **kwargs):
+            self.fail('faults should not be looked up')
+
+        self.stubs.Set(db, 'instance_get_all_by_filters', fake_get_all)
+        self.stubs.Set(compute_api.API, 'get_instance_faults',
+                       fake_get_instance_faults)
+
+        req = fakes.HTTPRequest.blank('/v2/fake/servers/detail'
+                                      '?fields=name,status')
+        servers = self.controller.detail(req)['servers']
+
+        self.assertEqual(1, len(servers))
+        self.assertEqual(set(['id', 'links', 'name', 'status']),
+                         set(servers[0]))
+        self.assertEqual(FAKE_UUID, servers[0]['id'])
+        self.assertEqual('server1', servers[0]['name'])
+        self.assertEqual('BUILD', servers[0]['status'])
+
+    def test_get_server_details_with_fields_needing_joins(self):
+        def fake_get_all(context, filters=None, sort_key=None,
+                         sort_dir='desc', limit=None, marker=None,
+                         columns_to_join=None, use_slave=None):
+            self.assertEqual(['metadata', 'system_metadata'],
+                             columns_to_join)
+            self.assertFalse('fields' in filters)
+            return [fakes.stub_instance(1, uuid=FAKE_UUID)]
+
+        self.stubs.Set(db, 'instance_get_all_by_filters', fake_get_all)
+
+        req = fakes.HTTPRequest.blank('/v2/fake/servers/detail'
+                                      '?fields=flavor,metadata',
+                                      use_admin_context=True)
+        servers = self.controller.detail(req)['servers']
+
+        self.assertEqual(set(['id', 'links', 'flavor', 'metadata']),
+                         set(servers[0]))
+        self.assertEqual('1', servers[0]['flavor']['id'])
+        self.assertEqual({'seq': '1'}, servers[0]['metadata'])
+
+    def test_get_server_details_without_fields_joins_everything(self):
+        def fake_get_all(context, filters=None, sort_key=None,
+                         sort_dir='desc', limit=None, marker=None,
+                         columns_to_join=None, use_slave=None):
+            self.assertEqual(None, columns_to_join)
+            return [fakes.stub_instance(1, uuid=FAKE_UUID)]
+
+        self.stubs.Set(db, 'instance_get_all_by_filters', fake_get_all)
+
+        req = fakes.HTTPRequest.blank('/v2/fake/servers/detail')
+        servers = self.controller.detail(req)['servers']
+
+        self.assertTrue('addresses' in servers[0])
+        self.assertTrue('flavor' in servers[0])
+
+    def test_get_server_details_prepares_networks_once(self):
+        calls = []
+        orig_get_networks = common.get_networks_for_instance
+
+        def fake_get_networks(context, instance):
+            calls.append(instance['uuid'])
+            return orig_get_networks(context, instance)
+
+        self.stubs.Set(common, 'get_networks_for_instance',
+                       fake_get_networks)
+
+        req = fakes.HTTPRequest.blank('/v2/fake/servers/detail')
+        servers = self.controller.detail(req)['servers']
+
+        uuids = [server['id'] for server in servers]
+        self.assertEqual(uuids, calls)
+        for uuid in uuids:
+            self.assertNotEqual(None, req.get_instance_networks(uuid))
+
+    def test_get_servers_etag(self):
+        app = fakes.wsgi_app(init_only=('servers',))
+        req = webob.Request.blank('/v2/fake/servers/detail')
+        req.headers['If-None-Match'] = 'W/"0"'
+        res = req.get_response(app)
+        self.assertEqual(200, res.status_int)
+        etag = res.headers['ETag']
+
+        def fake_get_all(*args, **kwargs):
+            self.fail('servers should not be listed')
+
+        self.stubs.Set(compute_api.API, 'get_all', fake_get_all)
+        req = webob.Request.blank('/v2/fake/servers/detail')
+        req.headers['If-None-Match'] = etag
+        res = req.get_response(app)
+        self.assertEqual(304, res.status_int)
+        self.assertEqual('', res.body)
+        self.assertEqual(etag, res.headers['ETag'])
+
+    def test_get_servers_etag_changes(self):
+        app = fakes.wsgi_app(init_only=('servers',))
+        req = webob.Request.blank('/v2/fake/servers/detail')
+        req.headers['If-None-Match'] = 'W/"0"'
+        etag = req.get_response(app).headers['ETag']
+
+        req = webob.Request.blank('/v2/fake/servers')
+        req.headers['If-None-Match'] = etag
+        res = req.get_response(app)
+        self.assertNotEqual(etag, res.headers['ETag'])
+
+        def fake_get_all_summary(compute_self, context, search_opts=None):
+            return {'count': 5, 'updated_at': datetime.datetime(2013, 6, 2)}
+
+        self.stubs.Set(compute_api.API, 'get_all_summary',
+                       fake_get_all_summary)
+        req = webob.Request.blank('/v2/fake/servers/detail')
+        req.headers['If-None-Match'] = etag
+        res = req.get_response(app)
+        self.assertEqual(200, res.status_int)
+        self.assertNotEqual(etag, res.headers['ETag'])
+        self.assertEqual(5, len(jsonutils.loads(res.body)['servers']))
+
+    def test_get_servers_etag_same_second_updates(self):
+        # updated_at has whole second resolution on MySQL, so a second
+        # update within 12:00:00 would leave the summary unchanged.
+        def fake_get_all_summary(compute_self, context, search_opts=None):
+            return {'count': 5,
+                    'updated_at': datetime.datetime(2013, 6, 2, 12, 0, 0)}
+
+        self.stubs.Set(compute_api.API, 'get_all_summary',
+                       fake_get_all_summary)
+        self.useFixture(test.TimeOverride())
+        timeutils.set_time_override(
+            datetime.datetime(2013, 6, 2, 12, 0, 0, 300000))
+        app = fakes.wsgi_app(init_only=('servers',))
+        req = webob.Request.blank('/v2/fake/servers/detail')
+        req.headers['If-None-Match'] = 'W/"0"'
+        res = req.get_response(app)
+        self.assertEqual(200, res.status_int)
+        self.assertFalse('ETag' in res.headers)
+
+        timeutils.set_time_override(datetime.datetime(2013, 6, 2, 12, 0, 1))
+        req = webob.Request.blank('/v2/fake/servers/detail')
+        req.headers['If-None-Match'] = 'W/"0"'
+        res = req.get_response(app)
+        self.assertTrue(res.headers['ETag'].startswith('W/'))
+
+    def test_get_servers_unconditional_skips_summary(self):
+        def fake_get_all_summary(compute_self, context, search_opts=None):
+            self.fail('the summary should not be looked up')
+
+        self.stubs.Set(compute_api.API, 'get_all_summary',
+                       fake_get_all_summary)
+        app = fakes.wsgi_app(init_only=('servers',))
+        res = webob.Request.blank('/v2/fake/servers/detail').get_response(app)
+        self.assertEqual(200, res.status_int)
+        self.assertFalse('ETag' in res.headers)
+
+    def test_get_server_details_with_invalid_fields(self):
+        req = fakes.HTTPRequest.blank('/v2/fake/servers/detail'
+                                      '?fields=name,bogus')
+        self.assertRaises(webob.exc.HTTPBadRequest,
+                          self.controller.detail, req)
+
+    def test_get_server_list_ignores_fields(self):
+        req = fakes.HTTPRequest.blank('/v2/fake/servers?fields=status')
+        servers = self.controller.index(req)['servers']
+
+        self.assertEqual(set(['id', 'links', 'name']), set(servers[0]))
+
     def _delete_server_instance(self, uuid=FAKE_UUID):
         fakes.stub_out_instance_quota(self.stubs, 0, 10)
         req = fakes.HTTPRequest.blank('/v2/fake/servers/%s' % uuid)
@@ -101,7 +101,7 @@ def wsgi_app(inner_app_v2=None, fake_auth_context=None,
 
 
 def stub_out_key_pair_funcs(stubs, have_key_pair=True):
-    def key_pair(context, user_id):
+    def key_pair(context, user_id, limit=None, marker=None):
         return [dict(name='key', public_key='public_key')]
 
     def one_key_pair(context, user_id, name):
@@ -110,7 +110,7 @@ def stub_out_key_pair_funcs(stubs, have_key_pair=True):
         else:
             raise exc.KeypairNotFound(user_id=user_id, name=name)
 
-    def no_key_pair(context, user_id):
+    def no_key_pair(context, user_id, limit=None, marker=None):
         return []
 
     if have_key_pair:
@@ -423,7 +423,8 @@ def stub_instance(id, user_id=None, project_id=None, host=None,
                   include_fake_metadata=True, config_drive=None,
                   power_state=None, nw_cache=None, metadata=None,
                   security_groups=None, root_device_name=None,
-                  limit=None, marker=None):
+                  limit=None, marker=None, use_slave=None,
+                  columns_to_join=None):
 
     if user_id is None:
         user_id = 'fake_user'
@@ -142,6 +142,22 @@ class JSONDictSerializerTest(test.TestCase):
         result = result.replace('\n', '').replace(' ', '')
         self.assertEqual(result, expected_json)
 
+    def test_serialize_iter(self):
+        input_dict = {'servers': [{'id': i, 'name': 'server%d' % i}
+                                  for i in range(5000)],
+                      'servers_links': [{'rel': 'next', 'href': 'x'}],
+                      'empty': [],
+                      'other': {'a': (2, 3)}}
+        serializer = wsgi.JSONDictSerializer()
+        chunks = list(serializer.serialize_iter(input_dict))
+        self.assertTrue(len(chunks) > 1)
+        self.assertEqual(''.join(chunks), serializer.serialize(input_dict))
+
+    def test_serialize_iter_not_dict(self):
+        serializer = wsgi.JSONDictSerializer()
+        self.assertEqual(list(serializer.serialize_iter([1, 2])),
+                         ['[1, 2]'])
+
 
 class TextDeserializerTest(test.TestCase):
     def test_dispatch_default(self):
@@ -880,6 +896,44 @@ class ResponseObjectTest(test.TestCase):
             self.assertEqual(response.status_int, 202)
             self.assertEqual(response.body, mtype)
 
+    def test_serialize_streams_large_collections(self):
+        self.flags(osapi_stream_min_items=3)
+        request = wsgi.Request.blank('/tests')
+        robj = wsgi.ResponseObject({'servers': [{'id': 1}, {'id': 2}]})
+        response = robj.serialize(request, 'application/json',
+                                  {'json': wsgi.JSONDictSerializer})
+        self.assertEqual(response.content_length, len(response.body))
+
+        robj = wsgi.ResponseObject({'servers': [{'id': 1}, {'id': 2},
+                                                {'id': 3}]})
+        response = robj.serialize(request, 'application/json',
+                                  {'json': wsgi.JSONDictSerializer})
+        self.assertTrue(isinstance(response.app_iter, list))
+        self.assertEqual(response.body,
+                         '{"servers": [{"id": 1}, {"id": 2}, {"id": 3}]}')
+        self.assertEqual(response.content_length, len(response.body))
+
+    def test_serialize_stream_failure_fails_request(self):
+        self.flags(osapi_stream_min_items=1)
+
+        class FailingSerializer(wsgi.JSONDictSerializer):
+            def serialize_iter(self, data, action='default'):
+                yield '{"servers": ['
+                raise ValueError('item can not be serialized')
+
+        request = wsgi.Request.blank('/tests')
+        robj = wsgi.ResponseObject({'servers': [{'id': 1}]})
+        self.assertRaises(ValueError, robj.serialize, request,
+                          'application/json', {'json': FailingSerializer})
+
+    def test_serialize_streaming_disabled(self):
+        self.flags(osapi_stream_min_items=0)
+        request = wsgi.Request.blank('/tests')
+        robj = wsgi.ResponseObject({'servers': [{'id': 1}]})
+        response = robj.serialize(request, 'application/json',
+                                  {'json': wsgi.JSONDictSerializer})
+        self.assertEqual(response.content_length, len(response.body))
+
 
 class ValidBodyTest(test.TestCase):
 
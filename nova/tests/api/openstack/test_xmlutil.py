@@ -655,6 +655,46 @@ class TemplateTest(test.TestCase):
                          str(obj['test']['image']['id']))
         self.assertEqual(result[idx].text, obj['test']['image']['name'])
 
+    def test_serialize_reuses_compiled_plan(self):
+        root = xmlutil.TemplateElement('test', selector='test', name='name')
+        master = xmlutil.MasterTemplate(root, 1)
+        root_slave = xmlutil.TemplateElement('test', selector='test',
+                                             id='id')
+        slave = xmlutil.SlaveTemplate(root_slave, 1)
+        obj = {'test': {'name': 'foobar', 'id': 42}}
+
+        tmpl = master.copy()
+        tmpl.attach(slave)
+        tmpl.serialize(obj)
+        plans = dict(root._plans)
+        self.assertEqual(len(plans), 1)
+
+        tmpl = master.copy()
+        tmpl.attach(slave)
+        result = etree.fromstring(tmpl.serialize(obj))
+        self.assertEqual(root._plans, plans)
+        self.assertEqual(result.get('name'), 'foobar')
+        self.assertEqual(result.get('id'), '42')
+
+        # Without the slave, a separate plan is used
+        result = etree.fromstring(master.copy().serialize(obj))
+        self.assertEqual(len(root._plans), 2)
+        self.assertEqual(result.get('id'), None)
+
+    def test_serialize_after_template_change(self):
+        root = xmlutil.TemplateElement('test', selector='test', name='name')
+        master = xmlutil.MasterTemplate(root, 1)
+        obj = {'test': {'name': 'foobar', 'id': 42}}
+        master.serialize(obj)
+
+        root.set('id')
+        xmlutil.SubTemplateElement(root, 'sub', selector='name').text = (
+            xmlutil.Selector())
+        result = etree.fromstring(master.serialize(obj))
+        self.assertEqual(result.get('id'), '42')
+        self.assertEqual(result[0].tag, 'sub')
+        self.assertEqual(result[0].text, 'foobar')
+
 
 class MasterTemplateBuilder(xmlutil.TemplateBuilder):
     def construct(self):
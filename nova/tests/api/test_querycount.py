@@ -0,0 +1,73 @@
+# Copyright (c) 2013 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import webob
+import webob.dec
+
+import nova.api.querycount
+import nova.api.timing
+from nova import context
+from nova import db
+from nova import test
+
+
+class TestQueryCounter(test.TestCase):
+
+    def setUp(self):
+        super(TestQueryCounter, self).setUp()
+        self.context = context.RequestContext('fake', 'fake', is_admin=True)
+
+        @webob.dec.wsgify()
+        def fake_app(req):
+            req.environ['nova.context'] = self.context
+            db.service_get_all(self.context)
+            db.service_get_all(self.context)
+            return webob.Response('')
+
+        self.middleware = nova.api.querycount.QueryCounter(fake_app)
+        self.request = webob.Request.blank('/')
+
+    def test_no_header_by_default(self):
+        response = self.request.get_response(self.middleware)
+        self.assertEqual(response.status_int, 200)
+        self.assertFalse('X-DB-Query-Count' in response.headers)
+        self.assertFalse('X-DB-Query-Time' in response.headers)
+
+    def test_header(self):
+        self.flags(query_count_header=True)
+        response = self.request.get_response(self.middleware)
+        self.assertEqual(response.headers['X-DB-Query-Count'], '2')
+        self.assertTrue(float(response.headers['X-DB-Query-Time']) >= 0)
+
+    def test_warning_has_request_id(self):
+        warnings = []
+        self.stubs.Set(nova.api.querycount.db_session.LOG, 'warn',
+                       lambda msg, values: warnings.append(values))
+        self.flags(sql_query_count_warning=1)
+        self.request.get_response(self.middleware)
+        self.assertEqual(len(warnings), 1)
+        self.assertEqual(warnings[0]['description'], 'GET /')
+        self.assertEqual(warnings[0]['request_id'], self.context.request_id)
+
+    def test_warning_logged_once_under_timing(self):
+        warnings = []
+        self.stubs.Set(nova.api.querycount.db_session.LOG, 'warn',
+                       lambda msg, values: warnings.append(values))
+        self.flags(sql_query_count_warning=1, query_count_header=True)
+        middleware = nova.api.timing.RequestTiming(self.middleware)
+        response = self.request.get_response(middleware)
+        self.assertEqual(response.headers['X-DB-Query-Count'], '2')
+        self.assertEqual(len(warnings), 1)
+        self.assertEqual(warnings[0]['description'], 'GET /')
+        self.assertEqual(warnings[0]['request_id'], self.context.request_id)
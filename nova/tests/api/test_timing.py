@@ -0,0 +1,88 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright (c) 2013 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import webob
+import webob.dec
+
+import nova.api.timing
+from nova.cert import rpcapi as cert_rpcapi
+from nova import context
+from nova import db
+from nova.openstack.common import rpc
+from nova import policy
+from nova import test
+
+
+class TestRequestTiming(test.TestCase):
+
+    def setUp(self):
+        super(TestRequestTiming, self).setUp()
+        self.context = context.RequestContext('fake', 'fake', is_admin=True)
+        self.stubs.Set(rpc, 'call', lambda *args, **kwargs: None)
+
+        @webob.dec.wsgify()
+        def fake_app(req):
+            req.environ['nova.context'] = self.context
+            db.service_get_all(self.context)
+            policy.enforce(self.context, 'compute:get', {})
+            rpcapi = cert_rpcapi.CertAPI()
+            rpcapi.revoke_certs_by_user(self.context, 'fake')
+            return webob.Response('')
+
+        self.middleware = nova.api.timing.RequestTiming(fake_app)
+        self.request = webob.Request.blank('/')
+
+    def _timings(self, header):
+        timings = {}
+        for part in header.split():
+            category, value = part.split('=')
+            timings[category] = value
+        return timings
+
+    def test_no_header_by_default(self):
+        response = self.request.get_response(self.middleware)
+        self.assertEqual(response.status_int, 200)
+        self.assertFalse('X-Nova-Timing' in response.headers)
+
+    def test_header(self):
+        self.flags(request_timing_header=True)
+        response = self.request.get_response(self.middleware)
+        timings = self._timings(response.headers['X-Nova-Timing'])
+        self.assertTrue(float(timings['total']) >= 0)
+        self.assertTrue(timings['db'].endswith('/1'))
+        self.assertTrue(timings['policy'].endswith('/1'))
+        self.assertTrue(timings['rpc'].endswith('/1'))
+
+    def test_warning(self):
+        warnings = []
+        self.stubs.Set(nova.api.timing.LOG, 'warn',
+                       lambda msg, values: warnings.append(values))
+        self.flags(request_timing_warning=0.000001)
+        self.request.get_response(self.middleware)
+        self.assertEqual(len(warnings), 1)
+        self.assertEqual(warnings[0]['path'], '/')
+        self.assertEqual(warnings[0]['request_id'], self.context.request_id)
+        self.assertTrue('rpc=' in warnings[0]['timings'])
+
+    def test_profile(self):
+        profiles = []
+        self.stubs.Set(nova.api.timing.LOG, 'info',
+                       lambda msg, values: profiles.append(values))
+        self.flags(request_profile_rate=1)
+        response = self.request.get_response(self.middleware)
+        self.assertEqual(response.status_int, 200)
+        self.assertEqual(len(profiles), 1)
+        self.assertTrue('fake_app' in profiles[0]['profile'])
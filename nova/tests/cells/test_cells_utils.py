@@ -34,11 +34,12 @@ class CellsUtilsTestCase(test.TestCase):
             call_info['shuffle'] += 1
 
         def instance_get_all_by_filters(context, filters,
-                sort_key, sort_order):
+                sort_key, sort_order, **kwargs):
             self.assertEqual(context, fake_context)
             self.assertEqual(sort_key, 'deleted')
             self.assertEqual(sort_order, 'asc')
             call_info['got_filters'] = filters
+            call_info['got_kwargs'] = kwargs
             call_info['get_all'] += 1
             return ['fake_instance1', 'fake_instance2', 'fake_instance3']
 
@@ -80,6 +81,19 @@ class CellsUtilsTestCase(test.TestCase):
                 {'changes-since': 'fake-updated-since',
                  'project_id': 'fake-project'})
         self.assertEqual(call_info['shuffle'], 2)
+        self.assertEqual(call_info['got_kwargs'], {})
+
+        def instance_uuids_get_all_by_filters(context, filters,
+                sort_key, sort_order, **kwargs):
+            call_info['got_kwargs'] = kwargs
+            return [{'uuid': 'fake-uuid'}]
+
+        self.stubs.Set(db, 'instance_get_all_by_filters',
+                instance_uuids_get_all_by_filters)
+        instances = cells_utils.get_instances_to_sync(fake_context,
+                                                      uuids_only=True)
+        self.assertEqual(['fake-uuid'], list(instances))
+        self.assertEqual(call_info['got_kwargs'], {'columns_to_join': []})
 
     def test_split_cell_and_item(self):
         path = 'australia', 'queensland', 'gold_coast'
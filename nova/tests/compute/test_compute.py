@@ -3354,6 +3354,69 @@ class ComputeTestCase(BaseTestCase):
         self.assertEqual(len(instances), 1)
         self.assertEqual(instances[0]['task_state'], None)
 
+    def test_sync_power_states_loads_only_columns(self):
+        idle = {'uuid': 'fake-uuid1', 'name': 'instance-1',
+                'task_state': None}
+        busy = {'uuid': 'fake-uuid2', 'name': 'instance-2',
+                'task_state': task_states.REBOOTING}
+        self.mox.StubOutWithMock(self.compute.conductor_api,
+                                 'instance_get_columns_by_host')
+        self.mox.StubOutWithMock(self.compute.conductor_api,
+                                 'instance_get_all_by_host')
+        self.mox.StubOutWithMock(self.compute.driver, 'get_num_instances')
+        self.mox.StubOutWithMock(self.compute.driver, 'get_info')
+        self.mox.StubOutWithMock(self.compute, '_sync_instance_power_state')
+        self.compute.conductor_api.instance_get_columns_by_host(
+            self.context, self.compute.host,
+            ['id', 'uuid', 'name', 'host', 'vm_state', 'task_state']
+        ).AndReturn([idle, busy])
+        self.compute.driver.get_num_instances().AndReturn(2)
+        self.compute.driver.get_info(idle).AndReturn(
+            {'state': power_state.SHUTDOWN})
+        self.compute._sync_instance_power_state(self.context, idle,
+                                                power_state.SHUTDOWN)
+        self.mox.ReplayAll()
+        self.compute._sync_power_states(self.context)
+
+    def test_prefetch_image(self):
+        calls = []
+
+        def fake_prefetch_image(context, image_id):
+            self.assertEqual('fetching',
+                self.compute.get_image_prefetch_status(context, image_id))
+            calls.append(image_id)
+
+        self.stubs.Set(self.compute.driver, 'prefetch_image',
+                       fake_prefetch_image)
+        self.assertEqual(None, self.compute.get_image_prefetch_status(
+            self.context, 'fake-image'))
+        self.compute.prefetch_image(self.context, 'fake-image')
+        self.assertEqual(['fake-image'], calls)
+        self.assertEqual('cached', self.compute.get_image_prefetch_status(
+            self.context, 'fake-image'))
+
+    def test_prefetch_image_unsupported(self):
+        def fake_prefetch_image(context, image_id):
+            raise NotImplementedError()
+
+        self.stubs.Set(self.compute.driver, 'prefetch_image',
+                       fake_prefetch_image)
+        self.compute.prefetch_image(self.context, 'fake-image')
+        self.assertEqual('unsupported',
+            self.compute.get_image_prefetch_status(self.context,
+                                                   'fake-image'))
+
+    def test_prefetch_image_error(self):
+        def fake_prefetch_image(context, image_id):
+            raise test.TestingException()
+
+        self.stubs.Set(self.compute.driver, 'prefetch_image',
+                       fake_prefetch_image)
+        self.assertRaises(test.TestingException, self.compute.prefetch_image,
+                          self.context, 'fake-image')
+        self.assertEqual('error', self.compute.get_image_prefetch_status(
+            self.context, 'fake-image'))
+
     def test_add_instance_fault(self):
         instance = self._create_fake_instance()
         exc_info = None
@@ -3551,12 +3614,13 @@ class ComputeTestCase(BaseTestCase):
             instance_map[uuid] = {'uuid': uuid, 'host': CONF.host}
             instances.append(instance_map[uuid])
 
-        call_info = {'get_all_by_host': 0, 'get_by_uuid': 0,
+        call_info = {'get_uuids_by_host': 0, 'get_by_uuid': 0,
                 'get_nw_info': 0, 'expected_instance': None}
 
-        def fake_instance_get_all_by_host(context, host):
-            call_info['get_all_by_host'] += 1
-            return instances[:]
+        def fake_instance_get_columns_by_host(context, host, columns):
+            self.assertEqual(['uuid'], columns)
+            call_info['get_uuids_by_host'] += 1
+            return [{'uuid': instance['uuid']} for instance in instances]
 
         def fake_instance_get_by_uuid(context, instance_uuid):
             if instance_uuid not in instance_map:
@@ -3573,8 +3637,9 @@ class ComputeTestCase(BaseTestCase):
             self.assertEqual(call_info['expected_instance'], instance)
             call_info['get_nw_info'] += 1
 
-        self.stubs.Set(self.compute.conductor_api, 'instance_get_all_by_host',
-                fake_instance_get_all_by_host)
+        self.stubs.Set(self.compute.conductor_api,
+                'instance_get_columns_by_host',
+                fake_instance_get_columns_by_host)
         self.stubs.Set(self.compute.conductor_api, 'instance_get_by_uuid',
                 fake_instance_get_by_uuid)
         self.stubs.Set(self.compute, '_get_instance_nw_info',
@@ -3582,14 +3647,14 @@ class ComputeTestCase(BaseTestCase):
 
         call_info['expected_instance'] = instances[0]
         self.compute._heal_instance_info_cache(ctxt)
-        self.assertEqual(1, call_info['get_all_by_host'])
-        self.assertEqual(0, call_info['get_by_uuid'])
+        self.assertEqual(1, call_info['get_uuids_by_host'])
+        self.assertEqual(1, call_info['get_by_uuid'])
         self.assertEqual(1, call_info['get_nw_info'])
 
         call_info['expected_instance'] = instances[1]
         self.compute._heal_instance_info_cache(ctxt)
-        self.assertEqual(1, call_info['get_all_by_host'])
-        self.assertEqual(1, call_info['get_by_uuid'])
+        self.assertEqual(1, call_info['get_uuids_by_host'])
+        self.assertEqual(2, call_info['get_by_uuid'])
         self.assertEqual(2, call_info['get_nw_info'])
 
         # Make an instance switch hosts
@@ -3599,9 +3664,9 @@ class ComputeTestCase(BaseTestCase):
         # '2' and '3' should be skipped..
         call_info['expected_instance'] = instances[4]
         self.compute._heal_instance_info_cache(ctxt)
-        self.assertEqual(call_info['get_all_by_host'], 1)
+        self.assertEqual(call_info['get_uuids_by_host'], 1)
         # Incremented for '2' and '4'.. '3' caused a raise above.
-        self.assertEqual(call_info['get_by_uuid'], 3)
+        self.assertEqual(call_info['get_by_uuid'], 4)
         self.assertEqual(call_info['get_nw_info'], 3)
         # Should be no more left.
         self.assertEqual(len(self.compute._instance_uuids_to_heal), 0)
@@ -3610,9 +3675,8 @@ class ComputeTestCase(BaseTestCase):
         # back again
         call_info['expected_instance'] = instances[0]
         self.compute._heal_instance_info_cache(ctxt)
-        self.assertEqual(call_info['get_all_by_host'], 2)
-        # Stays the same, because the instance came from the DB
-        self.assertEqual(call_info['get_by_uuid'], 3)
+        self.assertEqual(call_info['get_uuids_by_host'], 2)
+        self.assertEqual(call_info['get_by_uuid'], 5)
         self.assertEqual(call_info['get_nw_info'], 4)
 
     def test_poll_rescued_instances(self):
@@ -5754,6 +5818,22 @@ class ComputeAPITestCase(BaseTestCase):
         instance = self.compute_api.get(self.context, exp_instance['id'])
         self.assertEquals(expected, instance)
 
+    def test_get_all_columns_to_join(self):
+        c = context.get_admin_context()
+        instance = self._create_fake_instance()
+
+        instances = self.compute_api.get_all(c, columns_to_join=[])
+        self.assertEqual([instance['uuid']], [i['uuid'] for i in instances])
+        self.assertFalse('info_cache' in instances[0])
+        self.assertFalse('security_groups' in instances[0])
+
+        instances = self.compute_api.get_all(
+            c, columns_to_join=['info_cache'])
+        self.assertTrue('info_cache' in instances[0])
+        self.assertFalse('security_groups' in instances[0])
+
+        db.instance_destroy(c, instance['uuid'])
+
     def test_get_all_by_name_regexp(self):
         # Test searching instances by name (display_name).
         c = context.get_admin_context()
@@ -7417,7 +7497,8 @@ class KeypairAPITestCase(BaseTestCase):
 
     def _keypair_db_call_stubs(self):
 
-        def db_key_pair_get_all_by_user(self, user_id):
+        def db_key_pair_get_all_by_user(self, user_id, limit=None,
+                                        marker=None):
             return []
 
         def db_key_pair_create(self, keypair):
@@ -13,11 +13,16 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import eventlet
+from eventlet import event
+
 from nova.cells import utils as cells_utils
 from nova import compute
 from nova.compute import rpcapi as compute_rpcapi
 from nova import context
+from nova import exception
 from nova.openstack.common import rpc
+from nova.openstack.common.rpc import common as rpc_common
 from nova import test
 
 
@@ -189,6 +194,33 @@ class ComputeHostAPITestCase(test.TestCase):
         self.mox.VerifyAll()
         self.assertEqual(exp_services, result)
 
+    def test_service_get_all_paged(self):
+        services = [dict(id=2, key1='val1', topic='compute', host='host2')]
+        self.mox.StubOutWithMock(self.host_api.db, 'service_get_all')
+
+        # Column filters are paged by the database
+        self.host_api.db.service_get_all(self.ctxt, disabled=False,
+                                         filters=dict(key1='val1'), limit=1,
+                                         marker=1).AndReturn(services)
+        self.mox.ReplayAll()
+        result = self.host_api.service_get_all(
+            self.ctxt, filters=dict(key1='val1', disabled=False), limit=1,
+            marker=1)
+        self.mox.VerifyAll()
+        self.assertEqual(services, result)
+
+        # Zones are not in the database
+        self.mox.ResetAll()
+        services.append(dict(id=1, key1='val1', topic='compute',
+                             host='host1'))
+        self.host_api.db.service_get_all(self.ctxt,
+                                         disabled=None).AndReturn(services)
+        self.mox.ReplayAll()
+        result = self.host_api.service_get_all(
+            self.ctxt, filters=dict(availability_zone='nova'), limit=1)
+        self.mox.VerifyAll()
+        self.assertEqual([1], [service['id'] for service in result])
+
     def test_service_get_by_compute_host(self):
         self.mox.StubOutWithMock(self.host_api.db,
                                  'service_get_by_compute_host')
@@ -223,6 +255,85 @@ class ComputeHostAPITestCase(test.TestCase):
                 state='fake-state')
         self.assertEqual('fake-response', result)
 
+    def _stub_prefetch_hosts(self):
+        services = [dict(host='host1', availability_zone='az1'),
+                    dict(host='host2', availability_zone='az2'),
+                    dict(host='host3', availability_zone='az1')]
+        self.stubs.Set(self.host_api, 'service_get_all',
+                       lambda *args, **kwargs: services)
+        self.stubs.Set(self.host_api.db, 'aggregate_get_all',
+                       lambda context: [dict(id=1, name='agg1')])
+        self.stubs.Set(self.host_api.db, 'aggregate_host_get_all',
+                       lambda context, aggregate_id: ['host2', 'host3'])
+
+    def test_prefetch_image(self):
+        self._stub_prefetch_hosts()
+        casts = []
+        self.stubs.Set(self.host_api.rpcapi, 'prefetch_image',
+                       lambda context, image_id, host:
+                       casts.append((image_id, host)))
+        result = self.host_api.prefetch_image(self.ctxt, 'fake-image',
+                                              availability_zone='az1')
+        self.assertEqual(['host1', 'host3'], result)
+        self.assertEqual([('fake-image', 'host1'), ('fake-image', 'host3')],
+                         casts)
+
+    def test_prefetch_image_aggregate(self):
+        self._stub_prefetch_hosts()
+        self.stubs.Set(self.host_api.rpcapi, 'prefetch_image',
+                       lambda context, image_id, host: None)
+        result = self.host_api.prefetch_image(self.ctxt, 'fake-image',
+                                              aggregate='agg1')
+        self.assertEqual(['host2', 'host3'], result)
+        result = self.host_api.prefetch_image(self.ctxt, 'fake-image',
+                                              aggregate='1',
+                                              availability_zone='az1')
+        self.assertEqual(['host3'], result)
+
+    def test_prefetch_image_aggregate_not_found(self):
+        self._stub_prefetch_hosts()
+        self.assertRaises(exception.AggregateNotFound,
+                          self.host_api.prefetch_image, self.ctxt,
+                          'fake-image', aggregate='bogus')
+
+    def test_get_image_prefetch_status(self):
+        self._stub_prefetch_hosts()
+
+        def fake_get_status(context, image_id, host):
+            if host == 'host2':
+                raise rpc_common.Timeout()
+            if host == 'host3':
+                raise rpc_common.RemoteError('ValueError', 'bad image')
+            return 'cached'
+
+        self.stubs.Set(self.host_api.rpcapi, 'get_image_prefetch_status',
+                       fake_get_status)
+        result = self.host_api.get_image_prefetch_status(self.ctxt,
+                                                         'fake-image')
+        self.assertEqual({'host1': 'cached', 'host2': 'unreachable',
+                          'host3': 'error'}, result)
+
+    def test_get_image_prefetch_status_parallel(self):
+        self._stub_prefetch_hosts()
+        waiting = []
+        answered = event.Event()
+
+        def fake_get_status(context, image_id, host):
+            # Every host has to be asked before any of them answers.
+            waiting.append(host)
+            if len(waiting) == 3:
+                answered.send()
+            answered.wait()
+            return 'cached'
+
+        self.stubs.Set(self.host_api.rpcapi, 'get_image_prefetch_status',
+                       fake_get_status)
+        with eventlet.Timeout(1):
+            result = self.host_api.get_image_prefetch_status(self.ctxt,
+                                                             'fake-image')
+        self.assertEqual({'host1': 'cached', 'host2': 'cached',
+                          'host3': 'cached'}, result)
+
 
 class ComputeHostAPICellsTestCase(ComputeHostAPITestCase):
     def setUp(self):
@@ -295,6 +406,37 @@ class ComputeHostAPICellsTestCase(ComputeHostAPITestCase):
         self.mox.VerifyAll()
         self.assertEqual(exp_services, result)
 
+    def test_service_get_all_paged(self):
+        services = [dict(id=2, topic='compute', host='host2'),
+                    dict(id=1, topic='compute', host='host1')]
+        self.mox.StubOutWithMock(self.host_api.cells_rpcapi,
+                                 'service_get_all')
+        self.host_api.cells_rpcapi.service_get_all(self.ctxt,
+                filters={}).AndReturn(services)
+        self.mox.ReplayAll()
+        result = self.host_api.service_get_all(self.ctxt, limit=1, marker=1)
+        self.mox.VerifyAll()
+        self.assertEqual([services[0]], result)
+
+    def test_service_get_all_host_filter(self):
+        services = [dict(id=1, topic='compute', binary='nova-compute',
+                         host='cell1@host1'),
+                    dict(id=2, topic='compute', binary='nova-compute',
+                         host='cell2@host1')]
+        self.mox.StubOutWithMock(self.host_api.cells_rpcapi,
+                                 'service_get_all')
+        # Hosts carry the cell prefix only once they reach the API cell,
+        # so host and binary filters are not passed to the child cells.
+        self.host_api.cells_rpcapi.service_get_all(self.ctxt,
+                filters={}).AndReturn(services)
+        self.mox.ReplayAll()
+        filters = {'host': 'cell2@host1', 'binary': 'nova-compute'}
+        result = self.host_api.service_get_all(self.ctxt, filters=filters)
+        self.mox.VerifyAll()
+        self.assertEqual([services[1]], result)
+        self.assertEqual({'host': 'cell2@host1', 'binary': 'nova-compute'},
+                         filters)
+
     def test_service_get_by_compute_host(self):
         self.mox.StubOutWithMock(self.host_api.cells_rpcapi,
                                  'service_get_by_compute_host')
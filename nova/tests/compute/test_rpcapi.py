@@ -245,6 +245,14 @@ class ComputeRpcAPITestCase(test.TestCase):
                 node='node',
                 version='2.20')
 
+    def test_prefetch_image(self):
+        self._test_compute_api('prefetch_image', 'cast',
+                image_id='fake_image', host='host', version='2.28')
+
+    def test_get_image_prefetch_status(self):
+        self._test_compute_api('get_image_prefetch_status', 'call',
+                image_id='fake_image', host='host', version='2.28')
+
     def test_reboot_instance(self):
         self.maxDiff = None
         self._test_compute_api('reboot_instance', 'cast',
@@ -356,6 +356,17 @@ class _BaseTestCase(object):
         self.conductor.instance_get_active_by_window_joined(
             self.context, 'fake-begin', 'fake-end', 'fake-proj', 'fake-host')
 
+    def test_instance_get_columns_by_host(self):
+        self.mox.StubOutWithMock(db, 'instance_get_columns_by_host')
+        db.instance_get_columns_by_host(self.context.elevated(), 'host',
+                                        ['uuid', 'vm_state']).AndReturn(
+            [{'uuid': 'fake-uuid', 'vm_state': 'active'}])
+        self.mox.ReplayAll()
+        result = self.conductor.instance_get_columns_by_host(
+            self.context, 'host', ['uuid', 'vm_state'])
+        self.assertEqual([{'uuid': 'fake-uuid', 'vm_state': 'active'}],
+                         result)
+
     def test_instance_destroy(self):
         self.mox.StubOutWithMock(db, 'instance_destroy')
         db.instance_destroy(self.context, 'fake-uuid')
@@ -624,6 +635,28 @@ class ConductorTestCase(_BaseTestCase, test.TestCase):
         self.conductor = conductor_manager.ConductorManager()
         self.conductor_manager = self.conductor
 
+    def test_log_db_tpool_metrics(self):
+        metrics = {'pool_size': 5, 'in_flight': 7, 'queue_depth': 2,
+                   'max_queue_depth': 3,
+                   'calls': {'instance_get': {'count': 4,
+                                              'total_time': 4.0,
+                                              'max_time': 1.0,
+                                              'total_wait': 2.0,
+                                              'max_wait': 0.5}}}
+        self.mox.StubOutWithMock(db, 'get_tpool_metrics')
+        self.mox.StubOutWithMock(conductor_manager.LOG, 'info')
+        self.mox.StubOutWithMock(conductor_manager.LOG, 'debug')
+        db.get_tpool_metrics().AndReturn(metrics)
+        conductor_manager.LOG.info(mox.IgnoreArg(), metrics)
+        conductor_manager.LOG.debug(mox.IgnoreArg(),
+                                    dict(metrics['calls']['instance_get'],
+                                         name='instance_get'))
+        db.get_tpool_metrics().AndReturn(None)
+        self.mox.ReplayAll()
+        self.conductor._log_db_tpool_metrics(self.context)
+        # Nothing is logged when the tpool is not used
+        self.conductor._log_db_tpool_metrics(self.context)
+
     def test_block_device_mapping_update_or_create(self):
         fake_bdm = {'id': 'fake-id'}
         self.mox.StubOutWithMock(db, 'block_device_mapping_create')
@@ -34,6 +34,7 @@ CONF.import_opt('num_networks', 'nova.network.manager')
 CONF.import_opt('floating_ip_dns_manager', 'nova.network.floating_ips')
 CONF.import_opt('instance_dns_manager', 'nova.network.floating_ips')
 CONF.import_opt('policy_file', 'nova.policy')
+CONF.import_opt('quota_limit_cache_ttl', 'nova.quota')
 CONF.import_opt('compute_driver', 'nova.virt.driver')
 CONF.import_opt('api_paste_config', 'nova.wsgi')
 
@@ -61,6 +62,7 @@ class ConfFixture(fixtures.Fixture):
         self.conf.set_default('lock_path', None)
         self.conf.set_default('network_size', 8)
         self.conf.set_default('num_networks', 2)
+        self.conf.set_default('quota_limit_cache_ttl', 0)
         self.conf.set_default('rpc_backend',
                               'nova.openstack.common.rpc.impl_fake')
         self.conf.set_default('rpc_cast_timeout', 5)
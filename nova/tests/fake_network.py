@@ -149,6 +149,26 @@ class FakeNetworkManager(network_manager.NetworkManager):
             return [ip for ip in self.fixed_ips
                     if ip['virtual_interface_id'] == vif_id]
 
+        def fixed_ip_get_by_address(self, context, address):
+            for ip in self.fixed_ips:
+                if ip['address'] == address:
+                    vif = self.vifs[ip['virtual_interface_id']]
+                    return dict(ip, instance_uuid=vif['instance_uuid'])
+            raise exception.FixedIpNotFoundForAddress(address=address)
+
+        def fixed_ip_get(self, context, id):
+            for ip in self.fixed_ips:
+                if ip['id'] == id:
+                    vif = self.vifs[ip['virtual_interface_id']]
+                    return dict(ip, instance_uuid=vif['instance_uuid'])
+            raise exception.FixedIpNotFound(id=id)
+
+        def floating_ip_get_by_address(self, context, address):
+            for ip in self.floating_ips:
+                if ip['address'] == address:
+                    return ip
+            raise exception.FloatingIpNotFoundForAddress(address=address)
+
         def fixed_ip_disassociate(self, context, address):
             return True
 
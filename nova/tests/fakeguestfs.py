@@ -19,6 +19,7 @@ class GuestFS(object):
 
     def __init__(self):
         self.drives = []
+        self.labels = []
         self.running = False
         self.closed = False
         self.mounts = []
@@ -33,12 +34,28 @@ class GuestFS(object):
         self.running = False
         self.mounts = []
         self.drives = []
+        self.labels = []
 
     def close(self):
         self.closed = True
 
     def add_drive_opts(self, file, *args, **kwargs):
+        if 'label' in kwargs and not self.running:
+            raise RuntimeError("Hotplugging requires a launched appliance")
         self.drives.append((file, kwargs['format']))
+        self.labels.append(kwargs.get('label'))
+
+    def remove_drive(self, label):
+        index = self.labels.index(label)
+        del self.drives[index]
+        del self.labels[index]
+
+    def umount_all(self):
+        self.mounts = []
+
+    def ping_daemon(self):
+        if not self.running:
+            raise RuntimeError("Appliance is not running")
 
     def get_attach_method(self):
         return self.attach_method
@@ -126,6 +126,9 @@
   <extension alias="os-hypervisors" updated="%(timestamp)s" namespace="http://docs.openstack.org/compute/ext/hypervisors/api/v1.1" name="Hypervisors">
     <description>%(text)s</description>
   </extension>
+  <extension alias="os-image-prefetch" updated="%(timestamp)s" namespace="http://docs.openstack.org/compute/ext/image_prefetch/api/v1.1" name="ImagePrefetch">
+    <description>%(text)s</description>
+  </extension>
   <extension alias="os-instance_usage_audit_log" updated="%(timestamp)s" namespace="http://docs.openstack.org/ext/services/api/v1.1" name="OSInstanceUsageAuditLog">
     <description>%(text)s</description>
   </extension>
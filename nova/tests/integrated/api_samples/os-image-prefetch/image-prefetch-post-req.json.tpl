@@ -0,0 +1,6 @@
+{
+    "image_prefetch": {
+        "image_id": "%(image_id)s",
+        "availability_zone": "nova"
+    }
+}
@@ -0,0 +1,2 @@
+<?xml version="1.0" encoding="UTF-8"?>
+<image_prefetch image_id="%(image_id)s" availability_zone="nova"/>
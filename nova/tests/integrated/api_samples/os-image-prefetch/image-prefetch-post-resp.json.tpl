@@ -0,0 +1,18 @@
+{
+    "image_prefetch": {
+        "cached": 0,
+        "error": 0,
+        "fetching": 0,
+        "hosts": [
+            {
+                "host": "%(host_name)s",
+                "status": "queued"
+            }
+        ],
+        "image_id": "%(image_id)s",
+        "queued": 1,
+        "total": 1,
+        "unreachable": 0,
+        "unsupported": 0
+    }
+}
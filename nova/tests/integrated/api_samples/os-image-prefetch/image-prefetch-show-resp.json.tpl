@@ -0,0 +1,18 @@
+{
+    "image_prefetch": {
+        "cached": 1,
+        "error": 0,
+        "fetching": 0,
+        "hosts": [
+            {
+                "host": "%(host_name)s",
+                "status": "cached"
+            }
+        ],
+        "image_id": "%(image_id)s",
+        "queued": 0,
+        "total": 1,
+        "unreachable": 0,
+        "unsupported": 0
+    }
+}
@@ -0,0 +1,6 @@
+<?xml version='1.0' encoding='UTF-8'?>
+<image_prefetch image_id="%(image_id)s" total="1" queued="0" fetching="0" cached="1" error="0" unsupported="0" unreachable="0">
+  <hosts>
+    <host host="%(host_name)s" status="cached"/>
+  </hosts>
+</image_prefetch>
@@ -34,6 +34,7 @@ from nova.api.openstack.compute.contrib import fping
 from nova.cloudpipe import pipelib
 from nova.compute import api as compute_api
 from nova.compute import manager as compute_manager
+from nova.compute import rpcapi as compute_rpcapi
 from nova import context
 from nova import db
 from nova.db.sqlalchemy import models
@@ -2930,6 +2931,38 @@ class InstanceUsageAuditLogXmlTest(InstanceUsageAuditLogJsonTest):
     ctype = "xml"
 
 
+class ImagePrefetchSampleJsonTest(ApiSampleTestBase):
+    extension_name = ("nova.api.openstack.compute.contrib."
+                      "image_prefetch.Image_prefetch")
+
+    def test_image_prefetch_create(self):
+        subs = {'image_id': fake.get_valid_image_id()}
+        response = self._do_post('os-image-prefetch',
+                                 'image-prefetch-post-req', subs)
+        self.assertEqual(response.status, 202)
+        subs.update(self._get_regexes())
+        return self._verify_response('image-prefetch-post-resp',
+                                     subs, response)
+
+    def test_image_prefetch_show(self):
+        def fake_get_status(_self, context, image_id, host):
+            return 'cached'
+
+        self.stubs.Set(compute_rpcapi.ComputeAPI,
+                       'get_image_prefetch_status', fake_get_status)
+        image_id = fake.get_valid_image_id()
+        response = self._do_get('os-image-prefetch/%s' % image_id)
+        self.assertEqual(response.status, 200)
+        subs = self._get_regexes()
+        subs['image_id'] = image_id
+        return self._verify_response('image-prefetch-show-resp',
+                                     subs, response)
+
+
+class ImagePrefetchSampleXmlTest(ImagePrefetchSampleJsonTest):
+    ctype = "xml"
+
+
 class FlavorExtraSpecsSampleJsonTests(ApiSampleTestBase):
     extension_name = ("nova.api.openstack.compute.contrib.flavorextraspecs."
                       "Flavorextraspecs")
@@ -1535,6 +1535,34 @@ class CommonNetworkTestCase(test.TestCase):
         self.assertEqual(res[0]['instance_uuid'], _vifs[1]['instance_uuid'])
         self.assertEqual(res[1]['instance_uuid'], _vifs[2]['instance_uuid'])
 
+    def test_get_instance_uuids_by_exact_ip_regex(self):
+        manager = fake_network.FakeNetworkManager()
+        _vifs = manager.db.virtual_interface_get_all(None)
+        fake_context = context.RequestContext('user', 'project')
+        self.mox.StubOutWithMock(manager.db, 'virtual_interface_get_all')
+        self.mox.ReplayAll()
+
+        res = manager.get_instance_uuids_by_ip_filter(
+            fake_context, {'ip': '^172\\.16\\.0\\.2$'})
+        self.assertEqual([{'instance_uuid': _vifs[1]['instance_uuid'],
+                           'ip': '172.16.0.2'}], res)
+
+        # Floating IP
+        res = manager.get_instance_uuids_by_ip_filter(
+            fake_context, {'ip': '^173\\.16\\.1\\.2$'})
+        self.assertEqual([{'instance_uuid': _vifs[2]['instance_uuid'],
+                           'ip': '173.16.1.2'}], res)
+
+        # Doesn't exist
+        res = manager.get_instance_uuids_by_ip_filter(
+            fake_context, {'ip': '^10\\.0\\.0\\.1$'})
+        self.assertEqual([], res)
+
+        # Not an address
+        res = manager.get_instance_uuids_by_ip_filter(fake_context,
+                                                      {'ip': '^bogus$'})
+        self.assertEqual([], res)
+
     def test_get_instance_uuids_by_ipv6_regex(self):
         manager = fake_network.FakeNetworkManager()
         _vifs = manager.db.virtual_interface_get_all(None)
@@ -0,0 +1,58 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import fixtures
+
+from nova.openstack.common.db.sqlalchemy import session as db_session
+
+
+class QueryBudget(fixtures.Fixture):
+    """Fail when the code run under the fixture exceeds a query budget.
+
+    Used as a context manager around a single API call or DB API function:
+
+        with query_fixture.QueryBudget(3):
+            self.controller.index(req)
+
+    :param max_queries: the most SQL statements which may be run.
+    :param max_repeats: if set, the most times the same statement may be run.
+    """
+
+    def __init__(self, max_queries, max_repeats=None):
+        super(QueryBudget, self).__init__()
+        self.max_queries = max_queries
+        self.max_repeats = max_repeats
+
+    def setUp(self):
+        super(QueryBudget, self).setUp()
+        self.counter = db_session.start_query_counter(
+            description='QueryBudget')
+        self.addCleanup(self._check_budget)
+
+    def _check_budget(self):
+        db_session.stop_query_counter(self.counter)
+        if self.counter.count > self.max_queries:
+            raise AssertionError(
+                'Ran %d SQL statements, the budget is %d:\n%s' %
+                (self.counter.count, self.max_queries,
+                 '\n'.join(sorted(self.counter.statements))))
+        if self.max_repeats is not None:
+            repeated = self.counter.repeated(self.max_repeats)
+            if repeated:
+                raise AssertionError(
+                    'Ran the same SQL statement %d times, the budget is '
+                    '%d:\n%s' % (repeated[0][1], self.max_repeats,
+                                 repeated[0][0]))
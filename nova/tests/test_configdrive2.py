@@ -18,6 +18,7 @@
 
 import mox
 import os
+import struct
 import tempfile
 
 from nova import test
@@ -25,12 +26,17 @@ from nova import test
 from nova.openstack.common import log
 from nova import utils
 from nova.virt import configdrive
+from nova.virt.disk import iso9660
 
 LOG = log.getLogger(__name__)
 
 
 class ConfigDriveTestCase(test.TestCase):
 
+    def setUp(self):
+        super(ConfigDriveTestCase, self).setUp()
+        self.flags(config_drive_inprocess=False)
+
     def test_create_configdrive_iso(self):
         imagefile = None
 
@@ -91,3 +97,181 @@ class ConfigDriveTestCase(test.TestCase):
         finally:
             if imagefile:
                 utils.delete_if_exists(imagefile)
+
+    def _read_joliet_tree(self, image):
+        """Return a dict of path to contents from an ISO's Joliet tree."""
+        def read_dir(extent, size, prefix, result):
+            data = image[extent * 2048:extent * 2048 + size]
+            offset = 0
+            while offset < len(data):
+                length = ord(data[offset])
+                if not length:
+                    offset += 2048 - offset % 2048
+                    continue
+                record = data[offset:offset + length]
+                offset += length
+                name_len = ord(record[32])
+                name = record[33:33 + name_len]
+                if name in ('\x00', '\x01'):
+                    continue
+                name = name.decode('utf-16-be').split(';')[0]
+                child_extent = struct.unpack('<I', record[2:6])[0]
+                child_size = struct.unpack('<I', record[10:14])[0]
+                if ord(record[25]) & 2:
+                    read_dir(child_extent, child_size,
+                             prefix + name + '/', result)
+                else:
+                    result[prefix + name] = image[
+                        child_extent * 2048:child_extent * 2048 + child_size]
+            return result
+
+        svd = image[17 * 2048:18 * 2048]
+        self.assertEqual('\x02CD001', svd[:6])
+        self.assertEqual('%/E', svd[88:91])
+        root = svd[156:190]
+        return read_dir(struct.unpack('<I', root[2:6])[0],
+                        struct.unpack('<I', root[10:14])[0], '', {})
+
+    def _read_system_use(self, image, data):
+        """Return the SUSP entries in data, following continuation areas."""
+        entries = {}
+        while len(data) >= 4:
+            signature, length = data[:2], ord(data[2])
+            if not length:
+                break
+            entry, data = data[4:length], data[length:]
+            if signature == 'CE':
+                extent = struct.unpack('<I', entry[0:4])[0]
+                offset = struct.unpack('<I', entry[8:12])[0]
+                size = struct.unpack('<I', entry[16:20])[0]
+                start = extent * 2048 + offset
+                entries.update(self._read_system_use(
+                    image, image[start:start + size]))
+            else:
+                entries[signature] = entry
+        return entries
+
+    def _read_primary_tree(self, image):
+        """Return a dict of path to (contents, ISO9660 name, mode) from an
+        ISO's primary tree, named by the Rock Ridge NM entries.
+        """
+        def read_dir(extent, size, prefix, result):
+            data = image[extent * 2048:extent * 2048 + size]
+            offset = 0
+            while offset < len(data):
+                length = ord(data[offset])
+                if not length:
+                    offset += 2048 - offset % 2048
+                    continue
+                record = data[offset:offset + length]
+                offset += length
+                name_len = ord(record[32])
+                iso_name = record[33:33 + name_len]
+                system_use = self._read_system_use(
+                    image, record[33 + name_len + (1 - name_len % 2):])
+                if iso_name == '\x00' and not prefix:
+                    self.assertEqual('\xbe\xef\x00', system_use['SP'])
+                    self.assertEqual('RRIP_1991A', system_use['ER'][4:14])
+                if iso_name in ('\x00', '\x01'):
+                    continue
+                self.assertEqual('\x00', system_use['NM'][0])
+                name = system_use['NM'][1:]
+                mode = struct.unpack('<I', system_use['PX'][0:4])[0]
+                child_extent = struct.unpack('<I', record[2:6])[0]
+                child_size = struct.unpack('<I', record[10:14])[0]
+                if ord(record[25]) & 2:
+                    self.assertEqual(040555, mode)
+                    read_dir(child_extent, child_size,
+                             prefix + name + '/', result)
+                else:
+                    self.assertEqual(0100444, mode)
+                    result[prefix + name] = (image[
+                        child_extent * 2048:child_extent * 2048 +
+                        child_size], iso_name)
+            return result
+
+        pvd = image[16 * 2048:17 * 2048]
+        self.assertEqual('\x01CD001', pvd[:6])
+        root = pvd[156:190]
+        return read_dir(struct.unpack('<I', root[2:6])[0],
+                        struct.unpack('<I', root[10:14])[0], '', {})
+
+    def test_write_configdrive_iso(self):
+        self.flags(config_drive_format='iso9660', config_drive_inprocess=True)
+        self.mox.StubOutWithMock(utils, 'execute')
+        self.mox.ReplayAll()
+
+        files = {'openstack/latest/meta_data.json': '{"uuid": "fake"}',
+                 'openstack/latest/user_data': 'x' * 5000,
+                 'openstack/content/0000': '',
+                 'ec2/2009-04-04/meta-data.json': '{}'}
+        for i in range(100):
+            files['openstack/content/%04d_with_a_long_name' % i] = str(i)
+
+        with utils.tempdir() as tmpdir:
+            imagefile = os.path.join(tmpdir, 'disk.config')
+            with configdrive.ConfigDriveBuilder() as c:
+                for path, data in files.items():
+                    c._add_file(path, data)
+                c.make_drive(imagefile)
+            self.assertEqual(None, c.tempdir)
+
+            with open(imagefile, 'rb') as f:
+                image = f.read()
+
+        pvd = image[16 * 2048:17 * 2048]
+        self.assertEqual('\x01CD001', pvd[:6])
+        self.assertEqual('config-2', pvd[40:72].rstrip())
+        self.assertEqual(len(image) // 2048,
+                         struct.unpack('<I', pvd[80:84])[0])
+        self.assertEqual(files, self._read_joliet_tree(image))
+
+        primary = self._read_primary_tree(image)
+        self.assertEqual(files, dict((path, data) for path, (data, _name)
+                                     in primary.items()))
+        self.assertEqual('META_DAT.JSO;1',
+                         primary['openstack/latest/meta_data.json'][1])
+
+    def test_iso9660_names(self):
+        taken = set()
+        self.assertEqual('META_DAT.JSO;1',
+                         iso9660._iso_name('meta_data.json', False, taken))
+        self.assertEqual('META_D_1.JSO;1',
+                         iso9660._iso_name('meta_data.jsonp', False, taken))
+        self.assertEqual('USER_DAT.;1',
+                         iso9660._iso_name('user_data', False, taken))
+        self.assertEqual('2009_04_',
+                         iso9660._iso_name('2009-04-04', True, taken))
+
+    def test_write_configdrive_vfat(self):
+        self.flags(config_drive_format='vfat', config_drive_inprocess=True)
+        self.mox.StubOutWithMock(utils, 'execute')
+        self.mox.StubOutWithMock(utils, 'trycmd')
+        self.mox.ReplayAll()
+
+        with utils.tempdir() as tmpdir:
+            imagefile = os.path.join(tmpdir, 'disk.config')
+            with configdrive.ConfigDriveBuilder() as c:
+                c._add_file('openstack/latest/meta_data.json',
+                            '{"uuid": "fake"}')
+                c.make_drive(imagefile)
+
+            self.assertEqual(configdrive.CONFIGDRIVESIZE_BYTES,
+                             os.path.getsize(imagefile))
+            with open(imagefile, 'rb') as f:
+                boot_sector = f.read(512)
+                f.seek(0)
+                image = f.read(1024 * 1024)
+
+        self.assertEqual('\x55\xaa', boot_sector[510:])
+        self.assertEqual('config-2   ', boot_sector[43:54])
+        self.assertEqual('FAT16   ', boot_sector[54:62])
+        self.assertTrue('o\x00p\x00e\x00n\x00s\x00' in image)
+        self.assertTrue('{"uuid": "fake"}' in image)
+
+    def test_write_configdrive_vfat_too_large(self):
+        with utils.tempdir() as tmpdir:
+            imagefile = os.path.join(tmpdir, 'disk.config')
+            with configdrive.ConfigDriveBuilder() as c:
+                c._add_file('big', 'x' * (configdrive.CONFIGDRIVESIZE_BYTES))
+                self.assertRaises(ValueError, c._write_vfat, imagefile)
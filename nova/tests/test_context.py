@@ -38,6 +38,14 @@ class ContextTestCase(test.TestCase):
                                       roles=['Admin', 'weasel'])
         self.assertEquals(ctxt.is_admin, True)
 
+    def test_elevated_does_not_change_roles(self):
+        ctxt = context.RequestContext('111',
+                                      '222',
+                                      roles=['weasel'])
+        admin_ctxt = ctxt.elevated()
+        self.assertEquals(admin_ctxt.roles, ['weasel', 'admin'])
+        self.assertEquals(ctxt.roles, ['weasel'])
+
     def test_request_context_read_deleted(self):
         ctxt = context.RequestContext('111',
                                       '222',
@@ -23,6 +23,7 @@ import datetime
 import types
 import uuid as stdlib_uuid
 
+from eventlet import tpool
 from oslo.config import cfg
 from sqlalchemy.dialects import sqlite
 from sqlalchemy import MetaData
@@ -32,11 +33,15 @@ from sqlalchemy.sql.expression import select
 from nova import context
 from nova import db
 from nova.db.sqlalchemy import api as sqlalchemy_api
+from nova.db.sqlalchemy import models
 from nova import exception
+from nova.openstack.common.db import api as common_db_api
 from nova.openstack.common.db.sqlalchemy import session as db_session
+from nova.openstack.common import jsonutils
 from nova.openstack.common import timeutils
 from nova import test
 from nova.tests import matchers
+from nova.tests import query_fixture
 from nova import utils
 
 
@@ -165,6 +170,50 @@ class DbApiTestCase(DbTestCase):
         result = db.instance_get_all_by_filters(self.context, {})
         self.assertEqual(2, len(result))
 
+    def test_instance_get_summary_by_filters(self):
+        inst = self.create_instances_with_args(display_name='test1')
+        self.create_instances_with_args(display_name='other')
+        filters = {'display_name': 'test'}
+
+        summary = db.instance_get_summary_by_filters(self.context, filters)
+        self.assertEqual(1, summary['count'])
+        self.assertEqual(0, summary['security_groups_count'])
+
+        inst = db.instance_update(self.context, inst['uuid'],
+                                  {'task_state': 'spawning'})
+        summary = db.instance_get_summary_by_filters(self.context, filters)
+        self.assertEqual(inst['updated_at'], summary['updated_at'])
+
+        cache = db.instance_info_cache_update(self.context, inst['uuid'],
+                                              {'network_info': '[]'})
+        summary = db.instance_get_summary_by_filters(self.context, filters)
+        self.assertEqual(cache['updated_at'], summary['updated_at'])
+
+        group = db.security_group_create(self.context,
+                                         {'name': 'group',
+                                          'project_id': self.project_id})
+        db.instance_add_security_group(self.context, inst['uuid'],
+                                       group['id'])
+        summary = db.instance_get_summary_by_filters(self.context, filters)
+        self.assertEqual(1, summary['security_groups_count'])
+
+        self.useFixture(test.TimeOverride())
+        timeutils.set_time_override(summary['updated_at'] +
+                                    datetime.timedelta(seconds=1))
+        fault = db.instance_fault_create(self.context,
+                                         {'instance_uuid': inst['uuid'],
+                                          'code': 500,
+                                          'message': 'boom'})
+        summary = db.instance_get_summary_by_filters(self.context, filters)
+        self.assertEqual(1, summary['faults_count'])
+        self.assertEqual(fault['created_at'], summary['updated_at'])
+
+    def test_instance_get_summary_by_filters_no_match(self):
+        summary = db.instance_get_summary_by_filters(self.context,
+                                                     {'display_name': 'x'})
+        self.assertEqual(0, summary['count'])
+        self.assertEqual(None, summary['updated_at'])
+
     def test_instance_get_all_by_filters_regex(self):
         self.create_instances_with_args(display_name='test1')
         self.create_instances_with_args(display_name='teeeest2')
@@ -173,6 +222,83 @@ class DbApiTestCase(DbTestCase):
                                                 {'display_name': 't.*st.'})
         self.assertEqual(2, len(result))
 
+    def test_instance_get_all_by_filters_anchored_regex(self):
+        self.create_instances_with_args(display_name='test1')
+        self.create_instances_with_args(display_name='test12')
+        self.create_instances_with_args(display_name='Test1')
+        self.create_instances_with_args(display_name='te%t1')
+        result = db.instance_get_all_by_filters(self.context,
+                                                {'display_name': '^test1'})
+        self.assertEqual(set(['test1', 'test12']),
+                         set(i['display_name'] for i in result))
+        result = db.instance_get_all_by_filters(self.context,
+                                                {'display_name': '^test1$'})
+        self.assertEqual(['test1'], [i['display_name'] for i in result])
+        result = db.instance_get_all_by_filters(self.context,
+                                                {'display_name': '^te%t'})
+        self.assertEqual(['te%t1'], [i['display_name'] for i in result])
+        result = db.instance_get_all_by_filters(self.context,
+                                                {'display_name': '^tes?t1$'})
+        self.assertEqual(['test1'], [i['display_name'] for i in result])
+
+    def test_instance_get_all_by_filters_paginate_keyset(self):
+        instances = [self.create_instances_with_args(display_name='same')
+                     for i in range(5)]
+        expected = sorted(instances,
+                          key=lambda i: (i['created_at'], i['id']))
+        seen = []
+        marker = None
+        while True:
+            result = db.instance_get_all_by_filters(self.context, {},
+                                                    'display_name', 'asc',
+                                                    limit=2, marker=marker)
+            if not result:
+                break
+            seen.extend(i['id'] for i in result)
+            marker = result[-1]['uuid']
+        self.assertEqual([i['id'] for i in expected], seen)
+
+    def test_instance_get_all_by_filters_paginate_keyset_desc(self):
+        instances = [self.create_instances_with_args(display_name=name)
+                     for name in ('a', 'b', 'b', 'c', 'd')]
+        expected = sorted(instances,
+                          key=lambda i: (i['display_name'], i['created_at'],
+                                         i['id']),
+                          reverse=True)
+        seen = []
+        marker = None
+        while True:
+            result = db.instance_get_all_by_filters(self.context, {},
+                                                    'display_name', 'desc',
+                                                    limit=2, marker=marker)
+            if not result:
+                break
+            seen.extend(i['id'] for i in result)
+            marker = result[-1]['uuid']
+        self.assertEqual([i['id'] for i in expected], seen)
+
+    def test_instance_get_columns_by_host(self):
+        self.context = context.get_admin_context()
+        self.flags(instance_name_template='inst-%(uuid)s-%(hostname)s')
+        inst1 = self.create_instances_with_args(host='host1',
+                                                hostname='one')
+        self.create_instances_with_args(host='host2')
+        inst3 = self.create_instances_with_args(host='host1',
+                                                vm_state='stopped')
+        db.instance_destroy(self.context, inst3['uuid'])
+
+        result = db.instance_get_columns_by_host(self.context, 'host1',
+                                                 ['uuid', 'name', 'vm_state'])
+        self.assertEqual([{'uuid': inst1['uuid'],
+                           'name': 'inst-%s-one' % inst1['uuid'],
+                           'vm_state': inst1['vm_state']}], result)
+        self.assertEqual(inst1['name'], result[0]['name'])
+
+        self.flags(instance_name_template='instance-%08x')
+        result = db.instance_get_columns_by_host(self.context, 'host1',
+                                                 ['name'])
+        self.assertEqual([{'name': 'instance-%08x' % inst1['id']}], result)
+
     def test_instance_get_all_by_filters_metadata(self):
         self.create_instances_with_args(metadata={'foo': 'bar'})
         self.create_instances_with_args()
@@ -338,6 +464,21 @@ class DbApiTestCase(DbTestCase):
         self.assertEqual(floating1, floating_ip_refs[0]['address'])
         self.assertEqual(floating2, floating_ip_refs[1]['address'])
 
+    def test_floating_ip_get_all_by_project_paged(self):
+        ctxt = context.get_admin_context()
+        ids = [db.floating_ip_create(ctxt, {'address': address,
+                                            'project_id': 'project1'})
+               for address in ('10.0.0.1', '10.0.0.2', '10.0.0.3')]
+        ids = [db.floating_ip_get_by_address(ctxt, address)['id']
+               for address in ids]
+        floating_ips = db.floating_ip_get_all_by_project(ctxt, 'project1',
+                                                         limit=1,
+                                                         marker=ids[0])
+        self.assertEqual([ip['id'] for ip in floating_ips], ids[1:2])
+        self.assertRaises(exception.MarkerNotFound,
+                          db.floating_ip_get_all_by_project, ctxt,
+                          'project2', marker=ids[0])
+
     def test_network_create_safe(self):
         ctxt = context.get_admin_context()
         values = {'host': 'localhost', 'project_id': 'project1'}
@@ -915,6 +1056,49 @@ class DbApiTestCase(DbTestCase):
         self.assertTrue(isinstance(db.key_pair_get_all_by_user(
                 context.get_admin_context(), self.user_id), list))
 
+    def test_key_pair_get_all_by_user_paged(self):
+        ctxt = context.get_admin_context()
+        for name in ('key2', 'key1', 'key3'):
+            self.test_add_key_pair(name=name)
+        keypairs = db.key_pair_get_all_by_user(ctxt, self.user_id, limit=2)
+        self.assertEqual([kp['name'] for kp in keypairs], ['key1', 'key2'])
+        keypairs = db.key_pair_get_all_by_user(ctxt, self.user_id, limit=2,
+                                               marker='key2')
+        self.assertEqual([kp['name'] for kp in keypairs], ['key3'])
+        self.assertRaises(exception.MarkerNotFound,
+                          db.key_pair_get_all_by_user, ctxt, self.user_id,
+                          marker='missing')
+
+    def test_security_group_get_by_project_paged(self):
+        ctxt = context.get_admin_context()
+        ids = [db.security_group_create(ctxt, {'name': name,
+                                               'project_id': 'fake'})['id']
+               for name in ('sg1', 'sg2', 'sg3')]
+        db.security_group_create(ctxt, {'name': 'other',
+                                        'project_id': 'other'})
+        groups = db.security_group_get_by_project(ctxt, 'fake', limit=2)
+        self.assertEqual([group['id'] for group in groups], ids[:2])
+        groups = db.security_group_get_by_project(ctxt, 'fake',
+                                                  marker=ids[1])
+        self.assertEqual([group['id'] for group in groups], ids[2:])
+        groups = db.security_group_get_all(ctxt, marker=ids[2])
+        self.assertEqual([group['name'] for group in groups], ['other'])
+
+    def test_instance_get_active_by_window_joined_paged(self):
+        for project_id in ('project3', 'project1', 'project2', 'project1'):
+            self.create_instances_with_args(project_id=project_id)
+        ctxt = context.get_admin_context()
+        begin = timeutils.utcnow() - datetime.timedelta(hours=1)
+
+        instances = db.instance_get_active_by_window_joined(ctxt, begin,
+                                                            limit=2)
+        self.assertEqual(sorted(inst['project_id'] for inst in instances),
+                         ['project1', 'project1', 'project2'])
+        instances = db.instance_get_active_by_window_joined(
+                ctxt, begin, limit=2, marker='project2')
+        self.assertEqual([inst['project_id'] for inst in instances],
+                         ['project3'])
+
     def test_delete_non_existent_key_pair(self):
         self.assertRaises(exception.KeypairNotFound, db.key_pair_destroy,
                           context.get_admin_context(), self.user_id,
@@ -1364,6 +1548,17 @@ class AggregateDBApiTestCase(test.TestCase):
         self.assertEqual(r1, {'foo.openstack.org': set(['value'])})
         self.assertFalse('fake_key1' in r1)
 
+    def test_aggregate_host_get_by_metadata_key_single_query(self):
+        ctxt = context.get_admin_context()
+        for i in xrange(3):
+            _create_aggregate_with_hosts(context=ctxt,
+                    values={'name': 'fake_aggregate%d' % i},
+                    hosts=['host%d' % i], metadata={'good': 'value%d' % i})
+        with db_session.count_queries() as counter:
+            result = db.aggregate_host_get_by_metadata_key(ctxt, key='good')
+        self.assertEqual(1, counter.count)
+        self.assertEqual(set(['value1']), result['host1'])
+
     def test_aggregate_get_by_host_not_found(self):
         ctxt = context.get_admin_context()
         _create_aggregate_with_hosts(context=ctxt)
@@ -1609,11 +1804,7 @@ class CapacityTestCase(test.TestCase):
         return db.compute_node_create(self.ctxt, self.compute_node_dict)
 
     def _stats_as_dict(self, stats):
-        d = {}
-        for s in stats:
-            key = s['key']
-            d[key] = s['value']
-        return d
+        return jsonutils.loads(stats)
 
     def test_compute_node_create(self):
         item = self._create_helper('host1')
@@ -1667,24 +1858,47 @@ class CapacityTestCase(test.TestCase):
                 item['id'], {})
         self.assertNotEqual(item['updated_at'], item_updated['updated_at'])
 
-    def test_compute_node_stat_prune(self):
+    def test_compute_node_update_keeps_stats(self):
         item = self._create_helper('host1')
-        for stat in item['stats']:
-            if stat['key'] == 'num_instances':
-                num_instance_stat = stat
-                break
+        item = db.compute_node_update(self.ctxt, item['id'], {'vcpus': 4})
+        stats = self._stats_as_dict(item['stats'])
+        self.assertEqual(3, int(stats['num_instances']))
 
+    def test_compute_node_stat_prune(self):
+        item = self._create_helper('host1')
         values = {
             'stats': dict(num_instances=1)
         }
         db.compute_node_update(self.ctxt, item['id'], values, prune_stats=True)
         item = db.compute_node_get_all(self.ctxt)[0]
-        self.assertEqual(1, len(item['stats']))
-
-        stat = item['stats'][0]
-        self.assertEqual(num_instance_stat['id'], stat['id'])
-        self.assertEqual(num_instance_stat['key'], stat['key'])
-        self.assertEqual(1, int(stat['value']))
+        self.assertEqual({'num_instances': 1},
+                         self._stats_as_dict(item['stats']))
+
+    def test_compute_node_get_all_single_query(self):
+        self._create_helper('host1')
+        self._create_helper('host2')
+        with query_fixture.QueryBudget(1):
+            self.assertEqual(2, len(db.compute_node_get_all(self.ctxt)))
+
+    def test_compute_node_get_all_paged(self):
+        ids = [self._create_helper(host)['id']
+               for host in ('host1', 'host2', 'host3')]
+        nodes = db.compute_node_get_all(self.ctxt, limit=2)
+        self.assertEqual([node['id'] for node in nodes], ids[:2])
+        self.assertEqual(nodes[0]['service']['host'], 'host1')
+        nodes = db.compute_node_get_all(self.ctxt, limit=2, marker=ids[1])
+        self.assertEqual([node['id'] for node in nodes], ids[2:])
+        self.assertRaises(exception.MarkerNotFound,
+                          db.compute_node_get_all, self.ctxt, marker=-1)
+
+    def test_compute_node_get_all_paged_string_marker(self):
+        ids = [self._create_helper(host)['id']
+               for host in ('host1', 'host2', 'host3')]
+        nodes = db.compute_node_get_all(self.ctxt, limit=2,
+                                        marker=str(ids[1]))
+        self.assertEqual([node['id'] for node in nodes], ids[2:])
+        self.assertRaises(exception.MarkerNotFound,
+                          db.compute_node_get_all, self.ctxt, marker='bogus')
 
 
 class MigrationTestCase(test.TestCase):
@@ -1885,6 +2099,29 @@ class ServiceTestCase(test.TestCase, ModelsObjectComparatorMixin):
         for comp in compares:
             self._assertEqualListsOfObjects(*comp)
 
+    def test_service_get_all_paged(self):
+        values = [
+            {'host': 'host1', 'topic': 'topic1'},
+            {'host': 'host2', 'topic': 'topic2'},
+            {'host': 'host3', 'topic': 'topic1'},
+            {'host': 'host4', 'topic': 'topic1', 'disabled': True}
+        ]
+        services = [self._create_service(vals) for vals in values]
+
+        self._assertEqualListsOfObjects(
+            services[:2], db.service_get_all(self.ctxt, limit=2))
+        self._assertEqualListsOfObjects(
+            services[2:3],
+            db.service_get_all(self.ctxt, disabled=False,
+                               marker=services[1]['id']))
+        self._assertEqualListsOfObjects(
+            services[2:],
+            db.service_get_all(self.ctxt, filters={'topic': 'topic1'},
+                               marker=services[0]['id']))
+        self.assertRaises(exception.MarkerNotFound, db.service_get_all,
+                          self.ctxt, filters={'topic': 'topic2'},
+                          marker=services[0]['id'])
+
     def test_service_get_all_by_topic(self):
         values = [
             {'host': 'host1', 'topic': 't1'},
@@ -2132,6 +2369,108 @@ class VolumeUsageDBApiTestCase(test.TestCase):
         timeutils.clear_time_override()
 
 
+class QuotaReservationTestCase(test.TestCase):
+
+    def setUp(self):
+        super(QuotaReservationTestCase, self).setUp()
+        self.useFixture(test.TimeOverride())
+        self.context = context.get_admin_context()
+        self.usages = {}
+        self.reservations = []
+        for resource, delta in (('instances', 1), ('cores', 2)):
+            usage = sqlalchemy_api._quota_usage_create(self.context, 'fake',
+                                                       resource, 0, delta,
+                                                       None)
+            self.usages[resource] = usage
+            reservation = db.reservation_create(self.context,
+                                                str(stdlib_uuid.uuid4()),
+                                                usage, 'fake', resource,
+                                                delta,
+                                                timeutils.utcnow())
+            self.reservations.append(reservation['uuid'])
+
+        self.statements = []
+
+        def fake_record(counter, statement, duration):
+            verb = statement.split()[0].upper()
+            table = 'quota_usages' if 'quota_usages' in statement else \
+                    'reservations'
+            if not self.statements or self.statements[-1] != (verb, table):
+                self.statements.append((verb, table))
+
+        self.stubs.Set(db_session.QueryCounter, 'record', fake_record)
+
+    def _get_usage(self, resource):
+        return sqlalchemy_api.model_query(self.context, models.QuotaUsage).\
+                filter_by(id=self.usages[resource]['id']).\
+                first()
+
+    def _assertUsagesLockedFirst(self):
+        self.assertEqual(self.statements,
+                         [('SELECT', 'reservations'),
+                          ('SELECT', 'quota_usages'),
+                          ('SELECT', 'reservations'),
+                          ('UPDATE', 'quota_usages'),
+                          ('UPDATE', 'reservations')])
+
+    def test_reservation_commit(self):
+        with db_session.count_queries():
+            db.reservation_commit(self.context, self.reservations)
+        self._assertUsagesLockedFirst()
+        self.assertEqual(self._get_usage('instances').in_use, 1)
+        self.assertEqual(self._get_usage('instances').reserved, 0)
+        self.assertEqual(self._get_usage('cores').in_use, 2)
+        self.assertEqual(self._get_usage('cores').reserved, 0)
+
+    def test_reservation_rollback(self):
+        with db_session.count_queries():
+            db.reservation_rollback(self.context, self.reservations)
+        self._assertUsagesLockedFirst()
+        self.assertEqual(self._get_usage('instances').in_use, 0)
+        self.assertEqual(self._get_usage('instances').reserved, 0)
+        self.assertEqual(self._get_usage('cores').in_use, 0)
+        self.assertEqual(self._get_usage('cores').reserved, 0)
+
+    def test_reservation_expire(self):
+        timeutils.advance_time_seconds(10)
+        with db_session.count_queries():
+            db.reservation_expire(self.context)
+        self._assertUsagesLockedFirst()
+        self.assertEqual(self._get_usage('cores').reserved, 0)
+
+    def test_reservation_commit_twice(self):
+        db.reservation_commit(self.context, self.reservations)
+        db.reservation_commit(self.context, self.reservations)
+        self.assertEqual(self._get_usage('instances').in_use, 1)
+        self.assertEqual(self._get_usage('cores').in_use, 2)
+
+    def test_quota_usage_refresh(self):
+        syncs = []
+
+        def fake_sync(context, project_id, session):
+            syncs.append(project_id)
+            return {'instances': 0}
+
+        resources = {'instances': FakeQuotaResource(fake_sync)}
+        sqlalchemy_api.model_query(self.context, models.QuotaUsage).\
+                filter_by(id=self.usages['instances']['id']).\
+                update({'updated_at': timeutils.utcnow()})
+        timeutils.advance_time_seconds(120)
+        db.quota_usage_refresh(self.context, resources, 0, 60)
+        self.assertEqual(syncs, ['fake'])
+        self.assertEqual(self._get_usage('instances').updated_at,
+                         timeutils.utcnow())
+
+        # The unchanged count was still refreshed, so it is not due again
+        db.quota_usage_refresh(self.context, resources, 0, 60)
+        self.assertEqual(syncs, ['fake'])
+
+
+class FakeQuotaResource(object):
+    def __init__(self, sync):
+        self.sync = sync
+
+
 class TaskLogTestCase(test.TestCase):
 
     def setUp(self):
@@ -2547,6 +2886,37 @@ class ArchiveTestCase(test.TestCase):
         # Verify we still have 4 in shadow
         self.assertEqual(len(rows8), 4)
 
+    def test_archive_deleted_rows_in_batches(self):
+        tablename = "instance_id_mappings"
+        for uuidstr in self.uuidstrs:
+            insert_statement = self.table1.insert().values(uuid=uuidstr)
+            self.conn.execute(insert_statement)
+        update_statement = self.table1.update().\
+                where(self.table1.c.uuid.in_(self.uuidstrs[:5]))\
+                .values(deleted=1)
+        self.conn.execute(update_statement)
+        self.stubs.Set(sqlalchemy_api, '_ARCHIVE_BATCH_SIZE', 2)
+        deletes = []
+        real_delete = Table.delete
+
+        def fake_delete(table, *args, **kwargs):
+            deletes.append(table.name)
+            return real_delete(table, *args, **kwargs)
+
+        self.stubs.Set(Table, 'delete', fake_delete)
+        query = select([self.shadow_table1]).\
+                where(self.shadow_table1.c.uuid.in_(self.uuidstrs))
+        # A max_rows larger than a batch is archived in several batches
+        archived = db.archive_deleted_rows_for_table(self.context, tablename,
+                                                     max_rows=3)
+        self.assertEqual(archived, 3)
+        self.assertEqual(deletes, [tablename] * 2)
+        self.assertEqual(len(self.conn.execute(query).fetchall()), 3)
+        # Without max_rows the remaining deleted rows are archived
+        archived = db.archive_deleted_rows_for_table(self.context, tablename)
+        self.assertEqual(archived, 2)
+        self.assertEqual(len(self.conn.execute(query).fetchall()), 5)
+
     def test_archive_deleted_rows_for_table(self):
         tablename = "instance_id_mappings"
         # Add 6 rows to table
@@ -2647,3 +3017,414 @@ class ArchiveTestCase(test.TestCase):
         # Then archiving console_pools should work.
         num = db.archive_deleted_rows_for_table(self.context, "console_pools")
         self.assertEqual(num, 1)
+
+    def test_archive_deleted_rows_fk_constraint_skips_referenced_rows(self):
+        if self.engine.url.get_dialect() == sqlite.dialect:
+            self.conn.execute("PRAGMA foreign_keys = ON")
+        pool_ids = []
+        for unused in xrange(3):
+            result = self.conn.execute(
+                self.console_pools.insert().values(deleted=1))
+            pool_ids.append(result.inserted_primary_key[0])
+        self.ids.extend(pool_ids)
+        # Only the first pool is still referenced by a console.
+        result = self.conn.execute(
+            self.consoles.insert().values(pool_id=pool_ids[0]))
+        self.ids.append(result.inserted_primary_key[0])
+        self.stubs.Set(sqlalchemy_api, '_ARCHIVE_BATCH_SIZE', 2)
+
+        num = db.archive_deleted_rows_for_table(self.context, "console_pools")
+        self.assertEqual(num, 2)
+        rows = self.conn.execute(select([self.console_pools.c.id]).where(
+            self.console_pools.c.id.in_(pool_ids))).fetchall()
+        self.assertEqual([row[0] for row in rows], pool_ids[:1])
+        rows = self.conn.execute(select([self.shadow_console_pools.c.id]).
+            where(self.shadow_console_pools.c.id.in_(pool_ids))).fetchall()
+        self.assertEqual(sorted(row[0] for row in rows), pool_ids[1:])
+        self.conn.execute(self.consoles.delete(
+            self.consoles.c.pool_id == pool_ids[0]))
+
+    def test_archive_deleted_rows_referencing_tables_first(self):
+        if self.engine.url.get_dialect() == sqlite.dialect:
+            self.conn.execute("PRAGMA foreign_keys = ON")
+        result = self.conn.execute(
+            self.console_pools.insert().values(deleted=1))
+        pool_id = result.inserted_primary_key[0]
+        self.ids.append(pool_id)
+        result = self.conn.execute(
+            self.consoles.insert().values(deleted=1, pool_id=pool_id))
+        self.ids.append(result.inserted_primary_key[0])
+
+        # Both rows go in one pass, as consoles is archived before the
+        # console_pools it references.
+        self.assertEqual(db.archive_deleted_rows(self.context), 2)
+        for table in (self.consoles, self.console_pools):
+            rows = self.conn.execute(select([table]).where(
+                table.c.id.in_(self.ids))).fetchall()
+            self.assertEqual(rows, [])
+        for table in (self.shadow_consoles, self.shadow_console_pools):
+            rows = self.conn.execute(select([table]).where(
+                table.c.id.in_(self.ids))).fetchall()
+            self.assertEqual(len(rows), 1)
+        self.assertEqual(db.archive_deleted_rows(self.context), 0)
+
+
+class ReplicaSafeTestCase(test.TestCase):
+    def setUp(self):
+        super(ReplicaSafeTestCase, self).setUp()
+        self.context = context.get_admin_context()
+        self.slave_sessions = 0
+
+        def fake_get_session(use_slave=False, **kwargs):
+            if use_slave:
+                self.slave_sessions += 1
+            return get_session(**kwargs)
+
+        self.stubs.Set(sqlalchemy_api, 'get_session', fake_get_session)
+
+    def test_replica_by_default(self):
+        db.compute_node_statistics(self.context)
+        self.assertEqual(self.slave_sessions, 1)
+
+    def test_replica_by_default_override(self):
+        db.compute_node_statistics(self.context, use_slave=False)
+        self.assertEqual(self.slave_sessions, 0)
+
+    def test_primary_by_default(self):
+        db.instance_get_all_by_filters(self.context, {})
+        self.assertEqual(self.slave_sessions, 0)
+
+    def test_primary_by_default_override(self):
+        db.instance_get_all_by_filters(self.context, {}, use_slave=True)
+        self.assertEqual(self.slave_sessions, 1)
+
+    def test_explicit_session_is_kept(self):
+        sqlalchemy_api.compute_node_statistics(self.context,
+                                               session=get_session())
+        self.assertEqual(self.slave_sessions, 0)
+
+
+class SlaveConnectionTestCase(test.TestCase):
+    def setUp(self):
+        super(SlaveConnectionTestCase, self).setUp()
+        self.addCleanup(self._reset_slave)
+
+    def _reset_slave(self):
+        sqlalchemy_api._SLAVE_ENGINE = None
+        sqlalchemy_api._SLAVE_MAKER = None
+
+    def test_without_slave_connection(self):
+        self.assertTrue(sqlalchemy_api.get_engine(use_slave=True) is
+                        get_engine())
+        session = sqlalchemy_api.get_session(use_slave=True)
+        self.assertTrue(session.bind is get_engine())
+
+    def test_with_slave_connection(self):
+        self.flags(slave_connection='sqlite://')
+        engine = sqlalchemy_api.get_engine(use_slave=True)
+        self.assertFalse(engine is get_engine())
+        self.assertTrue(sqlalchemy_api.get_engine(use_slave=True) is engine)
+        session = sqlalchemy_api.get_session(use_slave=True)
+        self.assertTrue(session.bind is engine)
+        self.assertTrue(sqlalchemy_api.get_session().bind is get_engine())
+
+
+class InstanceSerializedMetadataTestCase(test.TestCase):
+    def setUp(self):
+        super(InstanceSerializedMetadataTestCase, self).setUp()
+        self.context = context.get_admin_context()
+        self.instance = db.instance_create(self.context,
+            {'metadata': {'foo': 'bar'},
+             'system_metadata': {'instance_type_memory_mb': 512}})
+        self.uuid = self.instance['uuid']
+
+    def _serialized(self, column='serialized_metadata'):
+        instance = db.instance_get_by_uuid(self.context, self.uuid)
+        if instance[column] is None:
+            return None
+        return jsonutils.loads(instance[column])
+
+    def _clear_serialized(self):
+        sqlalchemy_api.model_query(self.context, models.Instance).\
+                filter_by(uuid=self.uuid).\
+                update({'serialized_metadata': None,
+                        'serialized_system_metadata': None})
+
+    def test_create(self):
+        self.assertEqual(self._serialized(), {'foo': 'bar'})
+        self.assertEqual(self._serialized('serialized_system_metadata'),
+                         {'instance_type_memory_mb': '512'})
+
+    def test_instance_update(self):
+        db.instance_update(self.context, self.uuid,
+                           {'metadata': {'baz': 'qux'},
+                            'system_metadata': {'a': 'b'}})
+        self.assertEqual(self._serialized(), {'baz': 'qux'})
+        self.assertEqual(self._serialized('serialized_system_metadata'),
+                         {'a': 'b'})
+
+    def test_metadata_update(self):
+        db.instance_metadata_update(self.context, self.uuid,
+                                    {'baz': 'qux'}, False)
+        self.assertEqual(self._serialized(), {'foo': 'bar', 'baz': 'qux'})
+        db.instance_metadata_update(self.context, self.uuid,
+                                    {'foo': 'quux'}, True)
+        self.assertEqual(self._serialized(), {'foo': 'quux'})
+
+    def test_metadata_delete(self):
+        db.instance_metadata_delete(self.context, self.uuid, 'foo')
+        self.assertEqual(self._serialized(), {})
+
+    def test_system_metadata_update(self):
+        db.instance_system_metadata_update(self.context, self.uuid,
+                                           {'a': 'b'}, False)
+        self.assertEqual(self._serialized('serialized_system_metadata'),
+                         {'instance_type_memory_mb': '512', 'a': 'b'})
+        db.instance_system_metadata_update(self.context, self.uuid,
+                                           {'a': 'c'}, True)
+        self.assertEqual(self._serialized('serialized_system_metadata'),
+                         {'a': 'c'})
+
+    def test_destroy(self):
+        db.instance_destroy(self.context, self.uuid)
+        self.context.read_deleted = 'yes'
+        self.assertEqual(self._serialized(), None)
+
+    def test_metadata_updates_lock_instance(self):
+        locked = []
+
+        def fake_lock(context, instance_uuid, session):
+            locked.append(instance_uuid)
+
+        self.stubs.Set(sqlalchemy_api, '_instance_lock_for_metadata',
+                       fake_lock)
+        db.instance_metadata_update(self.context, self.uuid,
+                                    {'baz': 'qux'}, False)
+        db.instance_metadata_delete(self.context, self.uuid, 'foo')
+        db.instance_system_metadata_update(self.context, self.uuid,
+                                           {'a': 'b'}, False)
+        self.assertEqual(locked, [self.uuid] * 3)
+
+    def test_primitive_omits_serialized_metadata(self):
+        instance = db.instance_get_by_uuid(self.context, self.uuid)
+        for primitive in (jsonutils.to_primitive(instance), dict(instance)):
+            self.assertEqual(primitive['uuid'], self.uuid)
+            self.assertFalse('serialized_metadata' in primitive)
+            self.assertFalse('serialized_system_metadata' in primitive)
+
+    def test_listing_reads_serialized_metadata(self):
+        self.flags(compact_instance_metadata=True)
+        with query_fixture.QueryBudget(1):
+            instances = db.instance_get_all_by_filters(self.context, {})
+        self.assertEqual(len(instances), 1)
+        self.assertFalse('serialized_metadata' in instances[0])
+        self.assertEqual(utils.metadata_to_dict(instances[0]['metadata']),
+                         {'foo': 'bar'})
+        self.assertEqual(
+            utils.metadata_to_dict(instances[0]['system_metadata']),
+            {'instance_type_memory_mb': '512'})
+
+    def test_listing_falls_back_to_metadata_tables(self):
+        self.flags(compact_instance_metadata=True)
+        self._clear_serialized()
+        instances = db.instance_get_all_by_filters(self.context, {})
+        self.assertEqual(utils.metadata_to_dict(instances[0]['metadata']),
+                         {'foo': 'bar'})
+        self.assertEqual(
+            utils.metadata_to_dict(instances[0]['system_metadata']),
+            {'instance_type_memory_mb': '512'})
+
+    def test_listing_ignores_serialized_metadata_by_default(self):
+        sqlalchemy_api.model_query(self.context, models.Instance).\
+                filter_by(uuid=self.uuid).\
+                update({'serialized_metadata': '{"stale": "value"}'})
+        instances = db.instance_get_all_by_filters(self.context, {})
+        self.assertEqual(utils.metadata_to_dict(instances[0]['metadata']),
+                         {'foo': 'bar'})
+
+    def test_instance_metadata_compact(self):
+        self._clear_serialized()
+        db.instance_create(self.context, {})
+        self.assertEqual(db.instance_metadata_compact(self.context, 10), 1)
+        self.assertEqual(db.instance_metadata_compact(self.context, 10), 0)
+        self.assertEqual(self._serialized(), {'foo': 'bar'})
+        self.assertEqual(self._serialized('serialized_system_metadata'),
+                         {'instance_type_memory_mb': '512'})
+
+
+class QueryCounterTestCase(test.TestCase):
+    def setUp(self):
+        super(QueryCounterTestCase, self).setUp()
+        self.context = context.RequestContext('fake', 'fake',
+                                              is_admin=True)
+        self.warnings = []
+
+        def fake_warn(msg, values):
+            self.warnings.append(values)
+
+        self.stubs.Set(db_session.LOG, 'warn', fake_warn)
+
+    def test_count_queries(self):
+        with db_session.count_queries(description='test') as counter:
+            db.service_get_all(self.context)
+            db.service_get_all(self.context)
+        self.assertEqual(counter.count, 2)
+        self.assertEqual(counter.statements.values(), [2])
+        self.assertTrue(counter.duration >= 0)
+        self.assertEqual(counter.request_id, self.context.request_id)
+
+        db.service_get_all(self.context)
+        self.assertEqual(counter.count, 2)
+
+    def test_nested_counters(self):
+        with db_session.count_queries() as outer:
+            db.service_get_all(self.context)
+            with db_session.count_queries() as inner:
+                db.service_get_all(self.context)
+        self.assertEqual(outer.count, 2)
+        self.assertEqual(inner.count, 1)
+
+    def test_warnings(self):
+        self.flags(sql_query_count_warning=2, sql_query_repeat_warning=2)
+        with db_session.count_queries(description='test'):
+            for i in range(2):
+                db.service_get_all(self.context)
+        self.assertEqual(self.warnings, [])
+
+        with db_session.count_queries(description='test'):
+            for i in range(3):
+                db.service_get_all(self.context)
+        self.assertEqual(len(self.warnings), 2)
+        self.assertEqual(self.warnings[0]['description'], 'test')
+        self.assertEqual(self.warnings[0]['count'], 3)
+        self.assertTrue('services' in self.warnings[1]['statement'])
+
+    def test_warnings_disabled(self):
+        self.flags(sql_query_count_warning=0, sql_query_time_warning=0,
+                   sql_query_repeat_warning=0)
+        with db_session.count_queries():
+            for i in range(200):
+                db.service_get_all(self.context)
+        self.assertEqual(self.warnings, [])
+
+    def test_query_budget(self):
+        with query_fixture.QueryBudget(1):
+            db.service_get_all(self.context)
+
+        budget = query_fixture.QueryBudget(1)
+        budget.setUp()
+        db.service_get_all(self.context)
+        db.service_get_all(self.context)
+        self.assertRaises(AssertionError, budget.cleanUp)
+
+    def test_query_budget_repeats(self):
+        budget = query_fixture.QueryBudget(10, max_repeats=1)
+        budget.setUp()
+        db.service_get_all(self.context)
+        db.service_get_all(self.context)
+        self.assertRaises(AssertionError, budget.cleanUp)
+
+    def test_instance_get_all_by_filters_budget(self):
+        for i in range(5):
+            db.instance_create(self.context,
+                               {'metadata': {'key': str(i)},
+                                'system_metadata': {'key': str(i)}})
+        with query_fixture.QueryBudget(5, max_repeats=1):
+            instances = db.instance_get_all_by_filters(self.context, {})
+        self.assertEqual(len(instances), 5)
+
+
+class FakeDBBackend(object):
+    def __init__(self):
+        self.calls = []
+
+    def instance_get(self, context, instance_id):
+        self.calls.append(instance_id)
+        if instance_id == 'missing':
+            raise exception.InstanceNotFound(instance_id=instance_id)
+        return {'id': instance_id}
+
+
+class DBAPITpoolTestCase(test.TestCase):
+    def setUp(self):
+        super(DBAPITpoolTestCase, self).setUp()
+        self.context = context.get_admin_context()
+        self.backend = FakeDBBackend()
+        self.stubs.Set(common_db_api.importutils, 'import_module',
+                       lambda path: self)
+        self.pool_sizes = []
+        self.executed = []
+        self.in_worker = False
+
+        def fake_execute(meth, *args, **kwargs):
+            # Like eventlet, run calls made from a worker thread directly.
+            if self.in_worker:
+                return meth(*args, **kwargs)
+            self.executed.append(meth)
+            self.in_worker = True
+            try:
+                return meth(*args, **kwargs)
+            finally:
+                self.in_worker = False
+
+        self.stubs.Set(tpool, 'set_num_threads', self.pool_sizes.append)
+        self.stubs.Set(tpool, 'execute', fake_execute)
+
+    def get_backend(self):
+        return self.backend
+
+    def test_tpool_disabled(self):
+        self.flags(dbapi_use_tpool=False)
+        dbapi = db.api.TpoolDBAPI(common_db_api.DBAPI())
+        self.assertEqual({'id': 1}, dbapi.instance_get(self.context, 1))
+        self.assertEqual([], self.executed)
+        self.assertEqual([], self.pool_sizes)
+        self.assertEqual(None, dbapi.get_tpool_metrics())
+
+    def test_tpool_sized_to_sql_pool(self):
+        self.flags(dbapi_use_tpool=True, sql_max_pool_size=42,
+                   sql_max_overflow=8)
+        dbapi = db.api.TpoolDBAPI(common_db_api.DBAPI())
+        self.assertEqual({'id': 1}, dbapi.instance_get(self.context, 1))
+        self.assertEqual(1, len(self.executed))
+        self.assertEqual([50], self.pool_sizes)
+        self.assertEqual(50, dbapi.get_tpool_metrics()['pool_size'])
+
+    def test_tpool_sized_to_default_overflow(self):
+        self.flags(dbapi_use_tpool=True, sql_max_pool_size=5,
+                   sql_max_overflow=None)
+        dbapi = db.api.TpoolDBAPI(common_db_api.DBAPI())
+        dbapi.instance_get(self.context, 1)
+        self.assertEqual([15], self.pool_sizes)
+
+    def test_tpool_metrics(self):
+        self.flags(dbapi_use_tpool=True, sql_max_pool_size=1)
+        dbapi = db.api.TpoolDBAPI(common_db_api.DBAPI())
+        dbapi.instance_get(self.context, 1)
+        self.assertRaises(exception.InstanceNotFound,
+                          dbapi.instance_get, self.context, 'missing')
+        self.assertEqual([1, 'missing'], self.backend.calls)
+
+        metrics = dbapi.get_tpool_metrics()
+        self.assertEqual(0, metrics['in_flight'])
+        self.assertEqual(0, metrics['queue_depth'])
+        stats = metrics['calls']['instance_get']
+        self.assertEqual(2, stats['count'])
+        self.assertTrue(stats['total_time'] >= stats['max_time'] >= 0)
+        self.assertTrue(stats['total_wait'] >= stats['max_wait'] >= 0)
+
+    def test_tpool_metrics_queue_depth(self):
+        metrics = db.api.TpoolMetrics(2)
+        for i in range(5):
+            metrics.dispatched()
+        self.assertEqual(3, metrics.queue_depth)
+        for i in range(4):
+            metrics.completed('instance_get', 0.5, 1.0)
+        metrics.dispatched()
+        result = metrics.to_dict()
+        self.assertEqual(2, result['in_flight'])
+        self.assertEqual(0, result['queue_depth'])
+        self.assertEqual(3, result['max_queue_depth'])
+        self.assertEqual({'count': 4, 'total_time': 4.0, 'max_time': 1.0,
+                          'total_wait': 2.0, 'max_wait': 0.5},
+                         result['calls']['instance_get'])
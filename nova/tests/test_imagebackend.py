@@ -476,3 +476,45 @@ class BackendTestCase(test.TestCase):
 
     def test_image_default(self):
         self._test_image('default', imagebackend.Raw, imagebackend.Qcow2)
+
+
+class CacheBaseImageTestCase(test.TestCase):
+    def setUp(self):
+        super(CacheBaseImageTestCase, self).setUp()
+        self.instances_path = self.useFixture(fixtures.TempDir()).path
+        self.flags(instances_path=self.instances_path)
+        self.base_path = os.path.join(self.instances_path,
+                                      CONF.base_dir_name, 'fake-image')
+        self.locks = []
+
+        def fake_synchronized(name, *args, **kwargs):
+            self.locks.append(name)
+            return lambda func: func
+
+        self.stubs.Set(imagebackend.lockutils, 'synchronized',
+                       fake_synchronized)
+
+    def test_cache_base_image(self):
+        fetches = []
+
+        def fake_fetch(target, **kwargs):
+            fetches.append((target, kwargs))
+            open(target, 'w').close()
+
+        path = imagebackend.cache_base_image(fake_fetch, 'fake-image',
+                                             image_id='fake-id')
+        self.assertEqual(self.base_path, path)
+        self.assertTrue(os.path.exists(path))
+        self.assertEqual([(path, {'image_id': 'fake-id'})], fetches)
+        self.assertEqual(['fake-image'], self.locks)
+
+    def test_cache_base_image_exists(self):
+        os.mkdir(os.path.dirname(self.base_path))
+        open(self.base_path, 'w').close()
+
+        def fake_fetch(target, *args, **kwargs):
+            self.fail('the cached image should not be fetched again')
+
+        path = imagebackend.cache_base_image(fake_fetch, 'fake-image')
+        self.assertEqual(self.base_path, path)
+        self.assertEqual(['fake-image'], self.locks)
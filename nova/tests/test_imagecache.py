@@ -51,6 +51,14 @@ class ImageCacheManagerTestCase(test.TestCase):
                                          'instance-00000003',
                                          'banana-42-hamster'])
 
+        # Run the background checksum worker synchronously
+        self.stubs.Set(imagecache.greenthread, 'spawn_n',
+                       lambda func, *args, **kwargs: func(*args, **kwargs))
+        # and read base images without tpool, whose setup spawns a
+        # greenthread of its own
+        self.stubs.Set(imagecache.tpool, 'execute',
+                       lambda func, *args, **kwargs: func(*args, **kwargs))
+
     def test_read_stored_checksum_missing(self):
         self.stubs.Set(os.path, 'exists', lambda x: False)
         csum = imagecache.read_stored_checksum('/tmp/foo', timestamped=False)
@@ -510,6 +518,155 @@ class ImageCacheManagerTestCase(test.TestCase):
             # side effect of creating the checksum
             self.assertTrue(os.path.exists(info_fname))
 
+    def _write_info(self, info_fname, **info):
+        with open(info_fname, 'w') as f:
+            f.write(json.dumps(info))
+
+    def test_verify_checksum_refreshes_timestamp(self):
+        self.flags(checksum_base_images=True)
+
+        with utils.tempdir() as tmpdir:
+            self.flags(instances_path=tmpdir)
+            self.flags(image_info_filename_pattern=('$instances_path/'
+                                                    '%(image)s.info'))
+            fname, info_fname, testdata = self._make_checksum(tmpdir)
+            old = time.time() - 7200
+            self._write_info(info_fname,
+                             sha1=hashlib.sha1(testdata).hexdigest(),
+                             **{'sha1-timestamp': old})
+
+            image_cache_manager = imagecache.ImageCacheManager()
+            self.assertTrue(image_cache_manager._verify_checksum('aaa',
+                                                                 fname))
+            (csum, timestamp) = imagecache.read_stored_checksum(fname)
+            self.assertTrue(timestamp > old)
+
+            # The image is not read again within checksum_interval_seconds
+            self.stubs.Set(image_cache_manager, '_hash_base_file', None)
+            self.assertTrue(image_cache_manager._verify_checksum('aaa',
+                                                                 fname))
+
+    def test_verify_checksum_claimed_by_other_host(self):
+        self.flags(checksum_base_images=True)
+
+        with utils.tempdir() as tmpdir:
+            self.flags(instances_path=tmpdir)
+            self.flags(image_info_filename_pattern=('$instances_path/'
+                                                    '%(image)s.info'))
+            fname, info_fname, testdata = self._make_checksum(tmpdir)
+            self._write_info(info_fname, sha1='banana',
+                             **{'sha1-timestamp': time.time() - 7200,
+                                'sha1-claim': 'otherhost',
+                                'sha1-claim-timestamp': time.time()})
+
+            image_cache_manager = imagecache.ImageCacheManager()
+            self.stubs.Set(image_cache_manager, '_hash_base_file', None)
+            res = image_cache_manager._verify_checksum('aaa', fname)
+            self.assertTrue(res is None)
+
+    def test_hash_base_file_rate_limited(self):
+        self.flags(checksum_read_size=10, checksum_max_read_rate=10)
+        clock = [1000.0]
+        delays = []
+
+        def fake_sleep(delay):
+            delays.append(delay)
+            clock[0] += delay
+
+        self.stubs.Set(imagecache.time, 'time', lambda: clock[0])
+        self.stubs.Set(imagecache.greenthread, 'sleep', fake_sleep)
+
+        with utils.tempdir() as tmpdir:
+            fname, info_fname, testdata = self._make_checksum(tmpdir)
+            image_cache_manager = imagecache.ImageCacheManager()
+            self.assertEqual(hashlib.sha1(testdata).hexdigest(),
+                             image_cache_manager._hash_base_file(fname))
+
+        self.assertEqual((len(testdata) + 9) // 10, len(delays))
+        self.assertEqual([1.0] * (len(testdata) // 10),
+                         delays[:len(testdata) // 10])
+
+    def test_hash_base_file_resumes(self):
+        self.flags(checksum_read_size=10)
+        reads = []
+
+        def fake_sleep(delay):
+            reads.append(delay)
+            if len(reads) == 2:
+                raise test.TestingException()
+
+        self.stubs.Set(imagecache.greenthread, 'sleep', fake_sleep)
+
+        with utils.tempdir() as tmpdir:
+            fname, info_fname, testdata = self._make_checksum(tmpdir)
+            image_cache_manager = imagecache.ImageCacheManager()
+            self.assertRaises(test.TestingException,
+                              image_cache_manager._hash_base_file, fname)
+            self.assertEqual(20,
+                image_cache_manager._checksum_jobs[fname]['offset'])
+
+            self.assertEqual(hashlib.sha1(testdata).hexdigest(),
+                             image_cache_manager._hash_base_file(fname))
+            self.assertEqual((len(testdata) + 9) // 10, len(reads))
+            self.assertEqual({}, image_cache_manager._checksum_jobs)
+
+    def test_hash_base_file_reads_with_tpool(self):
+        self.flags(checksum_read_size=10)
+        calls = []
+
+        def fake_execute(func, *args, **kwargs):
+            calls.append(func)
+            return func(*args, **kwargs)
+
+        self.stubs.Set(imagecache.tpool, 'execute', fake_execute)
+
+        with utils.tempdir() as tmpdir:
+            fname, info_fname, testdata = self._make_checksum(tmpdir)
+            image_cache_manager = imagecache.ImageCacheManager()
+            self.assertEqual(hashlib.sha1(testdata).hexdigest(),
+                             image_cache_manager._hash_base_file(fname))
+
+        self.assertEqual([imagecache._hash_chunk] *
+                         ((len(testdata) + 9) // 10 + 1), calls)
+
+    def test_hash_base_file_restarts_if_changed(self):
+        self.flags(checksum_read_size=10)
+
+        with utils.tempdir() as tmpdir:
+            fname, info_fname, testdata = self._make_checksum(tmpdir)
+            image_cache_manager = imagecache.ImageCacheManager()
+            image_cache_manager._checksum_jobs[fname] = {
+                'size': 1, 'mtime': 0, 'offset': 10,
+                'digest': hashlib.sha1()}
+            self.assertEqual(hashlib.sha1(testdata).hexdigest(),
+                             image_cache_manager._hash_base_file(fname))
+
+    def test_queue_checksum_in_background(self):
+        self.flags(checksum_base_images=True)
+        spawned = []
+        self.stubs.Set(imagecache.greenthread, 'spawn_n',
+                       lambda func: spawned.append(func))
+
+        image_cache_manager = imagecache.ImageCacheManager()
+        self.assertTrue(image_cache_manager._queue_checksum('1', '/a') is None)
+        self.assertTrue(image_cache_manager._queue_checksum('2', '/b') is None)
+        self.assertEqual(1, len(spawned))
+
+        verified = []
+
+        def fake_verify_checksum(img_id, base_file):
+            verified.append(img_id)
+            return img_id == '1'
+
+        self.stubs.Set(image_cache_manager, '_verify_checksum',
+                       fake_verify_checksum)
+        self.stubs.Set(os.path, 'isfile', lambda path: True)
+        spawned[0]()
+        self.assertEqual(['1', '2'], sorted(verified))
+        self.assertTrue(image_cache_manager._queue_checksum('1', '/a'))
+        self.assertFalse(image_cache_manager._queue_checksum('2', '/b'))
+        self.assertEqual(2, len(spawned))
+
     @contextlib.contextmanager
     def _make_base_file(self, checksum=True):
         """Make a base file for testing."""
@@ -235,6 +235,17 @@ class InstanceTypeTestCase(test.TestCase):
         inst_types = instance_types.get_all_types()
         self.assertEqual(total_instance_types, len(inst_types))
 
+    def test_get_all_types_summary(self):
+        # Ensure the summary changes when an instance type is added.
+        inst_types = instance_types.get_all_types()
+        summary = instance_types.get_all_types_summary()
+        self.assertEqual(len(inst_types), summary['count'])
+
+        instance_types.create('summary', 256, 1, 120, 100, 'summary1')
+        new_summary = instance_types.get_all_types_summary()
+        self.assertEqual(len(inst_types) + 1, new_summary['count'])
+        self.assertNotEqual(summary, new_summary)
+
     def test_invalid_create_args_should_fail(self):
         # Ensures that instance type creation fails with invalid args.
         invalid_sigs = [
@@ -0,0 +1,268 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import cStringIO
+import hashlib
+import os
+
+import eventlet
+import fixtures
+import webob
+
+from nova.openstack.common import jsonutils
+from nova import test
+from nova.virt import images
+from nova.virt.libvirt import imagecache
+from nova.virt.libvirt import imagepeer
+
+
+BASE_NAME = hashlib.sha1('fake-image').hexdigest()
+PRIVATE_NAME = hashlib.sha1('private-image').hexdigest()
+IMAGE_DATA = ''.join(chr(i % 256) for i in xrange(10000))
+# The cached copy has been converted, so differs from the Glance image.
+GLANCE_CHECKSUM = hashlib.md5('fake-image-in-glance').hexdigest()
+CONTENT_CHECKSUM = hashlib.md5(IMAGE_DATA).hexdigest()
+
+
+class FakeHTTPResponse(object):
+    def __init__(self, resp):
+        self.status = resp.status_int
+        self._headers = dict((k.lower(), v) for k, v in resp.headers.items())
+        self._body = cStringIO.StringIO(resp.body)
+
+    def getheader(self, name, default=None):
+        return self._headers.get(name.lower(), default)
+
+    def read(self, size=-1):
+        return self._body.read(size)
+
+
+class ImagePeerTestCase(test.TestCase):
+
+    def setUp(self):
+        super(ImagePeerTestCase, self).setUp()
+        instances_path = self.useFixture(fixtures.TempDir()).path
+        self.flags(instances_path=instances_path)
+        self.base_dir = os.path.join(instances_path, '_base')
+        os.mkdir(self.base_dir)
+        self.base_path = os.path.join(self.base_dir, BASE_NAME)
+        with open(self.base_path, 'wb') as f:
+            f.write(IMAGE_DATA)
+        imagepeer.record_image(self.base_path, GLANCE_CHECKSUM)
+        with open(os.path.join(self.base_dir, BASE_NAME + '_10'), 'wb') as f:
+            f.write('resized')
+        with open(os.path.join(self.base_dir, PRIVATE_NAME), 'wb') as f:
+            f.write('private')
+        self.app = imagepeer.ImagePeerApp(base_dir=self.base_dir,
+                                          clients=['127.0.0.1'])
+        self.requests = []
+        # Number of ranges a peer serves before its connection drops.
+        self.fail_after = {}
+
+        def fake_request(peer, method, name, headers=None, timeout=None):
+            self.requests.append((peer, method, headers))
+            if headers and peer in self.fail_after:
+                if not self.fail_after[peer]:
+                    raise IOError('connection reset')
+                self.fail_after[peer] -= 1
+            return FakeHTTPResponse(self._request(name, method=method,
+                                                  headers=headers or {}))
+
+        self.stubs.Set(imagepeer, '_request', fake_request)
+        self.flags(libvirt_image_peer_chunk_size=4096)
+        self.target = os.path.join(self.base_dir, 'target.part')
+
+    def _request(self, name, remote_addr='127.0.0.1', **kwargs):
+        req = webob.Request.blank('/%s' % name, **kwargs)
+        req.remote_addr = remote_addr
+        return req.get_response(self.app)
+
+    def _stub_glance(self, is_public=True):
+        class FakeImageService(object):
+            def show(self, context, image_id):
+                return {'checksum': GLANCE_CHECKSUM, 'size': 12345,
+                        'is_public': is_public}
+
+        self.stubs.Set(imagepeer.glance, 'get_remote_image_service',
+                       lambda context, href: (FakeImageService(), href))
+
+    def _stub_fetch_to_raw(self):
+        def fake_fetch_to_raw(context, image_href, path, user_id,
+                              project_id, fetch_func=None):
+            fetch_func(context, image_href, path + '.part', user_id,
+                       project_id)
+            os.rename(path + '.part', path)
+
+        self.stubs.Set(images, 'fetch_to_raw', fake_fetch_to_raw)
+
+    def test_index_lists_only_recorded_base_images(self):
+        resp = self._request('')
+        self.assertEqual(200, resp.status_int)
+        self.assertEqual({'images': [{'name': BASE_NAME,
+                                      'size': 10000,
+                                      'checksum': GLANCE_CHECKSUM,
+                                      'content_checksum': CONTENT_CHECKSUM}]},
+                         jsonutils.loads(resp.body))
+
+    def test_refuses_other_hosts(self):
+        resp = self._request(BASE_NAME, remote_addr='10.0.0.1')
+        self.assertEqual(403, resp.status_int)
+        resp = self._request('', remote_addr='10.0.0.1')
+        self.assertEqual(403, resp.status_int)
+
+    def test_clients_default_to_peers(self):
+        self.flags(libvirt_image_peers=['127.0.0.1:6070'])
+        self.app = imagepeer.ImagePeerApp(base_dir=self.base_dir)
+        self.assertEqual(200, self._request(BASE_NAME).status_int)
+
+    def test_get_range(self):
+        resp = self._request(BASE_NAME, headers={'Range': 'bytes=100-199'})
+        self.assertEqual(206, resp.status_int)
+        self.assertEqual(IMAGE_DATA[100:200], resp.body)
+        self.assertEqual(GLANCE_CHECKSUM, resp.headers['X-Image-Checksum'])
+        self.assertEqual(CONTENT_CHECKSUM,
+                         resp.headers['X-Image-Content-Checksum'])
+
+    def test_get_unrecorded_image_not_found(self):
+        self.assertEqual(404, self._request(PRIVATE_NAME).status_int)
+
+    def test_get_replaced_image_not_found(self):
+        with open(self.base_path, 'wb') as f:
+            f.write('replaced')
+        self.assertEqual(404, self._request(BASE_NAME).status_int)
+
+    def test_get_resized_image_not_found(self):
+        self.assertEqual(404, self._request(BASE_NAME + '_10').status_int)
+
+    def test_get_path_traversal_not_found(self):
+        self.assertEqual(404, self._request('../' + BASE_NAME).status_int)
+
+    def test_fetch_from_peers(self):
+        self.assertTrue(imagepeer.fetch_from_peers(
+            BASE_NAME, self.target, GLANCE_CHECKSUM, peers=['peer1']))
+        with open(self.target, 'rb') as f:
+            self.assertEqual(IMAGE_DATA, f.read())
+        ranges = [r[2]['Range'] for r in self.requests if r[2]]
+        self.assertEqual(['bytes=0-4095', 'bytes=4096-8191',
+                          'bytes=8192-9999'], ranges)
+
+    def test_fetch_from_peers_resumes_on_next_peer(self):
+        self.fail_after['peer1'] = 1
+        self.assertTrue(imagepeer.fetch_from_peers(
+            BASE_NAME, self.target, GLANCE_CHECKSUM,
+            peers=['peer1', 'peer2']))
+        with open(self.target, 'rb') as f:
+            self.assertEqual(IMAGE_DATA, f.read())
+        ranges = [(r[0], r[2]['Range']) for r in self.requests if r[2]]
+        self.assertEqual([('peer1', 'bytes=0-4095'),
+                          ('peer1', 'bytes=4096-8191'),
+                          ('peer2', 'bytes=4096-8191'),
+                          ('peer2', 'bytes=8192-9999')], ranges)
+
+    def test_fetch_from_peers_other_image_checksum(self):
+        self.assertFalse(imagepeer.fetch_from_peers(
+            BASE_NAME, self.target, 'other', peers=['peer1']))
+        self.assertFalse(os.path.exists(self.target))
+        self.assertEqual([('peer1', 'HEAD', None)], self.requests)
+
+    def test_fetch_from_peers_content_mismatch(self):
+        imagecache.write_stored_info(
+            self.base_path, field=imagepeer.INFO_FIELD,
+            value={'checksum': GLANCE_CHECKSUM, 'md5': 'bad',
+                   'size': 10000})
+        self.assertFalse(imagepeer.fetch_from_peers(
+            BASE_NAME, self.target, GLANCE_CHECKSUM, peers=['peer1']))
+        self.assertFalse(os.path.exists(self.target))
+
+    def test_probe_peers_ignores_slow_peers(self):
+        self.flags(libvirt_image_peer_probe_timeout=1)
+
+        def fake_probe_peer(peer, name, checksum):
+            if peer == 'slow':
+                eventlet.sleep(5)
+            return (10000, CONTENT_CHECKSUM)
+
+        self.stubs.Set(imagepeer, '_probe_peer', fake_probe_peer)
+        self.assertEqual({'fast': (10000, CONTENT_CHECKSUM)},
+                         imagepeer._probe_peers(['slow', 'fast'], BASE_NAME,
+                                                GLANCE_CHECKSUM))
+
+    def test_fetch_to_raw_without_peers_uses_glance(self):
+        calls = []
+
+        def fake_fetch(context, image_href, path, user_id, project_id):
+            calls.append(path)
+            open(path, 'wb').close()
+
+        self._stub_fetch_to_raw()
+        self.stubs.Set(images, 'fetch', fake_fetch)
+        self.stubs.Set(imagepeer.glance, 'get_remote_image_service', None)
+        target = os.path.join(self.base_dir, 'target')
+        imagepeer.fetch_to_raw(None, 'fake-image', target, 'user',
+                               'project')
+        self.assertEqual([target + '.part'], calls)
+        self.assertEqual([], self.requests)
+
+    def test_fetch_to_raw_falls_back_to_glance(self):
+        calls = []
+
+        def fake_fetch(context, image_href, path, user_id, project_id):
+            calls.append(path)
+            open(path, 'wb').close()
+
+        self.flags(libvirt_image_peers=['peer1'])
+        self._stub_glance()
+        self._stub_fetch_to_raw()
+        self.stubs.Set(images, 'fetch', fake_fetch)
+        os.unlink(self.base_path)
+        imagepeer.fetch_to_raw(None, 'fake-image', self.base_path, 'user',
+                               'project')
+        self.assertEqual([self.base_path + '.part'], calls)
+
+    def test_fetch_to_raw_from_peer(self):
+        self.flags(libvirt_image_peers=['peer1'])
+        self._stub_glance()
+        self._stub_fetch_to_raw()
+        self.stubs.Set(images, 'fetch', None)
+        target = os.path.join(self.useFixture(fixtures.TempDir()).path,
+                              BASE_NAME)
+        imagepeer.fetch_to_raw(None, 'fake-image', target, 'user', 'project')
+        with open(target, 'rb') as f:
+            self.assertEqual(IMAGE_DATA, f.read())
+
+    def _fetch_from_glance(self, is_public):
+        def fake_fetch(context, image_href, path, user_id, project_id):
+            with open(path, 'wb') as f:
+                f.write('converted')
+
+        self.flags(libvirt_image_peer_server=True)
+        self._stub_glance(is_public=is_public)
+        self._stub_fetch_to_raw()
+        self.stubs.Set(images, 'fetch', fake_fetch)
+        target = os.path.join(self.base_dir, hashlib.sha1('new').hexdigest())
+        imagepeer.fetch_to_raw(None, 'fake-image', target, 'user', 'project')
+        return imagecache.read_stored_info(target,
+                                           field=imagepeer.INFO_FIELD)
+
+    def test_fetch_to_raw_records_public_image(self):
+        self.assertEqual({'checksum': GLANCE_CHECKSUM,
+                          'md5': hashlib.md5('converted').hexdigest(),
+                          'size': len('converted')},
+                         self._fetch_from_glance(is_public=True))
+
+    def test_fetch_to_raw_does_not_record_private_image(self):
+        self.assertEqual(None, self._fetch_from_glance(is_public=False))
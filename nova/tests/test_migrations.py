@@ -54,9 +54,11 @@ import netaddr
 import sqlalchemy
 from sqlalchemy.dialects import postgresql
 from sqlalchemy.dialects import sqlite
+from sqlalchemy.engine import reflection
 import sqlalchemy.exc
 
 import nova.db.sqlalchemy.migrate_repo
+from nova.openstack.common import jsonutils
 from nova.openstack.common import lockutils
 from nova.openstack.common import log as logging
 from nova.openstack.common import timeutils
@@ -1106,6 +1108,64 @@ class TestNovaMigrations(BaseMigrationTestCase, CommonTestsMixIn):
                 self.assertEqual(result['value'], original['value'])
                 self.assertEqual(result['created_at'], None)
 
+    def _check_162(self, engine, data):
+        inspector = reflection.Inspector.from_engine(engine)
+        indexes = dict((index['name'], index['column_names'])
+                       for index in inspector.get_indexes('instances'))
+        self.assertEqual(['project_id', 'deleted', 'created_at', 'id'],
+                indexes['instances_project_id_deleted_created_at_id_idx'])
+        self.assertEqual(['deleted', 'created_at', 'id'],
+                         indexes['instances_deleted_created_at_id_idx'])
+        self.assertEqual(['display_name'],
+                         indexes['instances_display_name_idx'])
+
+    def _check_163(self, engine, data):
+        for table_name in ('instances', 'shadow_instances'):
+            table = get_table(engine, table_name)
+            self.assertTrue(isinstance(table.c.serialized_metadata.type,
+                                       sqlalchemy.types.Text))
+            self.assertTrue(isinstance(
+                table.c.serialized_system_metadata.type,
+                sqlalchemy.types.Text))
+
+    def _pre_upgrade_164(self, engine):
+        compute_nodes = get_table(engine, 'compute_nodes')
+        compute_node_stats = get_table(engine, 'compute_node_stats')
+        compute_nodes.insert().execute({
+            'id': 164, 'service_id': 1, 'vcpus': 1, 'memory_mb': 1,
+            'local_gb': 1,
+            'vcpus_used': 0, 'memory_mb_used': 0, 'local_gb_used': 0,
+            'hypervisor_type': 'fake', 'hypervisor_version': 1,
+            'cpu_info': '', 'deleted': 0})
+        compute_node_stats.insert().execute([
+            {'compute_node_id': 164, 'key': 'num_instances', 'value': '5',
+             'deleted': 0},
+            {'compute_node_id': 164, 'key': 'num_vm_active', 'value': '4',
+             'deleted': 0},
+            {'compute_node_id': 164, 'key': 'num_vm_error', 'value': '1',
+             'deleted': 1},
+        ])
+
+    def _check_164(self, engine, data):
+        compute_nodes = get_table(engine, 'compute_nodes')
+        row = compute_nodes.select(compute_nodes.c.id == 164).execute().\
+                first()
+        self.assertEqual({'num_instances': '5', 'num_vm_active': '4'},
+                         jsonutils.loads(row['stats']))
+        self.assertRaises(sqlalchemy.exc.NoSuchTableError, get_table,
+                          engine, 'compute_node_stats')
+        self.assertRaises(sqlalchemy.exc.NoSuchTableError, get_table,
+                          engine, 'shadow_compute_node_stats')
+
+    def _post_downgrade_164(self, engine):
+        compute_node_stats = get_table(engine, 'compute_node_stats')
+        rows = compute_node_stats.select(
+            compute_node_stats.c.compute_node_id == 164).execute()
+        self.assertEqual({'num_instances': '5', 'num_vm_active': '4'},
+                         dict((row['key'], row['value']) for row in rows))
+        compute_nodes = get_table(engine, 'compute_nodes')
+        self.assertFalse('stats' in compute_nodes.c)
+
 
 class TestBaremetalMigrations(BaseMigrationTestCase, CommonTestsMixIn):
     """Test sqlalchemy-migrate migrations."""
@@ -409,6 +409,39 @@ class DBCommandsTestCase(test.TestCase):
         self.assertRaises(SystemExit,
                           self.commands.archive_deleted_rows, -1)
 
+    def test_archive_deleted_rows_until_complete(self):
+        batches = [10, 3, 0]
+        calls = []
+        sleeps = []
+
+        def fake_archive_deleted_rows(context, max_rows):
+            calls.append(max_rows)
+            return batches.pop(0)
+
+        self.stubs.Set(db, 'archive_deleted_rows', fake_archive_deleted_rows)
+        self.stubs.Set(nova_manage.time, 'sleep', sleeps.append)
+        self.commands.archive_deleted_rows(10, until_complete=True, sleep=2)
+
+        self.assertEqual(calls, [10, 10, 10])
+        self.assertEqual(sleeps, [2, 2])
+
+    def test_compact_instance_metadata(self):
+        batches = [5, 2, 0]
+        calls = []
+
+        def fake_instance_metadata_compact(context, max_count):
+            calls.append(max_count)
+            return batches.pop(0)
+
+        self.stubs.Set(db, 'instance_metadata_compact',
+                       fake_instance_metadata_compact)
+        self.commands.compact_instance_metadata(5)
+        self.assertEqual(calls, [5, 5, 5])
+
+    def test_compact_instance_metadata_invalid_max_count(self):
+        self.assertRaises(SystemExit,
+                          self.commands.compact_instance_metadata, 0)
+
 
 class ServiceCommandsTestCase(test.TestCase):
     def setUp(self):
@@ -422,3 +455,51 @@ class ServiceCommandsTestCase(test.TestCase):
     def test_service_disable_invalid_params(self):
         self.assertRaises(SystemExit,
                           self.commands.disable, 'nohost', 'noservice')
+
+
+class ImageCommandsTestCase(test.TestCase):
+    def setUp(self):
+        super(ImageCommandsTestCase, self).setUp()
+        self.commands = nova_manage.ImageCommands()
+        self.useFixture(fixtures.MonkeyPatch('sys.stdout',
+                                             StringIO.StringIO()))
+        self.statuses = [{'host1': 'fetching', 'host2': 'queued'},
+                         {'host1': 'cached', 'host2': 'error'}]
+
+        def fake_prefetch_image(context, image_id, aggregate=None,
+                                availability_zone=None):
+            if aggregate == 'bogus':
+                raise exception.AggregateNotFound(aggregate_id=aggregate)
+            return ['host1', 'host2']
+
+        def fake_get_status(context, image_id, aggregate=None,
+                            availability_zone=None):
+            return self.statuses.pop(0)
+
+        self.stubs.Set(nova_manage.compute.api.HostAPI, 'prefetch_image',
+                       lambda s, *a, **kw: fake_prefetch_image(*a, **kw))
+        self.stubs.Set(nova_manage.compute.api.HostAPI,
+                       'get_image_prefetch_status',
+                       lambda s, *a, **kw: fake_get_status(*a, **kw))
+        self.stubs.Set(nova_manage.time, 'sleep', lambda seconds: None)
+
+    def test_prefetch(self):
+        self.assertEqual(None, self.commands.prefetch('fake-image'))
+        self.assertTrue('2 hosts' in sys.stdout.getvalue())
+        self.assertEqual(2, len(self.statuses))
+
+    def test_prefetch_wait(self):
+        self.commands.prefetch('fake-image', wait=True)
+        self.assertEqual([], self.statuses)
+        result = sys.stdout.getvalue()
+        self.assertTrue('0 of 2 hosts finished' in result)
+        self.assertTrue('2 of 2 hosts finished' in result)
+        self.assertTrue('error' in result)
+
+    def test_prefetch_aggregate_not_found(self):
+        self.assertEqual(2, self.commands.prefetch('fake-image',
+                                                   aggregate='bogus'))
+
+    def test_prefetch_status(self):
+        self.commands.prefetch_status('fake-image')
+        self.assertTrue('fetching' in sys.stdout.getvalue())
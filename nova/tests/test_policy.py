@@ -58,6 +58,22 @@ class PolicyFileTestCase(test.TestCase):
             self.assertRaises(exception.PolicyNotAuthorized, policy.enforce,
                               self.context, action, self.target)
 
+    def test_policy_file_checked_periodically(self):
+        self.flags(policy_file_check_interval=60)
+        checks = []
+
+        def fake_read_cached_file(*args, **kwargs):
+            checks.append(args)
+
+        self.stubs.Set(utils, 'read_cached_file', fake_read_cached_file)
+        policy.enforce(self.context, "example:test", self.target, False)
+        policy.enforce(self.context, "example:test", self.target, False)
+        self.assertEqual(len(checks), 0)
+
+        policy._POLICY_CHECKED -= 60
+        policy.enforce(self.context, "example:test", self.target, False)
+        self.assertEqual(len(checks), 1)
+
 
 class PolicyTestCase(test.TestCase):
     def setUp(self):
@@ -146,6 +162,49 @@ class PolicyTestCase(test.TestCase):
         policy.enforce(admin_context, lowercase_action, self.target)
         policy.enforce(admin_context, uppercase_action, self.target)
 
+    def test_enforce_remembers_decisions(self):
+        checks = []
+        real_check = common_policy.check
+
+        def fake_check(rule, target, creds, *args, **kwargs):
+            checks.append(rule)
+            return real_check(rule, target, creds, *args, **kwargs)
+
+        self.stubs.Set(common_policy, 'check', fake_check)
+        action = "example:my_file"
+        target_mine = {'project_id': 'fake'}
+        target_not_mine = {'project_id': 'another'}
+        for i in range(3):
+            policy.enforce(self.context, action, target_mine)
+            self.assertRaises(exception.PolicyNotAuthorized, policy.enforce,
+                              self.context, action, target_not_mine)
+        self.assertEqual(len(checks), 2)
+
+        # Decisions depend on the roles of the context...
+        self.context.roles.append('compute_admin')
+        policy.enforce(self.context, action, target_not_mine)
+        self.assertEqual(len(checks), 3)
+
+        # ...and on the rules
+        self.policy.set_rules({action: "!"})
+        self.assertRaises(exception.PolicyNotAuthorized, policy.enforce,
+                          self.context, action, target_not_mine)
+        self.assertEqual(len(checks), 4)
+
+    def test_enforce_does_not_remember_objects(self):
+        checks = []
+        real_check = common_policy.check
+
+        def fake_check(rule, target, creds, *args, **kwargs):
+            checks.append(rule)
+            return real_check(rule, target, creds, *args, **kwargs)
+
+        self.stubs.Set(common_policy, 'check', fake_check)
+        target = {'project_id': 'fake', 'metadata': []}
+        policy.enforce(self.context, "example:my_file", target)
+        policy.enforce(self.context, "example:my_file", target)
+        self.assertEqual(len(checks), 2)
+
 
 class DefaultPolicyTestCase(test.TestCase):
 
@@ -18,6 +18,7 @@
 
 import datetime
 
+from eventlet import greenpool
 from oslo.config import cfg
 
 from nova import compute
@@ -231,6 +232,43 @@ class QuotaIntegrationTestCase(test.TestCase):
 
         assertInstancesReserved(0)
 
+    def test_parallel_reservations(self):
+        self.flags(quota_instances=100)
+        pool = greenpool.GreenPool()
+        reservations = list(pool.imap(
+            lambda i: quota.QUOTAS.reserve(self.context, instances=1),
+            range(100)))
+
+        self.assertRaises(exception.OverQuota, quota.QUOTAS.reserve,
+                          self.context, instances=1)
+        usages = db.quota_usage_get_all_by_project(self.context,
+                                                   self.project_id)
+        self.assertEqual(usages['instances'], dict(in_use=0, reserved=100))
+
+        for reservation in reservations:
+            quota.QUOTAS.commit(self.context, reservation)
+        usages = db.quota_usage_get_all_by_project(self.context,
+                                                   self.project_id)
+        self.assertEqual(usages['instances'], dict(in_use=100, reserved=0))
+
+    def test_usage_refresh(self):
+        self.flags(until_refresh=1)
+        for i in range(2):
+            reservations = quota.QUOTAS.reserve(self.context, instances=1)
+            quota.QUOTAS.commit(self.context, reservations)
+        usage = db.quota_usage_get(self.context, self.project_id,
+                                   'instances')
+        self.assertEqual(usage['until_refresh'], 0)
+        self.assertEqual(usage['in_use'], 2)
+
+        # The usage is only recounted by the periodic refresh
+        self._create_instance()
+        quota.QUOTAS.usage_refresh(self.context)
+        usage = db.quota_usage_get(self.context, self.project_id,
+                                   'instances')
+        self.assertEqual(usage['until_refresh'], 1)
+        self.assertEqual(usage['in_use'], 1)
+
 
 class FakeContext(object):
     def __init__(self, project_id, quota_class):
@@ -307,6 +345,12 @@ class FakeDriver(object):
     def expire(self, context):
         self.called.append(('expire', context))
 
+    def usage_refresh(self, context, resources):
+        self.called.append(('usage_refresh', context, resources))
+
+    def limits_changed(self, project_id=None, quota_class=None):
+        self.called.append(('limits_changed', project_id, quota_class))
+
 
 class BaseResourceTestCase(test.TestCase):
     def test_no_flag(self):
@@ -703,6 +747,27 @@ class QuotaEngineTestCase(test.TestCase):
                 ('expire', context),
                 ])
 
+    def test_usage_refresh(self):
+        context = FakeContext(None, None)
+        driver = FakeDriver()
+        quota_obj = self._make_quota_obj(driver)
+        quota_obj.usage_refresh(context)
+
+        self.assertEqual(driver.called, [
+                ('usage_refresh', context, quota_obj._resources),
+                ])
+
+    def test_limits_changed(self):
+        driver = FakeDriver()
+        quota_obj = self._make_quota_obj(driver)
+        quota_obj.limits_changed(project_id='test_project')
+        quota_obj.limits_changed(quota_class='test_class')
+
+        self.assertEqual(driver.called, [
+                ('limits_changed', 'test_project', None),
+                ('limits_changed', None, 'test_class'),
+                ])
+
     def test_resources(self):
         quota_obj = self._make_quota_obj(None)
 
@@ -803,6 +868,51 @@ class DbQuotaDriverTestCase(test.TestCase):
                 injected_file_content_bytes=5 * 1024,
                 ))
 
+    def test_get_class_quotas_cached_per_request(self):
+        self._stub_quota_class_get_all_by_name()
+        context = FakeContext('test_project', 'test_class')
+        for i in range(3):
+            self.driver.get_class_quotas(context, quota.QUOTAS._resources,
+                                         'test_class')
+
+        self.assertEqual(self.calls, ['quota_class_get_all_by_name'])
+
+    def test_get_class_quotas_cached_with_ttl(self):
+        self.flags(quota_limit_cache_ttl=5)
+        self._stub_quota_class_get_all_by_name()
+        for i in range(2):
+            self.driver.get_class_quotas(
+                FakeContext('test_project', 'test_class'),
+                quota.QUOTAS._resources, 'test_class')
+        self.assertEqual(self.calls, ['quota_class_get_all_by_name'])
+
+        timeutils.advance_time_seconds(6)
+        self.driver.get_class_quotas(
+            FakeContext('test_project', 'test_class'),
+            quota.QUOTAS._resources, 'test_class')
+        self.assertEqual(self.calls, ['quota_class_get_all_by_name'] * 2)
+
+    def test_limits_changed(self):
+        self.flags(quota_limit_cache_ttl=5)
+        self._stub_get_by_project()
+        self._stub_quota_class_get_all_by_name()
+        context = FakeContext('test_project', 'test_class')
+        self.driver.get_project_quotas(context, quota.QUOTAS._resources,
+                                       'test_project', usages=False)
+        self.driver.limits_changed(project_id='test_project')
+        self.driver.get_project_quotas(context, quota.QUOTAS._resources,
+                                       'test_project', usages=False)
+        self.driver.limits_changed(quota_class='test_class')
+        self.driver.get_project_quotas(context, quota.QUOTAS._resources,
+                                       'test_project', usages=False)
+
+        self.assertEqual(self.calls, [
+                'quota_get_all_by_project',
+                'quota_class_get_all_by_name',
+                'quota_get_all_by_project',
+                'quota_class_get_all_by_name',
+                ])
+
     def _stub_get_by_project(self):
         def fake_qgabp(context, project_id):
             self.calls.append('quota_get_all_by_project')
@@ -1377,6 +1487,21 @@ class DbQuotaDriverTestCase(test.TestCase):
                      res, dict(in_use=-1)) for res in resources]
         self.assertEqual(calls, exemplar)
 
+    def test_usage_refresh(self):
+        def fake_quota_usage_refresh(context, resources, until_refresh,
+                                     max_age):
+            self.calls.append(('quota_usage_refresh', resources,
+                               until_refresh, max_age))
+        self.stubs.Set(db, 'quota_usage_refresh', fake_quota_usage_refresh)
+        self.flags(until_refresh=5, max_age=3600)
+
+        self.driver.usage_refresh(FakeContext('test_project', 'test_class'),
+                                  quota.QUOTAS._resources)
+
+        self.assertEqual(self.calls, [
+                ('quota_usage_refresh', quota.QUOTAS._resources, 5, 3600),
+                ])
+
 
 class FakeSession(object):
     def begin(self):
@@ -1424,14 +1549,26 @@ class QuotaReserveSqlAlchemyTestCase(test.TestCase):
 
         self.usages = {}
         self.usages_created = {}
+        self.usages_locked = None
+        self.swap_conflicts = 0
         self.reservations_created = {}
 
         def fake_get_session():
             return FakeSession()
 
-        def fake_get_quota_usages(context, session, project_id):
+        def fake_get_quota_usages(context, session, project_id,
+                                  resources=None, lock=False):
+            self.usages_locked = lock
             return self.usages.copy()
 
+        def fake_quota_usage_swap(context, session, usage, values):
+            if self.swap_conflicts:
+                self.swap_conflicts -= 1
+                return False
+            for key, value in values.items():
+                setattr(usage, key, value)
+            return True
+
         def fake_quota_usage_create(context, project_id, resource, in_use,
                                     reserved, until_refresh, session=None,
                                     save=True):
@@ -1455,6 +1592,7 @@ class QuotaReserveSqlAlchemyTestCase(test.TestCase):
 
         self.stubs.Set(sqa_api, 'get_session', fake_get_session)
         self.stubs.Set(sqa_api, '_get_quota_usages', fake_get_quota_usages)
+        self.stubs.Set(sqa_api, '_quota_usage_swap', fake_quota_usage_swap)
         self.stubs.Set(sqa_api, '_quota_usage_create', fake_quota_usage_create)
         self.stubs.Set(sqa_api, 'reservation_create', fake_reservation_create)
 
@@ -1648,23 +1786,23 @@ class QuotaReserveSqlAlchemyTestCase(test.TestCase):
         result = sqa_api.quota_reserve(context, self.resources, quotas,
                                        deltas, self.expire, 5, 0)
 
-        self.assertEqual(self.sync_called, set(['instances', 'cores', 'ram']))
+        self.assertEqual(self.sync_called, set([]))
         self.compare_usage(self.usages, [
                 dict(resource='instances',
                      project_id='test_project',
-                     in_use=2,
+                     in_use=3,
                      reserved=2,
-                     until_refresh=5),
+                     until_refresh=0),
                 dict(resource='cores',
                      project_id='test_project',
-                     in_use=2,
+                     in_use=3,
                      reserved=4,
-                     until_refresh=5),
+                     until_refresh=0),
                 dict(resource='ram',
                      project_id='test_project',
-                     in_use=2,
+                     in_use=3,
                      reserved=2 * 1024,
-                     until_refresh=5),
+                     until_refresh=0),
                 ])
         self.assertEqual(self.usages_created, {})
         self.compare_reservation(result, [
@@ -1705,21 +1843,21 @@ class QuotaReserveSqlAlchemyTestCase(test.TestCase):
         result = sqa_api.quota_reserve(context, self.resources, quotas,
                                        deltas, self.expire, 0, max_age)
 
-        self.assertEqual(self.sync_called, set(['instances', 'cores', 'ram']))
+        self.assertEqual(self.sync_called, set([]))
         self.compare_usage(self.usages, [
                 dict(resource='instances',
                      project_id='test_project',
-                     in_use=2,
+                     in_use=3,
                      reserved=2,
                      until_refresh=None),
                 dict(resource='cores',
                      project_id='test_project',
-                     in_use=2,
+                     in_use=3,
                      reserved=4,
                      until_refresh=None),
                 dict(resource='ram',
                      project_id='test_project',
-                     in_use=2,
+                     in_use=3,
                      reserved=2 * 1024,
                      until_refresh=None),
                 ])
@@ -1738,6 +1876,54 @@ class QuotaReserveSqlAlchemyTestCase(test.TestCase):
                      delta=2 * 1024),
                 ])
 
+    def _reserve_all(self, context):
+        quotas = dict(
+            instances=5,
+            cores=10,
+            ram=10 * 1024,
+            )
+        deltas = dict(
+            instances=2,
+            cores=4,
+            ram=2 * 1024,
+            )
+        return sqa_api.quota_reserve(context, self.resources, quotas,
+                                     deltas, self.expire, 0, 0)
+
+    def test_quota_reserve_retries_on_conflict(self):
+        self.init_usage('test_project', 'instances', 3, 0)
+        self.init_usage('test_project', 'cores', 3, 0)
+        self.init_usage('test_project', 'ram', 3, 0)
+        self.swap_conflicts = 2
+        context = FakeContext('test_project', 'test_class')
+        result = self._reserve_all(context)
+
+        self.assertEqual(self.swap_conflicts, 0)
+        self.assertFalse(self.usages_locked)
+        self.compare_usage(self.usages, [
+                dict(resource='instances', in_use=3, reserved=2),
+                dict(resource='cores', in_use=3, reserved=4),
+                dict(resource='ram', in_use=3, reserved=2 * 1024),
+                ])
+        self.assertEqual(len(result), 3)
+
+    def test_quota_reserve_locks_last_attempt(self):
+        self.flags(quota_reserve_attempts=2)
+        self.init_usage('test_project', 'instances', 3, 0)
+        self.init_usage('test_project', 'cores', 3, 0)
+        self.init_usage('test_project', 'ram', 3, 0)
+        self.swap_conflicts = 1
+        context = FakeContext('test_project', 'test_class')
+        result = self._reserve_all(context)
+
+        self.assertTrue(self.usages_locked)
+        self.compare_usage(self.usages, [
+                dict(resource='instances', in_use=3, reserved=2),
+                dict(resource='cores', in_use=3, reserved=4),
+                dict(resource='ram', in_use=3, reserved=2 * 1024),
+                ])
+        self.assertEqual(len(result), 3)
+
     def test_quota_reserve_no_refresh(self):
         self.init_usage('test_project', 'instances', 3, 0)
         self.init_usage('test_project', 'cores', 3, 0)
@@ -172,6 +172,31 @@ class ServiceTestCase(test.TestCase):
         serv.start()
 
 
+class QueryCountingDispatcherTestCase(test.TestCase):
+
+    def test_dispatch(self):
+        ctxt = context.RequestContext('fake', 'fake', is_admin=True)
+        warnings = []
+        self.stubs.Set(service.db_session.LOG, 'warn',
+                       lambda msg, values: warnings.append(values))
+        self.flags(sql_query_count_warning=1)
+
+        class FakeDispatcher(object):
+            def dispatch(self, ctxt, version, method, **kwargs):
+                db.service_get_all(ctxt)
+                db.service_get_all(ctxt)
+                return kwargs['arg']
+
+        dispatcher = service.QueryCountingDispatcher(FakeDispatcher(),
+                                                     'fake')
+        self.assertEqual(dispatcher.dispatch(ctxt, '1.0', 'method', arg=1),
+                         1)
+        self.assertEqual(len(warnings), 1)
+        self.assertEqual(warnings[0]['description'], 'fake.method')
+        self.assertEqual(warnings[0]['request_id'], ctxt.request_id)
+        self.assertEqual(warnings[0]['count'], 2)
+
+
 class TestWSGIService(test.TestCase):
 
     def setUp(self):
@@ -532,6 +532,21 @@ class GenericUtilsTestCase(test.TestCase):
                           utils.get_shortened_ipv6_cidr,
                           "failure")
 
+    def test_regex_literal_prefix(self):
+        self.assertEqual(('test', False), utils.regex_literal_prefix('^test'))
+        self.assertEqual(('test', True), utils.regex_literal_prefix('^test$'))
+        self.assertEqual(('10.0.0.1', True),
+                         utils.regex_literal_prefix('^10\\.0\\.0\\.1$'))
+        self.assertEqual(('te', False),
+                         utils.regex_literal_prefix('^tes*t$'))
+        self.assertEqual(('test', False),
+                         utils.regex_literal_prefix('^test.*'))
+        self.assertEqual(('test', False),
+                         utils.regex_literal_prefix('^test\\d'))
+        self.assertEqual(('', False), utils.regex_literal_prefix('^.*'))
+        self.assertEqual(None, utils.regex_literal_prefix('test'))
+        self.assertEqual(None, utils.regex_literal_prefix('^test|foo'))
+
 
 class MonkeyPatchTestCase(test.TestCase):
     """Unit test for utils.monkey_patch()."""
@@ -945,6 +960,116 @@ class WrappedCodeTestCase(test.TestCase):
         self.assertTrue('blue' in func_code.co_varnames)
 
 
+class LazyModuleTestCase(test.TestCase):
+    def test_imported_on_first_use(self):
+        imported = []
+
+        def fake_import_module(name):
+            imported.append(name)
+            return os.path
+
+        self.stubs.Set(utils.importutils, 'import_module', fake_import_module)
+        lazy = utils.LazyModule('os.path')
+        self.assertEqual(imported, [])
+        self.assertEqual(lazy.join, os.path.join)
+        self.assertEqual(lazy.sep, os.path.sep)
+        self.assertEqual(imported, ['os.path'])
+
+
+class RequestTimerTestCase(test.TestCase):
+    """Test the per greenthread request timers."""
+
+    def test_nothing_recorded_without_timer(self):
+        with utils.timed('fake'):
+            pass
+        timer = utils.start_request_timer()
+        utils.stop_request_timer(timer)
+        self.assertEqual(timer.durations, {})
+
+    def test_timed(self):
+        outer = utils.start_request_timer()
+        with utils.timed('fake'):
+            inner = utils.start_request_timer()
+            with utils.timed('other'):
+                pass
+            utils.stop_request_timer(inner)
+        utils.stop_request_timer(outer)
+        self.assertEqual(outer.counts, {'fake': 1, 'other': 1})
+        self.assertEqual(inner.counts, {'other': 1})
+        self.assertTrue(outer.duration >= outer.durations['fake'])
+
+    def test_format(self):
+        timer = utils.RequestTimer()
+        timer.record('rpc', 0.25)
+        timer.record('rpc', 0.5)
+        timer.record('db', 0.125)
+        timer.duration = 1
+        self.assertEqual(timer.format(),
+                         'total=1.000 db=0.125/1 rpc=0.750/2')
+
+    def test_time_calls(self):
+        class FakeClient(object):
+            def request(self, url):
+                return url
+
+        client = utils.time_calls(FakeClient(), 'request', 'fake')
+        self.assertTrue(utils.time_calls(client, 'missing', 'fake') is
+                        client)
+        timer = utils.start_request_timer()
+        self.assertEqual(client.request('/'), '/')
+        utils.stop_request_timer(timer)
+        self.assertEqual(timer.counts, {'fake': 1})
+
+    def test_time_calls_iterates(self):
+        now = [0]
+
+        def fake_time():
+            return now[0]
+
+        def replies():
+            for reply in ('a', 'b'):
+                now[0] += 1
+                yield reply
+
+        class FakeProxy(object):
+            def multicall(self):
+                now[0] += 1
+                return replies()
+
+        self.stubs.Set(utils.time, 'time', fake_time)
+        proxy = utils.time_calls(FakeProxy(), 'multicall', 'rpc',
+                                 iterates=True)
+        timer = utils.start_request_timer()
+        result = proxy.multicall()
+        self.assertEqual(timer.counts, {})
+        self.assertEqual(list(result), ['a', 'b'])
+        utils.stop_request_timer(timer)
+        self.assertEqual(timer.counts, {'rpc': 1})
+        self.assertEqual(timer.durations, {'rpc': 3})
+
+
+class PageItemsTestCase(test.TestCase):
+    def setUp(self):
+        super(PageItemsTestCase, self).setUp()
+        self.items = [{'id': 3}, {'id': 1}, {'id': 2}]
+
+    def test_unpaged(self):
+        self.assertEqual(utils.page_items(self.items), self.items)
+
+    def test_limit(self):
+        self.assertEqual(utils.page_items(self.items, limit=2),
+                         [{'id': 1}, {'id': 2}])
+
+    def test_marker(self):
+        self.assertEqual(utils.page_items(self.items, limit=1, marker='1'),
+                         [{'id': 2}])
+        self.assertEqual(utils.page_items(self.items, marker=3), [])
+
+    def test_marker_not_found(self):
+        self.assertRaises(exception.MarkerNotFound, utils.page_items,
+                          self.items, marker=4)
+
+
 class StringLengthTestCase(test.TestCase):
     def test_check_string_length(self):
         self.assertIsNone(utils.check_string_length(
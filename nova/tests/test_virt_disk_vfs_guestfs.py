@@ -201,3 +201,152 @@ class VirtDiskVFSGuestFSTest(test.TestCase):
         self.assertEquals(vfs.handle.files["/some/file"]["gid"], 600)
 
         vfs.teardown()
+
+
+class VirtDiskVFSGuestFSPoolTest(test.TestCase):
+
+    def setUp(self):
+        super(VirtDiskVFSGuestFSPoolTest, self).setUp()
+        sys.modules['guestfs'] = fakeguestfs
+        vfsimpl.guestfs = fakeguestfs
+        self.stubs.Set(vfsimpl, '_pool', None)
+        self.flags(libguestfs_pool_size=1)
+
+    def _setup(self, partition=None):
+        vfs = vfsimpl.VFSGuestFS(imgfile="/dummy.qcow2",
+                                 imgfmt="qcow2",
+                                 partition=partition)
+        vfs.setup()
+        return vfs
+
+    def test_pooled_setup_static_nopart(self):
+        vfs = self._setup()
+
+        self.assertTrue(vfs.pooled)
+        self.assertEqual(vfs.handle.running, True)
+        self.assertEqual(vfs.handle.drives, [("/dummy.qcow2", "qcow2")])
+        self.assertEqual(vfs.handle.mounts,
+                         [("", "/dev/disk/guestfs/novaimg", "/")])
+
+        handle = vfs.handle
+        vfs.teardown()
+
+        self.assertEqual(vfs.handle, None)
+        self.assertEqual(handle.running, True)
+        self.assertEqual(handle.closed, False)
+        self.assertEqual(handle.drives, [])
+        self.assertEqual(handle.mounts, [])
+        self.assertEqual(vfsimpl.get_pool().idle, [handle])
+
+    def test_pooled_setup_static_part(self):
+        vfs = self._setup(partition=2)
+        self.assertEqual(vfs.handle.mounts,
+                         [("", "/dev/disk/guestfs/novaimg2", "/")])
+        vfs.teardown()
+
+    def test_pooled_handle_reused(self):
+        vfs = self._setup()
+        handle = vfs.handle
+        vfs.teardown()
+
+        vfs = self._setup(partition=-1)
+        self.assertTrue(vfs.handle is handle)
+        self.assertEqual(len(vfs.handle.mounts), 2)
+        vfs.teardown()
+        self.assertEqual(vfsimpl.get_pool().in_use, 0)
+
+    def test_pool_exhausted_uses_dedicated_appliance(self):
+        vfs1 = self._setup()
+        vfs2 = self._setup()
+
+        self.assertTrue(vfs1.pooled)
+        self.assertFalse(vfs2.pooled)
+        self.assertEqual(vfs2.handle.mounts, [("", "/dev/sda", "/")])
+
+        handle = vfs2.handle
+        vfs2.teardown()
+        self.assertEqual(handle.closed, True)
+        vfs1.teardown()
+        self.assertEqual(len(vfsimpl.get_pool().idle), 1)
+
+    def test_unhealthy_handle_replaced(self):
+        vfs = self._setup()
+        handle = vfs.handle
+        vfs.teardown()
+        handle.shutdown()
+
+        vfs = self._setup()
+        self.assertFalse(vfs.handle is handle)
+        self.assertEqual(handle.closed, True)
+        vfs.teardown()
+
+    def test_attach_failure_uses_dedicated_appliance(self):
+        pooled = fakeguestfs.GuestFS()
+        pooled.launch()
+
+        def fake_add_drive_opts(file, *args, **kwargs):
+            raise RuntimeError("hotplugging not supported")
+
+        self.stubs.Set(pooled, 'add_drive_opts', fake_add_drive_opts)
+        self.stubs.Set(vfsimpl.GuestFSPool, '_launch', lambda self: pooled)
+
+        vfs = self._setup()
+        self.assertFalse(vfs.pooled)
+        self.assertEqual(vfs.handle.mounts, [("", "/dev/sda", "/")])
+        self.assertEqual(pooled.closed, True)
+        self.assertEqual(vfsimpl.get_pool().in_use, 0)
+        self.assertEqual(vfsimpl.get_pool().idle, [])
+        vfs.teardown()
+
+    def test_attach_without_label_support_disables_pool(self):
+        pooled = fakeguestfs.GuestFS()
+        pooled.launch()
+
+        def fake_add_drive_opts(file, format=None):
+            pass
+
+        self.stubs.Set(pooled, 'add_drive_opts', fake_add_drive_opts)
+        self.stubs.Set(vfsimpl.GuestFSPool, '_launch', lambda self: pooled)
+
+        vfs = self._setup()
+        self.assertFalse(vfs.pooled)
+        self.assertEqual(vfs.handle.mounts, [("", "/dev/sda", "/")])
+        self.assertEqual(pooled.closed, True)
+        self.assertFalse(vfsimpl.get_pool().supported)
+        vfs.teardown()
+
+        vfs = self._setup()
+        self.assertFalse(vfs.pooled)
+        vfs.teardown()
+
+    def test_pool_unsupported_without_remove_drive(self):
+        class OldGuestFS(fakeguestfs.GuestFS):
+            remove_drive = None
+
+        self.stubs.Set(fakeguestfs, 'GuestFS', OldGuestFS)
+
+        vfs = self._setup()
+        self.assertFalse(vfs.pooled)
+        self.assertEqual(vfs.handle.mounts, [("", "/dev/sda", "/")])
+        vfs.teardown()
+        self.assertEqual(vfsimpl.get_pool().idle, [])
+
+    def test_prelaunch_fills_pool(self):
+        self.flags(libguestfs_pool_size=2)
+        vfsimpl.prelaunch()
+
+        pool = vfsimpl.get_pool()
+        self.assertEqual(len(pool.idle), 2)
+        self.assertEqual(pool.in_use, 0)
+        self.assertTrue(all(handle.running for handle in pool.idle))
+
+        handles = list(pool.idle)
+        vfs = self._setup()
+        self.assertTrue(vfs.handle in handles)
+        vfs.teardown()
+        self.assertEqual(len(pool.idle), 2)
+
+    def test_prelaunch_disabled(self):
+        self.flags(libguestfs_pool_size=0)
+        vfsimpl.prelaunch()
+        self.assertEqual(vfsimpl._pool, None)
@@ -68,11 +68,6 @@ class GenerateConfigDriveTestCase(test.TestCase):
                 FakeInstanceMetadata))
 
         self.mox.StubOutWithMock(utils, 'execute')
-        utils.execute('genisoimage', '-o', mox.IgnoreArg(), '-ldots',
-                      '-allow-lowercase', '-allow-multidot', '-l',
-                      '-publisher', mox.IgnoreArg(), '-quiet',
-                      '-J', '-r', '-V', 'config-2', mox.IgnoreArg(),
-                      attempts=1, run_as_root=False).AndReturn(None)
         utils.execute('dd', mox.IgnoreArg(), mox.IgnoreArg(),
                       run_as_root=True).AndReturn(None)
 
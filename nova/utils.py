@@ -38,6 +38,7 @@ import tempfile
 import time
 from xml.sax import saxutils
 
+from eventlet import corolocal
 from eventlet import event
 from eventlet.green import subprocess
 from eventlet import greenthread
@@ -546,6 +547,23 @@ class LazyPluggable(object):
         return getattr(backend, key)
 
 
+class LazyModule(object):
+    """A module imported when one of its attributes is first used.
+
+    This keeps modules which are expensive to import, and only needed by
+    some requests, out of service startup.
+    """
+
+    def __init__(self, name):
+        self.__name = name
+        self.__module = None
+
+    def __getattr__(self, key):
+        if self.__module is None:
+            self.__module = importutils.import_module(self.__name)
+        return getattr(self.__module, key)
+
+
 class LoopingCallDone(Exception):
     """Exception to break out and stop a LoopingCall.
 
@@ -1000,6 +1018,29 @@ def convert_to_list_dict(lst, label):
     return [{label: x} for x in lst]
 
 
+def page_items(items, limit=None, marker=None, key='id'):
+    """Return a page of a list of dicts, like a DB API limit and marker.
+
+    The items are sorted by key and the page starts after the item whose
+    key is marker.  The list is returned unchanged when neither limit nor
+    marker is given.
+
+    Raises MarkerNotFound if no item has the marker.
+    """
+    if limit is None and marker is None:
+        return items
+    items = sorted(items, key=lambda item: item[key])
+    if marker is not None:
+        keys = [str(item[key]) for item in items]
+        try:
+            items = items[keys.index(str(marker)) + 1:]
+        except ValueError:
+            raise exception.MarkerNotFound(marker=marker)
+    if limit is not None:
+        items = items[:limit]
+    return items
+
+
 def timefunc(func):
     """Decorator that logs how long a particular function took to execute."""
     @functools.wraps(func)
@@ -1014,6 +1055,149 @@ def timefunc(func):
     return inner
 
 
+class RequestTimer(object):
+    """Seconds spent in each category of work done on behalf of a request.
+
+    Categories are not exclusive: an RPC call made from a hook counts
+    against both 'hooks' and 'rpc'.
+    """
+
+    def __init__(self):
+        self.start_time = time.time()
+        self.duration = None
+        self.durations = {}
+        self.counts = {}
+
+    def record(self, category, duration):
+        self.durations[category] = self.durations.get(category, 0) + duration
+        self.counts[category] = self.counts.get(category, 0) + 1
+
+    def stop(self):
+        self.duration = time.time() - self.start_time
+
+    def format(self):
+        """Return the timings as 'total=0.120 db=0.010/3 ...'.
+
+        Each category is shown as seconds/number of calls.
+        """
+        duration = self.duration
+        if duration is None:
+            duration = time.time() - self.start_time
+        parts = ['total=%.3f' % duration]
+        for category in sorted(self.durations):
+            parts.append('%s=%.3f/%d' % (category, self.durations[category],
+                                         self.counts[category]))
+        return ' '.join(parts)
+
+
+# The RequestTimers active in each greenthread, innermost last.
+_TIMERS = corolocal.local()
+
+
+def start_request_timer():
+    """Start timing the work done by the current greenthread."""
+    timer = RequestTimer()
+    timers = getattr(_TIMERS, 'timers', None)
+    if timers is None:
+        timers = _TIMERS.timers = []
+    timers.append(timer)
+    return timer
+
+
+def stop_request_timer(timer):
+    """Stop a timer returned by start_request_timer."""
+    timers = getattr(_TIMERS, 'timers', None) or []
+    if timer in timers:
+        timers.remove(timer)
+    timer.stop()
+    return timer
+
+
+def record_time(category, duration):
+    """Add duration seconds to category on the active RequestTimers."""
+    for timer in getattr(_TIMERS, 'timers', None) or []:
+        timer.record(category, duration)
+
+
+@contextlib.contextmanager
+def timed(category):
+    """Record the time spent in the block against category.
+
+    Work done in other greenthreads, for example by spawn_n(), is not
+    recorded.
+    """
+    if not getattr(_TIMERS, 'timers', None):
+        yield
+        return
+    start_time = time.time()
+    try:
+        yield
+    finally:
+        record_time(category, time.time() - start_time)
+
+
+def _time_iteration(iterator, category, duration):
+    """Yield the items of iterator, timing how long each takes to arrive.
+
+    The total, plus duration, is recorded against category as one call once
+    the iterator is exhausted or closed.
+    """
+    try:
+        while True:
+            start_time = time.time()
+            try:
+                item = iterator.next()
+            finally:
+                duration += time.time() - start_time
+            yield item
+    finally:
+        record_time(category, duration)
+
+
+def time_calls(obj, name, category, iterates=False):
+    """Record the time spent in calls to the method name of obj.
+
+    Only the given object is changed, so this can be applied to the
+    clients of other services as they are created. Objects without the
+    method are left alone.
+
+    With iterates, the method returns an iterator whose items arrive as it
+    is consumed, like rpc.multicall(), and the time spent waiting for them
+    is recorded along with the call itself.
+    """
+    func = getattr(obj, name, None)
+    if func is None:
+        return obj
+
+    @functools.wraps(func)
+    def inner(*args, **kwargs):
+        if not iterates:
+            with timed(category):
+                return func(*args, **kwargs)
+        start_time = time.time()
+        try:
+            result = iter(func(*args, **kwargs))
+        except Exception:
+            with excutils.save_and_reraise_exception():
+                record_time(category, time.time() - start_time)
+        return _time_iteration(result, category, time.time() - start_time)
+
+    setattr(obj, name, inner)
+    return obj
+
+
+def time_rpc_calls(proxy):
+    """Record the time an RpcProxy spends on messages as 'rpc'.
+
+    For multicall the time spent waiting for the replies is included.
+    """
+    for name in ('call', 'cast', 'fanout_cast', 'cast_to_server',
+                 'fanout_cast_to_server'):
+        time_calls(proxy, name, 'rpc')
+    time_calls(proxy, 'multicall', 'rpc', iterates=True)
+    return proxy
+
+
 @contextlib.contextmanager
 def remove_path_on_error(path):
     """Protect code that wants to operate on PATH atomically.
@@ -1063,6 +1247,38 @@ def sanitize_hostname(hostname):
     return hostname
 
 
+def regex_literal_prefix(pattern):
+    """Return the literal text every match of an anchored regex starts with.
+
+    Returns a (literal, exact) tuple, where exact is True if the regex only
+    matches the literal itself, or None if the regex is not anchored to the
+    start of the string or could match alternatives.
+    """
+    if not pattern.startswith('^') or '|' in pattern:
+        return None
+    literal = []
+    i = 1
+    while i < len(pattern):
+        char = pattern[i]
+        if char == '\\':
+            if i + 1 >= len(pattern) or pattern[i + 1].isalnum():
+                break
+            literal.append(pattern[i + 1])
+            i += 2
+            continue
+        if char == '$' and i == len(pattern) - 1:
+            return ''.join(literal), True
+        if char in '*?{':
+            # The preceding character is optional or repeated.
+            literal = literal[:-1]
+            break
+        if char in '.^$+[]()':
+            break
+        literal.append(char)
+        i += 1
+    return ''.join(literal), False
+
+
 def read_cached_file(filename, cache_info, reload_func=None):
     """Read from a file if it has been modified.
 
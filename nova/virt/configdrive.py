@@ -28,6 +28,8 @@ from nova.openstack.common import fileutils
 from nova.openstack.common import log as logging
 from nova import utils
 from nova import version
+from nova.virt.disk import iso9660
+from nova.virt.disk import vfat
 
 LOG = logging.getLogger(__name__)
 
@@ -48,7 +50,11 @@ configdrive_opts = [
     cfg.StrOpt('mkisofs_cmd',
                default='genisoimage',
                help='Name and optionally path of the tool used for '
-                    'ISO image creation')
+                    'ISO image creation'),
+    cfg.BoolOpt('config_drive_inprocess',
+                default=True,
+                help='Write config drive images directly instead of using '
+                     'mkisofs_cmd, or mkfs.vfat and a loop mount'),
     ]
 
 CONF = cfg.CONF
@@ -63,12 +69,8 @@ class ConfigDriveBuilder(object):
 
     def __init__(self, instance_md=None):
         self.imagefile = None
-
-        # TODO(mikal): I don't think I can use utils.tempdir here, because
-        # I need to have the directory last longer than the scope of this
-        # method call
-        self.tempdir = tempfile.mkdtemp(dir=CONF.config_drive_tempdir,
-                                        prefix='cd_gen_')
+        self.tempdir = None
+        self.files = []
 
         if instance_md is not None:
             self.add_instance_metadata(instance_md)
@@ -85,11 +87,23 @@ class ConfigDriveBuilder(object):
         self.cleanup()
 
     def _add_file(self, path, data):
-        filepath = os.path.join(self.tempdir, path)
-        dirname = os.path.dirname(filepath)
-        fileutils.ensure_tree(dirname)
-        with open(filepath, 'w') as f:
-            f.write(data)
+        if isinstance(data, unicode):
+            data = data.encode('utf-8')
+        self.files.append((path, data))
+
+    def _write_tempdir(self):
+        """Write the files to a temporary directory for external tools."""
+        # TODO(mikal): I don't think I can use utils.tempdir here, because
+        # I need to have the directory last longer than the scope of this
+        # method call
+        self.tempdir = tempfile.mkdtemp(dir=CONF.config_drive_tempdir,
+                                        prefix='cd_gen_')
+        for path, data in self.files:
+            filepath = os.path.join(self.tempdir, path)
+            dirname = os.path.dirname(filepath)
+            fileutils.ensure_tree(dirname)
+            with open(filepath, 'w') as f:
+                f.write(data)
 
     def add_instance_metadata(self, instance_md):
         for (path, value) in instance_md.metadata_for_config_drive():
@@ -97,12 +111,24 @@ class ConfigDriveBuilder(object):
             LOG.debug(_('Added %(filepath)s to config drive'),
                       {'filepath': path})
 
-    def _make_iso9660(self, path):
-        publisher = "%(product)s %(version)s" % {
+    def _publisher(self):
+        return "%(product)s %(version)s" % {
             'product': version.product_string(),
             'version': version.version_string_with_package()
             }
 
+    def _write_iso9660(self, path):
+        iso9660.write_image(path, self.files, 'config-2',
+                            publisher=self._publisher())
+
+    def _write_vfat(self, path):
+        vfat.write_image(path, self.files, 'config-2',
+                         CONFIGDRIVESIZE_BYTES)
+
+    def _make_iso9660(self, path):
+        self._write_tempdir()
+        publisher = self._publisher()
+
         utils.execute(CONF.mkisofs_cmd,
                       '-o', path,
                       '-ldots',
@@ -120,6 +146,8 @@ class ConfigDriveBuilder(object):
                       run_as_root=False)
 
     def _make_vfat(self, path):
+        self._write_tempdir()
+
         # NOTE(mikal): This is a little horrible, but I couldn't find an
         # equivalent to genisoimage for vfat filesystems.
         with open(path, 'w') as f:
@@ -160,9 +188,15 @@ class ConfigDriveBuilder(object):
         :raises ProcessExecuteError if a helper process has failed.
         """
         if CONF.config_drive_format == 'iso9660':
-            self._make_iso9660(path)
+            if CONF.config_drive_inprocess:
+                self._write_iso9660(path)
+            else:
+                self._make_iso9660(path)
         elif CONF.config_drive_format == 'vfat':
-            self._make_vfat(path)
+            if CONF.config_drive_inprocess:
+                self._write_vfat(path)
+            else:
+                self._make_vfat(path)
         else:
             raise exception.ConfigDriveUnknownFormat(
                 format=CONF.config_drive_format)
@@ -171,6 +205,8 @@ class ConfigDriveBuilder(object):
         if self.imagefile:
             utils.delete_if_exists(self.imagefile)
 
+        if not self.tempdir:
+            return
         try:
             shutil.rmtree(self.tempdir)
         except OSError, e:
@@ -0,0 +1,410 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Write small ISO9660 images with Joliet and Rock Ridge extensions without
+external tools.
+
+The primary volume descriptor describes a strictly conforming ISO9660 tree
+with uppercase 8.3 style names. Rock Ridge entries on that tree carry the
+original names and read-only permissions, as genisoimage -r would write
+them, and the Joliet supplementary volume descriptor describes the same files
+under their original names too. Linux presents the Rock Ridge names and
+Windows the Joliet ones.
+"""
+
+import re
+import struct
+import time
+
+SECTOR_SIZE = 2048
+
+# Volume descriptors start after the 16 sector system area.
+_FIRST_DESCRIPTOR = 16
+
+_DIR_FLAG = 2
+
+# UCS-2 level 3
+_JOLIET_ESCAPE = '%/E'
+
+_JOLIET_MAX_NAME = 64
+# Interchange level 1 names, 8.3 for files and 8 for directories
+_ISO_MAX_BASE = 8
+_ISO_MAX_EXT = 3
+
+_ISO_INVALID_CHARS = re.compile('[^A-Z0-9_]')
+
+# Keeps a primary tree directory record, with its Rock Ridge entries, within
+# the 255 bytes a record may take.
+_ROCK_RIDGE_MAX_NAME = 150
+
+_ROCK_RIDGE_ID = 'RRIP_1991A'
+_ROCK_RIDGE_DESCRIPTOR = ('THE ROCK RIDGE INTERCHANGE PROTOCOL PROVIDES '
+                          'SUPPORT FOR POSIX FILE SYSTEM SEMANTICS')
+_ROCK_RIDGE_SOURCE = ('PLEASE CONTACT DISC PUBLISHER FOR SPECIFICATION '
+                      'SOURCE.  SEE PUBLISHER IDENTIFIER IN PRIMARY VOLUME '
+                      'DESCRIPTOR FOR CONTACT INFORMATION.')
+
+# Read-only for everyone, like genisoimage -r.
+_FILE_MODE = 0100444
+_DIR_MODE = 040555
+
+
+def _both_16(value):
+    return struct.pack('<H', value) + struct.pack('>H', value)
+
+
+def _both_32(value):
+    return struct.pack('<I', value) + struct.pack('>I', value)
+
+
+def _sectors(size):
+    return (size + SECTOR_SIZE - 1) // SECTOR_SIZE
+
+
+def _pad(value, length, fill=' '):
+    return value[:length] + fill * (length - len(value[:length]))
+
+
+def _joliet(value, length=None):
+    encoded = value.encode('utf-16-be')
+    if length is None:
+        return encoded
+    return _pad(encoded, length, fill='\x00 ')[:length]
+
+
+def _recording_date(timestamp):
+    t = time.gmtime(timestamp)
+    return struct.pack('7B', t.tm_year - 1900, t.tm_mon, t.tm_mday,
+                       t.tm_hour, t.tm_min, t.tm_sec, 0)
+
+
+def _volume_date(timestamp):
+    return time.strftime('%Y%m%d%H%M%S00', time.gmtime(timestamp)) + '\x00'
+
+
+def _susp(signature, data):
+    """Return a System Use Sharing Protocol entry."""
+    return signature + struct.pack('BB', 4 + len(data), 1) + data
+
+
+def _rock_ridge_extension():
+    """Return the ER entry announcing the Rock Ridge extensions."""
+    return _susp('ER', struct.pack('BBBB', len(_ROCK_RIDGE_ID),
+                                   len(_ROCK_RIDGE_DESCRIPTOR),
+                                   len(_ROCK_RIDGE_SOURCE), 1) +
+                 _ROCK_RIDGE_ID + _ROCK_RIDGE_DESCRIPTOR + _ROCK_RIDGE_SOURCE)
+
+
+def _rock_ridge_attributes(entry):
+    """Return the PX entry for a file or directory."""
+    if entry.is_dir:
+        mode = _DIR_MODE
+        links = 2 + len([child for child in entry.children.values()
+                         if child.is_dir])
+    else:
+        mode = _FILE_MODE
+        links = 1
+    return _susp('PX', _both_32(mode) + _both_32(links) + _both_32(0) +
+                 _both_32(0))
+
+
+def _rock_ridge_name(name):
+    """Return the NM entry carrying the original name of an entry."""
+    if isinstance(name, unicode):
+        name = name.encode('utf-8')
+    return _susp('NM', '\x00' + name[:_ROCK_RIDGE_MAX_NAME])
+
+
+def _iso_name(name, is_dir, taken):
+    """Return a unique ISO9660 identifier for a file or directory name."""
+    name = name.upper()
+    if is_dir:
+        base, ext = name, None
+    else:
+        base, dot, ext = name.rpartition('.')
+        if not dot:
+            base, ext = ext, ''
+        ext = _ISO_INVALID_CHARS.sub('_', ext)[:_ISO_MAX_EXT]
+    base = _ISO_INVALID_CHARS.sub('_', base) or '_'
+    limit = _ISO_MAX_BASE
+
+    counter = 0
+    while True:
+        suffix = '_%d' % counter if counter else ''
+        candidate = base[:limit - len(suffix)] + suffix
+        if ext is not None:
+            candidate = '%s.%s;1' % (candidate, ext)
+        if candidate not in taken:
+            taken.add(candidate)
+            return candidate
+        counter += 1
+
+
+class _Entry(object):
+    def __init__(self, name, parent=None, data=None):
+        self.name = name
+        self.parent = parent
+        self.data = data
+        self.children = {}
+        self.extent = 0
+        # Per tree directory extent and size, keyed by tree name.
+        self.dir_extent = {}
+        self.dir_size = {}
+        self.ident = {}
+
+    @property
+    def is_dir(self):
+        return self.data is None
+
+
+class _Tree(object):
+    """One of the two directory hierarchies described by the image.
+
+    The records of a tree with rock_ridge set carry Rock Ridge entries. The
+    entries announcing the extensions do not fit in the root directory's
+    own record, so they are placed in a continuation area at
+    continuation_extent.
+    """
+
+    def __init__(self, name, root, rock_ridge=False):
+        self.name = name
+        self.root = root
+        self.rock_ridge = rock_ridge
+        self.continuation_extent = 0
+        self.directories = self._directories()
+
+    def continuation_area(self):
+        return _rock_ridge_extension()
+
+    def children(self, entry):
+        return sorted(entry.children.values(),
+                      key=lambda child: child.ident[self.name])
+
+    def _directories(self):
+        # Path tables require breadth first order, sorted by parent and
+        # then by identifier.
+        directories = [self.root]
+        for entry in directories:
+            directories.extend(child for child in self.children(entry)
+                               if child.is_dir)
+        return directories
+
+    def record(self, entry, ident, timestamp, size=None, extent=None,
+               system_use=''):
+        if size is None:
+            size = entry.dir_size[self.name] if entry.is_dir else len(
+                entry.data)
+        if extent is None:
+            extent = (entry.dir_extent[self.name] if entry.is_dir
+                      else entry.extent)
+        padding = '\x00' * (1 - len(ident) % 2)
+        system_use += '\x00' * (len(system_use) % 2)
+        length = 33 + len(ident) + len(padding) + len(system_use)
+        return (struct.pack('BB', length, 0) + _both_32(extent) +
+                _both_32(size) + _recording_date(timestamp) +
+                struct.pack('BBB', _DIR_FLAG if entry.is_dir else 0, 0, 0) +
+                _both_16(1) + struct.pack('B', len(ident)) + ident +
+                padding + system_use)
+
+    def _system_use(self, entry, name=None, first=False):
+        if not self.rock_ridge:
+            return ''
+        system_use = ''
+        if first:
+            # Only the first record of the root directory announces the
+            # extensions.
+            continuation = self.continuation_area()
+            system_use += (_susp('SP', '\xbe\xef\x00') +
+                           _susp('CE', _both_32(self.continuation_extent) +
+                                 _both_32(0) + _both_32(len(continuation))))
+        system_use += _rock_ridge_attributes(entry)
+        if name is not None:
+            system_use += _rock_ridge_name(name)
+        return system_use
+
+    def directory(self, entry, timestamp):
+        """Return the directory records for a directory, sector aligned."""
+        parent = entry.parent or entry
+        records = [self.record(entry, '\x00', timestamp,
+                               system_use=self._system_use(
+                                   entry, first=entry is self.root)),
+                   self.record(parent, '\x01', timestamp,
+                               system_use=self._system_use(parent))]
+        for child in self.children(entry):
+            records.append(self.record(child, child.ident[self.name],
+                                       timestamp,
+                                       system_use=self._system_use(
+                                           child, name=child.name)))
+
+        # Directory records may not cross sector boundaries.
+        data = ''
+        for record in records:
+            used = len(data) % SECTOR_SIZE
+            if used + len(record) > SECTOR_SIZE:
+                data += '\x00' * (SECTOR_SIZE - used)
+            data += record
+        return data + '\x00' * (-len(data) % SECTOR_SIZE)
+
+    def path_table(self, byte_order):
+        numbers = dict((id(entry), i + 1)
+                       for i, entry in enumerate(self.directories))
+        table = ''
+        for entry in self.directories:
+            ident = entry.ident[self.name] if entry.parent else '\x00'
+            parent = numbers[id(entry.parent or entry)]
+            table += (struct.pack('BB', len(ident), 0) +
+                      struct.pack(byte_order + 'IH',
+                                  entry.dir_extent[self.name], parent) +
+                      ident + '\x00' * (len(ident) % 2))
+        return table
+
+
+def _build_tree(files):
+    root = _Entry('')
+    for path, data in files:
+        parts = [part for part in path.split('/') if part]
+        if not parts:
+            raise ValueError(_('Invalid file path %r') % path)
+        entry = root
+        for part in parts[:-1]:
+            entry = entry.children.setdefault(part, _Entry(part, entry))
+            if not entry.is_dir:
+                raise ValueError(_('%r is both a file and a directory') %
+                                 part)
+        if parts[-1] in entry.children:
+            raise ValueError(_('Duplicate file path %r') % path)
+        entry.children[parts[-1]] = _Entry(parts[-1], entry, data)
+
+    def assign_identifiers(entry):
+        taken = set()
+        for name in sorted(entry.children):
+            child = entry.children[name]
+            child.ident['iso'] = _iso_name(name, child.is_dir, taken)
+            joliet_name = name[:_JOLIET_MAX_NAME - (0 if child.is_dir
+                                                     else 2)]
+            child.ident['joliet'] = _joliet(
+                joliet_name if child.is_dir else joliet_name + ';1')
+            if child.is_dir:
+                assign_identifiers(child)
+
+    assign_identifiers(root)
+    return root
+
+
+def _volume_descriptor(tree, descriptor_type, volume_id, publisher,
+                       path_table_size, l_table, m_table, total_sectors,
+                       timestamp):
+    if tree.name == 'joliet':
+        text = _joliet
+        escape = _pad(_JOLIET_ESCAPE, 32, fill='\x00')
+    else:
+        text = _pad
+        escape = '\x00' * 32
+
+    root_record = tree.record(tree.root, '\x00', timestamp)
+    date = _volume_date(timestamp)
+    descriptor = (struct.pack('B', descriptor_type) + 'CD001\x01\x00' +
+                  text('', 32) + text(volume_id, 32) + '\x00' * 8 +
+                  _both_32(total_sectors) + escape + _both_16(1) +
+                  _both_16(1) + _both_16(SECTOR_SIZE) +
+                  _both_32(path_table_size) + struct.pack('<I', l_table) +
+                  '\x00' * 4 + struct.pack('>I', m_table) + '\x00' * 4 +
+                  root_record + text('', 128) + text(publisher, 128) +
+                  text('', 128) + text('', 128) + text('', 37) +
+                  text('', 37) + text('', 37) + date + date +
+                  '0' * 16 + '\x00' + date + '\x01\x00')
+    return descriptor + '\x00' * (SECTOR_SIZE - len(descriptor))
+
+
+def write_image(path, files, volume_id, publisher=''):
+    """Write an ISO9660 image containing files to path.
+
+    :param files: an iterable of (path, data) tuples, where path is a
+                  '/' separated path relative to the root of the image.
+    :param volume_id: the volume label.
+    """
+    timestamp = time.time()
+    root = _build_tree(files)
+    trees = [_Tree('iso', root, rock_ridge=True), _Tree('joliet', root)]
+
+    # Directory sizes only depend on names, so they can be computed before
+    # any extent is known.
+    for tree in trees:
+        for entry in tree.directories:
+            entry.dir_extent[tree.name] = 0
+            entry.dir_size[tree.name] = 0
+        for entry in tree.directories:
+            entry.dir_size[tree.name] = len(tree.directory(entry, timestamp))
+
+    # Primary, Joliet and terminator volume descriptors, then the L and M
+    # path tables of each tree, then directories, the Rock Ridge
+    # continuation area and finally file data. Readers which stream the
+    # image expect continuation areas after the directories using them.
+    sector = _FIRST_DESCRIPTOR + 3
+    tables = {}
+    for tree in trees:
+        size = len(tree.path_table('<'))
+        tables[tree.name] = (size, sector, sector + _sectors(size))
+        sector += 2 * _sectors(size)
+    for tree in trees:
+        for entry in tree.directories:
+            entry.dir_extent[tree.name] = sector
+            sector += _sectors(entry.dir_size[tree.name])
+    rock_ridge_tree = trees[0]
+    rock_ridge_tree.continuation_extent = sector
+    continuation = rock_ridge_tree.continuation_area()
+    sector += _sectors(len(continuation))
+
+    file_entries = []
+
+    def collect_files(entry):
+        for name in sorted(entry.children):
+            child = entry.children[name]
+            if child.is_dir:
+                collect_files(child)
+            else:
+                file_entries.append(child)
+
+    collect_files(root)
+    for entry in file_entries:
+        if entry.data:
+            entry.extent = sector
+            sector += _sectors(len(entry.data))
+    total_sectors = sector
+
+    with open(path, 'wb') as f:
+        f.write('\x00' * SECTOR_SIZE * _FIRST_DESCRIPTOR)
+        for descriptor_type, tree in zip((1, 2), trees):
+            size, l_table, m_table = tables[tree.name]
+            f.write(_volume_descriptor(tree, descriptor_type, volume_id,
+                                       publisher, size, l_table, m_table,
+                                       total_sectors, timestamp))
+        terminator = '\xffCD001\x01'
+        f.write(terminator + '\x00' * (SECTOR_SIZE - len(terminator)))
+
+        for tree in trees:
+            for byte_order in ('<', '>'):
+                table = tree.path_table(byte_order)
+                f.write(table + '\x00' * (-len(table) % SECTOR_SIZE))
+        for tree in trees:
+            for entry in tree.directories:
+                f.write(tree.directory(entry, timestamp))
+        f.write(continuation + '\x00' * (-len(continuation) % SECTOR_SIZE))
+        for entry in file_entries:
+            if entry.data:
+                f.write(entry.data)
+                f.write('\x00' * (-len(entry.data) % SECTOR_SIZE))
@@ -0,0 +1,298 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Write FAT16 filesystem images with long file names without mounting.
+
+The image is written directly to a file, so neither root privileges nor
+loop devices are needed. Every file and directory is given a VFAT long
+file name entry holding its original name, alongside a generated 8.3
+short name.
+"""
+
+import random
+import re
+import struct
+import time
+
+SECTOR_SIZE = 512
+
+_DIR_ENTRY_SIZE = 32
+_ROOT_ENTRIES = 512
+_RESERVED_SECTORS = 1
+_NUM_FATS = 2
+_MEDIA = 0xf8
+_END_OF_CHAIN = 0xffff
+
+# FAT16 volumes have between 4085 and 65524 clusters.
+_MIN_CLUSTERS = 4085
+_MAX_CLUSTERS = 65524
+
+_ATTR_VOLUME_ID = 0x08
+_ATTR_DIRECTORY = 0x10
+_ATTR_ARCHIVE = 0x20
+_ATTR_LONG_NAME = 0x0f
+
+_LFN_CHARS = 13
+
+_SHORT_INVALID_CHARS = re.compile("[^A-Z0-9!#$%&'()@^_`{}~-]")
+
+
+def _dos_datetime(timestamp):
+    t = time.localtime(timestamp)
+    date = ((max(t.tm_year, 1980) - 1980) << 9) | (t.tm_mon << 5) | t.tm_mday
+    dos_time = (t.tm_hour << 11) | (t.tm_min << 5) | (t.tm_sec // 2)
+    return date, dos_time
+
+
+def _short_name(name, taken):
+    """Return a unique 11 byte 8.3 name for a long file name."""
+    upper = name.upper()
+    base, dot, ext = upper.rpartition('.')
+    if not dot or not base:
+        base, ext = upper, ''
+    clean_base = _SHORT_INVALID_CHARS.sub('_', base.replace(' ', ''))
+    clean_ext = _SHORT_INVALID_CHARS.sub('_', ext.replace(' ', ''))[:3]
+
+    lossless = (clean_base == base and clean_ext == ext and
+                0 < len(base) <= 8)
+    if lossless:
+        candidate = base.ljust(8) + ext.ljust(3)
+        if candidate not in taken:
+            taken.add(candidate)
+            return candidate
+
+    clean_base = clean_base or '_'
+    counter = 1
+    while True:
+        tail = '~%d' % counter
+        candidate = (clean_base[:8 - len(tail)] + tail).ljust(8)
+        candidate += clean_ext.ljust(3)
+        if candidate not in taken:
+            taken.add(candidate)
+            return candidate
+        counter += 1
+
+
+def _lfn_checksum(short_name):
+    checksum = 0
+    for char in short_name:
+        checksum = (((checksum & 1) << 7) + (checksum >> 1) +
+                    ord(char)) & 0xff
+    return checksum
+
+
+def _lfn_entries(name, short_name):
+    """Return the long file name entries preceding a short entry."""
+    chars = [ord(c) for c in name]
+    if len(chars) % _LFN_CHARS:
+        chars.append(0)
+        chars.extend([0xffff] * (-len(chars) % _LFN_CHARS))
+    checksum = _lfn_checksum(short_name)
+
+    entries = []
+    count = len(chars) // _LFN_CHARS
+    for seq in range(count, 0, -1):
+        part = chars[(seq - 1) * _LFN_CHARS:seq * _LFN_CHARS]
+        order = seq | (0x40 if seq == count else 0)
+        entries.append(struct.pack('<B5HBBB6HH2H', order, *(
+            part[:5] + [_ATTR_LONG_NAME, 0, checksum] + part[5:11] +
+            [0] + part[11:])))
+    return entries
+
+
+def _entry(name, attr, cluster, size, timestamp):
+    date, dos_time = _dos_datetime(timestamp)
+    return struct.pack('<11sBBBHHHHHHHI', name, attr, 0, 0, dos_time, date,
+                       date, 0, dos_time, date, cluster, size)
+
+
+class _Node(object):
+    def __init__(self, name, data=None):
+        self.name = name
+        self.data = data
+        self.children = {}
+        self.cluster = 0
+        self.short_name = None
+
+    @property
+    def is_dir(self):
+        return self.data is None
+
+
+def _build_tree(files):
+    root = _Node('')
+    for path, data in files:
+        parts = [part for part in path.split('/') if part]
+        if not parts:
+            raise ValueError(_('Invalid file path %r') % path)
+        node = root
+        for part in parts[:-1]:
+            node = node.children.setdefault(part, _Node(part))
+            if not node.is_dir:
+                raise ValueError(_('%r is both a file and a directory') %
+                                 part)
+        if parts[-1] in node.children:
+            raise ValueError(_('Duplicate file path %r') % path)
+        node.children[parts[-1]] = _Node(parts[-1], data)
+    return root
+
+
+class _Layout(object):
+    """Geometry of a FAT16 filesystem of a given size."""
+
+    def __init__(self, size):
+        self.total_sectors = size // SECTOR_SIZE
+        self.root_sectors = _ROOT_ENTRIES * _DIR_ENTRY_SIZE // SECTOR_SIZE
+
+        self.sectors_per_cluster = 1
+        while True:
+            self.fat_sectors = 1
+            while True:
+                self.clusters = ((self.total_sectors - _RESERVED_SECTORS -
+                                  _NUM_FATS * self.fat_sectors -
+                                  self.root_sectors) //
+                                 self.sectors_per_cluster)
+                needed = -(-(self.clusters + 2) * 2 // SECTOR_SIZE)
+                if needed <= self.fat_sectors:
+                    break
+                self.fat_sectors = needed
+            if self.clusters <= _MAX_CLUSTERS:
+                break
+            self.sectors_per_cluster *= 2
+
+        if self.clusters < _MIN_CLUSTERS or self.sectors_per_cluster > 128:
+            raise ValueError(_('Cannot create a FAT16 filesystem of %d '
+                               'bytes') % size)
+
+        self.cluster_size = self.sectors_per_cluster * SECTOR_SIZE
+        self.root_offset = (_RESERVED_SECTORS +
+                            _NUM_FATS * self.fat_sectors) * SECTOR_SIZE
+        self.data_offset = self.root_offset + self.root_sectors * SECTOR_SIZE
+
+    def cluster_offset(self, cluster):
+        return self.data_offset + (cluster - 2) * self.cluster_size
+
+    def clusters_for(self, size):
+        return -(-size // self.cluster_size)
+
+
+def _boot_sector(layout, label):
+    total_16 = layout.total_sectors if layout.total_sectors < 0x10000 else 0
+    total_32 = 0 if total_16 else layout.total_sectors
+    sector = (struct.pack('<3s8sHBHBHHBHHHII', '\xeb\x3c\x90', 'MSWIN4.1',
+                          SECTOR_SIZE, layout.sectors_per_cluster,
+                          _RESERVED_SECTORS, _NUM_FATS, _ROOT_ENTRIES,
+                          total_16, _MEDIA, layout.fat_sectors, 32, 64, 0,
+                          total_32) +
+              struct.pack('<BBBI11s8s', 0x80, 0, 0x29,
+                          random.randint(0, 0xffffffff), label, 'FAT16   '))
+    return sector + '\x00' * (SECTOR_SIZE - 2 - len(sector)) + '\x55\xaa'
+
+
+def write_image(path, files, label, size):
+    """Write a FAT16 filesystem image of size bytes containing files.
+
+    :param files: an iterable of (path, data) tuples, where path is a
+                  '/' separated path relative to the root of the image.
+    :param label: the volume label, at most 11 characters.
+    """
+    timestamp = time.time()
+    layout = _Layout(size)
+    label = label[:11].ljust(11)
+    root = _build_tree(files)
+
+    # Directory contents only depend on names, so every directory and file
+    # can be given its clusters before anything is written.
+    fat = [_MEDIA | 0xff00, _END_OF_CHAIN]
+
+    def allocate(node, length):
+        clusters = layout.clusters_for(length)
+        if not clusters:
+            return
+        node.cluster = len(fat)
+        fat.extend(range(node.cluster + 1, node.cluster + clusters))
+        fat.append(_END_OF_CHAIN)
+
+    def entry_count(node):
+        return sum(len(_lfn_entries(child.name, '')) + 1
+                   for child in node.children.values())
+
+    def assign(node):
+        taken = set()
+        for name in sorted(node.children):
+            child = node.children[name]
+            child.short_name = _short_name(name, taken)
+            if child.is_dir:
+                allocate(child, (entry_count(child) + 2) * _DIR_ENTRY_SIZE)
+            else:
+                allocate(child, len(child.data))
+        for name in sorted(node.children):
+            if node.children[name].is_dir:
+                assign(node.children[name])
+
+    if entry_count(root) + 1 > _ROOT_ENTRIES:
+        raise ValueError(_('Too many files in the root directory'))
+    assign(root)
+    if len(fat) - 2 > layout.clusters:
+        raise ValueError(_('Files do not fit in a %d byte filesystem') %
+                         size)
+
+    def directory(node, parent_cluster):
+        entries = []
+        if node is root:
+            entries.append(_entry(label, _ATTR_VOLUME_ID, 0, 0, timestamp))
+        else:
+            entries.append(_entry('.'.ljust(11), _ATTR_DIRECTORY,
+                                  node.cluster, 0, timestamp))
+            entries.append(_entry('..'.ljust(11), _ATTR_DIRECTORY,
+                                  parent_cluster, 0, timestamp))
+        for name in sorted(node.children):
+            child = node.children[name]
+            entries.extend(_lfn_entries(child.name, child.short_name))
+            if child.is_dir:
+                entries.append(_entry(child.short_name, _ATTR_DIRECTORY,
+                                      child.cluster, 0, timestamp))
+            else:
+                entries.append(_entry(child.short_name, _ATTR_ARCHIVE,
+                                      child.cluster, len(child.data),
+                                      timestamp))
+        return ''.join(entries)
+
+    with open(path, 'wb') as f:
+        f.truncate(size)
+        f.write(_boot_sector(layout, label))
+
+        fat_data = struct.pack('<%dH' % len(fat), *fat)
+        for i in range(_NUM_FATS):
+            f.seek((_RESERVED_SECTORS + i * layout.fat_sectors) *
+                   SECTOR_SIZE)
+            f.write(fat_data)
+
+        f.seek(layout.root_offset)
+        f.write(directory(root, 0))
+
+        def write_children(node):
+            for child in node.children.values():
+                if child.is_dir:
+                    f.seek(layout.cluster_offset(child.cluster))
+                    f.write(directory(child, node.cluster))
+                    write_children(child)
+                elif child.data:
+                    f.seek(layout.cluster_offset(child.cluster))
+                    f.write(child.data)
+
+        write_children(root)
@@ -16,6 +16,7 @@
 
 from eventlet import tpool
 import guestfs
+from oslo.config import cfg
 
 from nova import exception
 from nova.openstack.common import log as logging
@@ -25,8 +26,174 @@ from nova.virt.libvirt import driver as libvirt_driver
 
 LOG = logging.getLogger(__name__)
 
+guestfs_opts = [
+    cfg.IntOpt('libguestfs_pool_size',
+               default=0,
+               help='Number of launched libguestfs appliances kept for '
+                    'file injection. Images are hotplugged into a pooled '
+                    'appliance instead of launching a new one each time, '
+                    'which requires libguestfs with libvirt attach method '
+                    'support. The appliances are launched when the compute '
+                    'service starts. 0 disables the pool'),
+    ]
+
+CONF = cfg.CONF
+CONF.register_opts(guestfs_opts)
+
 guestfs = None
 
+# Label of the drive hotplugged into pooled appliances.
+POOL_DRIVE_LABEL = 'novaimg'
+
+_pool = None
+
+
+def _load_guestfs():
+    global guestfs
+    if guestfs is None:
+        guestfs = __import__('guestfs')
+
+
+def _libvirt_attach_method():
+    return 'libvirt:' + libvirt_driver.LibvirtDriver.uri()
+
+
+def _close_handle(handle):
+    try:
+        handle.shutdown()
+    except AttributeError:
+        # Older libguestfs versions haven't an explicit shutdown
+        pass
+    except RuntimeError, e:
+        LOG.warn(_("Failed to shutdown appliance %s"), e)
+
+    try:
+        handle.close()
+    except AttributeError:
+        # Older libguestfs versions haven't an explicit close
+        pass
+    except RuntimeError, e:
+        LOG.warn(_("Failed to close guest handle %s"), e)
+
+
+class GuestFSPool(object):
+    """A bounded pool of launched libguestfs appliances.
+
+    Launching an appliance takes several seconds, while hotplugging a
+    drive into a running one does not. Handles are checked with
+    ping_daemon before being handed out and when they are returned, and
+    any that fail are closed and replaced.
+
+    Older libguestfs versions can not hotplug drives. The pool is then
+    marked unsupported and hands out no handles, so that every image gets
+    a dedicated appliance as before.
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self.idle = []
+        self.in_use = 0
+        self.supported = callable(getattr(guestfs.GuestFS, 'remove_drive',
+                                          None))
+        if not self.supported:
+            LOG.warn(_("libguestfs can not hotplug drives, not pooling "
+                       "appliances"))
+
+    def disable(self):
+        """Stop pooling, closing any idle handles."""
+        self.supported = False
+        while self.idle:
+            _close_handle(self.idle.pop())
+
+    def _launch(self):
+        handle = tpool.Proxy(guestfs.GuestFS())
+        try:
+            # Hotplugging drives is only supported by the libvirt
+            # attach method.
+            handle.set_attach_method(_libvirt_attach_method())
+            handle.launch()
+        except Exception:
+            _close_handle(handle)
+            raise
+        return handle
+
+    @staticmethod
+    def _is_healthy(handle):
+        try:
+            handle.ping_daemon()
+            return True
+        except (AttributeError, RuntimeError):
+            return False
+
+    def fill(self):
+        """Launch appliances until the pool is full."""
+        while self.supported and len(self.idle) + self.in_use < self.size:
+            # Reserve the slot while launching, so that get() does not
+            # launch an appliance for it as well.
+            self.in_use += 1
+            try:
+                LOG.debug(_("Launching pooled appliance"))
+                handle = self._launch()
+            except Exception, e:
+                LOG.warn(_("Failed to launch pooled appliance (%s)"), e)
+                return
+            finally:
+                self.in_use -= 1
+            self.idle.append(handle)
+
+    def get(self):
+        """Return a launched handle, or None if the pool is exhausted."""
+        if not self.supported:
+            return None
+
+        while self.idle:
+            handle = self.idle.pop()
+            if self._is_healthy(handle):
+                self.in_use += 1
+                return handle
+            LOG.debug(_("Discarding unresponsive pooled appliance"))
+            _close_handle(handle)
+
+        if self.in_use >= self.size:
+            return None
+
+        self.in_use += 1
+        try:
+            LOG.debug(_("Launching pooled appliance"))
+            return self._launch()
+        except Exception, e:
+            self.in_use -= 1
+            LOG.warn(_("Failed to launch pooled appliance (%s)"), e)
+            return None
+
+    def put(self, handle, reuse=True):
+        """Return a handle obtained from get() to the pool."""
+        self.in_use -= 1
+        if (reuse and self.supported and
+                len(self.idle) + self.in_use < self.size and
+                self._is_healthy(handle)):
+            self.idle.append(handle)
+        else:
+            _close_handle(handle)
+
+
+def get_pool():
+    """Return the appliance pool, or None if pooling is disabled."""
+    global _pool
+    if CONF.libguestfs_pool_size <= 0:
+        return None
+    if _pool is None or _pool.size != CONF.libguestfs_pool_size:
+        _pool = GuestFSPool(CONF.libguestfs_pool_size)
+    return _pool
+
+
+def prelaunch():
+    """Fill the appliance pool ahead of the first injection, if enabled."""
+    _load_guestfs()
+    pool = get_pool()
+    if pool is not None:
+        pool.fill()
+
 
 class VFSGuestFS(vfs.VFS):
 
@@ -39,11 +206,19 @@ class VFSGuestFS(vfs.VFS):
     def __init__(self, imgfile, imgfmt='raw', partition=None):
         super(VFSGuestFS, self).__init__(imgfile, imgfmt, partition)
 
-        global guestfs
-        if guestfs is None:
-            guestfs = __import__('guestfs')
+        _load_guestfs()
 
         self.handle = None
+        self.pooled = False
+
+    def _device(self, partition=None):
+        if self.pooled:
+            device = "/dev/disk/guestfs/%s" % POOL_DRIVE_LABEL
+        else:
+            device = "/dev/sda"
+        if partition:
+            device += "%d" % partition
+        return device
 
     def setup_os(self):
         if self.partition == -1:
@@ -55,10 +230,7 @@ class VFSGuestFS(vfs.VFS):
         LOG.debug(_("Mount guest OS image %(imgfile)s partition %(part)s"),
                   {'imgfile': self.imgfile, 'part': str(self.partition)})
 
-        if self.partition:
-            self.handle.mount_options("", "/dev/sda%d" % self.partition, "/")
-        else:
-            self.handle.mount_options("", "/dev/sda", "/")
+        self.handle.mount_options("", self._device(self.partition), "/")
 
     def setup_os_inspect(self):
         LOG.debug(_("Inspecting guest OS image %s"), self.imgfile)
@@ -91,16 +263,76 @@ class VFSGuestFS(vfs.VFS):
                       {'dev': mount[1], 'dir': mount[0]})
             self.handle.mount_options("", mount[1], mount[0])
 
+    def _setup_pooled(self, pool):
+        """Hotplug the image into a pooled appliance.
+
+        Returns False if no pooled appliance could be used, in which case
+        a dedicated appliance should be launched instead.
+        """
+        handle = pool.get()
+        if handle is None:
+            return False
+
+        LOG.debug(_("Attaching %(imgfile)s to pooled appliance") %
+                  {'imgfile': self.imgfile})
+        try:
+            handle.add_drive_opts(self.imgfile, format=self.imgfmt,
+                                  label=POOL_DRIVE_LABEL)
+        except (AttributeError, TypeError), e:
+            # The label argument is missing from older libguestfs versions.
+            LOG.warn(_("libguestfs can not hotplug drives, not pooling "
+                       "appliances (%s)"), e)
+            pool.put(handle, reuse=False)
+            pool.disable()
+            return False
+        except RuntimeError, e:
+            LOG.warn(_("Failed to attach %(imgfile)s to pooled appliance "
+                       "(%(e)s)") % {'imgfile': self.imgfile, 'e': e})
+            pool.put(handle, reuse=False)
+            return False
+
+        self.handle = handle
+        self.pooled = True
+        try:
+            self.setup_os()
+            self.handle.aug_init("/", 0)
+        except Exception:
+            self._release_pooled(reuse=False)
+            raise
+        return True
+
+    def _release_pooled(self, reuse=True):
+        try:
+            try:
+                self.handle.umount_all()
+                self.handle.remove_drive(POOL_DRIVE_LABEL)
+            except (AttributeError, TypeError, RuntimeError), e:
+                LOG.warn(_("Failed to detach image from pooled appliance "
+                           "%s"), e)
+                reuse = False
+            get_pool().put(self.handle, reuse=reuse)
+        finally:
+            self.handle = None
+            self.pooled = False
+
     def setup(self):
         LOG.debug(_("Setting up appliance for %(imgfile)s %(imgfmt)s") %
                   {'imgfile': self.imgfile, 'imgfmt': self.imgfmt})
+        pool = get_pool()
+        try:
+            if pool and self._setup_pooled(pool):
+                return
+        except RuntimeError, e:
+            raise exception.NovaException(
+                _("Error mounting %(imgfile)s with libguestfs (%(e)s)") %
+                {'imgfile': self.imgfile, 'e': e})
+
         self.handle = tpool.Proxy(guestfs.GuestFS())
 
         try:
             self.handle.add_drive_opts(self.imgfile, format=self.imgfmt)
             if self.handle.get_attach_method() == 'libvirt':
-                libvirt_url = 'libvirt:' + libvirt_driver.LibvirtDriver.uri()
-                self.handle.set_attach_method(libvirt_url)
+                self.handle.set_attach_method(_libvirt_attach_method())
             self.handle.launch()
 
             self.setup_os()
@@ -125,21 +357,11 @@ class VFSGuestFS(vfs.VFS):
             except RuntimeError, e:
                 LOG.warn(_("Failed to close augeas %s"), e)
 
-            try:
-                self.handle.shutdown()
-            except AttributeError:
-                # Older libguestfs versions haven't an explicit shutdown
-                pass
-            except RuntimeError, e:
-                LOG.warn(_("Failed to shutdown appliance %s"), e)
+            if self.pooled:
+                self._release_pooled()
+                return
 
-            try:
-                self.handle.close()
-            except AttributeError:
-                # Older libguestfs versions haven't an explicit close
-                pass
-            except RuntimeError, e:
-                LOG.warn(_("Failed to close guest handle %s"), e)
+            _close_handle(self.handle)
         finally:
             # dereference object and implicitly close()
             self.handle = None
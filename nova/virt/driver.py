@@ -806,6 +806,15 @@ class ComputeDriver(object):
         """
         pass
 
+    def prefetch_image(self, context, image_id):
+        """
+        Fetch an image into the driver's local image cache.
+
+        Called ahead of a large launch so that the first instance booted
+        from the image on this host does not pay for the download.
+        """
+        raise NotImplementedError()
+
     def add_to_aggregate(self, context, aggregate, host, **kwargs):
         """Add a compute host to an aggregate."""
         #NOTE(jogo) Currently only used for XenAPI-Pool
@@ -423,6 +423,9 @@ class FakeDriver(driver.ComputeDriver):
     def get_disk_available_least(self):
         pass
 
+    def prefetch_image(self, context, image_id):
+        pass
+
     def get_volume_connector(self, instance):
         return {'ip': '127.0.0.1', 'initiator': 'fake', 'host': 'fakehost'}
 
@@ -202,9 +202,11 @@ def fetch(context, image_href, path, _user_id, _project_id):
             image_service.download(context, image_id, image_file)
 
 
-def fetch_to_raw(context, image_href, path, user_id, project_id):
+def fetch_to_raw(context, image_href, path, user_id, project_id,
+                 fetch_func=None):
     path_tmp = "%s.part" % path
-    fetch(context, image_href, path_tmp, user_id, project_id)
+    fetch_func = fetch_func or fetch
+    fetch_func(context, image_href, path_tmp, user_id, project_id)
 
     with utils.remove_path_on_error(path_tmp):
         data = qemu_img_info(path_tmp)
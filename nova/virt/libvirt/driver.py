@@ -88,6 +88,7 @@ from nova.virt.libvirt import config as vconfig
 from nova.virt.libvirt import firewall as libvirt_firewall
 from nova.virt.libvirt import imagebackend
 from nova.virt.libvirt import imagecache
+from nova.virt.libvirt import imagepeer
 from nova.virt.libvirt import utils as libvirt_utils
 from nova.virt import netutils
 
@@ -214,6 +215,7 @@ libvirt_opts = [
 CONF = cfg.CONF
 CONF.register_opts(libvirt_opts)
 CONF.import_opt('host', 'nova.netconf')
+CONF.import_opt('base_dir_name', 'nova.virt.libvirt.imagecache')
 CONF.import_opt('my_ip', 'nova.netconf')
 CONF.import_opt('default_ephemeral_format', 'nova.virt.driver')
 CONF.import_opt('use_cow_images', 'nova.virt.driver')
@@ -548,6 +550,21 @@ class LibvirtDriver(driver.ComputeDriver):
 
         self._init_events()
 
+        if CONF.libvirt_image_peer_server:
+            imagepeer.start_server(os.path.join(CONF.instances_path,
+                                                CONF.base_dir_name))
+
+        eventlet.spawn_n(self._prelaunch_guestfs)
+
+    @staticmethod
+    def _prelaunch_guestfs():
+        try:
+            # Imported here, as the libguestfs bindings are optional.
+            from nova.virt.disk.vfs import guestfs as vfs_guestfs
+        except ImportError:
+            return
+        vfs_guestfs.prelaunch()
+
     def _get_connection(self):
         if not self._wrapped_conn or not self._test_connection():
             LOG.debug(_('Connecting to libvirt: %s'), self.uri())
@@ -3413,6 +3430,16 @@ class LibvirtDriver(driver.ComputeDriver):
         """Manage the local cache of images."""
         self.image_cache_manager.verify_base_images(context, all_instances)
 
+    def prefetch_image(self, context, image_id):
+        """Fetch an image into the local cache of images."""
+        fname = imagecache.get_cache_fname({'image_id': image_id}, 'image_id')
+        imagebackend.cache_base_image(libvirt_utils.fetch_image,
+                                      fname,
+                                      context=context,
+                                      image_id=image_id,
+                                      user_id=context.user_id,
+                                      project_id=context.project_id)
+
     def _cleanup_remote_migration(self, dest, inst_base, inst_base_resize):
         """Used only for cleanup in case migrate_disk_and_power_off fails."""
         try:
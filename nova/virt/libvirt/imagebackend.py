@@ -148,10 +148,7 @@ class Image(object):
                     'ephemeral_size' in kwargs:
                 fetch_func(target=target, *args, **kwargs)
 
-        base_dir = os.path.join(CONF.instances_path, CONF.base_dir_name)
-        if not os.path.exists(base_dir):
-            fileutils.ensure_tree(base_dir)
-        base = os.path.join(base_dir, filename)
+        base = _base_image_path(filename)
 
         if not os.path.exists(self.path) or not os.path.exists(base):
             self.create_image(call_if_not_exists, base, size,
@@ -366,6 +363,37 @@ class Lvm(Image):
         libvirt_utils.execute(*cmd, run_as_root=True, attempts=3)
 
 
+def _base_image_path(filename):
+    base_dir = os.path.join(CONF.instances_path, CONF.base_dir_name)
+    if not os.path.exists(base_dir):
+        fileutils.ensure_tree(base_dir)
+    return os.path.join(base_dir, filename)
+
+
+def cache_base_image(fetch_func, filename, *args, **kwargs):
+    """Populate the image cache without creating an instance image.
+
+    Takes the same lock as Image.cache, so a concurrent instance spawn
+    waits for the download instead of starting another one.
+
+    :fetch_func: Function that creates the base image
+                 Should accept `target` argument.
+    :filename: Name of the file in the image directory
+    :returns: Path of the base image
+    """
+    lock_path = os.path.join(CONF.instances_path, 'locks')
+
+    @lockutils.synchronized(filename, 'nova-', external=True,
+                            lock_path=lock_path)
+    def call_if_not_exists(target, *args, **kwargs):
+        if not os.path.exists(target):
+            fetch_func(target=target, *args, **kwargs)
+
+    base = _base_image_path(filename)
+    call_if_not_exists(base, *args, **kwargs)
+    return base
+
+
 class Backend(object):
     def __init__(self, use_cow):
         self.BACKEND = {
@@ -28,6 +28,8 @@ import os
 import re
 import time
 
+from eventlet import greenthread
+from eventlet import tpool
 from oslo.config import cfg
 
 from nova.compute import task_states
@@ -74,6 +76,14 @@ imagecache_opts = [
     cfg.IntOpt('checksum_interval_seconds',
                default=3600,
                help='How frequently to checksum base images'),
+    cfg.IntOpt('checksum_read_size',
+               default=4 * 1024 * 1024,
+               help='Number of bytes read from a base image at a time when '
+                    'checksumming it'),
+    cfg.IntOpt('checksum_max_read_rate',
+               default=0,
+               help='Maximum rate in bytes per second at which base images '
+                    'are read when checksumming them. 0 means unlimited'),
     ]
 
 CONF = cfg.CONF
@@ -239,11 +249,25 @@ def write_stored_checksum(target):
     write_stored_info(target, field='sha1', value=checksum)
 
 
+def _hash_chunk(f, size, digest):
+    """Read up to size bytes from f into digest, returning how many."""
+    data = f.read(size)
+    digest.update(data)
+    return len(data)
+
+
 class ImageCacheManager(object):
     def __init__(self):
         self.lock_path = os.path.join(CONF.instances_path, 'locks')
         self._reset_state()
 
+        # Checksumming happens in a background thread and may span several
+        # passes, so its state is not reset between them.
+        self._checksum_queue = {}
+        self._checksum_jobs = {}
+        self._checksum_results = {}
+        self._checksum_worker_running = False
+
     def _reset_state(self):
         """Reset state variables used for each pass."""
 
@@ -384,6 +408,45 @@ class ImageCacheManager(object):
             if m:
                 yield img, False, True
 
+    def _hash_base_file(self, base_file):
+        """Return the sha1 of a base image, read at a limited rate.
+
+        Progress is kept per file, so a hash interrupted part way through
+        resumes where it stopped on the next attempt unless the file has
+        changed in the meantime.
+        """
+        stat = os.stat(base_file)
+        job = self._checksum_jobs.get(base_file)
+        if (not job or job['size'] != stat.st_size or
+                job['mtime'] != stat.st_mtime):
+            job = {'size': stat.st_size, 'mtime': stat.st_mtime,
+                   'offset': 0, 'digest': hashlib.sha1()}
+            self._checksum_jobs[base_file] = job
+
+        start_time = time.time()
+        start_offset = job['offset']
+        with open(base_file, 'rb') as f:
+            f.seek(job['offset'])
+            while True:
+                # File reads block the whole process under eventlet, so
+                # they are done, along with the hashing, in a native thread.
+                length = tpool.execute(_hash_chunk, f,
+                                       CONF.checksum_read_size, job['digest'])
+                if not length:
+                    break
+                job['offset'] += length
+
+                # Sleeping also gives other threads a chance to run
+                delay = 0
+                if CONF.checksum_max_read_rate > 0:
+                    read = job['offset'] - start_offset
+                    delay = (float(read) / CONF.checksum_max_read_rate -
+                             (time.time() - start_time))
+                greenthread.sleep(max(delay, 0))
+
+        del self._checksum_jobs[base_file]
+        return job['digest'].hexdigest()
+
     def _verify_checksum(self, img_id, base_file, create_if_missing=True):
         """Compare the checksum stored on disk with the current file.
 
@@ -398,58 +461,108 @@ class ImageCacheManager(object):
         lock_name = 'hash-%s' % os.path.split(base_file)[-1]
 
         # Protect against other nova-computes performing checksums at the same
-        # time if we are using shared storage
+        # time if we are using shared storage. The lock is only held while
+        # claiming the image; the image itself is read without it.
         @lockutils.synchronized(lock_name, 'nova-', external=True,
                                 lock_path=self.lock_path)
-        def inner_verify_checksum():
+        def claim_checksum():
             (stored_checksum, stored_timestamp) = read_stored_checksum(
                 base_file, timestamped=True)
-            if stored_checksum:
-                # NOTE(mikal): Checksums are timestamped. If we have recently
-                # checksummed (possibly on another compute node if we are using
-                # shared storage), then we don't need to checksum again.
-                if (stored_timestamp and
-                    time.time() - stored_timestamp <
-                    CONF.checksum_interval_seconds):
-                    return True
-
-                # NOTE(mikal): If there is no timestamp, then the checksum was
-                # performed by a previous version of the code.
-                if not stored_timestamp:
-                    write_stored_info(base_file, field='sha1',
-                                      value=stored_checksum)
-
-                with open(base_file, 'r') as f:
-                    current_checksum = utils.hash_file(f)
-
-                if current_checksum != stored_checksum:
-                    LOG.error(_('image %(id)s at (%(base_file)s): image '
-                                'verification failed'),
-                              {'id': img_id,
-                               'base_file': base_file})
-                    return False
 
-                else:
-                    return True
+            # NOTE(mikal): Checksums are timestamped. If we have recently
+            # checksummed (possibly on another compute node if we are using
+            # shared storage), then we don't need to checksum again.
+            if (stored_checksum and stored_timestamp and
+                time.time() - stored_timestamp <
+                CONF.checksum_interval_seconds):
+                return stored_checksum, False, True
+
+            # Another node sharing this storage is already reading the image
+            # for this interval.
+            (claim, claim_timestamp) = read_stored_info(
+                base_file, field='sha1-claim', timestamped=True)
+            if (claim not in (None, CONF.host) and claim_timestamp and
+                time.time() - claim_timestamp <
+                CONF.checksum_interval_seconds):
+                return (stored_checksum, False,
+                        self._checksum_results.get(base_file))
+
+            # NOTE(mikal): If there is no timestamp, then the checksum was
+            # performed by a previous version of the code.
+            if stored_checksum and not stored_timestamp:
+                write_stored_info(base_file, field='sha1',
+                                  value=stored_checksum)
+
+            if stored_checksum or create_if_missing:
+                write_stored_info(base_file, field='sha1-claim',
+                                  value=CONF.host)
+            return stored_checksum, True, None
+
+        stored_checksum, needs_hash, result = claim_checksum()
+        if not needs_hash:
+            return result
+
+        if stored_checksum:
+            current_checksum = self._hash_base_file(base_file)
+            if current_checksum != stored_checksum:
+                LOG.error(_('image %(id)s at (%(base_file)s): image '
+                            'verification failed'),
+                          {'id': img_id,
+                           'base_file': base_file})
+                return False
 
-            else:
-                LOG.info(_('image %(id)s at (%(base_file)s): image '
-                           'verification skipped, no hash stored'),
-                         {'id': img_id,
-                          'base_file': base_file})
+            # Refresh the timestamp so that no node sharing this storage
+            # reads the image again until checksum_interval_seconds passes.
+            write_stored_info(base_file, field='sha1',
+                              value=stored_checksum)
+            return True
+
+        LOG.info(_('image %(id)s at (%(base_file)s): image '
+                   'verification skipped, no hash stored'),
+                 {'id': img_id,
+                  'base_file': base_file})
 
-                # NOTE(mikal): If the checksum file is missing, then we should
-                # create one. We don't create checksums when we download images
-                # from glance because that would delay VM startup.
-                if CONF.checksum_base_images and create_if_missing:
-                    LOG.info(_('%(id)s (%(base_file)s): generating checksum'),
-                             {'id': img_id,
-                              'base_file': base_file})
-                    write_stored_checksum(base_file)
+        # NOTE(mikal): If the checksum file is missing, then we should
+        # create one. We don't create checksums when we download images
+        # from glance because that would delay VM startup.
+        if create_if_missing:
+            LOG.info(_('%(id)s (%(base_file)s): generating checksum'),
+                     {'id': img_id,
+                      'base_file': base_file})
+            write_stored_info(base_file, field='sha1',
+                              value=self._hash_base_file(base_file))
 
-                return None
+        return None
 
-        return inner_verify_checksum()
+    def _queue_checksum(self, img_id, base_file):
+        """Queue a base image for checksumming in the background.
+
+        Returns the result of the most recent checksum of the image, in the
+        same form as _verify_checksum, or None if it has not finished yet.
+        """
+        if base_file not in self._checksum_queue:
+            self._checksum_queue[base_file] = img_id
+        if not self._checksum_worker_running:
+            self._checksum_worker_running = True
+            greenthread.spawn_n(self._checksum_worker)
+        return self._checksum_results.get(base_file)
+
+    def _checksum_worker(self):
+        """Checksum queued base images one at a time."""
+        try:
+            while self._checksum_queue:
+                base_file, img_id = self._checksum_queue.popitem()
+                try:
+                    if os.path.isfile(base_file):
+                        self._checksum_results[base_file] = (
+                            self._verify_checksum(img_id, base_file))
+                except Exception:
+                    LOG.exception(_('image %(id)s at (%(base_file)s): '
+                                    'checksum failed'),
+                                  {'id': img_id,
+                                   'base_file': base_file})
+        finally:
+            self._checksum_worker_running = False
 
     def _remove_base_file(self, base_file):
         """Remove a single base file if it is old enough.
@@ -475,6 +588,8 @@ class ImageCacheManager(object):
             LOG.info(_('Removing base file: %s'), base_file)
             try:
                 os.remove(base_file)
+                self._checksum_jobs.pop(base_file, None)
+                self._checksum_results.pop(base_file, None)
                 signature = get_info_filename(base_file)
                 if os.path.exists(signature):
                     os.remove(signature)
@@ -499,15 +614,12 @@ class ImageCacheManager(object):
 
         if (base_file and os.path.exists(base_file)
             and os.path.isfile(base_file)):
-            # _verify_checksum returns True if the checksum is ok, and None if
-            # there is no checksum file
-            checksum_result = self._verify_checksum(img_id, base_file)
+            # _queue_checksum returns True if the checksum was last found to
+            # be ok, and None if there is no checksum result yet
+            checksum_result = self._queue_checksum(img_id, base_file)
             if checksum_result is not None:
                 image_bad = not checksum_result
 
-            # Give other threads a chance to run
-            time.sleep(0)
-
         instances = []
         if img_id in self.used_images:
             local, remote, instances = self.used_images[img_id]
@@ -0,0 +1,411 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Peer-to-peer distribution of cached base images.
+
+Compute nodes with libvirt_image_peer_server enabled serve the unresized
+base images held in their image cache over plain HTTP, with support for
+range requests. Only images that Glance marks public are served, and only
+to the hosts listed in libvirt_image_peer_clients (by default the hosts in
+libvirt_image_peers).
+
+The image cache may hold a converted copy of the Glance image (see
+force_raw_images), so when a node fetches a public base image it records the
+Glance checksum the copy was made from, and the md5 and size of the copy
+itself, in the image's info file. Nodes with libvirt_image_peers configured
+ask those peers for a copy made from the same Glance checksum before falling
+back to Glance, and verify the download against the recorded md5.
+"""
+
+import hashlib
+import httplib
+import os
+import random
+import re
+import socket
+
+import eventlet
+from eventlet import greenpool
+from oslo.config import cfg
+import webob.dec
+import webob.exc
+import webob.static
+
+from nova.image import glance
+from nova.openstack.common import jsonutils
+from nova.openstack.common import log as logging
+from nova import utils
+from nova.virt import images
+from nova.virt.libvirt import imagecache
+from nova import wsgi
+
+LOG = logging.getLogger(__name__)
+
+imagepeer_opts = [
+    cfg.BoolOpt('libvirt_image_peer_server',
+                default=False,
+                help='Serve cached public base images to other compute '
+                     'nodes'),
+    cfg.StrOpt('libvirt_image_peer_listen',
+               default='$my_ip',
+               help='IP address on which the base image peer server '
+                    'listens'),
+    cfg.IntOpt('libvirt_image_peer_port',
+               default=6070,
+               help='Port on which the base image peer server listens'),
+    cfg.ListOpt('libvirt_image_peers',
+                default=[],
+                help='List of host:port peer servers to fetch base images '
+                     'from before falling back to Glance'),
+    cfg.ListOpt('libvirt_image_peer_clients',
+                default=[],
+                help='List of hosts allowed to fetch base images from the '
+                     'peer server. Defaults to the hosts in '
+                     'libvirt_image_peers'),
+    cfg.IntOpt('libvirt_image_peer_chunk_size',
+               default=64 * 1024 * 1024,
+               help='Number of bytes requested from a peer per range '
+                    'request'),
+    cfg.IntOpt('libvirt_image_peer_timeout',
+               default=30,
+               help='Timeout in seconds for range requests to image peers'),
+    cfg.IntOpt('libvirt_image_peer_probe_timeout',
+               default=2,
+               help='Total time in seconds allowed for asking the image '
+                    'peers whether they hold an image'),
+    ]
+
+CONF = cfg.CONF
+CONF.register_opts(imagepeer_opts)
+CONF.import_opt('my_ip', 'nova.netconf')
+
+# Only original (unresized) base images are copies of an image held in
+# Glance, and they are named after the sha1 of the image id.
+BASE_IMAGE_RE = re.compile('^[0-9a-f]{40}$')
+
+# Image info file field recording the Glance checksum, md5 and size of a
+# public base image.
+INFO_FIELD = 'peer'
+
+IMAGE_CHECKSUM_HEADER = 'X-Image-Checksum'
+CONTENT_CHECKSUM_HEADER = 'X-Image-Content-Checksum'
+
+_READ_SIZE = 64 * 1024
+
+
+class PeerFetchError(Exception):
+    pass
+
+
+def _resolve_hosts(hosts):
+    addresses = set()
+    for host in hosts:
+        host = _split_peer(host)[0]
+        try:
+            for info in socket.getaddrinfo(host, None):
+                addresses.add(info[4][0])
+        except socket.error as e:
+            LOG.warn(_('Unable to resolve image peer %(host)s: %(e)s') %
+                     locals())
+    return addresses
+
+
+def _default_clients():
+    return CONF.libvirt_image_peer_clients or CONF.libvirt_image_peers
+
+
+class ImagePeerApp(object):
+    """WSGI application serving the local image cache to peers.
+
+    GET / returns a JSON index of the base images available on this node,
+    HEAD and GET /<name> return a base image, honouring Range headers.
+    Requests from hosts other than the allowed clients are refused.
+    """
+
+    def __init__(self, base_dir, clients=None):
+        self.base_dir = base_dir
+        if clients is None:
+            clients = _default_clients()
+        self.allowed_addresses = _resolve_hosts(clients)
+
+    def _image_info(self, name):
+        """Return the recorded peer info for a servable image, or None."""
+        if not BASE_IMAGE_RE.match(name):
+            return None
+        path = os.path.join(self.base_dir, name)
+        if not os.path.isfile(path):
+            return None
+        info = imagecache.read_stored_info(path, field=INFO_FIELD)
+        # The info is only recorded for public images, and is stale if the
+        # base image has been replaced since.
+        if not info or info.get('size') != os.path.getsize(path):
+            return None
+        return info
+
+    def list_images(self):
+        base_images = []
+        if not os.path.isdir(self.base_dir):
+            return base_images
+        for name in sorted(os.listdir(self.base_dir)):
+            info = self._image_info(name)
+            if info:
+                base_images.append({'name': name,
+                                    'size': info['size'],
+                                    'checksum': info['checksum'],
+                                    'content_checksum': info['md5']})
+        return base_images
+
+    @webob.dec.wsgify
+    def __call__(self, req):
+        if req.remote_addr not in self.allowed_addresses:
+            raise webob.exc.HTTPForbidden()
+        if req.method not in ('GET', 'HEAD'):
+            raise webob.exc.HTTPMethodNotAllowed()
+
+        name = req.path_info.strip('/')
+        if not name:
+            resp = webob.Response(content_type='application/json')
+            resp.body = jsonutils.dumps({'images': self.list_images()})
+            return resp
+
+        info = self._image_info(name)
+        if not info:
+            raise webob.exc.HTTPNotFound()
+
+        path = os.path.join(self.base_dir, name)
+        resp = webob.Response(content_type='application/octet-stream',
+                              conditional_response=True)
+        resp.app_iter = webob.static.FileIter(open(path, 'rb'))
+        resp.content_length = info['size']
+        resp.headers[IMAGE_CHECKSUM_HEADER] = str(info['checksum'])
+        resp.headers[CONTENT_CHECKSUM_HEADER] = str(info['md5'])
+        return resp
+
+
+def start_server(base_dir):
+    """Start serving the image cache in base_dir to peers."""
+    if not _default_clients():
+        LOG.warn(_('No image peer clients are configured, the image peer '
+                   'server will refuse all requests'))
+    server = wsgi.Server('imagepeer', ImagePeerApp(base_dir),
+                         host=CONF.libvirt_image_peer_listen,
+                         port=CONF.libvirt_image_peer_port)
+    server.start()
+    return server
+
+
+def record_image(path, checksum):
+    """Record that the base image at path is a copy of a public image.
+
+    :param checksum: the Glance checksum of the image the copy was made from
+    """
+    size = os.path.getsize(path)
+    md5 = _rehash(path, size).hexdigest()
+    imagecache.write_stored_info(path, field=INFO_FIELD,
+                                 value={'checksum': checksum,
+                                        'md5': md5,
+                                        'size': size})
+
+
+def _split_peer(peer):
+    host, _sep, port = peer.strip().rpartition(':')
+    if not host:
+        return peer.strip(), CONF.libvirt_image_peer_port
+    return host, int(port)
+
+
+def _request(peer, method, name, headers=None, timeout=None):
+    host, port = _split_peer(peer)
+    conn = httplib.HTTPConnection(
+        host, port, timeout=timeout or CONF.libvirt_image_peer_timeout)
+    conn.request(method, '/%s' % name, headers=headers or {})
+    return conn.getresponse()
+
+
+def _probe_peer(peer, name, checksum):
+    """Ask a peer for a copy of a Glance image.
+
+    :returns: the (size, md5) of the peer's copy, or None if the peer does
+              not hold a copy made from the image with the given checksum.
+    """
+    try:
+        resp = _request(peer, 'HEAD', name,
+                        timeout=CONF.libvirt_image_peer_probe_timeout)
+        resp.read()
+    except Exception as e:
+        LOG.debug(_('Image peer %(peer)s unavailable: %(e)s') % locals())
+        return None
+    if (resp.status != 200 or
+            resp.getheader(IMAGE_CHECKSUM_HEADER) != checksum):
+        return None
+    return (int(resp.getheader('content-length', -1)),
+            resp.getheader(CONTENT_CHECKSUM_HEADER))
+
+
+def _probe_peers(peers, name, checksum):
+    """Probe the peers in parallel, within libvirt_image_peer_probe_timeout.
+
+    :returns: a dict mapping the peers holding a copy to its (size, md5).
+    """
+    copies = {}
+
+    def _probe(peer):
+        copy = _probe_peer(peer, name, checksum)
+        if copy:
+            copies[peer] = copy
+
+    pool = greenpool.GreenPool()
+    with eventlet.Timeout(CONF.libvirt_image_peer_probe_timeout, False):
+        for peer in peers:
+            pool.spawn_n(_probe, peer)
+        pool.waitall()
+    # Peers answering after the deadline are ignored.
+    return dict(copies)
+
+
+def _fetch_range(peer, name, start, end, image_file, digest):
+    headers = {'Range': 'bytes=%d-%d' % (start, end)}
+    resp = _request(peer, 'GET', name, headers=headers)
+    if resp.status != 206:
+        raise PeerFetchError(_('Unexpected status %(status)s for range '
+                               '%(start)d-%(end)d') %
+                             {'status': resp.status, 'start': start,
+                              'end': end})
+    received = 0
+    while True:
+        data = resp.read(_READ_SIZE)
+        if not data:
+            break
+        image_file.write(data)
+        digest.update(data)
+        received += len(data)
+    if received != end - start + 1:
+        raise PeerFetchError(_('Short read of range %(start)d-%(end)d') %
+                             {'start': start, 'end': end})
+
+
+def fetch_from_peers(name, path, checksum, peers=None):
+    """Download a base image from the peers that hold it.
+
+    Only peers holding a copy made from the Glance image with the given
+    checksum are used. When they hold differing copies, the copy held by the
+    most peers is downloaded. The image is downloaded in ranges of
+    libvirt_image_peer_chunk_size bytes. When a peer fails part way through
+    the download is resumed from the next peer holding an identical copy.
+
+    :returns: True if a verified copy of the image was written to path.
+    """
+    if peers is None:
+        peers = list(CONF.libvirt_image_peers)
+        random.shuffle(peers)
+
+    copies = _probe_peers(peers, name, checksum)
+    if not copies:
+        return False
+
+    copy_counts = {}
+    for copy in copies.values():
+        copy_counts[copy] = copy_counts.get(copy, 0) + 1
+    size, md5 = max(copy_counts, key=copy_counts.get)
+    candidates = [peer for peer in peers if copies.get(peer) == (size, md5)]
+
+    digest = hashlib.md5()
+    offset = 0
+    with open(path, 'wb') as image_file:
+        for peer in candidates:
+            try:
+                while offset < size:
+                    end = min(offset + CONF.libvirt_image_peer_chunk_size,
+                              size) - 1
+                    _fetch_range(peer, name, offset, end, image_file, digest)
+                    offset = end + 1
+                break
+            except Exception as e:
+                LOG.warn(_('Fetching %(name)s from image peer %(peer)s '
+                           'failed at offset %(offset)d: %(e)s') % locals())
+                # Discard the partially written range and resume from the
+                # last complete one.
+                image_file.seek(offset)
+                image_file.truncate()
+                digest = _rehash(path, offset)
+
+    if offset != size or digest.hexdigest() != md5:
+        LOG.warn(_('Image %(name)s from peers failed verification, '
+                   'falling back to Glance') % locals())
+        utils.delete_if_exists(path)
+        return False
+    return True
+
+
+def _rehash(path, length):
+    digest = hashlib.md5()
+    with open(path, 'rb') as image_file:
+        remaining = length
+        while remaining:
+            data = image_file.read(min(_READ_SIZE, remaining))
+            if not data:
+                break
+            digest.update(data)
+            remaining -= len(data)
+    return digest
+
+
+def _show(context, image_href):
+    (image_service, image_id) = glance.get_remote_image_service(
+        context, image_href)
+    return image_service.show(context, image_id)
+
+
+def fetch_to_raw(context, image_href, path, user_id, project_id):
+    """Fetch an image to path, from image peers if possible.
+
+    Wraps nova.virt.images.fetch_to_raw. When this node serves images to
+    its peers, public base images are recorded once they are in place.
+    """
+    meta = {}
+    name = os.path.basename(path)
+    if ((CONF.libvirt_image_peers or CONF.libvirt_image_peer_server) and
+            BASE_IMAGE_RE.match(name)):
+        try:
+            meta = _show(context, image_href)
+        except Exception as e:
+            LOG.warn(_('Unable to look up image %(image_href)s for image '
+                       'peers: %(e)s') % locals())
+    checksum = meta.get('checksum')
+
+    def _fetch(context, image_href, path, user_id, project_id):
+        if CONF.libvirt_image_peers and checksum:
+            try:
+                if fetch_from_peers(name, path, checksum):
+                    LOG.info(_('Fetched image %(image_href)s from image '
+                               'peers') % locals())
+                    return
+            except Exception as e:
+                LOG.warn(_('Unable to fetch image %(image_href)s from '
+                           'image peers: %(e)s') % locals())
+                utils.delete_if_exists(path)
+        images.fetch(context, image_href, path, user_id, project_id)
+
+    images.fetch_to_raw(context, image_href, path, user_id, project_id,
+                        fetch_func=_fetch)
+
+    if CONF.libvirt_image_peer_server and checksum and meta.get('is_public'):
+        try:
+            record_image(path, checksum)
+        except Exception as e:
+            LOG.warn(_('Unable to record image %(image_href)s for image '
+                       'peers: %(e)s') % locals())
@@ -590,7 +590,10 @@ def get_fs_info(path):
 
 def fetch_image(context, target, image_id, user_id, project_id):
     """Grab image."""
-    images.fetch_to_raw(context, image_id, target, user_id, project_id)
+    # NOTE: imported here rather than at the top of the module because
+    # imagepeer uses the image cache, which imports this module.
+    from nova.virt.libvirt import imagepeer
+    imagepeer.fetch_to_raw(context, image_id, target, user_id, project_id)
 
 
 def get_instance_path(instance, forceold=False):
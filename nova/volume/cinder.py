@@ -31,6 +31,7 @@ from oslo.config import cfg
 from nova.db import base
 from nova import exception
 from nova.openstack.common import log as logging
+from nova import utils
 
 cinder_opts = [
     cfg.StrOpt('cinder_catalog_info',
@@ -103,6 +104,7 @@ def cinderclient(context):
     c.client.auth_token = context.auth_token or '%s:%s' % (context.user_id,
                                                            context.project_id)
     c.client.management_url = url
+    utils.time_calls(c.client, 'request', 'cinder')
     return c
 
 
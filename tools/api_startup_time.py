@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Time how long the compute API takes to load its extensions.
+
+Each run builds the v2 APIRouter in a fresh interpreter, once as nova-api
+does and once with every module which extensions import lazily loaded up
+front, as they were before extensions deferred them:
+
+    python tools/api_startup_time.py [runs]
+"""
+
+import os
+import subprocess
+import sys
+
+RUN = """
+import gettext
+import sys
+import time
+gettext.install('nova', unicode=1)
+
+from nova import config
+config.parse_args([])
+import nova.api.openstack.compute
+from nova import utils
+
+start = time.time()
+before = len(sys.modules)
+nova.api.openstack.compute.APIRouter()
+if %(eager)s:
+    for module in sys.modules.values():
+        for value in vars(module or object).values():
+            if isinstance(value, utils.LazyModule):
+                getattr(value, '__name__')
+print time.time() - start, len(sys.modules) - before
+"""
+
+
+def measure(eager):
+    root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+    env = dict(os.environ, PYTHONPATH=root)
+    with open(os.devnull, 'w') as devnull:
+        output = subprocess.check_output(
+            [sys.executable, '-c', RUN % {'eager': eager}], env=env,
+            stderr=devnull)
+    seconds, modules = output.split()
+    return float(seconds), int(modules)
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    for name, eager in (('eager', True), ('lazy', False)):
+        results = [measure(eager) for _i in range(runs)]
+        best = min(seconds for seconds, _modules in results)
+        print '%-6s best of %d: %.3f seconds, %d modules imported' % (
+            name, runs, best, results[0][1])
+
+
+if __name__ == '__main__':
+    main()